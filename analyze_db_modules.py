@@ -39,7 +39,6 @@ def analyze_db_usage():
     # Modules utilisant SQLite
     sqlite_modules = [
         "core/offline_sync.py",
-        "core/optimized_mysql_sync.py", 
         "core/voice_to_action.py",
         "routes/api/sprint2_api.py"
     ]
@@ -102,7 +101,6 @@ def generate_standardization_plan():
     print("\n3. MODULES SQLITE À CONSERVER:")  
     print("   • offline_sync.py - Synchronisation offline")
     print("   • voice_to_action.py - Cache vocal local")
-    print("   • optimized_mysql_sync.py - Sync bidirectionnelle")
     
     print("\n4. DONNÉES DE DÉMONSTRATION:")
     print("   • Créer des scripts de seed par module")
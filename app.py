@@ -52,7 +52,7 @@ except ImportError as e:
 # NOUVEAU SPRINT 2 - Expérience Terrain Augmentée
 try:
     from core.voice_to_action import voice_engine
-    from core.optimized_mysql_sync import get_optimized_sync_manager
+    from core.offline_sync import init_sync_manager
     from core.ar_checklist import ar_overlay
     from routes.api.sprint2_api import register_sprint2_routes
     SPRINT2_FIELD_EXPERIENCE = True
@@ -247,7 +247,7 @@ def create_app(config_class=Config):
                 'charset': 'utf8mb4'
             }
             
-            sync_manager = get_optimized_sync_manager(mysql_config)
+            sync_manager = init_sync_manager(mysql_config)
             
             logger.info("🚀✅ Sprint 2 Field Experience initialisé - Voice + Offline + AR")
             
@@ -296,6 +296,14 @@ def create_app(config_class=Config):
     except Exception as e:
         logger.error(f"❌ Erreur enregistrement Work Order Extensions blueprint: {e}")
     
+    # Médias terrain du stockage objet (/media/<bucket>/<clé>)
+    try:
+        from routes.work_orders.media import bp as media_bp
+        app.register_blueprint(media_bp)
+        logger.info("✅ Media blueprint enregistré - /media")
+    except Exception as e:
+        logger.error(f"❌ Erreur enregistrement Media blueprint: {e}")
+    
     # Register Customer 360 API si disponible
     if CUSTOMER360_API_AVAILABLE:
         try:
@@ -0,0 +1,246 @@
+"""
+Validation des tokens de l'API publique et comptabilité d'usage
+Utilisé par routes/api/public_simple.py et public_documented.py
+
+Un appel partenaire ne fait plus d'accès base : le token (empreinte SHA-256)
+est servi par un cache mémoire à TTL court, le compteur d'usage est agrégé en
+mémoire et api_usage_logs est écrit par lots, par un thread de fond qui relit
+aussi les révocations récentes (api_token_revocations) pour les invalider dans
+chaque processus sans attendre le TTL.
+"""
+import atexit
+import hashlib
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from core.database import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+# Durée de vie d'un token en cache (secondes) et d'une empreinte inconnue
+TOKEN_CACHE_TTL = int(os.environ.get('API_TOKEN_CACHE_TTL', '60'))
+NEGATIVE_CACHE_TTL = 5
+TOKEN_CACHE_MAX_ENTRIES = 10000
+
+# Écriture des compteurs et journaux d'usage, lecture des révocations
+USAGE_FLUSH_INTERVAL = float(os.environ.get('API_USAGE_FLUSH_INTERVAL', '5'))
+USAGE_MAX_PENDING = 5000  # au-delà, écriture anticipée ; jamais plus de 10x en mémoire
+
+
+def hash_token(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class TokenCache:
+    """Cache empreinte -> enregistrement api_tokens (TTL court, entrées négatives)"""
+
+    def __init__(self, ttl: int = TOKEN_CACHE_TTL, max_entries: int = TOKEN_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: Dict[str, Tuple[float, Optional[Dict]]] = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def get(self, token_hash: str) -> Tuple[bool, Optional[Dict]]:
+        """(trouvé, enregistrement) ; un enregistrement None = token inconnu ou inactif"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(token_hash)
+            if entry and entry[0] > now:
+                record = entry[1]
+                # Expiration du token lui-même pendant la durée de cache
+                if record and record.get('expires_at') and record['expires_at'] <= datetime.now():
+                    self._entries[token_hash] = (entry[0], None)
+                    record = None
+                self._stats['hits'] += 1
+                return True, record
+            self._stats['misses'] += 1
+            return False, None
+
+    def put(self, token_hash: str, record: Optional[Dict]):
+        ttl = self.ttl if record else NEGATIVE_CACHE_TTL
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                now = time.monotonic()
+                self._entries = {key: entry for key, entry in self._entries.items() if entry[0] > now}
+                if len(self._entries) >= self.max_entries:
+                    self._entries.clear()
+            self._entries[token_hash] = (time.monotonic() + ttl, record)
+
+    def invalidate(self, token_hash: Optional[str] = None, token_id: Optional[int] = None):
+        """Oublier un token (empreinte ou id) ; sans argument, tout le cache"""
+        with self._lock:
+            if token_hash is None and token_id is None:
+                self._entries.clear()
+            else:
+                for key in [key for key, (_, record) in self._entries.items()
+                            if key == token_hash or (record and record['id'] == token_id)]:
+                    del self._entries[key]
+            self._stats['invalidations'] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries))
+
+
+class UsageAccounting:
+    """Compteurs d'usage par token et journaux d'appels, écrits par lots"""
+
+    def __init__(self, cache: TokenCache, flush_interval: float = USAGE_FLUSH_INTERVAL,
+                 max_pending: int = USAGE_MAX_PENDING):
+        self.cache = cache
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._counters: Dict[int, List] = {}  # token_id -> [appels, dernier appel]
+        self._logs: List[Tuple] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._stats = {'flushes': 0, 'rows_written': 0, 'dropped': 0, 'errors': 0}
+
+    def record(self, token_id: int, endpoint: str, method: str, ip_address: str,
+               status: int, response_time: Optional[int] = None):
+        """Comptabiliser un appel (mémoire seulement)"""
+        now = datetime.now()
+        with self._lock:
+            counter = self._counters.setdefault(token_id, [0, now])
+            counter[0] += 1
+            counter[1] = now
+            self._logs.append((token_id, endpoint, method, ip_address, status, response_time, now))
+            backlog = len(self._logs)
+        self._ensure_thread()
+        if backlog >= self.max_pending:
+            self._wake.set()
+
+    def flush(self):
+        """Écrire compteurs et journaux en attente (une transaction)"""
+        with self._flush_lock:
+            with self._lock:
+                counters, self._counters = self._counters, {}
+                logs, self._logs = self._logs, []
+            if not counters and not logs:
+                return
+            try:
+                with get_db_connection() as conn:
+                    with conn.cursor() as cursor:
+                        if counters:
+                            cursor.executemany("""
+                                UPDATE api_tokens
+                                SET usage_count = usage_count + %s,
+                                    last_used_at = GREATEST(COALESCE(last_used_at, %s), %s)
+                                WHERE id = %s
+                            """, [(count, last_used, last_used, token_id)
+                                  for token_id, (count, last_used) in counters.items()])
+                        if logs:
+                            cursor.executemany("""
+                                INSERT INTO api_usage_logs
+                                (token_id, endpoint, http_method, ip_address,
+                                 response_status, response_time_ms, created_at)
+                                VALUES (%s, %s, %s, %s, %s, %s, %s)
+                            """, logs)
+                    conn.commit()
+                self._stats['flushes'] += 1
+                self._stats['rows_written'] += len(logs)
+            except Exception as e:
+                logger.error(f"❌ Écriture de l'usage API impossible: {e}")
+                self._stats['errors'] += 1
+                self._requeue(counters, logs)
+
+    def _requeue(self, counters: Dict[int, List], logs: List[Tuple]):
+        """Remettre en attente un lot non écrit (journaux les plus anciens abandonnés au-delà de la borne)"""
+        with self._lock:
+            for token_id, (count, last_used) in counters.items():
+                counter = self._counters.setdefault(token_id, [0, last_used])
+                counter[0] += count
+                counter[1] = max(counter[1], last_used)
+            self._logs = logs + self._logs
+            overflow = len(self._logs) - self.max_pending * 10
+            if overflow > 0:
+                del self._logs[:overflow]
+                self._stats['dropped'] += overflow
+
+    def poll_revocations(self):
+        """Invalider les tokens révoqués récemment (par n'importe quel processus)"""
+        window = int(self.cache.ttl + 2 * self.flush_interval) + 1
+        try:
+            with get_db_connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("""
+                        SELECT token_hash FROM api_token_revocations
+                        WHERE revoked_at >= NOW() - INTERVAL %s SECOND
+                    """, (window,))
+                    for row in cursor.fetchall():
+                        self.cache.invalidate(token_hash=row['token_hash'])
+        except Exception as e:
+            logger.debug(f"Révocations API non relues: {e}")
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            with self._flush_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, daemon=True, name="APIUsageFlush")
+                    self._thread.start()
+                    atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+            self.poll_revocations()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            pending = len(self._logs)
+        return dict(self._stats, pending=pending)
+
+
+token_cache = TokenCache()
+usage_accounting = UsageAccounting(token_cache)
+
+
+def validate_token(token: str) -> Optional[Dict]:
+    """Enregistrement api_tokens d'un token actif et non expiré (cache, sinon une lecture)"""
+    token_hash = hash_token(token)
+    found, record = token_cache.get(token_hash)
+    if found:
+        return dict(record) if record else None
+
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT * FROM api_tokens
+                WHERE token_hash = %s
+                AND is_active = TRUE
+                AND (expires_at IS NULL OR expires_at > NOW())
+            """, (token_hash,))
+            record = cursor.fetchone()
+
+    token_cache.put(token_hash, record)
+    # Le démarrage du thread garantit la relecture des révocations
+    usage_accounting._ensure_thread()
+    return dict(record) if record else None
+
+
+def revoke_token(token_id: int) -> bool:
+    """Désactiver un token ; les autres processus l'oublient au prochain relevé des révocations"""
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT token_hash FROM api_tokens WHERE id = %s", (token_id,))
+            row = cursor.fetchone()
+            if not row:
+                return False
+            cursor.execute("UPDATE api_tokens SET is_active = FALSE WHERE id = %s", (token_id,))
+            cursor.execute("""
+                INSERT INTO api_token_revocations (token_id, token_hash, revoked_at)
+                VALUES (%s, %s, NOW())
+                ON DUPLICATE KEY UPDATE revoked_at = NOW()
+            """, (token_id, row['token_hash']))
+        conn.commit()
+    token_cache.invalidate(token_hash=row['token_hash'])
+    return True
@@ -0,0 +1,219 @@
+"""
+Journal des modifications serveur -> appareils terrain
+Les triggers de migrations/sprint7_sync_change_feed.sql écrivent une ligne
+(séquence monotone) à chaque modification d'un bon de travail, d'une tâche
+ou d'une intervention ; un appareil tire les deltas depuis son point de
+reprise au lieu de retélécharger ses listes complètes.
+
+Limite : les séquences suivent l'ordre des écritures et non celui des
+commits ; une transaction plus longue que SETTLE_SECONDS peut être manquée
+(augmenter SYNC_CHANGES_SETTLE_SECONDS pour les traitements par lots).
+"""
+import os
+import logging
+from typing import Dict, List, Optional, Any, Iterable, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Une modification n'est servie qu'après ce délai : une transaction encore
+# ouverte ne doit pas valider une séquence inférieure à celles déjà servies.
+# Limite : seq est attribuée à l'écriture, pas au commit ; une transaction
+# validée plus de SETTLE_SECONDS après sa première écriture sur ces tables
+# est sautée par les appareils déjà passés au-delà de sa séquence (jusqu'à la
+# prochaine modification de l'entité ou un rechargement complet)
+SETTLE_SECONDS = float(os.environ.get('SYNC_CHANGES_SETTLE_SECONDS', '2'))
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 2000
+
+# Type d'entité -> (table, colonnes envoyées aux appareils)
+ENTITIES = {
+    'work_order': ('work_orders', (
+        'id', 'claim_number', 'customer_id', 'vehicle_id', 'description', 'priority', 'status',
+        'assigned_technician_id', 'scheduled_date', 'estimated_duration', 'updated_at'
+    )),
+    'task': ('work_order_tasks', (
+        'id', 'work_order_id', 'title', 'description', 'status', 'priority', 'technician_id',
+        'estimated_minutes', 'scheduled_start', 'scheduled_end', 'started_at', 'completed_at', 'updated_at'
+    )),
+    'intervention': ('interventions', (
+        'id', 'work_order_id', 'task_id', 'technician_id', 'started_at', 'ended_at',
+        'result_status', 'summary', 'updated_at'
+    )),
+}
+
+# Colonne du technicien destinataire de chaque type d'entité
+TECHNICIAN_COLUMNS = {
+    'work_order': 'assigned_technician_id',
+    'task': 'technician_id',
+    'intervention': 'technician_id',
+}
+
+
+def _in_clause(values: List) -> str:
+    return ', '.join(['%s'] * len(values))
+
+
+def get_changes(cursor, since: int, technician_id: Optional[int] = None,
+                limit: int = DEFAULT_PAGE_SIZE) -> Dict[str, Any]:
+    """
+    Deltas postérieurs à la séquence since
+
+    Une entité modifiée plusieurs fois n'apparaît qu'une fois, avec son état
+    actuel et sa version (séquence de sa dernière modification). Les
+    suppressions et les réaffectations à un autre technicien sont des
+    pierres tombales (op 'delete', sans données) ; celle d'un bon de travail
+    vaut pour ses tâches et interventions (suppression en cascade).
+    technician_id None : toutes les modifications (superviseurs).
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    filters = ["seq > %s", "changed_at <= NOW(3) - INTERVAL %s MICROSECOND"]
+    params: List[Any] = [since, int(SETTLE_SECONDS * 1_000_000)]
+    if technician_id is not None:
+        filters.append("technician_id = %s")
+        params.append(technician_id)
+    cursor.execute(f"""
+        SELECT seq, entity_type, entity_id, op
+        FROM sync_change_log
+        WHERE {' AND '.join(filters)}
+        ORDER BY seq
+        LIMIT %s
+    """, params + [limit + 1])
+    rows = cursor.fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    # Dernière opération par entité dans la page
+    latest: Dict[Tuple[str, int], Dict] = {}
+    for row in rows:
+        key = (row['entity_type'], row['entity_id'])
+        latest.pop(key, None)
+        latest[key] = row
+
+    states = {}
+    for entity_type in ENTITIES:
+        ids = [entity_id for (kind, entity_id), row in latest.items()
+               if kind == entity_type and row['op'] == 'upsert']
+        if ids:
+            states[entity_type] = fetch_entities(cursor, entity_type, ids)
+
+    changes = []
+    for (entity_type, entity_id), row in latest.items():
+        data = states.get(entity_type, {}).get(entity_id) if row['op'] == 'upsert' else None
+        if data is not None and technician_id is not None \
+                and data.get(TECHNICIAN_COLUMNS[entity_type]) != technician_id:
+            # Réaffecté depuis : sa pierre tombale suit dans le journal
+            data = None
+        change = {'type': entity_type, 'id': entity_id, 'version': row['seq'],
+                  'op': 'upsert' if data is not None else 'delete'}
+        if data is not None:
+            change['data'] = data
+        changes.append(change)
+
+    # Journal purgé au-delà de since : l'appareil doit tout recharger puis
+    # reprendre à head_seq (relevé avant le rechargement)
+    cursor.execute("SELECT MIN(seq) AS first_seq, MAX(seq) AS head_seq FROM sync_change_log")
+    bounds = cursor.fetchone() or {}
+    first_seq = bounds.get('first_seq')
+
+    return {
+        'changes': changes,
+        'next_since': rows[-1]['seq'] if rows else since,
+        'has_more': has_more,
+        'head_seq': bounds.get('head_seq') or 0,
+        'reset_required': bool(since > 0 and first_seq and since < first_seq - 1)
+    }
+
+
+def fetch_entities(cursor, entity_type: str, ids: List[int]) -> Dict[int, Dict]:
+    """État actuel (colonnes compactes) des entités, indexé par id"""
+    table, columns = ENTITIES[entity_type]
+    cursor.execute(
+        f"SELECT {', '.join(columns)} FROM {table} WHERE id IN ({_in_clause(ids)})",
+        ids
+    )
+    return {row['id']: row for row in cursor.fetchall()}
+
+
+def current_versions(cursor, entity_type: str, ids: Iterable[int]) -> Dict[int, int]:
+    """Version actuelle (séquence de la dernière modification) par id ; absent = jamais journalisé"""
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        return {}
+    cursor.execute(f"""
+        SELECT entity_id, MAX(seq) AS version
+        FROM sync_change_log
+        WHERE entity_type = %s AND entity_id IN ({_in_clause(ids)})
+        GROUP BY entity_id
+    """, [entity_type] + ids)
+    return {row['entity_id']: row['version'] for row in cursor.fetchall()}
+
+
+def detect_conflicts(cursor, items: List[Dict[str, Any]],
+                     technician_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Modifications hors ligne en conflit : l'entité a changé sur le serveur
+    depuis la version sur laquelle l'appareil a travaillé (base_version)
+
+    items : [{'type', 'id', 'base_version'}] ; chaque conflit porte la version
+    et l'état actuels du serveur (None si l'entité a été supprimée). Avec
+    technician_id, une entité qui ne lui est pas affectée est un conflit sans
+    état, comme la pierre tombale du flux de modifications.
+    """
+    by_type: Dict[str, List[Dict]] = {}
+    for item in items:
+        if item.get('type') not in ENTITIES:
+            raise ValueError(f"Type d'entité inconnu: {item.get('type')}")
+        by_type.setdefault(item['type'], []).append(item)
+
+    conflicts = []
+    for entity_type, entity_items in by_type.items():
+        ids = [int(item['id']) for item in entity_items]
+        versions = current_versions(cursor, entity_type, ids)
+        if technician_id is None:
+            stale = [item for item in entity_items
+                     if versions.get(int(item['id']), 0) > int(item.get('base_version') or 0)]
+            if not stale:
+                continue
+            states = fetch_entities(cursor, entity_type, [int(item['id']) for item in stale])
+        else:
+            column = TECHNICIAN_COLUMNS[entity_type]
+            states = {entity_id: data for entity_id, data in fetch_entities(cursor, entity_type, ids).items()
+                      if data.get(column) == technician_id}
+            stale = [item for item in entity_items
+                     if int(item['id']) not in states
+                     or versions.get(int(item['id']), 0) > int(item.get('base_version') or 0)]
+        for item in stale:
+            entity_id = int(item['id'])
+            conflicts.append({
+                'type': entity_type,
+                'id': entity_id,
+                'base_version': item.get('base_version'),
+                'server_version': versions.get(entity_id, 0),
+                'server_data': states.get(entity_id)
+            })
+    return conflicts
+
+
+def get_checkpoint(cursor, user_id: int, device_id: str) -> Optional[Dict]:
+    cursor.execute("""
+        SELECT device_id, user_id, last_seq, last_pull_at
+        FROM sync_device_checkpoints
+        WHERE user_id = %s AND device_id = %s
+    """, (user_id, device_id))
+    return cursor.fetchone()
+
+
+def save_checkpoint(cursor, user_id: int, device_id: str, last_seq: int):
+    """
+    Point de reprise acquitté par l'appareil (ne recule jamais)
+
+    L'identifiant d'appareil est choisi par le client : le point de reprise
+    est propre à chaque utilisateur, un même device_id ne partage rien.
+    """
+    cursor.execute("""
+        INSERT INTO sync_device_checkpoints (user_id, device_id, last_seq, last_pull_at)
+        VALUES (%s, %s, %s, NOW())
+        ON DUPLICATE KEY UPDATE
+            last_seq = GREATEST(last_seq, VALUES(last_seq)),
+            last_pull_at = NOW()
+    """, (user_id, device_id, last_seq))
@@ -4,12 +4,30 @@ Copilote IA Chatbot pour superviseurs et managers
 Permet de poser des questions directes et recevoir des réponses exploitables
 """
 
+import os
 import json
+import time
 import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from functools import partial
 from typing import Dict, List, Any, Optional
 import re
 from core.database import get_db_connection
+from core.intent_matcher import IntentMatcher
+
+# Les handlers sont des coroutines : les requêtes MySQL (PyMySQL, bloquant)
+# s'exécutent dans ce pool pour ne pas bloquer la boucle d'évènements
+_db_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('CONVERSATIONAL_AI_DB_THREADS', '8')),
+    thread_name_prefix='conversational-ai-db'
+)
+
+# Questions de tableau de bord répétées : réponse réutilisée pendant ce délai (secondes)
+RESPONSE_CACHE_TTL = int(os.environ.get('CONVERSATIONAL_AI_CACHE_TTL', '60'))
+RESPONSE_CACHE_SIZE = 256
+CACHEABLE_QUESTION_TYPES = ('availability', 'workload', 'performance', 'urgent')
 
 class ConversationalAI:
     """Moteur d'IA conversationnelle pour ChronoTech"""
@@ -17,7 +35,8 @@ class ConversationalAI:
     def __init__(self):
         self.context_memory = {}
         self.user_sessions = {}
-        self.response_cache = {}
+        self.response_cache = {}  # (type, paramètres) -> (expiration, réponse)
+        self._cache_lock = threading.Lock()
         
         # Patterns de questions supportés
         self.question_patterns = {
@@ -53,6 +72,13 @@ class ConversationalAI:
             ]
         }
         
+        # Tous les motifs compilés une fois ; l'ordre de déclaration fixe la priorité
+        self.intent_matcher = IntentMatcher(strategy='priority')
+        for question_type, patterns in self.question_patterns.items():
+            for pattern in patterns:
+                self.intent_matcher.add(question_type, pattern)
+        self.intent_matcher.compile()
+        
         # Réponses templates
         self.response_templates = {
             'no_data': "Je n'ai pas trouvé de données pour cette demande.",
@@ -70,11 +96,14 @@ class ConversationalAI:
             # Identifier le type de question
             question_type, extracted_params = self._classify_question(cleaned_question)
             
-            # Générer la réponse
-            response = await self._generate_response(question_type, extracted_params, user_id, context)
+            # Générer la réponse (ou la reprendre du cache)
+            response = self._get_cached_response(question_type, extracted_params)
+            if response is None:
+                response = await self._generate_response(question_type, extracted_params, user_id, context)
+                self._cache_response(question_type, extracted_params, response)
             
-            # Sauvegarder dans l'historique
-            self._save_to_history(user_id, question, response)
+            # Sauvegarder dans l'historique sans attendre l'écriture
+            _db_executor.submit(self._save_to_history, user_id, question, response)
             
             return {
                 'status': 'success',
@@ -111,15 +140,63 @@ class ConversationalAI:
     
     def _classify_question(self, question: str) -> tuple:
         """Classifie le type de question et extrait les paramètres"""
-        for question_type, patterns in self.question_patterns.items():
-            for pattern in patterns:
-                match = re.search(pattern, question)
-                if match:
-                    params = match.groups() if match.groups() else []
-                    return question_type, params
+        match = self.intent_matcher.match(question)
+        if match:
+            return match.intent, match.params if match.params else []
         
         return 'unknown', []
     
+    def _cache_key(self, question_type: str, params) -> tuple:
+        return question_type, tuple(' '.join((p or '').split()) for p in params)
+    
+    def _get_cached_response(self, question_type: str, params) -> Optional[Dict[str, Any]]:
+        """Réponse récente à la même question, marquée cached"""
+        if question_type not in CACHEABLE_QUESTION_TYPES:
+            return None
+        key = self._cache_key(question_type, params)
+        with self._cache_lock:
+            entry = self.response_cache.get(key)
+            if not entry:
+                return None
+            if entry[0] <= time.time():
+                del self.response_cache[key]
+                return None
+            return dict(entry[1], cached=True, processing_time=0)
+    
+    def _cache_response(self, question_type: str, params, response: Dict[str, Any]):
+        """Mettre en cache une réponse avec données (pas les erreurs ni les réponses vides)"""
+        if question_type not in CACHEABLE_QUESTION_TYPES or not response.get('data') or RESPONSE_CACHE_TTL <= 0:
+            return
+        key = self._cache_key(question_type, params)
+        with self._cache_lock:
+            if len(self.response_cache) >= RESPONSE_CACHE_SIZE:
+                now = time.time()
+                for expired in [k for k, (expires, _r) in self.response_cache.items() if expires <= now]:
+                    del self.response_cache[expired]
+                if len(self.response_cache) >= RESPONSE_CACHE_SIZE:
+                    self.response_cache.pop(next(iter(self.response_cache)))
+            self.response_cache[key] = (time.time() + RESPONSE_CACHE_TTL, response)
+    
+    def clear_cache(self):
+        """Vider le cache des réponses"""
+        with self._cache_lock:
+            self.response_cache.clear()
+    
+    async def _fetch(self, query: str, params: tuple = None, one: bool = False):
+        """Exécuter une requête de lecture dans le pool, sans bloquer la boucle"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_db_executor, partial(self._fetch_sync, query, params, one))
+    
+    @staticmethod
+    def _fetch_sync(query: str, params: tuple, one: bool):
+        connection = get_db_connection()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(query, params)
+                return cursor.fetchone() if one else cursor.fetchall()
+        finally:
+            connection.close()
+    
     async def _generate_response(self, question_type: str, params: List[str], user_id: int, context: Dict) -> Dict[str, Any]:
         """Génère une réponse basée sur le type de question"""
         start_time = datetime.now()
@@ -162,9 +239,6 @@ class ConversationalAI:
             period = self._extract_time_period(params)
             
             # Requête base de données
-            connection = get_db_connection()
-            cursor = connection.cursor(dictionary=True)
-            
             query = """
             SELECT 
                 u.id,
@@ -185,8 +259,7 @@ class ConversationalAI:
             ORDER BY current_tasks ASC, u.name ASC
             """
             
-            cursor.execute(query)
-            technicians = cursor.fetchall()
+            technicians = await self._fetch(query)
             
             # Filtrer par disponibilité
             available_technicians = [t for t in technicians if t['availability_status'] in ['Disponible', 'Peu occupé']]
@@ -206,9 +279,6 @@ class ConversationalAI:
             else:
                 response_text = f"Aucun technicien n'est actuellement disponible {period}. Tous les techniciens sont occupés."
             
-            cursor.close()
-            connection.close()
-            
             return {
                 'text': response_text,
                 'data': {
@@ -238,9 +308,6 @@ class ConversationalAI:
         try:
             technician_name = params[0] if params else None
             
-            connection = get_db_connection()
-            cursor = connection.cursor(dictionary=True)
-            
             if technician_name:
                 # Recherche par nom de technicien
                 query = """
@@ -255,8 +322,7 @@ class ConversationalAI:
                 WHERE u.name LIKE %s AND u.role = 'technician' AND u.is_active = TRUE
                 GROUP BY u.id, u.name
                 """
-                cursor.execute(query, (f"%{technician_name}%",))
-                result = cursor.fetchone()
+                result = await self._fetch(query, (f"%{technician_name}%",), one=True)
                 
                 if result:
                     response_text = f"Charge de travail de **{result['name']}** :\n\n"
@@ -277,34 +343,35 @@ class ConversationalAI:
                 else:
                     response_text = f"Aucun technicien trouvé avec le nom '{technician_name}'."
             else:
-                # Vue d'ensemble de tous les techniciens
-                query = """
-                SELECT 
-                    COUNT(DISTINCT u.id) as total_technicians,
-                    COUNT(wo.id) as total_active_tasks,
-                    AVG(task_count.tasks_per_tech) as avg_tasks_per_tech
-                FROM users u
-                LEFT JOIN work_orders wo ON u.id = wo.assigned_technician_id 
-                    AND wo.status IN ('assigned', 'in_progress')
-                LEFT JOIN (
-                    SELECT assigned_technician_id, COUNT(*) as tasks_per_tech
-                    FROM work_orders 
-                    WHERE status IN ('assigned', 'in_progress')
-                    GROUP BY assigned_technician_id
-                ) task_count ON u.id = task_count.assigned_technician_id
-                WHERE u.role = 'technician' AND u.is_active = TRUE
-                """
-                cursor.execute(query)
-                stats = cursor.fetchone()
+                # Vue d'ensemble de tous les techniciens : deux agrégats indépendants en parallèle
+                technicians, tasks = await asyncio.gather(
+                    self._fetch("""
+                        SELECT COUNT(*) as total_technicians
+                        FROM users
+                        WHERE role = 'technician' AND is_active = TRUE
+                    """, one=True),
+                    self._fetch("""
+                        SELECT 
+                            COUNT(*) as total_active_tasks,
+                            COUNT(DISTINCT wo.assigned_technician_id) as busy_technicians
+                        FROM work_orders wo
+                        JOIN users u ON u.id = wo.assigned_technician_id
+                        WHERE wo.status IN ('assigned', 'in_progress')
+                            AND u.role = 'technician' AND u.is_active = TRUE
+                    """, one=True)
+                )
+                busy = tasks['busy_technicians'] or 0
+                stats = {
+                    'total_technicians': technicians['total_technicians'],
+                    'total_active_tasks': tasks['total_active_tasks'],
+                    'avg_tasks_per_tech': tasks['total_active_tasks'] / busy if busy else 0
+                }
                 
                 response_text = "**Vue d'ensemble de la charge de travail :**\n\n"
                 response_text += f"• Nombre de techniciens actifs : {stats['total_technicians']}\n"
                 response_text += f"• Total des tâches actives : {stats['total_active_tasks']}\n"
                 response_text += f"• Moyenne par technicien : {round(stats['avg_tasks_per_tech'] or 0, 1)} tâches\n"
             
-            cursor.close()
-            connection.close()
-            
             return {
                 'text': response_text,
                 'data': result if technician_name else stats,
@@ -322,9 +389,6 @@ class ConversationalAI:
     async def _handle_urgent_question(self, params: List[str], context: Dict) -> Dict[str, Any]:
         """Gère les questions sur les tâches urgentes"""
         try:
-            connection = get_db_connection()
-            cursor = connection.cursor(dictionary=True)
-            
             query = """
             SELECT 
                 wo.id,
@@ -342,8 +406,7 @@ class ConversationalAI:
             LIMIT 10
             """
             
-            cursor.execute(query)
-            urgent_tasks = cursor.fetchall()
+            urgent_tasks = await self._fetch(query)
             
             if urgent_tasks:
                 response_text = f"**{len(urgent_tasks)} tâche{'s' if len(urgent_tasks) > 1 else ''} urgente{'s' if len(urgent_tasks) > 1 else ''} en cours :**\n\n"
@@ -357,9 +420,6 @@ class ConversationalAI:
             else:
                 response_text = "✅ **Aucune tâche urgente en cours.** Toutes les priorités sont sous contrôle."
             
-            cursor.close()
-            connection.close()
-            
             return {
                 'text': response_text,
                 'data': {
@@ -382,28 +442,42 @@ class ConversationalAI:
         try:
             technician_name = params[0] if params else None
             
-            connection = get_db_connection()
-            cursor = connection.cursor(dictionary=True)
-            
             if technician_name:
-                # Performance d'un technicien spécifique
-                query = """
-                SELECT 
-                    u.name,
-                    COUNT(wo.id) as completed_tasks,
-                    AVG(TIMESTAMPDIFF(HOUR, wo.created_at, wo.completed_at)) as avg_completion_time,
-                    AVG(cf.overall_satisfaction) as avg_customer_satisfaction,
-                    COUNT(CASE WHEN wo.completed_at <= wo.scheduled_date THEN 1 END) as on_time_completions
-                FROM users u
-                LEFT JOIN work_orders wo ON u.id = wo.assigned_technician_id 
-                    AND wo.status = 'completed'
-                    AND wo.completed_at >= DATE_SUB(NOW(), INTERVAL 30 DAY)
-                LEFT JOIN client_feedback cf ON wo.id = cf.work_order_id
-                WHERE u.name LIKE %s AND u.role = 'technician' AND u.is_active = TRUE
-                GROUP BY u.id, u.name
-                """
-                cursor.execute(query, (f"%{technician_name}%",))
-                result = cursor.fetchone()
+                # Performance d'un technicien spécifique : délais et satisfaction en parallèle
+                # (requêtes séparées : la jointure des avis multipliait les lignes comptées)
+                pattern = f"%{technician_name}%"
+                completions, satisfactions = await asyncio.gather(
+                    self._fetch("""
+                        SELECT 
+                            u.id,
+                            u.name,
+                            COUNT(wo.id) as completed_tasks,
+                            AVG(TIMESTAMPDIFF(HOUR, wo.created_at, wo.completed_at)) as avg_completion_time,
+                            COUNT(CASE WHEN wo.completed_at <= wo.scheduled_date THEN 1 END) as on_time_completions
+                        FROM users u
+                        LEFT JOIN work_orders wo ON u.id = wo.assigned_technician_id 
+                            AND wo.status = 'completed'
+                            AND wo.completed_at >= DATE_SUB(NOW(), INTERVAL 30 DAY)
+                        WHERE u.name LIKE %s AND u.role = 'technician' AND u.is_active = TRUE
+                        GROUP BY u.id, u.name
+                    """, (pattern,)),
+                    self._fetch("""
+                        SELECT 
+                            wo.assigned_technician_id as technician_id,
+                            AVG(cf.overall_satisfaction) as avg_customer_satisfaction
+                        FROM client_feedback cf
+                        JOIN work_orders wo ON wo.id = cf.work_order_id
+                        JOIN users u ON u.id = wo.assigned_technician_id
+                        WHERE u.name LIKE %s AND u.role = 'technician' AND u.is_active = TRUE
+                            AND wo.status = 'completed'
+                            AND wo.completed_at >= DATE_SUB(NOW(), INTERVAL 30 DAY)
+                        GROUP BY wo.assigned_technician_id
+                    """, (pattern,))
+                )
+                result = completions[0] if completions else None
+                if result:
+                    satisfaction = {row['technician_id']: row['avg_customer_satisfaction'] for row in satisfactions}
+                    result['avg_customer_satisfaction'] = satisfaction.get(result['id'])
                 
                 if result:
                     on_time_rate = (result['on_time_completions'] / result['completed_tasks'] * 100) if result['completed_tasks'] > 0 else 0
@@ -426,9 +500,6 @@ class ConversationalAI:
             else:
                 response_text = "Veuillez préciser le nom du technicien pour consulter ses performances."
             
-            cursor.close()
-            connection.close()
-            
             return {
                 'text': response_text,
                 'data': result if technician_name else None,
@@ -540,7 +611,7 @@ class ConversationalAI:
                 INSERT INTO ai_conversation_history 
                 (user_id, question, response, created_at)
                 VALUES (%s, %s, %s, %s)
-            """, (user_id, question, json.dumps(response), datetime.now()))
+            """, (user_id, question, json.dumps(response, default=str), datetime.now()))
             
             connection.commit()
             cursor.close()
@@ -0,0 +1,237 @@
+"""
+Score de risque client par lots (routes/customers/finances.py)
+
+Les facteurs de tous les clients (retards de paiement sur 12 mois, montant
+en souffrance, ancienneté du compte) sont lus en deux requêtes groupées et
+notés en vecteurs NumPy ; les résultats sont conservés dans
+customer_risk_scores avec leur date de calcul, le niveau précédent et la
+date du dernier changement de niveau (alertes). Un score isolé est servi
+depuis cette table et recalculé à la demande s'il est absent ou trop ancien.
+"""
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Âge maximal d'un score servi sans recalcul (secondes)
+RISK_SCORE_MAX_AGE = int(os.environ.get('RISK_SCORE_MAX_AGE', '3600'))
+RISK_STORE_BATCH = 1000
+
+# Bornes hautes des niveaux (score 0-100, plus élevé = plus risqué)
+RISK_LEVELS = (
+    (20, 'very_low', 'Très faible'),
+    (40, 'low', 'Faible'),
+    (60, 'medium', 'Moyen'),
+    (80, 'high', 'Élevé'),
+    (100, 'very_high', 'Très élevé'),
+)
+RISK_LEVEL_LABELS = {level: label for _, level, label in RISK_LEVELS}
+_LEVEL_BOUNDS = np.array([bound for bound, _, _ in RISK_LEVELS[:-1]], dtype=float)
+_LEVEL_NAMES = np.array([level for _, level, _ in RISK_LEVELS])
+
+
+def _id_filter(column: str, customer_ids: Optional[Sequence[int]]):
+    if customer_ids is None:
+        return "", []
+    if not customer_ids:
+        return " AND 1 = 0", []
+    return f" AND {column} IN ({', '.join(['%s'] * len(customer_ids))})", list(customer_ids)
+
+
+def load_risk_factors(cursor, customer_ids: Optional[Sequence[int]] = None) -> Dict[str, np.ndarray]:
+    """Facteurs bruts de tous les clients (ou d'une liste) en deux requêtes groupées"""
+    where, params = _id_filter('id', customer_ids)
+    cursor.execute(f"""
+        SELECT id, COALESCE(DATEDIFF(NOW(), created_at), 0) AS account_days
+        FROM customers
+        WHERE 1 = 1{where}
+        ORDER BY id
+    """, params)
+    customers = cursor.fetchall()
+    ids = np.fromiter((row['id'] for row in customers), dtype=np.int64, count=len(customers))
+    account_days = np.fromiter((row['account_days'] for row in customers), dtype=float, count=len(customers))
+
+    where, params = _id_filter('customer_id', customer_ids)
+    cursor.execute(f"""
+        SELECT
+            customer_id,
+            SUM(status = 'paid' AND paid_date > due_date
+                AND created_at >= DATE_SUB(NOW(), INTERVAL 12 MONTH)) AS late_payments,
+            COALESCE(SUM(CASE WHEN status IN ('open', 'sent') AND due_date < NOW()
+                              THEN total_amount ELSE 0 END), 0) AS overdue_amount
+        FROM invoices
+        WHERE status IN ('paid', 'open', 'sent'){where}
+        GROUP BY customer_id
+    """, params)
+    invoices = [row for row in cursor.fetchall() if row['customer_id'] is not None]
+
+    late_payments = np.zeros(len(ids))
+    overdue_amount = np.zeros(len(ids))
+    if invoices and len(ids):
+        invoice_ids = np.fromiter((row['customer_id'] for row in invoices), dtype=np.int64, count=len(invoices))
+        positions = np.searchsorted(ids, invoice_ids)
+        # Factures de clients supprimés : ignorées
+        known = (positions < len(ids)) & (ids[np.minimum(positions, len(ids) - 1)] == invoice_ids)
+        late = np.fromiter((row['late_payments'] or 0 for row in invoices), dtype=float, count=len(invoices))
+        overdue = np.fromiter((row['overdue_amount'] or 0 for row in invoices), dtype=float, count=len(invoices))
+        late_payments[positions[known]] = late[known]
+        overdue_amount[positions[known]] = overdue[known]
+
+    return {
+        'customer_id': ids,
+        'late_payments': late_payments,
+        'overdue_amount': overdue_amount,
+        'account_days': account_days,
+    }
+
+
+def score_risk_factors(factors: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Composantes, score et niveau pour tous les clients à la fois"""
+    payment_delays = np.minimum(factors['late_payments'] * 10, 50)
+    overdue = np.minimum(factors['overdue_amount'] / 1000 * 5, 30)
+    # Bonus de confiance pour les comptes de plus d'un an
+    account_age = np.where(factors['account_days'] > 365, -10.0, 0.0)
+    # Arrondi au dixième enregistré avant le choix du niveau : le niveau
+    # correspond toujours au score stocké (20.04 -> 20.0 -> very_low)
+    score = np.round(np.clip(payment_delays + overdue + account_age, 0, 100), 1)
+    return {
+        'payment_delays': payment_delays,
+        'overdue_factor': overdue,
+        'account_age_factor': account_age,
+        'score': score,
+        'level': _LEVEL_NAMES[np.searchsorted(_LEVEL_BOUNDS, score, side='left')],
+    }
+
+
+def store_risk_scores(cursor, factors: Dict[str, np.ndarray], scores: Dict[str, np.ndarray],
+                      computed_at: datetime):
+    """Enregistrer les scores ; le niveau précédent est conservé pour les alertes"""
+    rows = list(zip(
+        factors['customer_id'].tolist(),
+        scores['score'].tolist(),
+        scores['level'].tolist(),
+        factors['late_payments'].astype(int).tolist(),
+        np.round(factors['overdue_amount'], 2).tolist(),
+        factors['account_days'].astype(int).tolist(),
+        np.round(scores['payment_delays'], 1).tolist(),
+        np.round(scores['overdue_factor'], 1).tolist(),
+        np.round(scores['account_age_factor'], 1).tolist(),
+        [computed_at] * len(factors['customer_id'])
+    ))
+    # Les affectations s'appliquent de gauche à droite : previous_* et
+    # level_changed_at lisent encore l'ancien niveau. previous_* ne bouge
+    # qu'à un changement de niveau (dernier niveau différent du courant)
+    query = """
+        INSERT INTO customer_risk_scores
+        (customer_id, score, level, late_payments, overdue_amount, account_days,
+         payment_delays_factor, overdue_factor, account_age_factor, computed_at)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            previous_score = IF(level <> VALUES(level), score, previous_score),
+            previous_level = IF(level <> VALUES(level), level, previous_level),
+            level_changed_at = IF(level <> VALUES(level), VALUES(computed_at), level_changed_at),
+            score = VALUES(score),
+            level = VALUES(level),
+            late_payments = VALUES(late_payments),
+            overdue_amount = VALUES(overdue_amount),
+            account_days = VALUES(account_days),
+            payment_delays_factor = VALUES(payment_delays_factor),
+            overdue_factor = VALUES(overdue_factor),
+            account_age_factor = VALUES(account_age_factor),
+            computed_at = VALUES(computed_at)
+    """
+    for start in range(0, len(rows), RISK_STORE_BATCH):
+        cursor.executemany(query, rows[start:start + RISK_STORE_BATCH])
+
+
+def refresh_risk_scores(conn, customer_ids: Optional[Sequence[int]] = None) -> Dict:
+    """
+    Recalculer et enregistrer les scores (tous les clients par défaut)
+
+    Retourne le nombre de clients notés et ceux dont le niveau a changé.
+    """
+    computed_at = datetime.now().replace(microsecond=0)
+    with conn.cursor() as cursor:
+        factors = load_risk_factors(cursor, customer_ids)
+        scores = score_risk_factors(factors)
+        store_risk_scores(cursor, factors, scores, computed_at)
+        cursor.execute("""
+            SELECT customer_id, previous_level, level, previous_score, score
+            FROM customer_risk_scores
+            WHERE level_changed_at = %s
+        """, (computed_at,))
+        changed = cursor.fetchall()
+    conn.commit()
+
+    for row in changed:
+        if row['previous_level']:
+            logger.info(f"⚠️ Risque client {row['customer_id']}: {row['previous_level']} → {row['level']}")
+    return {
+        'scored': int(len(factors['customer_id'])),
+        'changed': changed,
+        'computed_at': computed_at,
+    }
+
+
+def get_risk_score(conn, customer_id: int, max_age: int = RISK_SCORE_MAX_AGE,
+                   refresh: bool = False) -> Optional[Dict]:
+    """Score enregistré d'un client, recalculé s'il est absent, trop ancien ou si demandé"""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT * FROM customer_risk_scores WHERE customer_id = %s", (customer_id,))
+        row = cursor.fetchone()
+    if row and not refresh and row['computed_at'] >= datetime.now() - timedelta(seconds=max_age):
+        return row
+
+    refresh_risk_scores(conn, [customer_id])
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT * FROM customer_risk_scores WHERE customer_id = %s", (customer_id,))
+        return cursor.fetchone()
+
+
+def list_risk_scores(conn, level: Optional[str] = None, changed_since: Optional[datetime] = None,
+                     limit: int = 50) -> List[Dict]:
+    """Clients classés par risque décroissant (filtres niveau / changement de niveau)"""
+    conditions, params = [], []
+    if level:
+        conditions.append("r.level = %s")
+        params.append(level)
+    if changed_since:
+        conditions.append("r.level_changed_at >= %s")
+        params.append(changed_since)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    with conn.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT r.*, c.name AS customer_name
+            FROM customer_risk_scores r
+            JOIN customers c ON c.id = r.customer_id
+            {where}
+            ORDER BY r.score DESC, r.customer_id
+            LIMIT %s
+        """, params + [limit])
+        return cursor.fetchall()
+
+
+def format_risk_score(row: Dict) -> Dict:
+    """Forme de réponse de /risk-score (facteurs nommés comme le calcul historique)"""
+    return {
+        'customer_id': row['customer_id'],
+        'score': float(row['score']),
+        'level': row['level'],
+        'label': RISK_LEVEL_LABELS.get(row['level'], row['level']),
+        'factors': {
+            'payment_delays': float(row['payment_delays_factor']),
+            'overdue_amount': float(row['overdue_factor']),
+            'payment_frequency': 0,
+            'credit_utilization': 0,
+            'account_age': float(row['account_age_factor'])
+        },
+        'late_payments': row['late_payments'],
+        'overdue_total': float(row['overdue_amount']),
+        'previous_level': row.get('previous_level'),
+        'level_changed_at': row['level_changed_at'].isoformat() if row.get('level_changed_at') else None,
+        'calculated_at': row['computed_at'].isoformat()
+    }
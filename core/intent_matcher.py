@@ -0,0 +1,190 @@
+"""
+Reconnaissance d'intentions partagée - IA conversationnelle et commandes vocales
+Motifs compilés au démarrage ; un seul passage d'une expression de
+présélection (mots-clés des motifs) choisit les motifs à évaluer, après une
+normalisation unique de la phrase (casse, accents, apostrophes)
+"""
+
+import re
+import unicodedata
+from typing import Dict, List, Optional, Tuple, Iterable
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+# Lettres accentuées -> lettre de base, apostrophes typographiques -> '
+# (caractère pour caractère : les positions restent celles du texte d'origine)
+_FOLD_MAP = {}
+for _code in range(0xC0, 0x250):
+    _decomposed = unicodedata.normalize('NFD', chr(_code))
+    if len(_decomposed) > 1 and _decomposed[0].isascii():
+        _FOLD_MAP[chr(_code)] = _decomposed[0]
+_FOLD_MAP.update({'’': "'", '‘': "'", 'ʼ': "'"})
+_FOLD_RE = re.compile('[' + re.escape(''.join(_FOLD_MAP)) + ']')
+_WORD_RE = re.compile(r'\w+')
+
+# Longueur minimale d'un mot-clé de présélection
+MIN_ANCHOR_LENGTH = 3
+
+
+def fold_accents(text: str) -> str:
+    """Retirer les accents sans changer la longueur du texte"""
+    if text.isascii():
+        return text
+    return _FOLD_RE.sub(lambda m: _FOLD_MAP[m.group()], text)
+
+
+def normalize_text(text: str) -> str:
+    """Minuscules + accents retirés, longueur conservée (les positions restent valides)"""
+    lowered = text.lower()
+    if len(lowered) != len(text):
+        lowered = ''.join(c.lower() if len(c.lower()) == 1 else c for c in text)
+    return fold_accents(lowered)
+
+
+def required_word(pattern: str) -> Optional[str]:
+    """
+    Mot-clé d'un motif : plus long mot formé de caractères littéraux
+    obligatoires au premier niveau ("quels?\\s+techniciens?" -> "technicien"),
+    None si aucun
+    """
+    try:
+        items = sre_parse.parse(pattern)
+    except Exception:
+        return None
+    runs = ['']
+    for op, value in items:
+        if op is sre_parse.LITERAL:
+            runs[-1] += chr(value)
+        else:
+            runs.append('')
+    words = [word for run in runs for word in _WORD_RE.findall(run)]
+    best = max(words, key=len, default='')
+    return best if len(best) >= MIN_ANCHOR_LENGTH else None
+
+
+class IntentMatch:
+    """Intention reconnue : score (part de la phrase couverte), paramètres extraits"""
+
+    __slots__ = ('intent', 'score', 'params', 'span', 'pattern')
+
+    def __init__(self, intent: str, score: float, params: Tuple, span: Tuple[int, int], pattern: str):
+        self.intent = intent
+        self.score = score
+        self.params = params
+        self.span = span
+        self.pattern = pattern
+
+    def to_dict(self) -> Dict:
+        return {'intent': self.intent, 'score': self.score, 'params': list(self.params),
+                'span': list(self.span), 'pattern': self.pattern}
+
+
+class IntentMatcher:
+    """
+    Ensemble de motifs (expressions régulières ou phrases littérales) par intention
+
+    strategy='priority' : la première intention déclarée qui correspond gagne
+    (ordre des motifs) ; strategy='coverage' : la correspondance couvrant la
+    plus grande part de la phrase gagne, au-dessus du seuil de son intention.
+    Les paramètres sont les groupes capturés, pris dans le texte d'origine.
+
+    Le mot-clé de chaque motif (voir required_word) doit commencer un mot de
+    la phrase : la présélection le cherche après une limite de mot, sans
+    accents ni majuscules. Un motif sans mot-clé est toujours évalué.
+    """
+
+    def __init__(self, strategy: str = 'priority'):
+        if strategy not in ('priority', 'coverage'):
+            raise ValueError(f"Stratégie inconnue: {strategy}")
+        self.strategy = strategy
+        self.thresholds: Dict[str, float] = {}
+        self._patterns: List[Tuple[str, str, re.Pattern, Optional[str]]] = []  # (intention, motif, regex, mot-clé)
+        self._compiled = None  # (présélection, {mot-clé: indices}, indices sans mot-clé)
+
+    def add(self, intent: str, pattern: str, threshold: Optional[float] = None) -> 'IntentMatcher':
+        """Ajouter une expression régulière (écrite en minuscules ; les accents sont ignorés)"""
+        source = fold_accents(pattern)
+        self._patterns.append((intent, pattern, re.compile(source), required_word(source)))
+        if threshold is not None:
+            self.thresholds[intent] = threshold
+        self._compiled = None
+        return self
+
+    def add_phrases(self, intent: str, phrases: Iterable[str], threshold: Optional[float] = None) -> 'IntentMatcher':
+        """Ajouter des phrases littérales (recherchées comme sous-chaînes)"""
+        for phrase in phrases:
+            self.add(intent, re.escape(normalize_text(phrase)), threshold)
+        return self
+
+    def compile(self):
+        """Construire l'expression de présélection (alternative de tous les mots-clés)"""
+        by_word: Dict[str, List[int]] = {}
+        unanchored = []
+        for index, (_intent, _pattern, _regex, word) in enumerate(self._patterns):
+            if word:
+                by_word.setdefault(word, []).append(index)
+            else:
+                unanchored.append(index)
+
+        # Cherchés en début de mot, deux mots-clés ne se recouvrent dans la
+        # phrase que si l'un est préfixe de l'autre : le plus long (seul rendu
+        # par findall) entraîne aussi les motifs de ses préfixes
+        candidates = {
+            word: frozenset(i for other, indices in by_word.items() if word.startswith(other) for i in indices)
+            for word in by_word
+        }
+        alternation = '|'.join(re.escape(word) for word in sorted(by_word, key=len, reverse=True))
+        prefilter = re.compile(rf"\b(?:{alternation})") if by_word else None
+        self._compiled = (prefilter, candidates, frozenset(unanchored))
+
+    def matches(self, text: str) -> List[IntentMatch]:
+        """Toutes les correspondances, dans l'ordre de déclaration des motifs"""
+        return [self._build(text, index, found, length) for index, found, length in self._scan(text)]
+
+    def match(self, text: str) -> Optional[IntentMatch]:
+        """Meilleure intention selon la stratégie, None si rien ne correspond"""
+        best = None
+        best_score = -1.0
+        for index, found, length in self._scan(text):
+            score = min((found.end() - found.start()) / length, 1.0)
+            if score < self.thresholds.get(self._patterns[index][0], 0.0):
+                continue
+            if self.strategy == 'priority':
+                return self._build(text, index, found, length)
+            if score > best_score:
+                best, best_score = (index, found, length), score
+        return self._build(text, *best) if best else None
+
+    def _scan(self, text: str) -> List[Tuple[int, re.Match, int]]:
+        """(index du motif, correspondance, longueur) des motifs présélectionnés qui correspondent"""
+        if self._compiled is None:
+            self.compile()
+        prefilter, candidates, unanchored = self._compiled
+        normalized = normalize_text(text)
+
+        indices = set(unanchored)
+        if prefilter is not None:
+            for word in prefilter.findall(normalized):
+                indices.update(candidates[word])
+        if not indices:
+            return []
+
+        length = len(normalized) or 1
+        results = []
+        for index in sorted(indices):
+            found = self._patterns[index][2].search(normalized)
+            if found:
+                results.append((index, found, length))
+        return results
+
+    def _build(self, text: str, index: int, found: re.Match, length: int) -> IntentMatch:
+        intent, pattern, regex, _word = self._patterns[index]
+        params = tuple(
+            text[found.start(i):found.end(i)] if found.start(i) >= 0 else None
+            for i in range(1, regex.groups + 1)
+        )
+        start, end = found.span()
+        return IntentMatch(intent, min((end - start) / length, 1.0), params, (start, end), pattern)
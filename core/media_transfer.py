@@ -0,0 +1,350 @@
+"""
+Transfert des médias terrain (photos, vidéos d'intervention) vers le stockage objet
+Utilisé par OfflineSyncManager._sync_media_files (core/offline_sync.py)
+
+- déduplication par empreinte SHA-256 du fichier source : un média déjà
+  présent dans le stockage n'est ni réduit ni renvoyé
+- envoi par morceaux (multipart) reprenable : après une coupure, seuls les
+  morceaux absents de list_parts sont renvoyés
+- réduction des photos et vignette générées avant l'envoi (Pillow)
+- débit total plafonné, partagé par les envois parallèles
+
+LocalObjectStore reprend le sous-ensemble de l'API S3 (mêmes noms de méthodes
+et de paramètres que le client boto3) sur le système de fichiers : un client
+S3 peut lui être substitué sans modifier MediaTransfer.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    from PIL import Image, ImageOps
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+MEDIA_STORE_PATH = os.environ.get('MEDIA_STORE_PATH', 'data/object_store')
+MEDIA_BUCKET = os.environ.get('MEDIA_BUCKET', 'chronotech-media')
+MEDIA_PUBLIC_BASE_URL = os.environ.get('MEDIA_PUBLIC_BASE_URL', '/media')
+
+# Taille des morceaux (le minimum S3 est de 5 Mo, sauf pour le dernier)
+MEDIA_CHUNK_SIZE = int(os.environ.get('MEDIA_CHUNK_SIZE', str(8 * 1024 * 1024)))
+# Envois simultanés et débit total en octets/s (0 = illimité)
+MEDIA_UPLOAD_WORKERS = int(os.environ.get('MEDIA_UPLOAD_WORKERS', '3'))
+MEDIA_BANDWIDTH_LIMIT = int(os.environ.get('MEDIA_BANDWIDTH_LIMIT', '0'))
+
+# Photos réduites au plus grand côté indiqué avant l'envoi, vignettes
+MEDIA_MAX_IMAGE_SIZE = int(os.environ.get('MEDIA_MAX_IMAGE_SIZE', '1920'))
+THUMBNAIL_SIZE = (320, 320)
+JPEG_QUALITY = 85
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.heic', '.bmp'}
+
+
+class NoSuchKey(Exception):
+    """Objet absent du stockage"""
+
+
+class NoSuchUpload(Exception):
+    """Envoi multipart inconnu (terminé, abandonné ou expiré)"""
+
+
+def _etag(data: bytes) -> str:
+    return f'"{hashlib.md5(data).hexdigest()}"'
+
+
+class LocalObjectStore:
+    """Stockage objet sur disque, compatible avec l'API S3 utilisée ici"""
+
+    def __init__(self, root: str = MEDIA_STORE_PATH):
+        self.root = root
+        self._uploads_root = os.path.join(root, '.multipart')
+        os.makedirs(self._uploads_root, exist_ok=True)
+
+    def _object_path(self, bucket: str, key: str) -> str:
+        path = os.path.normpath(os.path.join(self.root, bucket, key))
+        if not path.startswith(os.path.normpath(os.path.join(self.root, bucket)) + os.sep):
+            raise ValueError(f"Clé d'objet invalide: {key}")
+        return path
+
+    def _upload_dir(self, upload_id: str) -> str:
+        if not upload_id.isalnum():
+            raise NoSuchUpload(upload_id)
+        return os.path.join(self._uploads_root, upload_id)
+
+    def _write_object(self, path: str, write: Callable) -> None:
+        """Écriture atomique : un objet visible est toujours complet"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, 'wb') as handle:
+                write(handle)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def head_object(self, Bucket: str, Key: str) -> Dict:
+        path = self._object_path(Bucket, Key)
+        if not os.path.isfile(path):
+            raise NoSuchKey(Key)
+        return {'ContentLength': os.path.getsize(path)}
+
+    def get_object(self, Bucket: str, Key: str) -> Dict:
+        path = self._object_path(Bucket, Key)
+        if not os.path.isfile(path):
+            raise NoSuchKey(Key)
+        return {'Body': open(path, 'rb'), 'ContentLength': os.path.getsize(path)}
+
+    def put_object(self, Bucket: str, Key: str, Body: bytes) -> Dict:
+        self._write_object(self._object_path(Bucket, Key), lambda handle: handle.write(Body))
+        return {'ETag': _etag(Body)}
+
+    def create_multipart_upload(self, Bucket: str, Key: str) -> Dict:
+        upload_id = uuid.uuid4().hex
+        upload_dir = self._upload_dir(upload_id)
+        os.makedirs(upload_dir)
+        with open(os.path.join(upload_dir, 'upload.json'), 'w') as handle:
+            json.dump({'bucket': Bucket, 'key': Key}, handle)
+        return {'Bucket': Bucket, 'Key': Key, 'UploadId': upload_id}
+
+    def _check_upload(self, Bucket: str, Key: str, UploadId: str) -> str:
+        upload_dir = self._upload_dir(UploadId)
+        try:
+            with open(os.path.join(upload_dir, 'upload.json')) as handle:
+                meta = json.load(handle)
+        except FileNotFoundError:
+            raise NoSuchUpload(UploadId)
+        if meta != {'bucket': Bucket, 'key': Key}:
+            raise NoSuchUpload(UploadId)
+        return upload_dir
+
+    def upload_part(self, Bucket: str, Key: str, UploadId: str, PartNumber: int, Body: bytes) -> Dict:
+        upload_dir = self._check_upload(Bucket, Key, UploadId)
+        self._write_object(os.path.join(upload_dir, f"part-{PartNumber:05d}"),
+                           lambda handle: handle.write(Body))
+        return {'ETag': _etag(Body)}
+
+    def list_parts(self, Bucket: str, Key: str, UploadId: str) -> Dict:
+        upload_dir = self._check_upload(Bucket, Key, UploadId)
+        parts = []
+        for name in sorted(os.listdir(upload_dir)):
+            if not name.startswith('part-') or name.endswith('.tmp'):
+                continue
+            with open(os.path.join(upload_dir, name), 'rb') as handle:
+                data = handle.read()
+            parts.append({'PartNumber': int(name[5:]), 'ETag': _etag(data), 'Size': len(data)})
+        return {'Parts': parts}
+
+    def complete_multipart_upload(self, Bucket: str, Key: str, UploadId: str,
+                                  MultipartUpload: Dict) -> Dict:
+        upload_dir = self._check_upload(Bucket, Key, UploadId)
+        stored = {part['PartNumber']: part['ETag']
+                  for part in self.list_parts(Bucket, Key, UploadId)['Parts']}
+        parts = sorted(MultipartUpload['Parts'], key=lambda part: part['PartNumber'])
+        for part in parts:
+            if stored.get(part['PartNumber']) != part['ETag']:
+                raise ValueError(f"Morceau {part['PartNumber']} absent ou différent")
+
+        def write(handle):
+            for part in parts:
+                with open(os.path.join(upload_dir, f"part-{part['PartNumber']:05d}"), 'rb') as source:
+                    shutil.copyfileobj(source, handle)
+
+        self._write_object(self._object_path(Bucket, Key), write)
+        shutil.rmtree(upload_dir, ignore_errors=True)
+        return {'Bucket': Bucket, 'Key': Key}
+
+    def abort_multipart_upload(self, Bucket: str, Key: str, UploadId: str) -> Dict:
+        shutil.rmtree(self._check_upload(Bucket, Key, UploadId), ignore_errors=True)
+        return {}
+
+
+class BandwidthLimiter:
+    """Seau à jetons partagé par les threads d'envoi (octets/s, 0 = illimité)"""
+
+    def __init__(self, rate: int = MEDIA_BANDWIDTH_LIMIT):
+        self.rate = rate
+        self._allowance = float(rate)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, size: int):
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            # Une seconde de débit au plus en réserve
+            self._allowance = min(float(self.rate), self._allowance + (now - self._last) * self.rate)
+            self._last = now
+            self._allowance -= size
+            wait = -self._allowance / self.rate if self._allowance < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for block in iter(lambda: handle.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def is_image(path: str, file_type: Optional[str] = None) -> bool:
+    if file_type:
+        return file_type.split('/')[0] in ('image', 'photo')
+    return os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS
+
+
+def prepare_image(path: str, work_dir: str, content_hash: str) -> Tuple[str, Optional[str]]:
+    """
+    Photo réduite (JPEG, orientation EXIF appliquée) et vignette, écrites dans
+    work_dir ; sans Pillow ou si l'image est illisible, le fichier d'origine
+    est envoyé tel quel et sans vignette
+    """
+    if not PIL_AVAILABLE:
+        return path, None
+    try:
+        os.makedirs(work_dir, exist_ok=True)
+        scaled_path = os.path.join(work_dir, f"{content_hash}.jpg")
+        thumbnail_path = os.path.join(work_dir, f"{content_hash}_thumb.jpg")
+        with Image.open(path) as source:
+            image = ImageOps.exif_transpose(source).convert('RGB')
+        if max(image.size) > MEDIA_MAX_IMAGE_SIZE or os.path.splitext(path)[1].lower() not in ('.jpg', '.jpeg'):
+            image.thumbnail((MEDIA_MAX_IMAGE_SIZE, MEDIA_MAX_IMAGE_SIZE), Image.Resampling.LANCZOS)
+            image.save(scaled_path, 'JPEG', quality=JPEG_QUALITY, optimize=True)
+            # Réduction sans gain : garder l'original
+            if os.path.getsize(scaled_path) >= os.path.getsize(path):
+                os.remove(scaled_path)
+                scaled_path = path
+        else:
+            scaled_path = path
+        image.thumbnail(THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
+        image.save(thumbnail_path, 'JPEG', quality=80)
+        return scaled_path, thumbnail_path
+    except Exception as e:
+        logger.warning(f"⚠️ Réduction impossible pour {path}: {e}")
+        return path, None
+
+
+class MediaTransfer:
+    """Envoi d'un fichier vers le stockage objet : déduplication, multipart reprenable, débit plafonné"""
+
+    def __init__(self, store=None, bucket: str = MEDIA_BUCKET, chunk_size: int = MEDIA_CHUNK_SIZE,
+                 limiter: Optional[BandwidthLimiter] = None):
+        self.store = store or LocalObjectStore()
+        self.bucket = bucket
+        self.chunk_size = chunk_size
+        self.limiter = limiter or BandwidthLimiter()
+
+    def object_url(self, key: str) -> str:
+        return f"{MEDIA_PUBLIC_BASE_URL.rstrip('/')}/{self.bucket}/{key}"
+
+    def open(self, key: str):
+        """Flux de lecture d'un objet (NoSuchKey s'il est absent)"""
+        return self.store.get_object(Bucket=self.bucket, Key=key)['Body']
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.store.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except NoSuchKey:
+            return False
+        except Exception as e:
+            # Client S3 : ClientError avec un code 404
+            code = getattr(e, 'response', {}).get('Error', {}).get('Code')
+            if code in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+
+    def upload(self, path: str, key: str, upload_id: Optional[str] = None,
+               on_upload_id: Optional[Callable[[str], None]] = None,
+               on_progress: Optional[Callable[[int], None]] = None) -> Dict:
+        """
+        Envoyer path sous key ; renvoie {'key', 'deduplicated', 'bytes_sent'}
+
+        upload_id : envoi multipart d'une tentative précédente à reprendre.
+        on_upload_id est appelé dès la création d'un envoi multipart (à
+        persister avant l'envoi des morceaux) ; on_progress reçoit les octets
+        envoyés ou déjà présents, au fil de l'eau.
+        """
+        size = os.path.getsize(path)
+        if self.exists(key):
+            if upload_id:
+                self.abort(key, upload_id)
+            if on_progress:
+                on_progress(size)
+            return {'key': key, 'deduplicated': True, 'bytes_sent': 0}
+
+        if size <= self.chunk_size and not upload_id:
+            with open(path, 'rb') as handle:
+                body = handle.read()
+            self.limiter.consume(len(body))
+            self.store.put_object(Bucket=self.bucket, Key=key, Body=body)
+            if on_progress:
+                on_progress(size)
+            return {'key': key, 'deduplicated': False, 'bytes_sent': size}
+
+        done = self._resume(key, upload_id) if upload_id else None
+        if done is None:
+            upload_id = self.store.create_multipart_upload(Bucket=self.bucket, Key=key)['UploadId']
+            if on_upload_id:
+                on_upload_id(upload_id)
+            done = {}
+
+        parts: List[Dict] = []
+        sent = 0
+        with open(path, 'rb') as handle:
+            part_number = 1
+            while True:
+                offset = (part_number - 1) * self.chunk_size
+                if offset >= size:
+                    break
+                length = min(self.chunk_size, size - offset)
+                previous = done.get(part_number)
+                if previous and previous['Size'] == length:
+                    parts.append({'PartNumber': part_number, 'ETag': previous['ETag']})
+                else:
+                    handle.seek(offset)
+                    body = handle.read(length)
+                    self.limiter.consume(len(body))
+                    etag = self.store.upload_part(Bucket=self.bucket, Key=key, UploadId=upload_id,
+                                                  PartNumber=part_number, Body=body)['ETag']
+                    parts.append({'PartNumber': part_number, 'ETag': etag})
+                    sent += length
+                if on_progress:
+                    on_progress(length)
+                part_number += 1
+
+        self.store.complete_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id,
+                                             MultipartUpload={'Parts': parts})
+        return {'key': key, 'deduplicated': False, 'bytes_sent': sent}
+
+    def _resume(self, key: str, upload_id: str) -> Optional[Dict[int, Dict]]:
+        """Morceaux déjà reçus d'un envoi précédent ; None s'il n'existe plus"""
+        try:
+            listing = self.store.list_parts(Bucket=self.bucket, Key=key, UploadId=upload_id)
+        except NoSuchUpload:
+            return None
+        except Exception as e:
+            code = getattr(e, 'response', {}).get('Error', {}).get('Code')
+            if code == 'NoSuchUpload':
+                return None
+            raise
+        return {part['PartNumber']: part for part in listing.get('Parts', [])}
+
+    def abort(self, key: str, upload_id: str):
+        """Abandonner un envoi multipart (morceaux reçus supprimés)"""
+        try:
+            self.store.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+        except Exception:
+            pass
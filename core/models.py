@@ -6,35 +6,194 @@ Classes pour représenter les entités de l'application
 from datetime import datetime
 from typing import Dict, List, Any, Optional
 from .database import db_manager
+from .search import (build_boolean_query, escape_like, is_missing_fulltext_index,
+                     WORK_ORDER_MATCH, CUSTOMER_MATCH)
 import logging
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
+def _identity_map():
+    """Carte d'identité de la requête HTTP courante (None hors requête)"""
+    try:
+        from flask import g, has_request_context
+    except ImportError:
+        return None
+    if not has_request_context():
+        return None
+    if 'model_identity_map' not in g:
+        g.model_identity_map = {}
+    return g.model_identity_map
+
+def clear_identity_map():
+    """Oublier les objets chargés pendant la requête (après des UPDATE SQL bruts)"""
+    identity_map = _identity_map()
+    if identity_map is not None:
+        identity_map.clear()
+
+def _in_clause(values):
+    """Placeholders et paramètres pour une clause IN (...)"""
+    values = list(values)
+    return ', '.join(['%s'] * len(values)), values
+
 class BaseModel:
-    """Classe de base pour tous les modèles"""
+    """
+    Classe de base pour tous les modèles
+    
+    Les colonnes déclarées par chaque modèle sont stockées dans des slots ;
+    les colonnes supplémentaires d'un SELECT * vont dans _extra. Les objets
+    liés sont chargés à la demande et mémorisés dans _related (voir
+    prefetch_related pour les charger en lot).
+    """
+    
+    __slots__ = ('_extra', '_related', '__weakref__')
     
     def __init__(self, **kwargs):
         for key, value in kwargs.items():
             setattr(self, key, value)
     
+    def __setattr__(self, key, value):
+        try:
+            object.__setattr__(self, key, value)
+        except AttributeError:
+            # Colonne non déclarée : stockée à part
+            try:
+                extra = object.__getattribute__(self, '_extra')
+            except AttributeError:
+                extra = {}
+                object.__setattr__(self, '_extra', extra)
+            extra[key] = value
+    
+    def __getattr__(self, key):
+        # Appelé seulement si l'attribut est absent des slots
+        if key.startswith('_'):
+            raise AttributeError(key)
+        try:
+            return object.__getattribute__(self, '_extra')[key]
+        except (AttributeError, KeyError):
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{key}'") from None
+    
+    @classmethod
+    def _field_names(cls):
+        """Colonnes déclarées (slots publics de la hiérarchie)"""
+        names = cls.__dict__.get('_fields_cache')
+        if names is None:
+            names = tuple(
+                name
+                for klass in reversed(cls.__mro__)
+                for name in klass.__dict__.get('__slots__', ())
+                if not name.startswith('_')
+            )
+            setattr(cls, '_fields_cache', names)
+        return names
+    
     def to_dict(self):
         """Convertir l'objet en dictionnaire"""
         result = {}
-        for key, value in self.__dict__.items():
-            if isinstance(value, datetime):
-                result[key] = value.isoformat()
-            else:
-                result[key] = value
+        for key in self._field_names():
+            value = getattr(self, key, None)
+            result[key] = value.isoformat() if isinstance(value, datetime) else value
+        for key, value in getattr(self, '_extra', {}).items():
+            result[key] = value.isoformat() if isinstance(value, datetime) else value
         return result
     
     @classmethod
     def from_dict(cls, data):
         """Créer un objet à partir d'un dictionnaire"""
         return cls(**data)
+    
+    @classmethod
+    def _load(cls, row):
+        """
+        Objet pour une ligne de base : une seule instance par (modèle, id)
+        pendant une requête HTTP
+        """
+        identity_map = _identity_map()
+        key = (cls, row.get('id'))
+        if identity_map is not None and key[1] is not None:
+            instance = identity_map.get(key)
+            if instance is None:
+                instance = identity_map[key] = cls.from_dict(row)
+            else:
+                # Ligne plus récente ou jointure différente : colonnes fusionnées
+                for column, value in row.items():
+                    setattr(instance, column, value)
+            return instance
+        return cls.from_dict(row)
+    
+    @classmethod
+    def _load_all(cls, rows):
+        return [cls._load(row) for row in rows] if rows else []
+    
+    @classmethod
+    def from_rows(cls, rows):
+        """Objets pour des lignes déjà lues par une requête SQL (carte d'identité partagée)"""
+        return cls._load_all(rows)
+    
+    @classmethod
+    def _identity_get(cls, object_id):
+        identity_map = _identity_map()
+        return identity_map.get((cls, object_id)) if identity_map is not None else None
+    
+    @classmethod
+    def _find_by_ids(cls, table, ids, condition=''):
+        """{id: objet} en une requête, objets déjà chargés dans la requête HTTP réutilisés"""
+        found = {}
+        missing = []
+        for object_id in ids:
+            cached = cls._identity_get(object_id)
+            if cached is not None:
+                found[object_id] = cached
+            else:
+                missing.append(object_id)
+        if missing:
+            placeholders, params = _in_clause(missing)
+            query = f"SELECT * FROM {table} WHERE id IN ({placeholders}){condition}"
+            for row in db_manager.execute_query(query, params) or []:
+                found[row['id']] = cls._load(row)
+        return found
+    
+    @classmethod
+    def _group_by_work_order(cls, query_template, work_order_ids):
+        """{work_order_id: [objets]} pour une requête contenant un IN ({ids})"""
+        grouped = {}
+        if not work_order_ids:
+            return grouped
+        placeholders, params = _in_clause(work_order_ids)
+        for row in db_manager.execute_query(query_template.format(ids=placeholders), params) or []:
+            grouped.setdefault(row['work_order_id'], []).append(cls._load(row))
+        return grouped
+    
+    def _forget(self):
+        """Retirer l'objet de la carte d'identité après une écriture (relu au prochain accès)"""
+        identity_map = _identity_map()
+        if identity_map is not None:
+            identity_map.pop((type(self), getattr(self, 'id', None)), None)
+    
+    def _get_related(self, name, loader):
+        """Relation mémorisée, chargée par loader() au premier accès"""
+        related = getattr(self, '_related', None)
+        if related is None:
+            related = {}
+            object.__setattr__(self, '_related', related)
+        if name not in related:
+            related[name] = loader()
+        return related[name]
+    
+    def _set_related(self, name, value):
+        related = getattr(self, '_related', None)
+        if related is None:
+            related = {}
+            object.__setattr__(self, '_related', related)
+        related[name] = value
 
 class User(BaseModel):
     """Modèle pour les utilisateurs"""
     
+    __slots__ = ('id', 'name', 'email', 'password', 'role', 'created_at', 'updated_at',
+                 'is_active')
+    
     def __init__(self, id=None, name=None, email=None, password=None, role=None, 
                  created_at=None, updated_at=None, is_active=True, **kwargs):
         self.id = id
@@ -50,10 +209,13 @@ class User(BaseModel):
     @classmethod
     def find_by_id(cls, user_id):
         """Trouver un utilisateur par ID"""
+        cached = cls._identity_get(user_id)
+        if cached is not None and cached.is_active:
+            return cached
         try:
             query = "SELECT * FROM users WHERE id = %s AND is_active = TRUE"
             result = db_manager.execute_query(query, (user_id,), fetch_one=True)
-            return cls.from_dict(result) if result else None
+            return cls._load(result) if result else None
         except Exception as e:
             logger.error(f"Erreur lors de la recherche de l'utilisateur {user_id}: {e}")
             return None
@@ -64,11 +226,20 @@ class User(BaseModel):
         try:
             query = "SELECT * FROM users WHERE email = %s AND is_active = TRUE"
             result = db_manager.execute_query(query, (email,), fetch_one=True)
-            return cls.from_dict(result) if result else None
+            return cls._load(result) if result else None
         except Exception as e:
             logger.error(f"Erreur lors de la recherche de l'utilisateur {email}: {e}")
             return None
     
+    @classmethod
+    def find_by_ids(cls, user_ids):
+        """Trouver plusieurs utilisateurs actifs en une requête ({id: utilisateur})"""
+        try:
+            return cls._find_by_ids('users', set(user_ids), " AND is_active = TRUE")
+        except Exception as e:
+            logger.error(f"Erreur lors de la recherche des utilisateurs {sorted(user_ids)}: {e}")
+            return {}
+    
     @classmethod
     def get_all(cls, role=None):
         """Récupérer tous les utilisateurs"""
@@ -80,7 +251,7 @@ class User(BaseModel):
                 query = "SELECT * FROM users WHERE is_active = TRUE ORDER BY name"
                 result = db_manager.execute_query(query)
             
-            return [cls.from_dict(user) for user in result] if result else []
+            return cls._load_all(result)
         except Exception as e:
             logger.error(f"Erreur lors de la récupération des utilisateurs: {e}")
             return []
@@ -109,6 +280,7 @@ class User(BaseModel):
                 # Récupérer l'ID généré
                 self.id = db_manager.get_connection().insert_id()
             
+            self._forget()
             return True
         except Exception as e:
             logger.error(f"Erreur lors de la sauvegarde de l'utilisateur: {e}")
@@ -120,6 +292,7 @@ class User(BaseModel):
             query = "UPDATE users SET is_active = FALSE, updated_at = NOW() WHERE id = %s"
             db_manager.execute_query(query, (self.id,))
             self.is_active = False
+            self._forget()
             return True
         except Exception as e:
             logger.error(f"Erreur lors de la suppression de l'utilisateur: {e}")
@@ -128,6 +301,9 @@ class User(BaseModel):
 class Customer(BaseModel):
     """Modèle pour les clients"""
     
+    __slots__ = ('id', 'name', 'company', 'email', 'phone', 'address', 'vehicle_info',
+                 'created_at', 'updated_at', 'is_active')
+    
     def __init__(self, id=None, name=None, company=None, email=None, phone=None, 
                  address=None, vehicle_info=None, created_at=None, updated_at=None, 
                  is_active=True, **kwargs):
@@ -146,38 +322,66 @@ class Customer(BaseModel):
     @classmethod
     def find_by_id(cls, customer_id):
         """Trouver un client par ID"""
+        cached = cls._identity_get(customer_id)
+        if cached is not None and cached.is_active:
+            return cached
         try:
             query = "SELECT * FROM customers WHERE id = %s AND is_active = TRUE"
             result = db_manager.execute_query(query, (customer_id,), fetch_one=True)
-            return cls.from_dict(result) if result else None
+            return cls._load(result) if result else None
         except Exception as e:
             logger.error(f"Erreur lors de la recherche du client {customer_id}: {e}")
             return None
     
+    @classmethod
+    def find_by_ids(cls, customer_ids):
+        """Trouver plusieurs clients actifs en une requête ({id: client})"""
+        try:
+            return cls._find_by_ids('customers', set(customer_ids), " AND is_active = TRUE")
+        except Exception as e:
+            logger.error(f"Erreur lors de la recherche des clients {sorted(customer_ids)}: {e}")
+            return {}
+    
     @classmethod
     def get_all(cls):
         """Récupérer tous les clients"""
         try:
             query = "SELECT * FROM customers WHERE is_active = TRUE ORDER BY name"
             result = db_manager.execute_query(query)
-            return [cls.from_dict(customer) for customer in result] if result else []
+            return cls._load_all(result)
         except Exception as e:
             logger.error(f"Erreur lors de la récupération des clients: {e}")
             return []
     
     @classmethod
-    def search(cls, search_term):
-        """Rechercher des clients"""
+    def search(cls, search_term, limit=50, offset=0):
+        """Rechercher des clients (index FULLTEXT, du plus pertinent au moins pertinent)"""
         try:
+            boolean_query = build_boolean_query(search_term)
+            if boolean_query:
+                query = f"""
+                    SELECT *, {CUSTOMER_MATCH} AS search_score FROM customers 
+                    WHERE is_active = TRUE AND {CUSTOMER_MATCH}
+                    ORDER BY search_score DESC, name
+                    LIMIT %s OFFSET %s
+                """
+                try:
+                    result = db_manager.execute_query(query, (boolean_query, boolean_query, limit, offset))
+                    return cls._load_all(result)
+                except Exception as e:
+                    if not is_missing_fulltext_index(e):
+                        raise
+            
             query = """
                 SELECT * FROM customers 
                 WHERE is_active = TRUE 
                 AND (name LIKE %s OR company LIKE %s OR email LIKE %s)
                 ORDER BY name
+                LIMIT %s OFFSET %s
             """
-            search_pattern = f"%{search_term}%"
-            result = db_manager.execute_query(query, (search_pattern, search_pattern, search_pattern))
-            return [cls.from_dict(customer) for customer in result] if result else []
+            search_pattern = f"%{escape_like(search_term)}%"
+            result = db_manager.execute_query(query, (search_pattern, search_pattern, search_pattern, limit, offset))
+            return cls._load_all(result)
         except Exception as e:
             logger.error(f"Erreur lors de la recherche de clients: {e}")
             return []
@@ -209,6 +413,7 @@ class Customer(BaseModel):
                 # Récupérer l'ID généré
                 self.id = db_manager.get_connection().insert_id()
             
+            self._forget()
             return True
         except Exception as e:
             logger.error(f"Erreur lors de la sauvegarde du client: {e}")
@@ -217,6 +422,10 @@ class Customer(BaseModel):
 
 class Vehicle(BaseModel):
     """Modèle pour les véhicules liés aux clients"""
+    
+    __slots__ = ('id', 'customer_id', 'make', 'model', 'year', 'vin', 'license_plate', 'notes',
+                 'created_at', 'updated_at')
+    
     def __init__(self, id=None, customer_id=None, make=None, model=None, year=None, vin=None, license_plate=None, notes=None, created_at=None, updated_at=None, **kwargs):
         self.id = id
         self.customer_id = customer_id
@@ -235,7 +444,7 @@ class Vehicle(BaseModel):
         try:
             query = "SELECT * FROM vehicles WHERE customer_id = %s ORDER BY created_at DESC"
             result = db_manager.execute_query(query, (customer_id,))
-            return [cls.from_dict(row) for row in result] if result else []
+            return cls._load_all(result)
         except Exception as e:
             logger.error(f"Erreur lors de la récupération des véhicules pour le client {customer_id}: {e}")
             return []
@@ -245,7 +454,7 @@ class Vehicle(BaseModel):
         try:
             query = "SELECT * FROM vehicles WHERE id = %s"
             result = db_manager.execute_query(query, (vehicle_id,), fetch_one=True)
-            return cls.from_dict(result) if result else None
+            return cls._load(result) if result else None
         except Exception as e:
             logger.error(f"Erreur lors de la recherche du véhicule {vehicle_id}: {e}")
             return None
@@ -253,6 +462,11 @@ class Vehicle(BaseModel):
 class WorkOrder(BaseModel):
     """Modèle pour les bons de travail"""
     
+    __slots__ = ('id', 'claim_number', 'customer_name', 'customer_address', 'customer_phone',
+                 'description', 'priority', 'status', 'assigned_technician_id',
+                 'created_by_user_id', 'customer_id', 'estimated_duration', 'scheduled_date',
+                 'created_at', 'updated_at')
+    
     def __init__(self, id=None, claim_number=None, customer_name=None, customer_address=None,
                  customer_phone=None, description=None, priority='medium', status='pending',
                  assigned_technician_id=None, created_by_user_id=None, customer_id=None,
@@ -278,10 +492,13 @@ class WorkOrder(BaseModel):
     @classmethod
     def find_by_id(cls, work_order_id):
         """Trouver un bon de travail par ID"""
+        cached = cls._identity_get(work_order_id)
+        if cached is not None:
+            return cached
         try:
             query = "SELECT * FROM work_orders WHERE id = %s"
             result = db_manager.execute_query(query, (work_order_id,), fetch_one=True)
-            return cls.from_dict(result) if result else None
+            return cls._load(result) if result else None
         except Exception as e:
             logger.error(f"Erreur lors de la recherche du bon de travail {work_order_id}: {e}")
             return None
@@ -308,25 +525,41 @@ class WorkOrder(BaseModel):
             base_query += " ORDER BY created_at DESC"
             
             result = db_manager.execute_query(base_query, params if params else None)
-            return [cls.from_dict(wo) for wo in result] if result else []
+            return cls._load_all(result)
         except Exception as e:
             logger.error(f"Erreur lors de la récupération des bons de travail: {e}")
             return []
     
     @classmethod
-    def search(cls, search_term):
-        """Rechercher des bons de travail"""
+    def search(cls, search_term, limit=50, offset=0):
+        """Rechercher des bons de travail (index FULLTEXT, du plus pertinent au moins pertinent)"""
         try:
+            boolean_query = build_boolean_query(search_term)
+            if boolean_query:
+                query = f"""
+                    SELECT *, {WORK_ORDER_MATCH} AS search_score FROM work_orders 
+                    WHERE {WORK_ORDER_MATCH}
+                    ORDER BY search_score DESC, created_at DESC
+                    LIMIT %s OFFSET %s
+                """
+                try:
+                    result = db_manager.execute_query(query, (boolean_query, boolean_query, limit, offset))
+                    return cls._load_all(result)
+                except Exception as e:
+                    if not is_missing_fulltext_index(e):
+                        raise
+            
             query = """
                 SELECT * FROM work_orders 
                 WHERE claim_number LIKE %s 
                    OR customer_name LIKE %s 
                    OR description LIKE %s
                 ORDER BY created_at DESC
+                LIMIT %s OFFSET %s
             """
-            search_pattern = f"%{search_term}%"
-            result = db_manager.execute_query(query, (search_pattern, search_pattern, search_pattern))
-            return [cls.from_dict(wo) for wo in result] if result else []
+            search_pattern = f"%{escape_like(search_term)}%"
+            result = db_manager.execute_query(query, (search_pattern, search_pattern, search_pattern, limit, offset))
+            return cls._load_all(result)
         except Exception as e:
             logger.error(f"Erreur lors de la recherche de bons de travail: {e}")
             return []
@@ -367,6 +600,7 @@ class WorkOrder(BaseModel):
                 # Récupérer l'ID généré
                 self.id = db_manager.get_connection().insert_id()
             
+            self._forget()
             return True
         except Exception as e:
             logger.error(f"Erreur lors de la sauvegarde du bon de travail: {e}")
@@ -374,27 +608,74 @@ class WorkOrder(BaseModel):
     
     def get_assigned_technician(self):
         """Récupérer le technicien assigné"""
-        if self.assigned_technician_id:
-            return User.find_by_id(self.assigned_technician_id)
-        return None
+        return self._get_related('technician', lambda: (
+            User.find_by_id(self.assigned_technician_id) if self.assigned_technician_id else None
+        ))
     
     def get_customer(self):
         """Récupérer le client associé"""
-        if self.customer_id:
-            return Customer.find_by_id(self.customer_id)
-        return None
+        return self._get_related('customer', lambda: (
+            Customer.find_by_id(self.customer_id) if self.customer_id else None
+        ))
     
     def get_lines(self):
         """Récupérer les lignes du bon de travail"""
-        return WorkOrderLine.find_by_work_order_id(self.id)
+        return self._get_related('lines', lambda: WorkOrderLine.find_by_work_order_id(self.id))
     
     def get_interventions(self):
         """Récupérer les interventions associées"""
-        return InterventionNote.find_by_work_order_id(self.id)
+        return self._get_related('interventions', lambda: InterventionNote.find_by_work_order_id(self.id))
+    
+    @classmethod
+    def prefetch_related(cls, work_orders, *relations):
+        """
+        Charger en lot les relations d'une liste de bons de travail
+        
+        Une requête IN (...) par relation au lieu d'une par bon de travail ;
+        les accesseurs get_*() lisent ensuite les objets préchargés.
+        relations : 'customer', 'technician', 'lines', 'interventions'
+        (toutes par défaut).
+        """
+        work_orders = [wo for wo in work_orders if wo.id is not None]
+        if not work_orders:
+            return work_orders
+        relations = relations or ('customer', 'technician', 'lines', 'interventions')
+        
+        try:
+            if 'customer' in relations:
+                customers = Customer.find_by_ids({wo.customer_id for wo in work_orders if wo.customer_id})
+                for wo in work_orders:
+                    wo._set_related('customer', customers.get(wo.customer_id))
+            
+            if 'technician' in relations:
+                technicians = User.find_by_ids(
+                    {wo.assigned_technician_id for wo in work_orders if wo.assigned_technician_id}
+                )
+                for wo in work_orders:
+                    wo._set_related('technician', technicians.get(wo.assigned_technician_id))
+            
+            work_order_ids = [wo.id for wo in work_orders]
+            if 'lines' in relations:
+                lines = WorkOrderLine.find_by_work_order_ids(work_order_ids)
+                for wo in work_orders:
+                    wo._set_related('lines', lines.get(wo.id, []))
+            
+            if 'interventions' in relations:
+                notes = InterventionNote.find_by_work_order_ids(work_order_ids)
+                for wo in work_orders:
+                    wo._set_related('interventions', notes.get(wo.id, []))
+        except Exception as e:
+            # Les accesseurs retomberont sur le chargement unitaire
+            logger.error(f"Erreur lors du préchargement des relations des bons de travail: {e}")
+        
+        return work_orders
 
 class WorkOrderLine(BaseModel):
     """Modèle pour les lignes de bon de travail"""
     
+    __slots__ = ('id', 'work_order_id', 'product_description', 'quantity', 'unit_price',
+                 'total_price')
+    
     def __init__(self, id=None, work_order_id=None, product_description=None, 
                  quantity=None, unit_price=None, total_price=None, **kwargs):
         self.id = id
@@ -411,11 +692,21 @@ class WorkOrderLine(BaseModel):
         try:
             query = "SELECT * FROM work_order_lines WHERE work_order_id = %s ORDER BY id"
             result = db_manager.execute_query(query, (work_order_id,))
-            return [cls.from_dict(line) for line in result] if result else []
+            return cls._load_all(result)
         except Exception as e:
             logger.error(f"Erreur lors de la recherche des lignes du bon de travail {work_order_id}: {e}")
             return []
     
+    @classmethod
+    def find_by_work_order_ids(cls, work_order_ids):
+        """Lignes de plusieurs bons de travail en une requête ({work_order_id: [lignes]})"""
+        try:
+            query = "SELECT * FROM work_order_lines WHERE work_order_id IN ({ids}) ORDER BY work_order_id, id"
+            return cls._group_by_work_order(query, work_order_ids)
+        except Exception as e:
+            logger.error(f"Erreur lors de la recherche des lignes des bons de travail: {e}")
+            return {}
+    
     def save(self):
         """Sauvegarder la ligne de bon de travail"""
         try:
@@ -442,6 +733,7 @@ class WorkOrderLine(BaseModel):
                 # Récupérer l'ID généré
                 self.id = db_manager.get_connection().insert_id()
             
+            self._forget()
             return True
         except Exception as e:
             logger.error(f"Erreur lors de la sauvegarde de la ligne de bon de travail: {e}")
@@ -450,6 +742,8 @@ class WorkOrderLine(BaseModel):
 class InterventionNote(BaseModel):
     """Modèle pour les notes d'intervention"""
     
+    __slots__ = ('id', 'work_order_id', 'user_id', 'note_text', 'note_type', 'created_at')
+    
     def __init__(self, id=None, work_order_id=None, user_id=None, note_text=None,
                  note_type='private', created_at=None, **kwargs):
         self.id = id
@@ -465,18 +759,34 @@ class InterventionNote(BaseModel):
         """Trouver les notes d'un bon de travail"""
         try:
             query = """
-                SELECT in.*, u.name as user_name 
-                FROM intervention_notes in
-                LEFT JOIN users u ON in.user_id = u.id
-                WHERE in.work_order_id = %s 
-                ORDER BY in.created_at DESC
+                SELECT n.*, u.name as user_name 
+                FROM intervention_notes n
+                LEFT JOIN users u ON n.user_id = u.id
+                WHERE n.work_order_id = %s 
+                ORDER BY n.created_at DESC
             """
             result = db_manager.execute_query(query, (work_order_id,))
-            return [cls.from_dict(note) for note in result] if result else []
+            return cls._load_all(result)
         except Exception as e:
             logger.error(f"Erreur lors de la recherche des notes d'intervention {work_order_id}: {e}")
             return []
     
+    @classmethod
+    def find_by_work_order_ids(cls, work_order_ids):
+        """Notes de plusieurs bons de travail en une requête ({work_order_id: [notes]})"""
+        try:
+            query = """
+                SELECT n.*, u.name as user_name 
+                FROM intervention_notes n
+                LEFT JOIN users u ON n.user_id = u.id
+                WHERE n.work_order_id IN ({ids}) 
+                ORDER BY n.work_order_id, n.created_at DESC
+            """
+            return cls._group_by_work_order(query, work_order_ids)
+        except Exception as e:
+            logger.error(f"Erreur lors de la recherche des notes d'intervention des bons de travail: {e}")
+            return {}
+    
     def save(self):
         """Sauvegarder la note d'intervention"""
         try:
@@ -489,6 +799,7 @@ class InterventionNote(BaseModel):
             
             # Récupérer l'ID généré
             self.id = db_manager.get_connection().insert_id()
+            self._forget()
             return True
         except Exception as e:
             logger.error(f"Erreur lors de la sauvegarde de la note d'intervention: {e}")
@@ -497,6 +808,9 @@ class InterventionNote(BaseModel):
 class InterventionMedia(BaseModel):
     """Modèle pour les médias d'intervention"""
     
+    __slots__ = ('id', 'work_order_id', 'user_id', 'file_name', 'file_path', 'file_type',
+                 'file_size', 'description', 'created_at')
+    
     def __init__(self, id=None, work_order_id=None, user_id=None, file_name=None,
                  file_path=None, file_type=None, file_size=None, description=None,
                  created_at=None, **kwargs):
@@ -523,7 +837,7 @@ class InterventionMedia(BaseModel):
                 ORDER BY im.created_at DESC
             """
             result = db_manager.execute_query(query, (work_order_id,))
-            return [cls.from_dict(media) for media in result] if result else []
+            return cls._load_all(result)
         except Exception as e:
             logger.error(f"Erreur lors de la recherche des médias d'intervention {work_order_id}: {e}")
             return []
@@ -542,6 +856,7 @@ class InterventionMedia(BaseModel):
             
             # Récupérer l'ID généré
             self.id = db_manager.get_connection().insert_id()
+            self._forget()
             return True
         except Exception as e:
             logger.error(f"Erreur lors de la sauvegarde du média d'intervention: {e}")
@@ -550,6 +865,9 @@ class InterventionMedia(BaseModel):
 class Notification(BaseModel):
     """Modèle pour les notifications"""
     
+    __slots__ = ('id', 'user_id', 'title', 'message', 'type', 'is_read', 'related_id',
+                 'related_type', 'created_at')
+    
     def __init__(self, id=None, user_id=None, title=None, message=None, type='info',
                  is_read=False, related_id=None, related_type=None, created_at=None, **kwargs):
         self.id = id
@@ -576,7 +894,7 @@ class Notification(BaseModel):
             query += " ORDER BY created_at DESC"
             
             result = db_manager.execute_query(query, params)
-            return [cls.from_dict(notification) for notification in result] if result else []
+            return cls._load_all(result)
         except Exception as e:
             logger.error(f"Erreur lors de la recherche des notifications de l'utilisateur {user_id}: {e}")
             return []
@@ -594,6 +912,7 @@ class Notification(BaseModel):
             
             # Récupérer l'ID généré
             self.id = db_manager.get_connection().insert_id()
+            self._forget()
             return True
         except Exception as e:
             logger.error(f"Erreur lors de la sauvegarde de la notification: {e}")
@@ -605,41 +924,92 @@ class Notification(BaseModel):
             query = "UPDATE notifications SET is_read = TRUE WHERE id = %s"
             db_manager.execute_query(query, (self.id,))
             self.is_read = True
+            self._forget()
             return True
         except Exception as e:
             logger.error(f"Erreur lors du marquage de la notification comme lue: {e}")
             return False
 
 # Fonctions helper pour les requêtes communes
+
+# Cache des compteurs du tableau de bord : partagé par rôle (par technicien
+# pour la vue technicien), quelques secondes suffisent à absorber les rafales
+DASHBOARD_STATS_TTL = 30
+_dashboard_stats_cache = {}
+_dashboard_stats_lock = threading.Lock()
+
+def _dashboard_counters_query(user_id=None, user_role=None):
+    """Requête unique (une ligne) pour les compteurs d'un rôle"""
+    if user_role == 'technician' and user_id:
+        query = """
+            SELECT 
+                COUNT(*) AS my_work_orders,
+                COALESCE(SUM(CASE WHEN status = 'pending' THEN 1 ELSE 0 END), 0) AS my_pending,
+                COALESCE(SUM(CASE WHEN status = 'in_progress' THEN 1 ELSE 0 END), 0) AS my_in_progress,
+                (SELECT COUNT(*) FROM customers WHERE is_active = TRUE) AS total_customers
+            FROM work_orders
+            WHERE assigned_technician_id = %s
+        """
+        return query, (user_id,)
+
+    user_counters = ""
+    if user_role in ['admin', 'manager']:
+        user_counters = """,
+                (SELECT COUNT(*) FROM users WHERE is_active = TRUE) AS total_users,
+                (SELECT COUNT(*) FROM users WHERE is_active = TRUE AND role = 'technician') AS technicians"""
+
+    query = f"""
+            SELECT 
+                COUNT(*) AS total_work_orders,
+                COALESCE(SUM(CASE WHEN status = 'pending' THEN 1 ELSE 0 END), 0) AS pending_work_orders,
+                COALESCE(SUM(CASE WHEN status = 'in_progress' THEN 1 ELSE 0 END), 0) AS in_progress_work_orders,
+                COALESCE(SUM(CASE WHEN status = 'completed' THEN 1 ELSE 0 END), 0) AS completed_work_orders,
+                (SELECT COUNT(*) FROM customers WHERE is_active = TRUE) AS total_customers{user_counters}
+            FROM work_orders
+        """
+    return query, None
+
+def invalidate_dashboard_stats():
+    """Vider le cache des compteurs (après un import massif par exemple)"""
+    with _dashboard_stats_lock:
+        _dashboard_stats_cache.clear()
+
 def get_dashboard_stats(user_id=None, user_role=None):
-    """Récupérer les statistiques pour le tableau de bord"""
+    """
+    Récupérer les statistiques pour le tableau de bord
+    
+    Tous les compteurs viennent d'une seule requête agrégée (une ligne
+    transférée quel que soit le volume), mise en cache DASHBOARD_STATS_TTL
+    secondes par rôle. Les notifications non lues restent propres à
+    l'utilisateur et sont comptées à chaque appel.
+    """
     try:
-        stats = {}
-        
-        # Statistiques générales des bons de travail
-        if user_role == 'technician' and user_id:
-            # Statistiques pour le technicien
-            stats['my_work_orders'] = len(WorkOrder.get_all(technician_id=user_id))
-            stats['my_pending'] = len(WorkOrder.get_all(status='pending', technician_id=user_id))
-            stats['my_in_progress'] = len(WorkOrder.get_all(status='in_progress', technician_id=user_id))
+        is_technician = user_role == 'technician' and user_id
+        if is_technician:
+            cache_key = ('technician', user_id)
         else:
-            # Statistiques globales
-            stats['total_work_orders'] = len(WorkOrder.get_all())
-            stats['pending_work_orders'] = len(WorkOrder.get_all(status='pending'))
-            stats['in_progress_work_orders'] = len(WorkOrder.get_all(status='in_progress'))
-            stats['completed_work_orders'] = len(WorkOrder.get_all(status='completed'))
+            cache_key = (user_role if user_role in ['admin', 'manager'] else 'default', None)
         
-        # Statistiques des utilisateurs (seulement pour admin/manager)
-        if user_role in ['admin', 'manager']:
-            stats['total_users'] = len(User.get_all())
-            stats['technicians'] = len(User.get_all(role='technician'))
+        now = time.time()
+        with _dashboard_stats_lock:
+            cached = _dashboard_stats_cache.get(cache_key)
         
-        # Statistiques des clients
-        stats['total_customers'] = len(Customer.get_all())
+        if cached and now - cached[0] < DASHBOARD_STATS_TTL:
+            stats = dict(cached[1])
+        else:
+            query, params = _dashboard_counters_query(user_id, user_role)
+            row = db_manager.execute_query(query, params, fetch_one=True) or {}
+            stats = {key: int(value or 0) for key, value in row.items()}
+            with _dashboard_stats_lock:
+                _dashboard_stats_cache[cache_key] = (now, dict(stats))
         
         # Notifications non lues
         if user_id:
-            stats['unread_notifications'] = len(Notification.find_by_user_id(user_id, unread_only=True))
+            row = db_manager.execute_query(
+                "SELECT COUNT(*) AS unread FROM notifications WHERE user_id = %s AND is_read = FALSE",
+                (user_id,), fetch_one=True
+            )
+            stats['unread_notifications'] = int(row['unread']) if row else 0
         
         return stats
     except Exception as e:
@@ -651,17 +1021,24 @@ def get_recent_activities(user_id=None, limit=10):
     try:
         # Pour l'instant, on retourne les bons de travail récents
         # Plus tard, on pourra ajouter une table d'activités
-        recent_work_orders = WorkOrder.get_all()[:limit]
+        query = """
+            SELECT id, claim_number, description, status, created_at
+            FROM work_orders
+            ORDER BY created_at DESC
+            LIMIT %s
+        """
+        recent_work_orders = db_manager.execute_query(query, (int(limit),)) or []
         
         activities = []
         for wo in recent_work_orders:
+            description = wo['description'] or ''
             activities.append({
                 'type': 'work_order',
-                'title': f"Bon de travail {wo.claim_number}",
-                'description': wo.description[:50] + "..." if len(wo.description) > 50 else wo.description,
-                'status': wo.status,
-                'created_at': wo.created_at,
-                'url': f"/work_orders/{wo.id}"
+                'title': f"Bon de travail {wo['claim_number']}",
+                'description': description[:50] + "..." if len(description) > 50 else description,
+                'status': wo['status'],
+                'created_at': wo['created_at'],
+                'url': f"/work_orders/{wo['id']}"
             })
         
         return activities
@@ -679,6 +1056,10 @@ class WorkOrderTask(BaseModel):
     Empêche par design les tâches orphelines
     """
     
+    __slots__ = ('id', 'work_order_id', 'title', 'description', 'task_source', 'created_by',
+                 'status', 'priority', 'technician_id', 'estimated_minutes', 'scheduled_start',
+                 'scheduled_end', 'started_at', 'completed_at', 'created_at', 'updated_at')
+    
     def __init__(self, id=None, work_order_id=None, title=None, description=None,
                  task_source=None, created_by='operator', status='pending', 
                  priority='medium', technician_id=None, estimated_minutes=None,
@@ -745,7 +1126,7 @@ class WorkOrderTask(BaseModel):
             """
             
             results = db_manager.execute_query(query, (work_order_id,))
-            return [cls(**result) for result in results]
+            return cls._load_all(results)
             
         except Exception as e:
             logger.error(f"Erreur lors de la récupération des tâches: {e}")
@@ -759,7 +1140,7 @@ class WorkOrderTask(BaseModel):
             results = db_manager.execute_query(query, (task_id,))
             
             if results:
-                return cls(**results[0])
+                return cls._load(results[0])
             return None
             
         except Exception as e:
@@ -799,6 +1180,7 @@ class WorkOrderTask(BaseModel):
             db_manager.execute_query(query, params)
             self.status = new_status
             
+            self._forget()
             return True
             
         except Exception as e:
@@ -811,6 +1193,9 @@ class Intervention(BaseModel):
     Relation 1-1 stricte avec WorkOrderTask
     """
     
+    __slots__ = ('id', 'work_order_id', 'task_id', 'technician_id', 'started_at', 'ended_at',
+                 'result_status', 'summary', 'created_at')
+    
     def __init__(self, id=None, work_order_id=None, task_id=None, technician_id=None,
                  started_at=None, ended_at=None, result_status='ok', summary=None,
                  created_at=None, **kwargs):
@@ -873,7 +1258,7 @@ class Intervention(BaseModel):
             results = db_manager.execute_query(query, (intervention_id,))
             
             if results:
-                return cls(**results[0])
+                return cls._load(results[0])
             return None
             
         except Exception as e:
@@ -893,7 +1278,7 @@ class Intervention(BaseModel):
             """
             
             results = db_manager.execute_query(query, (work_order_id,))
-            return [cls(**result) for result in results]
+            return cls._load_all(results)
             
         except Exception as e:
             logger.error(f"Erreur lors de la récupération des interventions: {e}")
@@ -3,26 +3,44 @@ Sprint 7.4 - Multi-sites & Consolidation
 Vue comparative et consolidation des ateliers multiples
 """
 
-from typing import Dict, List, Any, Tuple
+from typing import Dict, List, Any, Optional, Tuple
+from collections import OrderedDict
 from datetime import datetime, timedelta
+import os
 import statistics
+import threading
+import time
 from core.database import get_db_connection
 
 class MultiSiteManager:
     """Gestionnaire pour la vue multi-sites et consolidation"""
     
-    def __init__(self):
-        self.comparison_cache = {}
+    def __init__(self, cache_ttl: int = 300, comparison_cache_size: int = 256):
+        self.comparison_cache = OrderedDict()
         self.site_metrics_cache = {}
+        self.cache_ttl = cache_ttl  # secondes
+        self.comparison_cache_size = comparison_cache_size
+        self._cache_lock = threading.Lock()
+        # Rafraîchissement de site_daily_kpis (secondes)
+        self.kpi_refresh_interval = int(os.environ.get('SITE_KPI_REFRESH_INTERVAL', '900'))
+        self._kpi_thread = None
     
     def get_comparative_dashboard(self, site_ids: List[int] = None, 
                                 date_range: int = 30) -> Dict[str, Any]:
         """Vue comparative des sites/ateliers"""
+        self._ensure_kpi_refresh_thread()
         try:
             # Si aucun site spécifié, récupérer tous les sites actifs
             if not site_ids:
                 site_ids = self._get_active_site_ids()
             
+            cache_key = (date_range, tuple(sorted(site_ids)))
+            with self._cache_lock:
+                cached = self.comparison_cache.get(cache_key)
+                if cached and time.time() - cached[0] < self.cache_ttl:
+                    self.comparison_cache.move_to_end(cache_key)
+                    return cached[1]
+            
             comparative_data = {
                 'sites_overview': [],
                 'comparative_metrics': {},
@@ -31,10 +49,8 @@ class MultiSiteManager:
                 'recommendations': []
             }
             
-            # Récupérer les données de chaque site
-            for site_id in site_ids:
-                site_data = self._get_site_comprehensive_data(site_id, date_range)
-                comparative_data['sites_overview'].append(site_data)
+            # Récupérer les données de tous les sites en une seule requête groupée
+            comparative_data['sites_overview'] = self._get_sites_comprehensive_data(site_ids, date_range)
             
             # Calculer les métriques comparatives
             comparative_data['comparative_metrics'] = self._calculate_comparative_metrics(
@@ -50,13 +66,16 @@ class MultiSiteManager:
             comparative_data['trends_analysis'] = self._analyze_cross_site_trends(
                 comparative_data['sites_overview'], date_range
             )
+            comparative_data['trends_analysis']['workload_trends'] = self.get_site_kpi_trends(
+                site_ids, date_range
+            )
             
             # Recommandations d'optimisation
             comparative_data['recommendations'] = self._generate_multi_site_recommendations(
                 comparative_data
             )
             
-            return {
+            result = {
                 'status': 'success',
                 'data': comparative_data,
                 'generated_at': datetime.now().isoformat(),
@@ -64,6 +83,19 @@ class MultiSiteManager:
                 'date_range_days': date_range
             }
             
+            now = time.time()
+            with self._cache_lock:
+                # Entrées expirées puis moins récemment utilisées au-delà de la taille max
+                for key in [key for key, entry in self.comparison_cache.items()
+                            if now - entry[0] >= self.cache_ttl]:
+                    del self.comparison_cache[key]
+                self.comparison_cache[cache_key] = (now, result)
+                self.comparison_cache.move_to_end(cache_key)
+                while len(self.comparison_cache) > self.comparison_cache_size:
+                    self.comparison_cache.popitem(last=False)
+            
+            return result
+            
         except Exception as e:
             print(f"❌ Erreur dashboard comparatif: {e}")
             return {
@@ -184,88 +216,255 @@ class MultiSiteManager:
     
     def _get_site_comprehensive_data(self, site_id: int, date_range: int) -> Dict[str, Any]:
         """Récupère les données complètes d'un site"""
+        sites = self._get_sites_comprehensive_data([site_id], date_range)
+        return sites[0] if sites else {}
+    
+    def _get_sites_comprehensive_data(self, site_ids: List[int], date_range: int) -> List[Dict[str, Any]]:
+        """Récupère les données complètes de plusieurs sites en une requête
+        
+        Chaque source (équipe, work orders, feedback) est pré-agrégée par site
+        dans une sous-requête avant la jointure, ce qui évite le produit
+        cartésien users × work_orders × client_feedback.
+        """
+        if not site_ids:
+            return []
+        
+        placeholders = ', '.join(['%s'] * len(site_ids))
+        params = (
+            list(site_ids)
+            + [date_range] + list(site_ids)
+            + [date_range, date_range] + list(site_ids)
+            + list(site_ids)
+        )
+        
         connection = get_db_connection()
-        cursor = connection.cursor(dictionary=True)
+        cursor = connection.cursor()
         
-        # Informations de base du site
-        cursor.execute("""
+        cursor.execute(f"""
             SELECT 
                 s.id,
                 s.name,
                 s.location,
                 s.department,
                 s.region,
-                COUNT(DISTINCT u.id) as team_size,
-                COUNT(DISTINCT wo.id) as total_work_orders,
-                AVG(cf.overall_satisfaction) as avg_satisfaction
+                COALESCE(team.team_size, 0) as team_size,
+                COALESCE(wo.total_work_orders, 0) as total_work_orders,
+                COALESCE(wo.completed_orders, 0) as completed_orders,
+                COALESCE(wo.pending_orders, 0) as pending_orders,
+                COALESCE(wo.in_progress_orders, 0) as in_progress_orders,
+                wo.avg_completion_time,
+                COALESCE(wo.week_activity, 0) as week_activity,
+                fb.satisfaction_score
             FROM sites s
-            LEFT JOIN users u ON s.id = u.site_id AND u.is_active = TRUE
-            LEFT JOIN work_orders wo ON u.id = wo.assigned_technician_id 
-                AND wo.created_at >= DATE_SUB(NOW(), INTERVAL %s DAY)
-            LEFT JOIN client_feedback cf ON u.id = cf.technician_id
-                AND cf.submitted_at >= DATE_SUB(NOW(), INTERVAL %s DAY)
-            WHERE s.id = %s
-            GROUP BY s.id, s.name, s.location, s.department, s.region
-        """, (date_range, date_range, site_id))
-        
-        site_info = cursor.fetchone()
-        
-        if not site_info:
-            cursor.close()
-            connection.close()
-            return {}
+            LEFT JOIN (
+                SELECT site_id, COUNT(*) as team_size
+                FROM users
+                WHERE is_active = TRUE AND site_id IN ({placeholders})
+                GROUP BY site_id
+            ) team ON team.site_id = s.id
+            LEFT JOIN (
+                SELECT 
+                    u.site_id,
+                    COUNT(*) as total_work_orders,
+                    COUNT(CASE WHEN w.status = 'completed' THEN 1 END) as completed_orders,
+                    COUNT(CASE WHEN w.status = 'pending' THEN 1 END) as pending_orders,
+                    COUNT(CASE WHEN w.status = 'in_progress' THEN 1 END) as in_progress_orders,
+                    AVG(CASE WHEN w.status = 'completed' THEN 
+                        TIMESTAMPDIFF(HOUR, w.created_at, w.completed_at) END) as avg_completion_time,
+                    COUNT(CASE WHEN w.created_at >= DATE_SUB(NOW(), INTERVAL 7 DAY) THEN 1 END) as week_activity
+                FROM work_orders w
+                INNER JOIN users u ON u.id = w.assigned_technician_id AND u.is_active = TRUE
+                WHERE w.created_at >= DATE_SUB(NOW(), INTERVAL %s DAY)
+                AND u.site_id IN ({placeholders})
+                GROUP BY u.site_id
+            ) wo ON wo.site_id = s.id
+            LEFT JOIN (
+                SELECT u.site_id, AVG(cf.overall_satisfaction) as satisfaction_score
+                FROM client_feedback cf
+                INNER JOIN work_orders w ON w.id = cf.work_order_id
+                    AND w.created_at >= DATE_SUB(NOW(), INTERVAL %s DAY)
+                INNER JOIN users u ON u.id = w.assigned_technician_id AND u.is_active = TRUE
+                WHERE cf.submitted_at >= DATE_SUB(NOW(), INTERVAL %s DAY)
+                AND u.site_id IN ({placeholders})
+                GROUP BY u.site_id
+            ) fb ON fb.site_id = s.id
+            WHERE s.id IN ({placeholders})
+            ORDER BY s.id
+        """, params)
+        
+        rows = cursor.fetchall()
+        cursor.close()
+        connection.close()
+        
+        return [self._build_site_data(row) for row in rows]
+    
+    def _build_site_data(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        """Calcule les KPIs d'un site à partir de sa ligne agrégée"""
+        total_work_orders = int(row['total_work_orders'] or 0)
+        completed_orders = int(row['completed_orders'] or 0)
+        team_size = int(row['team_size'] or 0)
+        satisfaction = float(row['satisfaction_score'] or 0)
         
-        # Métriques de performance
-        cursor.execute("""
-            SELECT 
-                COUNT(CASE WHEN wo.status = 'completed' THEN 1 END) as completed_orders,
-                COUNT(CASE WHEN wo.status = 'pending' THEN 1 END) as pending_orders,
-                COUNT(CASE WHEN wo.status = 'in_progress' THEN 1 END) as in_progress_orders,
-                AVG(CASE WHEN wo.status = 'completed' THEN 
-                    TIMESTAMPDIFF(HOUR, wo.created_at, wo.completed_at) END) as avg_completion_time,
-                AVG(CASE WHEN cf.overall_satisfaction IS NOT NULL THEN cf.overall_satisfaction END) as satisfaction_score,
-                COUNT(DISTINCT CASE WHEN wo.created_at >= DATE_SUB(NOW(), INTERVAL 7 DAY) THEN wo.id END) as week_activity
-            FROM users u
-            LEFT JOIN work_orders wo ON u.id = wo.assigned_technician_id 
-                AND wo.created_at >= DATE_SUB(NOW(), INTERVAL %s DAY)
-            LEFT JOIN client_feedback cf ON wo.id = cf.work_order_id
-                AND cf.submitted_at >= DATE_SUB(NOW(), INTERVAL %s DAY)
-            WHERE u.site_id = %s AND u.is_active = TRUE
-        """, (date_range, date_range, site_id))
-        
-        performance_metrics = cursor.fetchone()
-        
-        # Calculs des KPIs
         efficiency_rate = 0
-        if performance_metrics['completed_orders'] and site_info['total_work_orders']:
-            efficiency_rate = (performance_metrics['completed_orders'] / site_info['total_work_orders']) * 100
+        if completed_orders and total_work_orders:
+            efficiency_rate = (completed_orders / total_work_orders) * 100
         
         productivity_score = 0
-        if site_info['team_size'] and site_info['total_work_orders']:
-            productivity_score = site_info['total_work_orders'] / site_info['team_size']
-        
-        cursor.close()
-        connection.close()
+        if team_size and total_work_orders:
+            productivity_score = total_work_orders / team_size
         
         return {
-            'site_id': site_id,
-            'site_name': site_info['name'],
-            'location': site_info['location'],
-            'department': site_info['department'],
-            'region': site_info['region'],
-            'team_size': site_info['team_size'] or 0,
-            'total_work_orders': site_info['total_work_orders'] or 0,
-            'completed_orders': performance_metrics['completed_orders'] or 0,
-            'pending_orders': performance_metrics['pending_orders'] or 0,
-            'in_progress_orders': performance_metrics['in_progress_orders'] or 0,
+            'site_id': row['id'],
+            'site_name': row['name'],
+            'location': row['location'],
+            'department': row['department'],
+            'region': row['region'],
+            'team_size': team_size,
+            'total_work_orders': total_work_orders,
+            'completed_orders': completed_orders,
+            'pending_orders': int(row['pending_orders'] or 0),
+            'in_progress_orders': int(row['in_progress_orders'] or 0),
             'efficiency_rate': round(efficiency_rate, 1),
             'productivity_score': round(productivity_score, 1),
-            'satisfaction_score': round(performance_metrics['satisfaction_score'] or 0, 1),
-            'avg_completion_time': round(performance_metrics['avg_completion_time'] or 0, 1),
-            'week_activity': performance_metrics['week_activity'] or 0,
-            'performance_grade': self._calculate_performance_grade(efficiency_rate, productivity_score, performance_metrics['satisfaction_score'] or 0)
+            'satisfaction_score': round(satisfaction, 1),
+            'avg_completion_time': round(float(row['avg_completion_time'] or 0), 1),
+            'week_activity': int(row['week_activity'] or 0),
+            'performance_grade': self._calculate_performance_grade(efficiency_rate, productivity_score, satisfaction)
         }
     
+    def refresh_site_daily_kpis(self, days_back: Optional[int] = None) -> bool:
+        """
+        Matérialise les KPIs journaliers par site (site_daily_kpis)
+        
+        Les lignes sont indexées par jour de création : sont recalculés les
+        jours de création des bons de travail créés, modifiés ou terminés
+        pendant les N derniers jours (par défaut depuis la dernière
+        matérialisation). Ces jours sont supprimés puis réinsérés pour
+        refléter suppressions et réaffectations de site.
+        """
+        connection = None
+        try:
+            connection = get_db_connection()
+            with connection.cursor() as cursor:
+                if days_back is None:
+                    cursor.execute("""
+                        SELECT DATEDIFF(CURDATE(), MAX(updated_at)) + 1 AS days_back
+                        FROM site_daily_kpis
+                    """)
+                    row = cursor.fetchone()
+                    days_back = row['days_back'] if row and row['days_back'] is not None else 365
+                
+                cursor.execute("""
+                    SELECT DISTINCT DATE(created_at) AS kpi_date
+                    FROM work_orders
+                    WHERE updated_at >= CURDATE() - INTERVAL %s DAY
+                    OR completed_at >= CURDATE() - INTERVAL %s DAY
+                """, (days_back, days_back))
+                touched_days = [row['kpi_date'] for row in cursor.fetchall() if row['kpi_date']]
+                
+                day_filter = "{column} >= CURDATE() - INTERVAL %s DAY"
+                params = [days_back]
+                if touched_days:
+                    day_filter += f" OR {{column}} IN ({', '.join(['%s'] * len(touched_days))})"
+                    params += touched_days
+                
+                cursor.execute(
+                    f"DELETE FROM site_daily_kpis WHERE {day_filter.format(column='kpi_date')}",
+                    params
+                )
+                cursor.execute(f"""
+                    INSERT INTO site_daily_kpis (
+                        site_id, kpi_date, total_work_orders, completed_orders,
+                        pending_orders, in_progress_orders, completion_hours_sum,
+                        completion_count
+                    )
+                    SELECT 
+                        u.site_id,
+                        DATE(w.created_at),
+                        COUNT(*),
+                        COUNT(CASE WHEN w.status = 'completed' THEN 1 END),
+                        COUNT(CASE WHEN w.status = 'pending' THEN 1 END),
+                        COUNT(CASE WHEN w.status = 'in_progress' THEN 1 END),
+                        COALESCE(SUM(CASE WHEN w.status = 'completed' THEN 
+                            TIMESTAMPDIFF(HOUR, w.created_at, w.completed_at) END), 0),
+                        COUNT(CASE WHEN w.status = 'completed' AND w.completed_at IS NOT NULL THEN 1 END)
+                    FROM work_orders w
+                    INNER JOIN users u ON u.id = w.assigned_technician_id
+                    WHERE u.site_id IS NOT NULL
+                    AND ({day_filter.format(column='DATE(w.created_at)')})
+                    GROUP BY u.site_id, DATE(w.created_at)
+                """, params)
+            
+            connection.commit()
+            
+            with self._cache_lock:
+                self.comparison_cache.clear()
+            
+            return True
+            
+        except Exception as e:
+            print(f"❌ Erreur matérialisation KPIs sites: {e}")
+            if connection:
+                connection.rollback()
+            return False
+        finally:
+            if connection:
+                connection.close()
+    
+    def _ensure_kpi_refresh_thread(self):
+        """Démarre au premier usage le rafraîchissement périodique de site_daily_kpis"""
+        if self._kpi_thread is None:
+            with self._cache_lock:
+                if self._kpi_thread is None:
+                    self._kpi_thread = threading.Thread(
+                        target=self._kpi_refresh_loop, daemon=True, name="SiteKPIRefresh"
+                    )
+                    self._kpi_thread.start()
+    
+    def _kpi_refresh_loop(self):
+        while True:
+            self.refresh_site_daily_kpis()
+            time.sleep(self.kpi_refresh_interval)
+    
+    def get_site_kpi_trends(self, site_ids: List[int], date_range: int = 30) -> Dict[int, List[Dict]]:
+        """Série journalière des KPIs par site, lue dans site_daily_kpis"""
+        if not site_ids:
+            return {}
+        
+        connection = None
+        try:
+            placeholders = ', '.join(['%s'] * len(site_ids))
+            connection = get_db_connection()
+            with connection.cursor() as cursor:
+                cursor.execute(f"""
+                    SELECT site_id, kpi_date, total_work_orders, completed_orders,
+                           completion_hours_sum, completion_count
+                    FROM site_daily_kpis
+                    WHERE site_id IN ({placeholders})
+                    AND kpi_date >= CURDATE() - INTERVAL %s DAY
+                    ORDER BY site_id, kpi_date
+                """, list(site_ids) + [date_range])
+                rows = cursor.fetchall()
+            
+        except Exception as e:
+            print(f"❌ Erreur lecture tendances KPIs sites: {e}")
+            return {}
+        finally:
+            if connection:
+                connection.close()
+        
+        trends = {}
+        for row in rows:
+            completion_count = row['completion_count'] or 0
+            trends.setdefault(row['site_id'], []).append({
+                'date': row['kpi_date'].isoformat(),
+                'total_work_orders': row['total_work_orders'],
+                'completed_orders': row['completed_orders'],
+                'avg_completion_time': round(float(row['completion_hours_sum']) / completion_count, 1) if completion_count else 0
+            })
+        
+        return trends
+    
     def _calculate_comparative_metrics(self, sites_data: List[Dict]) -> Dict[str, Any]:
         """Calcule les métriques comparatives entre sites"""
         if not sites_data:
@@ -469,7 +668,7 @@ class MultiSiteManager:
     def _get_available_sites(self) -> List[Dict]:
         """Récupère la liste des sites disponibles"""
         connection = get_db_connection()
-        cursor = connection.cursor(dictionary=True)
+        cursor = connection.cursor()
         
         cursor.execute("""
             SELECT DISTINCT s.id, s.name, s.location, s.department, s.region
@@ -1,40 +1,190 @@
 """
 ChronoTech Sprint 2 - Système de Synchronisation Offline
 Synchronisation SQLite local avec MySQL cloud
+
+Service unique de synchronisation (remplace aussi l'ancien
+OptimizedSyncManager) : les modifications faites hors ligne sont écrites
+dans l'outbox SQLite sync_queue (mode WAL) puis rejouées par lots, chaque
+lot dans une seule transaction MySQL. Une clé d'idempotence par opération
+(table sync_applied_ops), réservée dans la transaction du lot avant les
+opérations, garantit qu'un lot rejoué après une coupure, ou par deux
+processus à la fois, n'est jamais appliqué deux fois.
+
+Planification adaptative : réveil immédiat à chaque mise en file, intervalle
+allongé tant que rien n'arrive, lots élargis au retour de la connexion,
+backoff exponentiel hors ligne. Une étape qui échoue (schéma local ou
+distant incompatible...) est reprise avec son propre backoff sans ralentir
+les autres.
+
+Chaque worker de l'application crée son service, mais un seul (détenteur
+du verrou fichier <offline.db>.sync.lock) fait tourner la boucle ; les
+autres prennent le relais s'il s'arrête.
+
+Les médias (offline_media) passent par core/media_transfer.py : envoi par
+morceaux reprenable, dédupliqué par empreinte, en parallèle à débit plafonné.
 """
-import asyncio
+import fcntl
 import json
 import logging
 import os
+import random
+import re
 import sqlite3
 import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
-import aiohttp
+from itertools import groupby
+from typing import Any, Dict, List, Optional, Tuple
 import mysql.connector
-from mysql.connector import Error
+from mysql.connector import Error, pooling
 import threading
 import queue
 
+from core.media_transfer import (
+    MediaTransfer, MEDIA_UPLOAD_WORKERS, file_sha256, is_image, prepare_image
+)
+
 logger = logging.getLogger(__name__)
 
+# Opérations de l'outbox rejouées par transaction MySQL (lots élargis au
+# retour de la connexion, pour vider l'arriéré)
+SYNC_BATCH_SIZE = int(os.environ.get('OFFLINE_SYNC_BATCH_SIZE', '500'))
+SYNC_BURST_BATCH_SIZE = int(os.environ.get('OFFLINE_SYNC_BURST_BATCH_SIZE', '2000'))
+
+# Connexions MySQL partagées par la synchronisation et les mises en file
+SYNC_POOL_SIZE = int(os.environ.get('OFFLINE_SYNC_POOL_SIZE', '3'))
+
+# Intervalles en secondes : après un cycle actif, puis allongé (x2) à
+# chaque cycle sans activité jusqu'au plafond
+SYNC_INTERVAL = 10
+SYNC_IDLE_MAX = 120
+
+# Reprises hors ligne : backoff exponentiel avec gigue, en secondes
+SYNC_BACKOFF_BASE = 5
+SYNC_BACKOFF_MAX = 300
+
+# Processus en attente du verrou de service : nouvel essai (secondes)
+SERVICE_LOCK_RETRY = 30
+
+# Nettoyage des éléments synchronisés (au plus une fois par période)
+CLEANUP_INTERVAL = 3600
+
+# Fichiers dérivés des médias (photos réduites, vignettes) en attente d'envoi
+MEDIA_WORK_DIR = os.environ.get('MEDIA_WORK_DIR', 'data/media_work')
+
+# Conservation des clés d'idempotence côté MySQL (l'outbox locale purge à 7 jours)
+APPLIED_OPS_RETENTION_DAYS = 30
+
+_IDENTIFIER_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+APPLIED_OPS_DDL = '''
+    CREATE TABLE IF NOT EXISTS sync_applied_ops (
+        idempotency_key VARCHAR(100) NOT NULL PRIMARY KEY,
+        device_id VARCHAR(64) NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        INDEX idx_device_applied (device_id, applied_at)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+'''
+
+# Journal des actions terrain (add_offline_action)
+OFFLINE_ACTIONS_DDL = '''
+    CREATE TABLE IF NOT EXISTS offline_actions (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        action_type VARCHAR(64) NOT NULL,
+        table_name VARCHAR(64) NOT NULL,
+        record_data JSON NOT NULL,
+        technician_id INT,
+        device_id VARCHAR(128),
+        offline_timestamp TIMESTAMP NOT NULL,
+        synced_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        INDEX idx_technician (technician_id),
+        INDEX idx_offline_time (offline_timestamp)
+    )
+'''
+
+
+def _db_value(value: Any) -> Any:
+    """Valeur JSON de l'outbox -> paramètre MySQL (objets et listes sérialisés)"""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def _placeholders(count: int) -> str:
+    return ', '.join(['%s'] * count)
+
+
 class OfflineSyncManager:
     """Gestionnaire de synchronisation entre SQLite local et MySQL cloud"""
     
-    def __init__(self, mysql_config: Dict, offline_db_path: str = 'data/offline.db'):
+    def __init__(self, mysql_config: Dict, offline_db_path: str = 'data/offline.db',
+                 pool_size: int = SYNC_POOL_SIZE):
         self.mysql_config = mysql_config
         self.offline_db_path = offline_db_path
-        self.sync_interval = 30  # Secondes entre les tentatives de sync
+        self.sync_interval = SYNC_INTERVAL  # Secondes après un cycle actif
+        self.idle_max_interval = SYNC_IDLE_MAX
+        self.batch_size = SYNC_BATCH_SIZE
+        self.burst_batch_size = SYNC_BURST_BATCH_SIZE
+        self.pool_size = pool_size
         self.max_retry_attempts = 3
         self.is_online = False
         self.sync_running = False
         self.sync_thread = None
+        # Verrou fichier détenu par le processus qui fait tourner la boucle
+        self.service_owner = False
+        self._service_lock_file = None
+        self.device_id = None
+        self.mode = 'offline'  # offline, burst, active, idle
+        self.next_sync_in = self.sync_interval
         self.sync_stats = {
             'last_sync': None,
             'total_synced': 0,
             'sync_errors': 0,
-            'pending_items': 0
+            'pending_items': 0,
+            'consecutive_failures': 0,
+            'idle_cycles': 0,
+            'last_replay': None,
+            # Étapes en échec : nom -> échecs consécutifs
+            'failing_stages': {}
         }
+        # Backoff par étape : nom -> (échecs consécutifs, prochaine tentative)
+        self._stage_backoff = {}
+        
+        # (horodatage, opérations rejouées) des derniers cycles, pour le débit
+        self._throughput = deque(maxlen=120)
+        self._last_cleanup = 0.0
+        
+        # Connexion SQLite persistante en WAL et connexion MySQL du service
+        # (empruntée au pool), protégées par un verrou réentrant partagé avec
+        # la synchronisation
+        self._lock = threading.RLock()
+        self._local_conn = None
+        self._mysql_conn = None
+        # Connexion SQLite des producteurs (enqueue, statistiques) : en WAL,
+        # elle n'attend pas la fin d'un cycle de synchronisation
+        self._producer_conn = None
+        self._producer_lock = threading.Lock()
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._wake = threading.Event()
+        
+        # Envoi des médias et progression exposée par get_sync_status
+        self.media_transfer = MediaTransfer()
+        self.media_workers = MEDIA_UPLOAD_WORKERS
+        self.media_progress = {
+            'files_total': 0,
+            'files_done': 0,
+            'bytes_total': 0,
+            'bytes_done': 0,
+            'deduplicated': 0,
+            'failed': 0
+        }
+        self._media_lock = threading.Lock()
+        # Un seul envoi de médias à la fois (boucle et force_sync_now)
+        self._media_sync_lock = threading.Lock()
         
         # Queue pour les synchronisations prioritaires
         self.priority_sync_queue = queue.Queue()
@@ -46,21 +196,90 @@ class OfflineSyncManager:
         """Initialiser la base de données SQLite pour le mode offline"""
         try:
             # Créer le dossier data s'il n'existe pas
-            os.makedirs(os.path.dirname(self.offline_db_path), exist_ok=True)
+            os.makedirs(os.path.dirname(self.offline_db_path) or '.', exist_ok=True)
             
-            conn = sqlite3.connect(self.offline_db_path)
-            cursor = conn.cursor()
-            
-            # Vérifier et migrer si nécessaire
-            self._migrate_offline_database(cursor)
-            
-            conn.commit()
-            conn.close()
+            with self._lock:
+                conn = self._local()
+                cursor = conn.cursor()
+                
+                # Vérifier et migrer si nécessaire
+                self._migrate_offline_database(cursor)
+                self._init_outbox(cursor)
+                self._init_media_outbox(cursor)
+                
+                conn.commit()
             logger.info("✅ Base de données SQLite initialisée")
             
         except Exception as e:
             logger.error(f"❌ Erreur initialisation base SQLite: {e}")
     
+    def _local(self) -> sqlite3.Connection:
+        """Connexion SQLite du service (à utiliser sous self._lock)"""
+        if self._local_conn is None:
+            self._local_conn = self._open_local()
+        return self._local_conn
+    
+    def _producer(self) -> sqlite3.Connection:
+        """Connexion SQLite des producteurs (à utiliser sous self._producer_lock)"""
+        if self._producer_conn is None:
+            self._producer_conn = self._open_local()
+        return self._producer_conn
+    
+    def _open_local(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.offline_db_path, timeout=10.0, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        # WAL : les écritures de l'application (commandes vocales, API
+        # offline) ne sont pas bloquées pendant la lecture de l'outbox
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+    
+    def _get_pool(self) -> pooling.MySQLConnectionPool:
+        """Pool MySQL créé à la première connexion réussie"""
+        with self._pool_lock:
+            if self._pool is None:
+                config = dict(self.mysql_config)
+                config.setdefault('connection_timeout', 5)
+                config['autocommit'] = False
+                self._pool = pooling.MySQLConnectionPool(
+                    pool_name=f"offline_sync_{id(self):x}",
+                    pool_size=self.pool_size,
+                    pool_reset_session=False,
+                    **config
+                )
+            return self._pool
+    
+    @contextmanager
+    def connection(self):
+        """Connexion empruntée au pool (rendue à la sortie, reconnectée si nécessaire)"""
+        conn = self._get_pool().get_connection()
+        try:
+            yield conn
+        finally:
+            conn.close()
+    
+    def _mysql(self):
+        """Connexion MySQL du service de synchronisation, vérifiée par ping"""
+        with self._lock:
+            if self._mysql_conn is not None:
+                try:
+                    self._mysql_conn.ping(reconnect=True, attempts=1, delay=0)
+                    return self._mysql_conn
+                except Error:
+                    self._close_mysql()
+            self._mysql_conn = self._get_pool().get_connection()
+            return self._mysql_conn
+    
+    def _close_mysql(self):
+        """Rendre la connexion du service au pool"""
+        with self._lock:
+            conn, self._mysql_conn = self._mysql_conn, None
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+    
     def _migrate_offline_database(self, cursor):
         """Migrer la base de données SQLite si nécessaire"""
         try:
@@ -154,55 +373,218 @@ class OfflineSyncManager:
             )
         ''')
     
+    def _init_outbox(self, cursor):
+        """Outbox sync_queue (clé d'idempotence, index de lecture) et identifiant de l'appareil"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sync_queue (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                table_name TEXT NOT NULL,
+                record_id INTEGER,
+                action TEXT NOT NULL, -- insert, update, delete
+                data TEXT, -- JSON data
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                attempts INTEGER DEFAULT 0,
+                last_attempt TIMESTAMP,
+                status TEXT DEFAULT 'pending', -- pending, synced, failed
+                idempotency_key TEXT
+            )
+        ''')
+        cursor.execute("PRAGMA table_info(sync_queue)")
+        if 'idempotency_key' not in [col[1] for col in cursor.fetchall()]:
+            cursor.execute("ALTER TABLE sync_queue ADD COLUMN idempotency_key TEXT")
+            logger.info("✅ Colonne idempotency_key ajoutée à sync_queue")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_sync_queue_status ON sync_queue(status, id)")
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sync_meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            )
+        ''')
+        cursor.execute("SELECT value FROM sync_meta WHERE key = 'device_id'")
+        row = cursor.fetchone()
+        if row:
+            self.device_id = row[0]
+        else:
+            self.device_id = uuid.uuid4().hex
+            cursor.execute("INSERT INTO sync_meta (key, value) VALUES ('device_id', ?)", (self.device_id,))
+        
+        # Reprise des actions en attente de l'ancienne file critical_offline_actions
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='critical_offline_actions'")
+        if cursor.fetchone():
+            cursor.execute("SELECT id, action_data, created_at FROM critical_offline_actions WHERE synced = 0")
+            legacy = cursor.fetchall()
+            for action_id, action_data, created_at in legacy:
+                cursor.execute('''
+                    INSERT INTO sync_queue (table_name, record_id, action, data, created_at, idempotency_key)
+                    VALUES ('offline_actions', NULL, 'insert', ?, ?, ?)
+                ''', (json.dumps(self._offline_action_row(json.loads(action_data), created_at)),
+                      created_at, f"{self.device_id}:critical:{action_id}"))
+            cursor.execute("DROP TABLE critical_offline_actions")
+            if legacy:
+                logger.info(f"✅ {len(legacy)} actions critical_offline_actions reprises dans sync_queue")
+    
+    def _init_media_outbox(self, cursor):
+        """File locale des médias à envoyer (état de reprise de l'envoi multipart)"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS offline_media (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                work_order_id INTEGER NOT NULL,
+                file_path TEXT NOT NULL,
+                original_filename TEXT,
+                file_type TEXT,
+                transcription TEXT,
+                file_size INTEGER,
+                uploaded_by INTEGER,
+                content_hash TEXT,
+                upload_path TEXT, -- fichier envoyé (photo réduite ou original)
+                thumbnail_path TEXT,
+                upload_id TEXT, -- envoi multipart en cours
+                attempts INTEGER DEFAULT 0,
+                last_error TEXT,
+                sync_status TEXT DEFAULT 'pending', -- pending, synced, error
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        cursor.execute("PRAGMA table_info(offline_media)")
+        columns = [col[1] for col in cursor.fetchall()]
+        for column, column_type in (('original_filename', 'TEXT'), ('uploaded_by', 'INTEGER')):
+            if column not in columns:
+                cursor.execute(f"ALTER TABLE offline_media ADD COLUMN {column} {column_type}")
+                logger.info(f"✅ Colonne {column} ajoutée à offline_media")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_offline_media_status ON offline_media(sync_status, id)")
+
     def start_sync_service(self):
         """Démarrer le service de synchronisation en arrière-plan"""
         if not self.sync_running:
             self.sync_running = True
-            self.sync_thread = threading.Thread(target=self._sync_loop, daemon=True)
+            self._wake.clear()
+            self.sync_thread = threading.Thread(target=self._run_service, daemon=True, name="OfflineSyncThread")
             self.sync_thread.start()
             logger.info("🔄 Service de synchronisation démarré")
     
+    def _run_service(self):
+        """Boucle de synchronisation, dans le seul processus détenteur du verrou de service"""
+        if not self._acquire_service_lock():
+            return
+        try:
+            self._sync_loop()
+        finally:
+            self._release_service_lock()
+    
+    def _acquire_service_lock(self) -> bool:
+        """
+        Attendre le verrou fichier partagé par les processus qui utilisent la
+        même base locale (False si le service est arrêté entre-temps)
+        """
+        lock_file = open(f"{self.offline_db_path}.sync.lock", 'a')
+        waiting = False
+        while self.sync_running:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                if not waiting:
+                    logger.info("⏸️ Synchronisation assurée par un autre processus (relais s'il s'arrête)")
+                    waiting = True
+                self._wake.wait(SERVICE_LOCK_RETRY)
+                self._wake.clear()
+                continue
+            self._service_lock_file = lock_file
+            self.service_owner = True
+            if waiting:
+                logger.info("🔒 Verrou de synchronisation repris par ce processus")
+            return True
+        lock_file.close()
+        return False
+    
+    def _release_service_lock(self):
+        lock_file, self._service_lock_file = self._service_lock_file, None
+        self.service_owner = False
+        if lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            finally:
+                lock_file.close()
+    
     def stop_sync_service(self):
         """Arrêter le service de synchronisation"""
         self.sync_running = False
+        self._wake.set()
         if self.sync_thread:
             self.sync_thread.join(timeout=5)
+        self._close_mysql()
         logger.info("⏹️ Service de synchronisation arrêté")
     
     def _sync_loop(self):
-        """Boucle principale de synchronisation"""
+        """Boucle principale de synchronisation (intervalle adaptatif)"""
         while self.sync_running:
+            success = False
+            synced = 0
             try:
                 # Vérifier la connectivité
-                self._check_connectivity()
-                
-                if self.is_online:
+                was_offline = self.mode == 'offline'
+                if self._check_connectivity():
+                    if was_offline:
+                        # Retour de la connexion : vider l'arriéré à grands lots
+                        self.mode = 'burst'
+                        logger.info("⚡ Connexion rétablie - rejeu de l'arriéré")
+                    
                     # Traiter les synchronisations prioritaires
                     self._process_priority_sync()
                     
                     # Synchronisation complète
-                    self._perform_full_sync()
+                    before = self.sync_stats['total_synced']
+                    success = self._perform_full_sync()
+                    synced = self.sync_stats['total_synced'] - before
                     
                     # Mettre à jour les statistiques
                     self._update_sync_stats()
                 
-                # Attendre avant la prochaine synchronisation
-                time.sleep(self.sync_interval)
-                
             except Exception as e:
                 logger.error(f"Erreur dans la boucle de synchronisation: {e}")
                 self.sync_stats['sync_errors'] += 1
-                time.sleep(self.sync_interval * 2)  # Attendre plus longtemps en cas d'erreur
+            
+            self.next_sync_in = self._schedule_next(success, synced)
+            
+            # Attendre la prochaine synchronisation (réveil anticipé par une
+            # mise en file, add_priority_sync ou stop_sync_service)
+            self._wake.wait(self.next_sync_in)
+            self._wake.clear()
+    
+    def _schedule_next(self, success: bool, synced: int) -> float:
+        """Mode et délai du prochain cycle d'après le résultat de celui-ci"""
+        if not success:
+            self.sync_stats['consecutive_failures'] += 1
+            if not self.is_online:
+                self.mode = 'offline'
+            return self._backoff_delay(self.sync_stats['consecutive_failures'])
+        
+        self.sync_stats['consecutive_failures'] = 0
+        self._throughput.append((time.time(), synced))
+        if synced:
+            self.sync_stats['idle_cycles'] = 0
+            self.mode = 'active'
+            return self.sync_interval
+        
+        # Rien à transmettre : allonger l'attente (une mise en file réveille
+        # le service immédiatement)
+        self.sync_stats['idle_cycles'] += 1
+        self.mode = 'idle'
+        return min(self.idle_max_interval, self.sync_interval * 2 ** self.sync_stats['idle_cycles'])
+    
+    @staticmethod
+    def _backoff_delay(failures: int) -> float:
+        """Délai avant la tentative suivante : exponentiel avec gigue, plafonné"""
+        delay = min(SYNC_BACKOFF_MAX, SYNC_BACKOFF_BASE * (2 ** (failures - 1)))
+        return delay * (0.5 + random.random() / 2)
     
     def _check_connectivity(self) -> bool:
-        """Vérifier la connectivité réseau et base de données"""
+        """Vérifier la connectivité base de données (ping de la connexion persistante)"""
         try:
-            # Test de connexion MySQL
-            connection = mysql.connector.connect(**self.mysql_config, connection_timeout=5)
-            if connection.is_connected():
-                connection.close()
-                self.is_online = True
-                return True
+            self._mysql()
+            self.is_online = True
+            return True
         except Error as e:
             logger.debug(f"Pas de connexion MySQL: {e}")
         except Exception as e:
@@ -222,34 +604,67 @@ class OfflineSyncManager:
             except Exception as e:
                 logger.error(f"Erreur sync prioritaire: {e}")
     
-    def _perform_full_sync(self):
-        """Effectuer une synchronisation complète"""
-        try:
+    def _perform_full_sync(self, force: bool = False) -> bool:
+        """
+        Effectuer une synchronisation complète (False si la connexion MySQL
+        a été perdue)
+
+        Chaque étape prend self._lock pour elle seule ; l'envoi des médias
+        ne le prend que pour lire et écrire les bases. Une étape en échec
+        est écartée pendant son propre backoff (force : toutes les étapes
+        sont tentées) et n'allonge pas l'attente du cycle suivant.
+        """
+        stages = [
             # 1. Synchroniser les bons de travail
-            self._sync_work_orders()
-            
+            self._sync_work_orders,
             # 2. Synchroniser les commandes vocales
-            self._sync_voice_commands()
-            
-            # 3. Synchroniser les fichiers média
-            self._sync_media_files()
-            
-            # 4. Synchroniser la queue générale
-            self._sync_queue_items()
-            
+            self._sync_voice_commands,
+            # 3. Synchroniser les fichiers média (verrouillage propre)
+            self._sync_media_files,
+            # 4. Rejouer l'outbox
+            self._sync_queue_items,
             # 5. Nettoyer les éléments synchronisés anciens
-            self._cleanup_synced_items()
-            
+            self._cleanup_synced_items
+        ]
+        for stage in stages:
+            name = stage.__name__
+            failures, retry_at = self._stage_backoff.get(name, (0, 0.0))
+            if not force and time.time() < retry_at:
+                continue
+            try:
+                if stage == self._sync_media_files:
+                    stage()
+                else:
+                    with self._lock:
+                        stage()
+                self._stage_backoff.pop(name, None)
+                self.sync_stats['failing_stages'].pop(name, None)
+            except (mysql.connector.OperationalError, mysql.connector.InterfaceError) as e:
+                # Connexion perdue : inutile de poursuivre, reprise avec backoff
+                logger.warning(f"Connexion MySQL perdue pendant la synchronisation: {e}")
+                self.is_online = False
+                self._close_mysql()
+                self.sync_stats['sync_errors'] += 1
+                return False
+            except sqlite3.OperationalError as e:
+                # Table locale absente ou d'un autre schéma : une reprise n'y changerait rien
+                logger.warning(f"Étape {name} ignorée: {e}")
+            except Exception as e:
+                # Étape en échec : backoff propre, les suivantes continuent
+                failures += 1
+                delay = self._backoff_delay(failures)
+                self._stage_backoff[name] = (failures, time.time() + delay)
+                self.sync_stats['failing_stages'][name] = failures
+                self.sync_stats['sync_errors'] += 1
+                logger.error(f"Erreur synchronisation ({name}), nouvel essai dans {delay:.0f}s: {e}")
+        
+        if not self.sync_stats['failing_stages']:
             logger.info("✅ Synchronisation complète terminée")
-            
-        except Exception as e:
-            logger.error(f"Erreur synchronisation complète: {e}")
-            self.sync_stats['sync_errors'] += 1
+        return True
     
     def _sync_work_orders(self):
         """Synchroniser les bons de travail offline vers MySQL"""
-        offline_conn = sqlite3.connect(self.offline_db_path)
-        offline_conn.row_factory = sqlite3.Row
+        offline_conn = self._local()
         offline_cursor = offline_conn.cursor()
         
         # Récupérer les work orders à synchroniser
@@ -262,8 +677,10 @@ class OfflineSyncManager:
         work_orders = offline_cursor.fetchall()
         
         if work_orders:
-            mysql_conn = mysql.connector.connect(**self.mysql_config)
+            mysql_conn = self._mysql()
             mysql_cursor = mysql_conn.cursor()
+            synced = []
+            errors = []
             
             for wo in work_orders:
                 try:
@@ -279,35 +696,28 @@ class OfflineSyncManager:
                         wo['updated_at'],
                         wo['original_id']
                     ))
-                    
-                    # Marquer comme synchronisé
-                    offline_cursor.execute('''
-                        UPDATE offline_work_orders 
-                        SET sync_status = 'synced' 
-                        WHERE id = ?
-                    ''', (wo['id'],))
-                    
-                    self.sync_stats['total_synced'] += 1
+                    synced.append((wo['id'],))
                     logger.debug(f"Work order {wo['original_id']} synchronisé")
                     
+                except (mysql.connector.OperationalError, mysql.connector.InterfaceError):
+                    raise
                 except Error as e:
                     logger.error(f"Erreur sync work order {wo['original_id']}: {e}")
-                    offline_cursor.execute('''
-                        UPDATE offline_work_orders 
-                        SET sync_status = 'error' 
-                        WHERE id = ?
-                    ''', (wo['id'],))
+                    errors.append((wo['id'],))
             
             mysql_conn.commit()
-            mysql_conn.close()
+            mysql_cursor.close()
+            
+            # Marquer après le commit MySQL
+            offline_cursor.executemany("UPDATE offline_work_orders SET sync_status = 'synced' WHERE id = ?", synced)
+            offline_cursor.executemany("UPDATE offline_work_orders SET sync_status = 'error' WHERE id = ?", errors)
+            self.sync_stats['total_synced'] += len(synced)
         
         offline_conn.commit()
-        offline_conn.close()
     
     def _sync_voice_commands(self):
         """Synchroniser les commandes vocales vers MySQL"""
-        offline_conn = sqlite3.connect(self.offline_db_path)
-        offline_conn.row_factory = sqlite3.Row
+        offline_conn = self._local()
         offline_cursor = offline_conn.cursor()
         
         # Récupérer les commandes vocales à synchroniser
@@ -320,8 +730,10 @@ class OfflineSyncManager:
         voice_commands = offline_cursor.fetchall()
         
         if voice_commands:
-            mysql_conn = mysql.connector.connect(**self.mysql_config)
+            mysql_conn = self._mysql()
             mysql_cursor = mysql_conn.cursor()
+            synced = []
+            errors = []
             
             for cmd in voice_commands:
                 try:
@@ -361,274 +773,619 @@ class OfflineSyncManager:
                         cmd['confidence_score'],
                         cmd['created_at']
                     ))
-                    
-                    # Marquer comme synchronisé
-                    offline_cursor.execute('''
-                        UPDATE offline_voice_commands 
-                        SET sync_status = 'synced' 
-                        WHERE id = ?
-                    ''', (cmd['id'],))
-                    
-                    self.sync_stats['total_synced'] += 1
+                    synced.append((cmd['id'],))
                     logger.debug(f"Commande vocale {cmd['id']} synchronisée")
                     
+                except (mysql.connector.OperationalError, mysql.connector.InterfaceError):
+                    raise
                 except Error as e:
                     logger.error(f"Erreur sync commande vocale {cmd['id']}: {e}")
-                    offline_cursor.execute('''
-                        UPDATE offline_voice_commands 
-                        SET sync_status = 'error' 
-                        WHERE id = ?
-                    ''', (cmd['id'],))
+                    errors.append((cmd['id'],))
             
             mysql_conn.commit()
-            mysql_conn.close()
+            mysql_cursor.close()
+            
+            # Marquer après le commit MySQL
+            offline_cursor.executemany("UPDATE offline_voice_commands SET sync_status = 'synced' WHERE id = ?", synced)
+            offline_cursor.executemany("UPDATE offline_voice_commands SET sync_status = 'error' WHERE id = ?", errors)
+            self.sync_stats['total_synced'] += len(synced)
         
         offline_conn.commit()
-        offline_conn.close()
     
     def _sync_media_files(self):
-        """Synchroniser les fichiers média (photos, audio) vers le cloud"""
-        offline_conn = sqlite3.connect(self.offline_db_path)
-        offline_conn.row_factory = sqlite3.Row
-        offline_cursor = offline_conn.cursor()
-        
-        # Récupérer les fichiers média à synchroniser
-        offline_cursor.execute('''
-            SELECT * FROM offline_media 
-            WHERE sync_status = 'pending'
-            ORDER BY created_at ASC
-        ''')
+        """
+        Envoyer les médias en attente vers le stockage objet (envois parallèles,
+        débit partagé) puis les enregistrer dans work_order_media
+
+        Les envois se font hors de self._lock : les autres étapes et les
+        lectures de statut ne les attendent pas.
+        """
+        if not self._media_sync_lock.acquire(blocking=False):
+            # Envoi déjà en cours (force_sync_now pendant un cycle)
+            return
+        try:
+            with self._lock:
+                media_files = self._local().execute('''
+                    SELECT * FROM offline_media 
+                    WHERE sync_status = 'pending' AND attempts < ?
+                    ORDER BY id ASC
+                ''', (self.max_retry_attempts,)).fetchall()
+            if not media_files:
+                return
+            
+            results = self._transfer_media_files(media_files)
+            with self._lock:
+                self._record_media_results(media_files, results)
+        finally:
+            self._media_sync_lock.release()
+    
+    def _transfer_media_files(self, media_files: List[sqlite3.Row]) -> List[Dict]:
+        """Envois parallèles d'un lot de médias (progression remise à zéro)"""
+        with self._media_lock:
+            self.media_progress.update({
+                'files_total': len(media_files),
+                'files_done': 0,
+                'bytes_total': sum(media['file_size'] or 0 for media in media_files),
+                'bytes_done': 0,
+                'deduplicated': 0,
+                'failed': 0
+            })
         
-        media_files = offline_cursor.fetchall()
+        with ThreadPoolExecutor(max_workers=self.media_workers, thread_name_prefix='MediaUpload') as executor:
+            return list(executor.map(self._transfer_media, media_files))
+    
+    def _record_media_results(self, media_files: List[sqlite3.Row], results: List[Dict]):
+        """Enregistrer les médias envoyés dans work_order_media (sous self._lock)"""
+        offline_conn = self._local()
+        uploaded = [(media, result) for media, result in zip(media_files, results) if 'error' not in result]
+        failed = [(media, result) for media, result in zip(media_files, results) if 'error' in result]
         
-        for media in media_files:
+        if uploaded:
+            # Idempotent : un média déjà enregistré (même empreinte pour le
+            # bon de travail) n'est pas dupliqué
+            mysql_conn = self._mysql()
+            mysql_cursor = mysql_conn.cursor()
             try:
-                # Upload du fichier (simulation - implémenter upload S3/cloud)
-                uploaded_url = self._upload_media_file(media['file_path'])
-                
-                if uploaded_url:
-                    # Enregistrer l'URL dans MySQL
-                    mysql_conn = mysql.connector.connect(**self.mysql_config)
-                    mysql_cursor = mysql_conn.cursor()
-                    
-                    mysql_cursor.execute('''
-                        INSERT INTO work_order_media 
-                        (work_order_id, file_url, file_type, transcription, uploaded_at)
-                        VALUES (%s, %s, %s, %s, %s)
-                    ''', (
-                        media['work_order_id'],
-                        uploaded_url,
-                        media['file_type'],
-                        media['transcription'],
-                        media['created_at']
-                    ))
-                    
-                    mysql_conn.commit()
-                    mysql_conn.close()
-                    
-                    # Marquer comme synchronisé
-                    offline_cursor.execute('''
-                        UPDATE offline_media 
-                        SET sync_status = 'synced' 
-                        WHERE id = ?
-                    ''', (media['id'],))
-                    
-                    self.sync_stats['total_synced'] += 1
-                    logger.debug(f"Fichier média {media['id']} synchronisé")
-                
-            except Exception as e:
-                logger.error(f"Erreur sync média {media['id']}: {e}")
-                offline_cursor.execute('''
-                    UPDATE offline_media 
-                    SET sync_status = 'error' 
-                    WHERE id = ?
-                ''', (media['id'],))
+                mysql_cursor.executemany('''
+                    INSERT IGNORE INTO work_order_media 
+                    (work_order_id, filename, original_filename, file_path, file_type, file_size,
+                     uploaded_by, content_hash, thumbnail_url, transcription, created_at)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                ''', [(
+                    media['work_order_id'],
+                    result['key'],
+                    media['original_filename'] or os.path.basename(media['file_path']),
+                    self.media_transfer.object_url(result['key']),
+                    media['file_type'],
+                    result['size'],
+                    media['uploaded_by'],
+                    result['content_hash'],
+                    self.media_transfer.object_url(result['thumbnail_key']) if result['thumbnail_key'] else None,
+                    media['transcription'],
+                    media['created_at']
+                ) for media, result in uploaded])
+                mysql_conn.commit()
+            except (mysql.connector.OperationalError, mysql.connector.InterfaceError):
+                raise
+            except Error as e:
+                # Rejet MySQL (schéma, contrainte) : tentative comptée comme un échec
+                # d'envoi, le média passe en erreur après max_retry_attempts
+                self._rollback(mysql_conn)
+                failed.extend((media, {'error': f"Enregistrement work_order_media: {e}"})
+                              for media, _ in uploaded)
+                uploaded = []
+            finally:
+                mysql_cursor.close()
+        
+        if uploaded:
+            offline_conn.executemany('''
+                UPDATE offline_media 
+                SET sync_status = 'synced', upload_id = NULL, updated_at = CURRENT_TIMESTAMP 
+                WHERE id = ?
+            ''', [(media['id'],) for media, _ in uploaded])
+            self.sync_stats['total_synced'] += len(uploaded)
+            for media, result in uploaded:
+                self._remove_media_work_files(media, result)
         
+        for media, result in failed:
+            logger.error(f"Erreur sync média {media['id']}: {result['error']}")
+        offline_conn.executemany('''
+            UPDATE offline_media 
+            SET attempts = attempts + 1, last_error = ?, updated_at = CURRENT_TIMESTAMP,
+                sync_status = CASE WHEN attempts + 1 >= ? THEN 'error' ELSE 'pending' END 
+            WHERE id = ?
+        ''', [(result['error'], self.max_retry_attempts, media['id']) for media, result in failed])
         offline_conn.commit()
-        offline_conn.close()
+        
+        if uploaded:
+            deduplicated = sum(1 for _, result in uploaded if result['deduplicated'])
+            logger.info(f"📸 {len(uploaded)} médias synchronisés ({deduplicated} déjà présents)")
     
-    def _sync_queue_items(self):
-        """Synchroniser les éléments de la queue générale"""
-        offline_conn = sqlite3.connect(self.offline_db_path)
-        offline_conn.row_factory = sqlite3.Row
-        offline_cursor = offline_conn.cursor()
+    def _transfer_media(self, media: sqlite3.Row) -> Dict:
+        """
+        Préparer et envoyer un média (thread d'envoi) : empreinte du fichier
+        source, réduction et vignette pour les photos, envoi multipart repris
+        là où la tentative précédente s'est arrêtée
+        """
+        try:
+            file_path = media['file_path']
+            size = os.path.getsize(file_path)
+            content_hash = media['content_hash'] or file_sha256(file_path)
+            key = f"media/{content_hash[:2]}/{content_hash}"
+            thumbnail_key = f"thumbnails/{content_hash[:2]}/{content_hash}.jpg"
+            self._add_media_bytes(size - (media['file_size'] or 0), 0)
+            
+            if self.media_transfer.exists(key):
+                if media['upload_id']:
+                    self.media_transfer.abort(key, media['upload_id'])
+                self._add_media_bytes(0, size, files_done=1, deduplicated=1)
+                return {'key': key, 'content_hash': content_hash, 'size': size, 'deduplicated': True,
+                        'thumbnail_key': thumbnail_key if self.media_transfer.exists(thumbnail_key) else None}
+            
+            upload_path, thumbnail_path = media['upload_path'], media['thumbnail_path']
+            if not upload_path or not os.path.exists(upload_path):
+                upload_path, thumbnail_path = file_path, None
+                if is_image(file_path, media['file_type']):
+                    upload_path, thumbnail_path = prepare_image(file_path, MEDIA_WORK_DIR, content_hash)
+                self._save_media_state(media['id'], content_hash=content_hash, upload_path=upload_path,
+                                       thumbnail_path=thumbnail_path)
+            
+            if thumbnail_path and os.path.exists(thumbnail_path):
+                self.media_transfer.upload(thumbnail_path, thumbnail_key)
+            else:
+                thumbnail_key = None
+            
+            # Progression en octets du fichier source (la photo réduite est plus petite)
+            upload_size = os.path.getsize(upload_path)
+            result = self.media_transfer.upload(
+                upload_path, key,
+                upload_id=media['upload_id'],
+                on_upload_id=lambda upload_id: self._save_media_state(media['id'], upload_id=upload_id),
+                on_progress=lambda done: self._add_media_bytes(0, done * size // max(upload_size, 1))
+            )
+            self._add_media_bytes(0, 0, files_done=1, deduplicated=int(result['deduplicated']))
+            result.update({'content_hash': content_hash, 'size': upload_size, 'thumbnail_key': thumbnail_key,
+                           'upload_path': upload_path, 'thumbnail_path': thumbnail_path})
+            return result
+        except Exception as e:
+            self._add_media_bytes(0, 0, failed=1)
+            return {'error': str(e)}
+    
+    def _save_media_state(self, media_id: int, **fields):
+        """Persister l'état de reprise d'un média (appelé depuis les threads d'envoi)"""
+        with self._producer_lock:
+            local = self._producer()
+            local.execute(f'''
+                UPDATE offline_media SET {', '.join(f'{name} = ?' for name in fields)}, 
+                updated_at = CURRENT_TIMESTAMP WHERE id = ?
+            ''', list(fields.values()) + [media_id])
+            local.commit()
+    
+    def _add_media_bytes(self, total: int, done: int, files_done: int = 0, deduplicated: int = 0,
+                         failed: int = 0):
+        with self._media_lock:
+            progress = self.media_progress
+            progress['bytes_total'] += total
+            progress['bytes_done'] += done
+            progress['files_done'] += files_done
+            progress['deduplicated'] += deduplicated
+            progress['failed'] += failed
+    
+    @staticmethod
+    def _remove_media_work_files(media: sqlite3.Row, result: Dict):
+        """Supprimer les fichiers dérivés envoyés (jamais le fichier d'origine)"""
+        for path in (result.get('upload_path'), result.get('thumbnail_path'),
+                     media['upload_path'], media['thumbnail_path']):
+            if path and path != media['file_path'] and os.path.exists(path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+    
+    def _sync_queue_items(self) -> int:
+        """
+        Rejouer l'outbox sync_queue jusqu'à la vider, par lots de batch_size
+        opérations (une transaction MySQL par lot). Renvoie le nombre
+        d'opérations appliquées.
+        """
+        started = time.perf_counter()
+        applied = 0
+        processed = 0
+        last_id = 0
+        batch_size = self.burst_batch_size if self.mode == 'burst' else self.batch_size
         
-        # Récupérer les éléments de la queue à synchroniser
-        offline_cursor.execute('''
-            SELECT * FROM sync_queue 
-            WHERE status = 'pending' AND attempts < ?
-            ORDER BY created_at ASC
-            LIMIT 50
-        ''', (self.max_retry_attempts,))
+        while True:
+            # Lecture par clé (id > dernier lu) : une opération en échec reste
+            # 'pending' mais n'est retentée qu'au cycle suivant
+            rows = self._local().execute('''
+                SELECT id, table_name, record_id, action, data, attempts, idempotency_key
+                FROM sync_queue 
+                WHERE status = 'pending' AND attempts < ? AND id > ?
+                ORDER BY id
+                LIMIT ?
+            ''', (self.max_retry_attempts, last_id, batch_size)).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1]['id']
+            processed += len(rows)
+            applied += self._replay_batch(rows)
         
-        queue_items = offline_cursor.fetchall()
+        if processed:
+            elapsed = time.perf_counter() - started
+            self.sync_stats['last_replay'] = {
+                'operations': processed,
+                'applied': applied,
+                'duration_ms': round(elapsed * 1000, 1),
+                'ops_per_second': round(processed / elapsed) if elapsed > 0 else None
+            }
+            logger.info(f"📤 Outbox rejouée: {applied}/{processed} opérations en {elapsed:.2f}s")
+        return applied
+    
+    def _replay_batch(self, rows: List[sqlite3.Row]) -> int:
+        """Appliquer un lot de l'outbox dans une transaction MySQL, puis le marquer localement"""
+        operations = []
+        invalid = []
+        for row in rows:
+            try:
+                operations.append(self._parse_operation(row))
+            except (ValueError, TypeError) as e:
+                invalid.append((row['id'], str(e)))
+        if invalid:
+            # Opérations inexploitables : inutile de les retenter
+            for item_id, reason in invalid:
+                logger.error(f"Opération d'outbox {item_id} invalide: {reason}")
+            self._record_failures([item_id for item_id, _ in invalid], permanent=True)
+        if not operations:
+            return 0
         
-        if queue_items:
-            mysql_conn = mysql.connector.connect(**self.mysql_config)
-            mysql_cursor = mysql_conn.cursor()
+        conn = self._mysql()
+        try:
+            applied = self._apply_operations(conn, operations)
+            conn.commit()
+        except (mysql.connector.OperationalError, mysql.connector.InterfaceError):
+            self._rollback(conn)
+            raise
+        except Error as e:
+            self._rollback(conn)
+            if len(operations) == 1:
+                logger.error(f"Erreur sync queue item {operations[0][0]['id']}: {e}")
+                self._record_failures([operations[0][0]['id']])
+                return 0
+            # Isoler l'opération fautive par dichotomie (ordre conservé)
+            logger.warning(f"Lot de {len(operations)} opérations rejeté ({e}), rejeu en deux moitiés")
+            middle = len(operations) // 2
+            return (self._replay_batch([operation[0] for operation in operations[:middle]])
+                    + self._replay_batch([operation[0] for operation in operations[middle:]]))
+        
+        local = self._local()
+        local.executemany('''
+            UPDATE sync_queue 
+            SET status = 'synced', last_attempt = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', [(operation[0]['id'],) for operation in operations])
+        local.commit()
+        self.sync_stats['total_synced'] += applied
+        return applied
+    
+    def _parse_operation(self, row: sqlite3.Row) -> Tuple[sqlite3.Row, str, Dict]:
+        """(ligne, clé d'idempotence, données) d'une opération validée"""
+        table_name, action = row['table_name'], row['action']
+        data = json.loads(row['data']) if row['data'] else {}
+        if not isinstance(data, dict):
+            raise ValueError("données JSON attendues sous forme d'objet")
+        if not _IDENTIFIER_RE.match(table_name or ''):
+            raise ValueError(f"nom de table invalide: {table_name!r}")
+        bad_columns = [column for column in data if not _IDENTIFIER_RE.match(column)]
+        if bad_columns:
+            raise ValueError(f"colonnes invalides: {bad_columns}")
+        if action == 'insert':
+            if not data:
+                raise ValueError("insertion sans données")
+        elif action in ('update', 'delete'):
+            if row['record_id'] is None:
+                raise ValueError(f"{action} sans record_id")
+            if action == 'update' and not data:
+                raise ValueError("mise à jour sans données")
+        else:
+            raise ValueError(f"action inconnue: {action!r}")
+        key = row['idempotency_key'] or f"{self.device_id}:{row['id']}"
+        return row, key, data
+    
+    def _apply_operations(self, conn, operations: List[Tuple[sqlite3.Row, str, Dict]]) -> int:
+        """
+        Réserver les clés des opérations puis exécuter celles qui n'étaient pas
+        encore appliquées (sans commit). Les opérations consécutives de même
+        table, action et colonnes sont regroupées en une seule requête.
+        """
+        cursor = conn.cursor()
+        try:
+            fresh = self._claim_operations(cursor, operations)
+            if len(fresh) < len(operations):
+                logger.info(f"♻️ {len(operations) - len(fresh)} opérations déjà appliquées ignorées")
             
-            for item in queue_items:
-                try:
-                    data = json.loads(item['data'])
-                    
-                    if item['action'] == 'insert':
-                        self._execute_insert(mysql_cursor, item['table_name'], data)
-                    elif item['action'] == 'update':
-                        self._execute_update(mysql_cursor, item['table_name'], item['record_id'], data)
-                    elif item['action'] == 'delete':
-                        self._execute_delete(mysql_cursor, item['table_name'], item['record_id'])
-                    
-                    # Marquer comme synchronisé
-                    offline_cursor.execute('''
-                        UPDATE sync_queue 
-                        SET status = 'synced', last_attempt = CURRENT_TIMESTAMP
-                        WHERE id = ?
-                    ''', (item['id'],))
-                    
-                    self.sync_stats['total_synced'] += 1
-                    
-                except Exception as e:
-                    logger.error(f"Erreur sync queue item {item['id']}: {e}")
-                    
-                    # Incrémenter les tentatives
-                    offline_cursor.execute('''
-                        UPDATE sync_queue 
-                        SET attempts = attempts + 1, last_attempt = CURRENT_TIMESTAMP,
-                            status = CASE 
-                                WHEN attempts + 1 >= ? THEN 'failed' 
-                                ELSE 'pending' 
-                            END
-                        WHERE id = ?
-                    ''', (self.max_retry_attempts, item['id']))
+            def group_key(operation):
+                row, _key, data = operation
+                columns = tuple(sorted(data)) if row['action'] != 'delete' else ()
+                return row['table_name'], row['action'], columns
             
-            mysql_conn.commit()
-            mysql_conn.close()
-        
-        offline_conn.commit()
-        offline_conn.close()
-    
-    def _execute_insert(self, cursor, table_name: str, data: Dict):
-        """Exécuter une insertion dans MySQL"""
-        columns = ', '.join(data.keys())
-        placeholders = ', '.join(['%s'] * len(data))
-        values = list(data.values())
-        
-        query = f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders})"
-        cursor.execute(query, values)
-    
-    def _execute_update(self, cursor, table_name: str, record_id: int, data: Dict):
-        """Exécuter une mise à jour dans MySQL"""
-        set_clause = ', '.join([f"{key} = %s" for key in data.keys()])
-        values = list(data.values()) + [record_id]
-        
-        query = f"UPDATE {table_name} SET {set_clause} WHERE id = %s"
-        cursor.execute(query, values)
-    
-    def _execute_delete(self, cursor, table_name: str, record_id: int):
-        """Exécuter une suppression dans MySQL"""
-        query = f"DELETE FROM {table_name} WHERE id = %s"
-        cursor.execute(query, (record_id,))
-    
-    def _upload_media_file(self, file_path: str) -> Optional[str]:
-        """Upload d'un fichier média vers le cloud (simulation)"""
-        # En production, implémenter upload vers S3, Google Cloud, etc.
-        import os
-        import hashlib
-        
-        if os.path.exists(file_path):
-            # Simuler l'upload
-            file_hash = hashlib.md5(file_path.encode()).hexdigest()
-            simulated_url = f"https://chronotech-media.cloud/{file_hash}/{os.path.basename(file_path)}"
+            for (table_name, action, columns), group in groupby(fresh, key=group_key):
+                group = list(group)
+                if action == 'insert':
+                    self._execute_inserts(cursor, table_name, columns, group)
+                elif action == 'update':
+                    self._execute_updates(cursor, table_name, columns, group)
+                else:
+                    self._execute_deletes(cursor, table_name, group)
             
-            # Simulation d'upload réussi
-            time.sleep(0.1)  # Simuler le temps d'upload
-            return simulated_url
+            return len(fresh)
+        finally:
+            cursor.close()
+    
+    def _claim_operations(self, cursor, operations: List[Tuple[sqlite3.Row, str, Dict]]) -> List:
+        """
+        Insérer les clés d'idempotence dans la transaction du lot, avant les
+        opérations : une clé déjà enregistrée, ou réservée par un autre
+        processus (l'INSERT attend alors le verrou de sa ligne jusqu'au commit
+        ou rollback de l'autre transaction), écarte l'opération. Un seul
+        INSERT multi-lignes si toutes les clés sont nouvelles, sinon une
+        réservation par clé pour savoir lesquelles sont à appliquer.
+        """
+        unique = {}
+        for operation in operations:
+            unique.setdefault(operation[1], operation)
+        # Clés triées : deux processus verrouillent les lignes dans le même ordre
+        params = [(key, self.device_id) for key in sorted(unique)]
+        query = "INSERT IGNORE INTO sync_applied_ops (idempotency_key, device_id) VALUES (%s, %s)"
+        
+        cursor.execute("SAVEPOINT claim_ops")
+        cursor.executemany(query, params)
+        if cursor.rowcount == len(params):
+            return list(unique.values())
+        
+        cursor.execute("ROLLBACK TO SAVEPOINT claim_ops")
+        claimed = set()
+        for param in params:
+            cursor.execute(query, param)
+            if cursor.rowcount == 1:
+                claimed.add(param[0])
+        return [operation for key, operation in unique.items() if key in claimed]
+    
+    def _execute_inserts(self, cursor, table_name: str, columns: Tuple[str, ...], group: List):
+        """INSERT multi-lignes ; upsert si les lignes portent leur id"""
+        row_placeholder = f"({_placeholders(len(columns))})"
+        query = (f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES "
+                 + ', '.join([row_placeholder] * len(group)))
+        if 'id' in columns:
+            updates = ', '.join(f"{column} = VALUES({column})" for column in columns if column != 'id')
+            if updates:
+                query += f" ON DUPLICATE KEY UPDATE {updates}"
+        params = [_db_value(data[column]) for _, _, data in group for column in columns]
+        cursor.execute(query, params)
+    
+    def _execute_updates(self, cursor, table_name: str, columns: Tuple[str, ...], group: List):
+        """Un seul UPDATE ... CASE id pour le groupe (dernière valeur par enregistrement)"""
+        latest = {}
+        for row, _key, data in group:
+            latest.pop(row['record_id'], None)
+            latest[row['record_id']] = data
+        if len(latest) == 1:
+            record_id, data = next(iter(latest.items()))
+            set_clause = ', '.join(f"{column} = %s" for column in columns)
+            cursor.execute(f"UPDATE {table_name} SET {set_clause} WHERE id = %s",
+                           [_db_value(data[column]) for column in columns] + [record_id])
+            return
         
-        return None
+        set_clauses = []
+        params = []
+        for column in columns:
+            set_clauses.append(f"{column} = CASE id " + ' '.join(['WHEN %s THEN %s'] * len(latest)) + " END")
+            for record_id, data in latest.items():
+                params.extend((record_id, _db_value(data[column])))
+        params.extend(latest)
+        cursor.execute(
+            f"UPDATE {table_name} SET {', '.join(set_clauses)} WHERE id IN ({_placeholders(len(latest))})",
+            params
+        )
+    
+    def _execute_deletes(self, cursor, table_name: str, group: List):
+        """Un seul DELETE ... WHERE id IN pour le groupe"""
+        record_ids = list(dict.fromkeys(row['record_id'] for row, _, _ in group))
+        cursor.execute(f"DELETE FROM {table_name} WHERE id IN ({_placeholders(len(record_ids))})", record_ids)
+    
+    def _record_failures(self, item_ids: List[int], permanent: bool = False):
+        """Incrémenter les tentatives ('failed' au maximum, ou immédiatement si permanent)"""
+        local = self._local()
+        if permanent:
+            local.executemany('''
+                UPDATE sync_queue 
+                SET attempts = ?, last_attempt = CURRENT_TIMESTAMP, status = 'failed'
+                WHERE id = ?
+            ''', [(self.max_retry_attempts, item_id) for item_id in item_ids])
+        else:
+            local.executemany('''
+                UPDATE sync_queue 
+                SET attempts = attempts + 1, last_attempt = CURRENT_TIMESTAMP,
+                    status = CASE 
+                        WHEN attempts + 1 >= ? THEN 'failed' 
+                        ELSE 'pending' 
+                    END
+                WHERE id = ?
+            ''', [(self.max_retry_attempts, item_id) for item_id in item_ids])
+        local.commit()
+        self.sync_stats['sync_errors'] += len(item_ids)
+    
+    @staticmethod
+    def _rollback(conn):
+        try:
+            conn.rollback()
+        except Error:
+            pass
     
     def _cleanup_synced_items(self):
-        """Nettoyer les éléments synchronisés anciens"""
-        offline_conn = sqlite3.connect(self.offline_db_path)
+        """Nettoyer les éléments synchronisés anciens (au plus une fois par CLEANUP_INTERVAL)"""
+        if time.time() - self._last_cleanup < CLEANUP_INTERVAL:
+            return
+        self._last_cleanup = time.time()
+        offline_conn = self._local()
         offline_cursor = offline_conn.cursor()
         
         # Supprimer les éléments synchronisés vieux de plus de 7 jours
-        cutoff_date = (datetime.now() - timedelta(days=7)).isoformat()
+        cutoff_date = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d %H:%M:%S')
         
         tables_to_clean = [
             'offline_work_orders',
             'offline_voice_commands', 
-            'offline_media',
-            'sync_queue'
+            'offline_media'
         ]
         
         for table in tables_to_clean:
-            offline_cursor.execute(f'''
-                DELETE FROM {table} 
-                WHERE sync_status = 'synced' AND updated_at < ?
-            ''', (cutoff_date,))
+            try:
+                offline_cursor.execute(f'''
+                    DELETE FROM {table} 
+                    WHERE sync_status = 'synced' AND created_at < ?
+                ''', (cutoff_date,))
+            except sqlite3.OperationalError:
+                pass
+        
+        # L'outbox utilise la colonne status
+        offline_cursor.execute('''
+            DELETE FROM sync_queue 
+            WHERE status = 'synced' AND last_attempt < ?
+        ''', (cutoff_date,))
         
         offline_conn.commit()
-        offline_conn.close()
+        
+        # Clés d'idempotence de cet appareil devenues inutiles
+        mysql_conn = self._mysql()
+        mysql_cursor = mysql_conn.cursor()
+        mysql_cursor.execute('''
+            DELETE FROM sync_applied_ops 
+            WHERE device_id = %s AND applied_at < NOW() - INTERVAL %s DAY
+        ''', (self.device_id, APPLIED_OPS_RETENTION_DAYS))
+        mysql_conn.commit()
+        mysql_cursor.close()
         
         logger.debug("🧹 Nettoyage des éléments synchronisés anciens")
     
     def _update_sync_stats(self):
         """Mettre à jour les statistiques de synchronisation"""
         try:
-            offline_conn = sqlite3.connect(self.offline_db_path, timeout=10.0)
-            offline_cursor = offline_conn.cursor()
-        
-            # Compter les éléments en attente avec gestion d'erreurs
-            pending_count = 0
-            try:
-                offline_cursor.execute('SELECT COUNT(*) FROM offline_work_orders WHERE sync_status = "pending"')
-                pending_count += offline_cursor.fetchone()[0]
-            except sqlite3.OperationalError:
-                pass
-                
-            try:
-                offline_cursor.execute('SELECT COUNT(*) FROM offline_voice_commands WHERE sync_status = "pending"')
-                pending_count += offline_cursor.fetchone()[0]
-            except sqlite3.OperationalError:
-                pass
-                
-            try:
-                offline_cursor.execute('SELECT COUNT(*) FROM offline_media WHERE sync_status = "pending"')
-                pending_count += offline_cursor.fetchone()[0]
-            except sqlite3.OperationalError:
-                pass
-                
-            try:
-                offline_cursor.execute('SELECT COUNT(*) FROM sync_queue WHERE status = "pending"')
-                pending_count += offline_cursor.fetchone()[0]
-            except sqlite3.OperationalError:
-                pass
+            with self._lock:
+                offline_cursor = self._local().cursor()
+            
+                # Compter les éléments en attente avec gestion d'erreurs
+                pending_count = 0
+                for query in (
+                    "SELECT COUNT(*) FROM offline_work_orders WHERE sync_status = 'pending'",
+                    "SELECT COUNT(*) FROM offline_voice_commands WHERE sync_status = 'pending'",
+                    "SELECT COUNT(*) FROM offline_media WHERE sync_status = 'pending'",
+                    "SELECT COUNT(*) FROM sync_queue WHERE status = 'pending'"
+                ):
+                    try:
+                        offline_cursor.execute(query)
+                        pending_count += offline_cursor.fetchone()[0]
+                    except sqlite3.OperationalError:
+                        pass
                 
             self.sync_stats['pending_items'] = pending_count
             self.sync_stats['last_sync'] = datetime.now().isoformat()
             
-            offline_conn.close()
-            
         except Exception as e:
             logger.error(f"Erreur mise à jour stats sync: {e}")
     
     def add_priority_sync(self, sync_item: Dict):
-        """Ajouter un élément à la synchronisation prioritaire"""
+        """Ajouter un élément à la synchronisation prioritaire (réveille la boucle)"""
         self.priority_sync_queue.put(sync_item)
+        self._wake.set()
+    
+    def enqueue(self, table_name: str, action: str, data: Dict, record_id: Optional[int] = None,
+                idempotency_key: Optional[str] = None) -> int:
+        """Écrire une opération dans l'outbox et réveiller le service ; renvoie son id"""
+        with self._producer_lock:
+            local = self._producer()
+            cursor = local.execute('''
+                INSERT INTO sync_queue (table_name, record_id, action, data, created_at, idempotency_key)
+                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP, ?)
+            ''', (table_name, record_id, action, json.dumps(data, default=str), idempotency_key))
+            local.commit()
+        self.wake()
+        return cursor.lastrowid
+    
+    def add_media_file(self, work_order_id: int, file_path: str, file_type: Optional[str] = None,
+                       transcription: Optional[str] = None, original_filename: Optional[str] = None,
+                       uploaded_by: Optional[int] = None) -> int:
+        """Mettre un média (photo, vidéo, audio) en file d'envoi et réveiller le service ; renvoie son id"""
+        with self._producer_lock:
+            local = self._producer()
+            cursor = local.execute('''
+                INSERT INTO offline_media (work_order_id, file_path, original_filename, file_type,
+                                           transcription, file_size, uploaded_by)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (work_order_id, file_path, original_filename, file_type, transcription,
+                  os.path.getsize(file_path), uploaded_by))
+            local.commit()
+        self.wake()
+        return cursor.lastrowid
+    
+    def wake(self):
+        """Déclencher un cycle sans attendre la fin de l'intervalle"""
+        self._wake.set()
+    
+    def add_offline_action(self, action_data: Dict) -> bool:
+        """
+        Journaliser une action terrain dans offline_actions : écriture directe
+        (connexion du pool) si MySQL répond, sinon via l'outbox
+        """
+        row = self._offline_action_row(action_data, datetime.now())
+        if self.is_online:
+            try:
+                with self.connection() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute(f'''
+                        INSERT INTO offline_actions ({', '.join(row)})
+                        VALUES ({_placeholders(len(row))})
+                    ''', list(row.values()))
+                    conn.commit()
+                    cursor.close()
+                return True
+            except Error as e:
+                logger.warning(f"⚠️ MySQL indisponible, action mise en file: {e}")
+                self.is_online = False
+        
+        try:
+            self.enqueue('offline_actions', 'insert', row)
+            return True
+        except Exception as e:
+            logger.error(f"❌ Impossible d'enregistrer action offline: {e}")
+            return False
+    
+    @staticmethod
+    def _offline_action_row(action_data: Dict, timestamp) -> Dict:
+        """Ligne offline_actions d'une action terrain"""
+        return {
+            'action_type': action_data.get('type', 'unknown'),
+            'table_name': action_data.get('table', 'work_orders'),
+            'record_data': json.dumps(action_data, default=str),
+            'technician_id': action_data.get('technician_id'),
+            'device_id': action_data.get('device_id'),
+            'offline_timestamp': str(action_data.get('timestamp') or timestamp)
+        }
     
     def force_sync_now(self) -> Dict:
         """Forcer une synchronisation immédiate"""
-        if not self.is_online:
+        if not self.is_online and not self._check_connectivity():
             return {
                 'success': False,
                 'message': 'Pas de connexion réseau disponible'
             }
         
         try:
-            self._perform_full_sync()
+            success = self._perform_full_sync(force=True) and not self.sync_stats['failing_stages']
+            self._update_sync_stats()
             return {
-                'success': True,
-                'message': 'Synchronisation forcée terminée',
+                'success': success,
+                'message': 'Synchronisation forcée terminée' if success
+                           else 'Synchronisation forcée terminée avec des erreurs',
                 'stats': self.sync_stats
             }
         except Exception as e:
@@ -642,8 +1399,51 @@ class OfflineSyncManager:
         return {
             'is_online': self.is_online,
             'sync_running': self.sync_running,
+            'service_owner': self.service_owner,
+            'mode': self.mode,
+            'device_id': self.device_id,
             'stats': self.sync_stats,
-            'next_sync_in': self.sync_interval if self.sync_running else None
+            'media': self.get_media_progress(),
+            'next_sync_in': round(self.next_sync_in, 1) if self.sync_running else None
+        }
+    
+    def get_media_progress(self) -> Dict:
+        """Progression de l'envoi des médias du cycle en cours (ou du dernier)"""
+        with self._media_lock:
+            progress = dict(self.media_progress)
+        progress['percent'] = (round(100 * progress['bytes_done'] / progress['bytes_total'], 1)
+                               if progress['bytes_total'] else 100.0)
+        return progress
+    
+    def get_queue_stats(self) -> Dict:
+        """Profondeur de l'outbox par statut, retard du plus ancien élément en attente et débit"""
+        with self._producer_lock:
+            local = self._producer()
+            depth = {row['status']: row['total'] for row in local.execute(
+                "SELECT status, COUNT(*) AS total FROM sync_queue GROUP BY status"
+            )}
+            oldest = local.execute('''
+                SELECT CAST(strftime('%s', 'now') - strftime('%s', MIN(created_at)) AS INTEGER) AS lag
+                FROM sync_queue WHERE status = 'pending'
+            ''').fetchone()['lag']
+        
+        window = [entry for entry in self._throughput if entry[0] >= time.time() - 300]
+        elapsed = time.time() - window[0][0] if len(window) > 1 else None
+        return {
+            'queue_depth': {
+                'pending': depth.get('pending', 0),
+                'failed': depth.get('failed', 0),
+                'synced': depth.get('synced', 0)
+            },
+            'lag_seconds': oldest or 0,
+            'throughput': {
+                'ops_per_minute_5m': round(sum(ops for _, ops in window[1:]) / elapsed * 60, 1) if elapsed else 0,
+                'last_replay': self.sync_stats['last_replay']
+            },
+            'mode': self.mode,
+            'is_online': self.is_online,
+            'next_sync_in': round(self.next_sync_in, 1) if self.sync_running else None,
+            'pool_size': self.pool_size
         }
     
     def _sync_single_item(self, sync_item: Dict):
@@ -676,11 +1476,19 @@ def create_mysql_tables(mysql_config: Dict):
         CREATE TABLE IF NOT EXISTS work_order_media (
             id INT AUTO_INCREMENT PRIMARY KEY,
             work_order_id INT NOT NULL,
-            file_url VARCHAR(500) NOT NULL,
-            file_type VARCHAR(50),
+            filename VARCHAR(255) NOT NULL,
+            original_filename VARCHAR(255) NOT NULL,
+            file_path VARCHAR(500) NOT NULL,
+            file_type VARCHAR(100),
+            file_size INT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            uploaded_by INT,
+            content_hash CHAR(64),
+            thumbnail_url VARCHAR(500),
             transcription TEXT,
-            uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            INDEX idx_work_order (work_order_id)
+            INDEX idx_work_order_id (work_order_id),
+            INDEX idx_created_at (created_at),
+            UNIQUE KEY uq_work_order_media_hash (work_order_id, content_hash)
         ) ENGINE=InnoDB
     ''')
     
@@ -701,6 +1509,12 @@ def create_mysql_tables(mysql_config: Dict):
         ) ENGINE=InnoDB
     ''')
     
+    # Clés d'idempotence des opérations d'outbox déjà appliquées
+    cursor.execute(APPLIED_OPS_DDL)
+    
+    # Journal des actions terrain
+    cursor.execute(OFFLINE_ACTIONS_DDL)
+    
     connection.commit()
     connection.close()
     
@@ -710,12 +1524,29 @@ def create_mysql_tables(mysql_config: Dict):
 # Instance globale du gestionnaire de synchronisation
 sync_manager = None
 
-def init_sync_manager(mysql_config: Dict, offline_db_path: str = 'data/offline.db'):
-    """Initialiser le gestionnaire de synchronisation"""
+def init_sync_manager(mysql_config: Dict, offline_db_path: str = 'data/offline.db',
+                      start: bool = True) -> OfflineSyncManager:
+    """Initialiser (une seule fois) et démarrer le service de synchronisation"""
     global sync_manager
-    sync_manager = OfflineSyncManager(mysql_config, offline_db_path)
+    if sync_manager is not None:
+        return sync_manager
     
-    # Créer les tables MySQL nécessaires
-    create_mysql_tables(mysql_config)
+    # Créer les tables MySQL nécessaires (MySQL peut être indisponible au démarrage)
+    try:
+        create_mysql_tables(mysql_config)
+    except Error as e:
+        logger.warning(f"⚠️ Tables MySQL de synchronisation non vérifiées: {e}")
     
+    sync_manager = OfflineSyncManager(mysql_config, offline_db_path)
+    if start:
+        sync_manager.start_sync_service()
     return sync_manager
+
+def get_sync_manager() -> Optional[OfflineSyncManager]:
+    """Service de synchronisation du processus (None si non initialisé)"""
+    return sync_manager
+
+def wake_sync_service():
+    """Signaler une écriture dans sync_queue faite hors du service (réveil immédiat)"""
+    if sync_manager is not None:
+        sync_manager.wake()
@@ -6,6 +6,9 @@ Maintenance prévisionnelle, heatmap des interventions, eco-scoring
 from datetime import datetime, timedelta, date
 from typing import Dict, List, Optional, Tuple
 import json
+import os
+import threading
+import time
 import uuid
 from core.database import get_db_connection
 from core.config import Config
@@ -154,45 +157,36 @@ class PredictiveMaintenanceEngine:
 class InterventionHeatmapManager:
     """Gestionnaire de heatmap des interventions géographiques"""
     
+    # Précision de la grille des tuiles (4 décimales ≈ 11 m)
+    GRID_PRECISION = 4
+    PERIOD_DAYS = {'last_30_days': 30, 'last_90_days': 90}
+    PERIODS = ('all',) + tuple(PERIOD_DAYS)
+    
+    TILES_TABLE = 'intervention_heatmap_tiles'
+    # Verrous MySQL nommés (GET_LOCK) partagés par les workers : un seul
+    # planificateur de rafraîchissement, une seule reconstruction complète
+    SCHEDULER_LOCK = 'heatmap_tiles_scheduler'
+    REBUILD_LOCK = 'heatmap_tiles_rebuild'
+    
     def __init__(self):
         self.default_radius = 5.0  # km
         self.colors = ['#00ff00', '#ffff00', '#ff8000', '#ff0000', '#800080']
+        # Rafraîchissement des tuiles (secondes) et reconstruction complète (suppressions)
+        self.refresh_interval = int(os.environ.get('HEATMAP_REFRESH_INTERVAL', '300'))
+        self.full_rebuild_interval = int(os.environ.get('HEATMAP_FULL_REBUILD_INTERVAL', '86400'))
+        self._refresh_thread = None
+        self._refresh_lock = threading.Lock()
+        self._tiles_refreshed_at = None
     
     def generate_heatmap_data(self, date_filter: Optional[str] = None) -> Dict:
         """Génère les données pour la heatmap Google Maps"""
+        self._ensure_refresh_thread()
         try:
             conn = get_db_connection()
-            cursor = conn.cursor(dictionary=True)
-            
-            # Récupérer toutes les interventions avec coordonnées
-            date_condition = ""
-            params = []
-            
-            if date_filter:
-                if date_filter == 'last_30_days':
-                    date_condition = "AND wo.created_at >= DATE_SUB(NOW(), INTERVAL 30 DAY)"
-                elif date_filter == 'last_90_days':
-                    date_condition = "AND wo.created_at >= DATE_SUB(NOW(), INTERVAL 90 DAY)"
-            
-            cursor.execute(f"""
-                SELECT 
-                    wo.latitude,
-                    wo.longitude,
-                    COUNT(*) as intervention_count,
-                    AVG(wo.total_cost) as avg_cost,
-                    AVG(TIMESTAMPDIFF(HOUR, wo.created_at, wo.completed_at)) as avg_duration_hours,
-                    wo.status,
-                    c.name as customer_name
-                FROM work_orders wo
-                LEFT JOIN customers c ON wo.customer_id = c.id
-                WHERE wo.latitude IS NOT NULL 
-                AND wo.longitude IS NOT NULL
-                {date_condition}
-                GROUP BY wo.latitude, wo.longitude
-                ORDER BY intervention_count DESC
-            """, params)
+            cursor = conn.cursor()
             
-            interventions = cursor.fetchall()
+            # Agrégation des tuiles journalières sur la fenêtre demandée
+            interventions = self._rollup_tiles(cursor, date_filter)
             
             # Créer des zones automatiquement
             zones = self._create_dynamic_zones(interventions, cursor)
@@ -202,12 +196,12 @@ class InterventionHeatmapManager:
             for intervention in interventions:
                 intensity = min(intervention['intervention_count'] / 10.0, 1.0)
                 heatmap_points.append({
-                    'lat': float(intervention['latitude']),
-                    'lng': float(intervention['longitude']),
+                    'lat': intervention['latitude'],
+                    'lng': intervention['longitude'],
                     'weight': intensity,
                     'count': intervention['intervention_count'],
-                    'avg_cost': float(intervention.get('avg_cost') or 0),
-                    'customer': intervention.get('customer_name', 'N/A')
+                    'avg_cost': intervention['avg_cost'],
+                    'customer': intervention.get('customer_name') or 'N/A'
                 })
             
             return {
@@ -224,6 +218,304 @@ class InterventionHeatmapManager:
             if 'conn' in locals():
                 conn.close()
     
+    def generate_compact_heatmap(self, date_filter: Optional[str] = None) -> Dict:
+        """Génère la heatmap sous forme de tableaux parallèles (lat/lng/weight/count)"""
+        self._ensure_refresh_thread()
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            
+            cells = self._rollup_tiles(cursor, date_filter, with_customers=False)
+            
+            return {
+                'lat': [c['latitude'] for c in cells],
+                'lng': [c['longitude'] for c in cells],
+                'weight': [round(min(c['intervention_count'] / 10.0, 1.0), 2) for c in cells],
+                'count': [c['intervention_count'] for c in cells],
+                'precision': self.GRID_PRECISION,
+                'generated_at': datetime.now().isoformat()
+            }
+            
+        except Exception as e:
+            logger.error(f"Erreur génération heatmap compacte: {e}")
+            return {'error': str(e)}
+        finally:
+            if 'conn' in locals():
+                conn.close()
+    
+    def refresh_work_order_tiles(self, work_order_id: int) -> bool:
+        """Recalcule la tuile journalière du jour de création d'un work order
+        
+        Appelé par les routes de bons de travail après leur commit, dans une
+        transaction propre : un échec laisse les tuiles intactes, rattrapées
+        par le rafraîchissement périodique (refresh_touched_tiles).
+        """
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute(
+                "SELECT DATE(created_at) AS bucket_date FROM work_orders WHERE id = %s",
+                (work_order_id,)
+            )
+            row = cursor.fetchone()
+            if not row or not row['bucket_date']:
+                return False
+            
+            self._rebuild_buckets(cursor, row['bucket_date'], row['bucket_date'])
+            conn.commit()
+            return True
+            
+        except Exception as e:
+            logger.warning(f"Mise à jour tuile heatmap impossible (WO {work_order_id}): {e}")
+            if 'conn' in locals():
+                conn.rollback()
+            return False
+        finally:
+            if 'conn' in locals():
+                conn.close()
+    
+    def refresh_touched_tiles(self) -> bool:
+        """Recalcule les jours de création des work orders modifiés depuis le dernier rafraîchissement
+        
+        Couvre toutes les écritures (API, kanban, mobile, SQL) via
+        updated_at / completed_at ; les suppressions sont rattrapées par la
+        reconstruction complète périodique.
+        """
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            
+            started_at = datetime.now()
+            since = self._tiles_refreshed_at
+            if since is None:
+                cursor.execute("SELECT MAX(updated_at) AS refreshed_at FROM intervention_heatmap_tiles")
+                row = cursor.fetchone()
+                since = row['refreshed_at'] if row and row['refreshed_at'] else started_at - timedelta(days=1)
+            # Marge pour les transactions validées pendant le dernier rafraîchissement
+            since -= timedelta(seconds=self.refresh_interval)
+            
+            cursor.execute("""
+                SELECT DISTINCT DATE(created_at) AS bucket_date
+                FROM work_orders
+                WHERE updated_at >= %s OR completed_at >= %s OR created_at >= %s
+            """, (since, since, since))
+            for day in sorted(row['bucket_date'] for row in cursor.fetchall() if row['bucket_date']):
+                self._rebuild_buckets(cursor, day, day)
+            conn.commit()
+            self._tiles_refreshed_at = started_at
+            return True
+            
+        except Exception as e:
+            logger.error(f"Erreur rafraîchissement tuiles heatmap: {e}")
+            if 'conn' in locals():
+                conn.rollback()
+            return False
+        finally:
+            if 'conn' in locals():
+                conn.close()
+    
+    def rebuild_tiles(self, since: Optional[date] = None) -> bool:
+        """Reconstruit les tuiles journalières (toutes, ou à partir d'une date)
+        
+        Reconstruction complète : une seule à la fois entre les workers
+        (GET_LOCK), construite dans une table de travail puis échangée par
+        RENAME TABLE atomique ; les lectures voient l'ancienne table entière
+        jusqu'à l'échange, jamais une table vide ou partielle.
+        """
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            
+            if since is not None:
+                self._rebuild_buckets(cursor, since, None)
+                conn.commit()
+                return True
+            
+            if not self._get_lock(cursor, self.REBUILD_LOCK):
+                logger.info("Reconstruction des tuiles heatmap déjà en cours dans un autre processus")
+                return False
+            try:
+                started_at = datetime.now()
+                self._swap_rebuild(cursor)
+                # Les écritures pendant la reconstruction sont reprises par le
+                # prochain rafraîchissement incrémental
+                self._tiles_refreshed_at = started_at
+                return True
+            finally:
+                cursor.execute("DO RELEASE_LOCK(%s)", (self.REBUILD_LOCK,))
+            
+        except Exception as e:
+            logger.error(f"Erreur reconstruction tuiles heatmap: {e}")
+            if 'conn' in locals():
+                conn.rollback()
+            return False
+        finally:
+            if 'conn' in locals():
+                conn.close()
+    
+    def _swap_rebuild(self, cursor):
+        """Remplit une copie de la table des tuiles puis l'échange avec l'originale"""
+        table = self.TILES_TABLE
+        cursor.execute(f"DROP TABLE IF EXISTS {table}_new, {table}_old")
+        cursor.execute(f"CREATE TABLE {table}_new LIKE {table}")
+        self._insert_buckets(cursor, f"{table}_new", [], [])
+        cursor.execute(f"RENAME TABLE {table} TO {table}_old, {table}_new TO {table}")
+        cursor.execute(f"DROP TABLE {table}_old")
+    
+    @staticmethod
+    def _get_lock(cursor, name: str, timeout: int = 0) -> bool:
+        """Verrou MySQL nommé (GET_LOCK) sur la session du curseur"""
+        cursor.execute("SELECT GET_LOCK(%s, %s) AS acquired", (name, timeout))
+        row = cursor.fetchone()
+        return bool(row and row['acquired'])
+    
+    def _ensure_refresh_thread(self):
+        """Démarre au premier affichage le rafraîchissement périodique des tuiles"""
+        if self._refresh_thread is None:
+            with self._refresh_lock:
+                if self._refresh_thread is None:
+                    self._refresh_thread = threading.Thread(
+                        target=self._refresh_loop, daemon=True, name="HeatmapTilesRefresh"
+                    )
+                    self._refresh_thread.start()
+    
+    def _refresh_loop(self):
+        """
+        Planificateur des rafraîchissements : chaque worker en démarre un,
+        seul celui qui détient SCHEDULER_LOCK (connexion dédiée) travaille,
+        les autres reprennent le verrou si sa connexion tombe
+        """
+        while True:
+            time.sleep(self.refresh_interval)
+            lock_conn = None
+            try:
+                lock_conn = get_db_connection()
+                lock_cursor = lock_conn.cursor()
+                if not self._get_lock(lock_cursor, self.SCHEDULER_LOCK):
+                    continue
+                logger.info("🗺️ Planificateur des tuiles heatmap actif dans ce processus")
+                self._run_scheduler(lock_cursor)
+            except Exception as e:
+                logger.warning(f"Planificateur des tuiles heatmap interrompu: {e}")
+            finally:
+                if lock_conn is not None:
+                    try:
+                        lock_conn.close()
+                    except Exception:
+                        pass
+    
+    def _run_scheduler(self, lock_cursor):
+        """Rafraîchissements tant que la session détient toujours SCHEDULER_LOCK"""
+        last_full_rebuild = time.monotonic()
+        while True:
+            if time.monotonic() - last_full_rebuild >= self.full_rebuild_interval:
+                if self.rebuild_tiles():
+                    last_full_rebuild = time.monotonic()
+            else:
+                self.refresh_touched_tiles()
+            time.sleep(self.refresh_interval)
+            # Verrou perdu (connexion coupée) : un autre worker a pu le prendre
+            lock_cursor.execute("SELECT IS_USED_LOCK(%s) = CONNECTION_ID() AS held", (self.SCHEDULER_LOCK,))
+            row = lock_cursor.fetchone()
+            if not row or not row['held']:
+                return
+    
+    def _rebuild_buckets(self, cursor, start: Optional[date], end: Optional[date]):
+        """Remplace les tuiles des jours [start, end] par un agrégat de work_orders"""
+        tile_conditions = []
+        wo_conditions = []
+        params = []
+        
+        if start:
+            tile_conditions.append("bucket_date >= %s")
+            wo_conditions.append("AND wo.created_at >= %s")
+            params.append(start)
+        if end:
+            tile_conditions.append("bucket_date <= %s")
+            wo_conditions.append("AND wo.created_at < %s + INTERVAL 1 DAY")
+            params.append(end)
+        
+        where_tiles = f"WHERE {' AND '.join(tile_conditions)}" if tile_conditions else ""
+        cursor.execute(f"DELETE FROM {self.TILES_TABLE} {where_tiles}", params)
+        self._insert_buckets(cursor, self.TILES_TABLE, wo_conditions, params)
+    
+    def _insert_buckets(self, cursor, table: str, wo_conditions: List[str], params: List):
+        """Agrège les work_orders par jour et cellule dans la table de tuiles donnée"""
+        precision = self.GRID_PRECISION
+        cursor.execute(f"""
+            INSERT INTO {table} (
+                bucket_date, cell_lat, cell_lng, intervention_count,
+                cost_sum, cost_count, duration_hours_sum, duration_count,
+                last_customer_id
+            )
+            SELECT 
+                DATE(wo.created_at),
+                ROUND(wo.latitude, {precision}),
+                ROUND(wo.longitude, {precision}),
+                COUNT(*),
+                COALESCE(SUM(wo.total_cost), 0),
+                COUNT(wo.total_cost),
+                COALESCE(SUM(TIMESTAMPDIFF(HOUR, wo.created_at, wo.completed_at)), 0),
+                COUNT(wo.completed_at),
+                MAX(wo.customer_id)
+            FROM work_orders wo
+            WHERE wo.latitude IS NOT NULL 
+            AND wo.longitude IS NOT NULL
+            {' '.join(wo_conditions)}
+            GROUP BY DATE(wo.created_at), ROUND(wo.latitude, {precision}), ROUND(wo.longitude, {precision})
+        """, params)
+    
+    def _rollup_tiles(self, cursor, date_filter: Optional[str], with_customers: bool = True) -> List[Dict]:
+        """Agrège les tuiles journalières par cellule sur la période demandée"""
+        date_condition = ""
+        params = []
+        
+        days = self.PERIOD_DAYS.get(date_filter)
+        if days:
+            date_condition = "WHERE t.bucket_date >= CURDATE() - INTERVAL %s DAY"
+            params.append(days)
+        
+        cursor.execute(f"""
+            SELECT 
+                t.cell_lat as latitude,
+                t.cell_lng as longitude,
+                SUM(t.intervention_count) as intervention_count,
+                SUM(t.cost_sum) / NULLIF(SUM(t.cost_count), 0) as avg_cost,
+                SUM(t.duration_hours_sum) / NULLIF(SUM(t.duration_count), 0) as avg_duration_hours,
+                MAX(t.last_customer_id) as customer_id
+            FROM intervention_heatmap_tiles t
+            {date_condition}
+            GROUP BY t.cell_lat, t.cell_lng
+            ORDER BY intervention_count DESC
+        """, params)
+        
+        cells = []
+        for row in cursor.fetchall():
+            cells.append({
+                'latitude': float(row['latitude']),
+                'longitude': float(row['longitude']),
+                'intervention_count': int(row['intervention_count'] or 0),
+                'avg_cost': float(row['avg_cost'] or 0),
+                'avg_duration_hours': float(row['avg_duration_hours'] or 0),
+                'customer_id': row['customer_id']
+            })
+        
+        if with_customers:
+            customer_ids = sorted({c['customer_id'] for c in cells if c['customer_id']})
+            names = {}
+            if customer_ids:
+                placeholders = ', '.join(['%s'] * len(customer_ids))
+                cursor.execute(
+                    f"SELECT id, name FROM customers WHERE id IN ({placeholders})",
+                    customer_ids
+                )
+                names = {r['id']: r['name'] for r in cursor.fetchall()}
+            for cell in cells:
+                cell['customer_name'] = names.get(cell['customer_id'])
+        
+        return cells
+    
     def _create_dynamic_zones(self, interventions: List[Dict], cursor) -> List[Dict]:
         """Crée des zones d'intervention dynamiques"""
         zones = []
@@ -0,0 +1,171 @@
+"""
+Limitation de débit de l'API publique par token (api_tokens.rate_limit_per_hour)
+Utilisé par require_api_auth (routes/api/public_simple.py, public_documented.py)
+
+Seau à jetons par (token, classe d'appel) : capacité = limite horaire,
+rechargé en continu (limite / 3600 jetons par seconde). Les lectures et les
+écritures ont chacune leur seau : une intégration qui écrit en boucle ne
+prive pas ses propres lectures, et inversement.
+
+Stockage en mémoire du processus par défaut ; RATE_LIMIT_REDIS_URL partage
+les seaux entre processus (module redis optionnel, script Lua atomique).
+"""
+import logging
+import math
+import os
+import threading
+import time
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_REDIS_URL = os.environ.get('RATE_LIMIT_REDIS_URL')
+DEFAULT_RATE_LIMIT = 1000  # appels par heure si le token n'en précise pas
+
+READ_METHODS = frozenset(('GET', 'HEAD', 'OPTIONS'))
+
+
+class RateLimitResult(NamedTuple):
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_after: float  # secondes avant que le seau soit de nouveau plein
+    retry_after: float  # secondes avant le prochain jeton (0 si autorisé)
+
+    def headers(self) -> Dict[str, str]:
+        """En-têtes X-RateLimit-* (et Retry-After en cas de refus)"""
+        headers = {
+            'X-RateLimit-Limit': str(self.limit),
+            'X-RateLimit-Remaining': str(self.remaining),
+            'X-RateLimit-Reset': str(math.ceil(self.reset_after))
+        }
+        if not self.allowed:
+            headers['Retry-After'] = str(max(1, math.ceil(self.retry_after)))
+        return headers
+
+
+def request_class(method: str) -> str:
+    return 'read' if method.upper() in READ_METHODS else 'write'
+
+
+class MemoryBackend:
+    """Seaux en mémoire du processus ; horloge injectable (tests, benchmark)"""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic, max_buckets: int = 100000):
+        self.clock = clock
+        self.max_buckets = max_buckets
+        self._buckets: Dict[Tuple, list] = {}  # clé -> [jetons, dernier calcul]
+        self._lock = threading.Lock()
+
+    def take(self, key: Tuple, capacity: int, refill_per_second: float) -> Tuple[bool, float]:
+        """Prendre un jeton ; renvoie (accordé, jetons restants)"""
+        now = self.clock()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.max_buckets:
+                    self._evict_full(now)
+                bucket = self._buckets[key] = [float(capacity), now]
+            else:
+                bucket[0] = min(float(capacity), bucket[0] + (now - bucket[1]) * refill_per_second)
+                bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return True, bucket[0]
+            return False, bucket[0]
+
+    def _evict_full(self, now: float):
+        """Oublier les seaux inactifs depuis plus d'une heure (pleins de toute façon)"""
+        self._buckets = {key: bucket for key, bucket in self._buckets.items() if now - bucket[1] < 3600}
+
+    def reset(self, key: Optional[Tuple] = None):
+        with self._lock:
+            if key is None:
+                self._buckets.clear()
+            else:
+                self._buckets.pop(key, None)
+
+
+class RedisBackend:
+    """Seaux partagés entre processus (un hash Redis par seau, mis à jour par script Lua)"""
+
+    SCRIPT = """
+        local capacity = tonumber(ARGV[1])
+        local rate = tonumber(ARGV[2])
+        local t = redis.call('TIME')
+        local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+        local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+        local tokens = tonumber(state[1]) or capacity
+        local ts = tonumber(state[2]) or now
+        tokens = math.min(capacity, tokens + (now - ts) * rate)
+        local allowed = 0
+        if tokens >= 1 then
+            tokens = tokens - 1
+            allowed = 1
+        end
+        redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+        redis.call('EXPIRE', KEYS[1], 3600)
+        return {allowed, tostring(tokens)}
+    """
+
+    def __init__(self, url: str, prefix: str = 'ratelimit:'):
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._take = self.client.register_script(self.SCRIPT)
+
+    def take(self, key: Tuple, capacity: int, refill_per_second: float) -> Tuple[bool, float]:
+        allowed, tokens = self._take(keys=[self.prefix + ':'.join(map(str, key))],
+                                     args=[capacity, refill_per_second])
+        return bool(allowed), float(tokens)
+
+    def reset(self, key: Optional[Tuple] = None):
+        if key is not None:
+            self.client.delete(self.prefix + ':'.join(map(str, key)))
+
+
+class RateLimiter:
+    """Limiteur par token et classe d'appel (lecture / écriture)"""
+
+    def __init__(self, backend=None):
+        self.backend = backend or MemoryBackend()
+
+    def hit(self, token_id: int, limit_per_hour: Optional[int], method: str = 'GET') -> RateLimitResult:
+        limit = int(limit_per_hour or DEFAULT_RATE_LIMIT)
+        if limit <= 0:
+            # Limite nulle ou négative : token sans limitation
+            return RateLimitResult(True, limit, limit, 0.0, 0.0)
+        refill = limit / 3600.0
+        try:
+            allowed, tokens = self.backend.take((token_id, request_class(method)), limit, refill)
+        except Exception as e:
+            # Stockage partagé injoignable : ne pas bloquer les partenaires
+            logger.warning(f"⚠️ Limitation de débit indisponible: {e}")
+            return RateLimitResult(True, limit, limit, 0.0, 0.0)
+        return RateLimitResult(
+            allowed=allowed,
+            limit=limit,
+            remaining=int(tokens),
+            reset_after=(limit - tokens) / refill,
+            retry_after=0.0 if allowed else (1 - tokens) / refill
+        )
+
+
+def _default_backend():
+    if RATE_LIMIT_REDIS_URL:
+        if REDIS_AVAILABLE:
+            try:
+                return RedisBackend(RATE_LIMIT_REDIS_URL)
+            except Exception as e:
+                logger.warning(f"⚠️ Redis indisponible pour la limitation de débit: {e}")
+        else:
+            logger.warning("⚠️ RATE_LIMIT_REDIS_URL défini mais module redis absent : limitation par processus")
+    return MemoryBackend()
+
+
+rate_limiter = RateLimiter(_default_backend())
@@ -0,0 +1,200 @@
+"""
+Recherche plein texte - bons de travail et clients
+Index FULLTEXT MySQL (collation utf8mb4_unicode_ci : insensible à la casse et
+aux accents), résultats classés par pertinence et paginés
+"""
+
+import re
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional
+
+from core.database import db_manager
+
+logger = logging.getLogger(__name__)
+
+# innodb_ft_min_token_size par défaut : les mots plus courts ne sont pas indexés
+FULLTEXT_MIN_TOKEN = 3
+MAX_QUERY_WORDS = 8
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+WORK_ORDER_MATCH = "MATCH(claim_number, customer_name, description) AGAINST (%s IN BOOLEAN MODE)"
+CUSTOMER_MATCH = "MATCH(name, company, email) AGAINST (%s IN BOOLEAN MODE)"
+
+
+def build_boolean_query(search_term: str) -> str:
+    """
+    Expression BOOLEAN MODE pour un terme saisi : chaque mot est requis et
+    recherché en préfixe ("frein pla" -> "+frein* +pla*"). Les opérateurs
+    saisis par l'utilisateur sont ignorés. Chaîne vide si aucun mot n'est
+    assez long pour l'index.
+    """
+    words = [w for w in _WORD_RE.findall(search_term or '') if len(w) >= FULLTEXT_MIN_TOKEN]
+    return ' '.join(f"+{word}*" for word in words[:MAX_QUERY_WORDS])
+
+
+def escape_like(value: str) -> str:
+    """Échapper les jokers LIKE d'une saisie utilisateur"""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def is_missing_fulltext_index(error: Exception) -> bool:
+    """Erreur 1191 : index FULLTEXT absent (migration non appliquée)"""
+    return bool(getattr(error, 'args', None)) and error.args[0] == 1191
+
+
+class SearchService:
+    """Recherche classée des bons de travail et des clients, avec saisie semi-automatique"""
+
+    def __init__(self, max_limit: int = 100, typeahead_ttl: int = 30, typeahead_cache_size: int = 512):
+        self.max_limit = max_limit
+        self.typeahead_ttl = typeahead_ttl  # secondes
+        self.typeahead_cache_size = typeahead_cache_size
+        self.fulltext_available = True
+        self._typeahead_cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def search_work_orders(self, search_term: str, limit: int = 20, offset: int = 0) -> Dict[str, Any]:
+        """
+        Bons de travail correspondant au terme, du plus pertinent au moins
+        pertinent : {'results', 'has_more', 'mode'}
+        """
+        limit, offset = self._bounds(limit, offset)
+        boolean_query = build_boolean_query(search_term)
+
+        if boolean_query and self.fulltext_available:
+            query = f"""
+                SELECT m.id, m.claim_number, m.status, m.priority, m.created_at, m.score,
+                       COALESCE(c.name, m.customer_name) AS customer_name,
+                       u.name AS technician_name
+                FROM (
+                    SELECT id, claim_number, status, priority, created_at, customer_id,
+                           customer_name, assigned_technician_id,
+                           {WORK_ORDER_MATCH} AS score
+                    FROM work_orders
+                    WHERE {WORK_ORDER_MATCH}
+                    ORDER BY score DESC, created_at DESC
+                    LIMIT %s OFFSET %s
+                ) m
+                LEFT JOIN customers c ON c.id = m.customer_id
+                LEFT JOIN users u ON u.id = m.assigned_technician_id
+                ORDER BY m.score DESC, m.created_at DESC
+            """
+            rows = self._run_fulltext(query, (boolean_query, boolean_query, limit + 1, offset))
+            if rows is not None:
+                return self._page(rows, limit, 'fulltext')
+
+        # Mots trop courts pour l'index : préfixe du numéro de réclamation (index B-tree)
+        pattern = self._like_pattern(search_term, prefix_only=bool(self.fulltext_available))
+        query = """
+            SELECT wo.id, wo.claim_number, wo.status, wo.priority, wo.created_at, NULL AS score,
+                   COALESCE(c.name, wo.customer_name) AS customer_name,
+                   u.name AS technician_name
+            FROM work_orders wo
+            LEFT JOIN customers c ON wo.customer_id = c.id
+            LEFT JOIN users u ON wo.assigned_technician_id = u.id
+            WHERE wo.claim_number LIKE %s OR wo.customer_name LIKE %s
+            ORDER BY wo.created_at DESC
+            LIMIT %s OFFSET %s
+        """
+        rows = db_manager.execute_query(query, (pattern, pattern, limit + 1, offset)) or []
+        return self._page(rows, limit, 'like')
+
+    def search_customers(self, search_term: str, limit: int = 20, offset: int = 0) -> Dict[str, Any]:
+        """Clients actifs correspondant au terme, classés par pertinence"""
+        limit, offset = self._bounds(limit, offset)
+        boolean_query = build_boolean_query(search_term)
+
+        if boolean_query and self.fulltext_available:
+            query = f"""
+                SELECT id, name, company, email, phone,
+                       {CUSTOMER_MATCH} AS score
+                FROM customers
+                WHERE is_active = TRUE AND {CUSTOMER_MATCH}
+                ORDER BY score DESC, name
+                LIMIT %s OFFSET %s
+            """
+            rows = self._run_fulltext(query, (boolean_query, boolean_query, limit + 1, offset))
+            if rows is not None:
+                return self._page(rows, limit, 'fulltext')
+
+        pattern = self._like_pattern(search_term, prefix_only=bool(self.fulltext_available))
+        query = """
+            SELECT id, name, company, email, phone, NULL AS score
+            FROM customers
+            WHERE is_active = TRUE AND (name LIKE %s OR company LIKE %s OR email LIKE %s)
+            ORDER BY name
+            LIMIT %s OFFSET %s
+        """
+        rows = db_manager.execute_query(query, (pattern, pattern, pattern, limit + 1, offset)) or []
+        return self._page(rows, limit, 'like')
+
+    def typeahead(self, search_term: str, k: int = 8) -> Dict[str, Any]:
+        """
+        Saisie semi-automatique : k meilleurs bons de travail et clients
+
+        Les frappes successives d'un même terme sont servies par un petit
+        cache LRU de typeahead_ttl secondes.
+        """
+        term = ' '.join((search_term or '').split()).lower()
+        k = max(1, min(int(k), 20))
+        if len(term) < 2:
+            return {'query': term, 'work_orders': [], 'customers': []}
+
+        cache_key = (term, k)
+        now = time.time()
+        with self._cache_lock:
+            cached = self._typeahead_cache.get(cache_key)
+            if cached and now - cached[0] < self.typeahead_ttl:
+                self._typeahead_cache.move_to_end(cache_key)
+                return cached[1]
+
+        result = {
+            'query': term,
+            'work_orders': self.search_work_orders(term, limit=k)['results'],
+            'customers': self.search_customers(term, limit=k)['results']
+        }
+
+        with self._cache_lock:
+            self._typeahead_cache[cache_key] = (now, result)
+            self._typeahead_cache.move_to_end(cache_key)
+            while len(self._typeahead_cache) > self.typeahead_cache_size:
+                self._typeahead_cache.popitem(last=False)
+        return result
+
+    def clear_cache(self):
+        """Vider le cache de saisie semi-automatique"""
+        with self._cache_lock:
+            self._typeahead_cache.clear()
+
+    def _run_fulltext(self, query: str, params: tuple) -> Optional[List[Dict]]:
+        """Exécuter une requête MATCH ; None si l'index FULLTEXT manque"""
+        try:
+            return db_manager.execute_query(query, params) or []
+        except Exception as e:
+            if not is_missing_fulltext_index(e):
+                raise
+            logger.warning("Index FULLTEXT absent (migrations/sprint7_fulltext_search.sql) - recherche LIKE")
+            self.fulltext_available = False
+            return None
+
+    def _like_pattern(self, search_term: str, prefix_only: bool) -> str:
+        term = escape_like((search_term or '').strip())
+        return f"{term}%" if prefix_only else f"%{term}%"
+
+    def _bounds(self, limit: int, offset: int):
+        return max(1, min(int(limit), self.max_limit)), max(0, int(offset))
+
+    def _page(self, rows: List[Dict], limit: int, mode: str) -> Dict[str, Any]:
+        results = list(rows[:limit])
+        for row in results:
+            if row.get('score') is not None:
+                row['score'] = round(float(row['score']), 4)
+        return {'results': results, 'has_more': len(rows) > limit, 'mode': mode}
+
+
+# Instance globale du service de recherche
+search_service = SearchService()
@@ -9,7 +9,7 @@ import json
 import hashlib
 import secrets
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Any, Optional, Union
 from werkzeug.utils import secure_filename
 from email_validator import validate_email, EmailNotValidError
@@ -81,23 +81,35 @@ def validate_phone_number(phone, country_code='FR'):
     except NumberParseException:
         raise ValidationError("Format de numéro de téléphone invalide")
 
-def validate_work_order_data(data):
-    """Valider les données d'un bon de travail"""
-    errors = []
+def _non_text_errors(data, fields):
+    """Champs texte reçus avec un autre type JSON (nombre, liste, objet)"""
+    return [f"Le champ {field} doit être une chaîne de caractères" for field in fields
+            if data.get(field) is not None and not isinstance(data[field], str)]
+
+def validate_work_order_data(data, is_update=False):
+    """Valider les données d'un bon de travail (mise à jour : seuls les champs fournis)"""
+    errors = _non_text_errors(data, ('claim_number', 'title', 'customer_name', 'customer_address',
+                                     'customer_phone', 'customer_email', 'description', 'priority',
+                                     'status', 'scheduled_date', 'notes'))
+    if errors:
+        raise ValidationError("; ".join(errors))
     
     # Validation du numéro de réclamation
-    if not data.get('claim_number'):
-        errors.append("Le numéro de réclamation est requis")
-    elif not re.match(r'^WO-\d{4}-\d{3,}$', data['claim_number']):
-        errors.append("Format du numéro de réclamation invalide (format attendu: WO-YYYY-XXX)")
+    if not is_update or 'claim_number' in data:
+        if not data.get('claim_number'):
+            errors.append("Le numéro de réclamation est requis")
+        elif not re.match(r'^WO-\d{4}-\d{3,}$', data['claim_number']):
+            errors.append("Format du numéro de réclamation invalide (format attendu: WO-YYYY-XXX)")
     
     # Validation du nom du client
-    if not data.get('customer_name') or len(data['customer_name'].strip()) < 2:
-        errors.append("Le nom du client est requis (minimum 2 caractères)")
+    if not is_update or 'customer_name' in data:
+        if not data.get('customer_name') or len(data['customer_name'].strip()) < 2:
+            errors.append("Le nom du client est requis (minimum 2 caractères)")
     
     # Validation de l'adresse
-    if not data.get('customer_address') or len(data['customer_address'].strip()) < 5:
-        errors.append("L'adresse du client est requise (minimum 5 caractères)")
+    if not is_update or 'customer_address' in data:
+        if not data.get('customer_address') or len(data['customer_address'].strip()) < 5:
+            errors.append("L'adresse du client est requise (minimum 5 caractères)")
     
     # Validation du téléphone
     if data.get('customer_phone'):
@@ -107,14 +119,20 @@ def validate_work_order_data(data):
             errors.append(f"Téléphone invalide: {e}")
     
     # Validation de la description
-    if not data.get('description') or len(data['description'].strip()) < 10:
-        errors.append("La description est requise (minimum 10 caractères)")
+    if not is_update or 'description' in data:
+        if not data.get('description') or len(data['description'].strip()) < 10:
+            errors.append("La description est requise (minimum 10 caractères)")
     
     # Validation de la priorité
     valid_priorities = ['low', 'medium', 'high', 'urgent']
-    if data.get('priority') not in valid_priorities:
+    if (not is_update or 'priority' in data) and data.get('priority') not in valid_priorities:
         errors.append(f"Priorité invalide. Valeurs autorisées: {', '.join(valid_priorities)}")
     
+    # Validation du statut
+    valid_statuses = ['draft', 'pending', 'assigned', 'in_progress', 'completed', 'cancelled']
+    if data.get('status') and data['status'] not in valid_statuses:
+        errors.append(f"Statut invalide. Valeurs autorisées: {', '.join(valid_statuses)}")
+    
     # Validation de la durée estimée
     if data.get('estimated_duration'):
         try:
@@ -128,7 +146,12 @@ def validate_work_order_data(data):
     if data.get('scheduled_date'):
         try:
             scheduled = datetime.fromisoformat(data['scheduled_date'].replace('Z', '+00:00'))
-            if scheduled < datetime.now():
+            now = datetime.now()
+            if scheduled.tzinfo is not None:
+                # Date avec fuseau (Z, +02:00) : comparée en UTC naïf
+                scheduled = scheduled.astimezone(timezone.utc).replace(tzinfo=None)
+                now = datetime.now(timezone.utc).replace(tzinfo=None)
+            if scheduled < now:
                 errors.append("La date programmée ne peut pas être dans le passé")
         except ValueError:
             errors.append("Format de date programmée invalide")
@@ -160,7 +183,10 @@ def validate_postal_code_by_country(postal_code, country='FR'):
 
 def validate_customer_data(data, is_update=False):
     """Valider les données client avec validation métier complète"""
-    errors = []
+    errors = _non_text_errors(data, ('name', 'email', 'phone', 'customer_type', 'company', 'siret',
+                                     'address', 'postal_code', 'city', 'country', 'status'))
+    if errors:
+        raise ValidationError("; ".join(errors))
     
     # Validation du nom (requis pour particuliers et entreprises)
     if not is_update or 'name' in data:
@@ -487,7 +513,13 @@ def get_priority_color(priority):
     return priority_colors.get(priority, 'secondary')
 
 def paginate_query_results(query_results, page=1, per_page=20):
-    """Paginer les résultats d'une requête"""
+    """
+    Paginer les résultats d'une requête (liste déjà chargée en mémoire)
+    
+    Obsolète pour les listes issues de la base : utiliser
+    utils.pagination.paginate_query ou paginate_keyset, qui ne chargent
+    que la page demandée.
+    """
     if not query_results:
         return {
             'items': [],
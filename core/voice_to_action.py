@@ -12,6 +12,8 @@ import threading
 import queue
 import time
 
+from core.intent_matcher import IntentMatcher
+
 logger = logging.getLogger(__name__)
 
 class VoiceToActionEngine:
@@ -20,6 +22,7 @@ class VoiceToActionEngine:
     def __init__(self, offline_db_path='data/offline.db'):
         self.offline_db_path = offline_db_path
         self.command_patterns = self._load_command_patterns()
+        self.intent_matcher = self._build_intent_matcher(self.command_patterns)
         self.voice_commands_queue = queue.Queue()
         self.is_listening = False
         self.current_technician_id = None
@@ -89,6 +92,15 @@ class VoiceToActionEngine:
             }
         }
     
+    @staticmethod
+    def _build_intent_matcher(command_patterns: Dict) -> IntentMatcher:
+        """Phrases de commande compilées une fois ; confiance = part de la transcription couverte"""
+        matcher = IntentMatcher(strategy='coverage')
+        for command_type, config in command_patterns.items():
+            matcher.add_phrases(command_type, config['patterns'], threshold=config['confidence_threshold'])
+        matcher.compile()
+        return matcher
+    
     def _init_offline_db(self):
         """Initialiser la base de données SQLite offline"""
         os.makedirs(os.path.dirname(self.offline_db_path), exist_ok=True)
@@ -141,13 +153,14 @@ class VoiceToActionEngine:
             CREATE TABLE IF NOT EXISTS sync_queue (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 table_name TEXT NOT NULL,
-                record_id INTEGER NOT NULL,
+                record_id INTEGER, -- NULL pour les insertions
                 action TEXT NOT NULL, -- insert, update, delete
                 data TEXT, -- JSON data
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 attempts INTEGER DEFAULT 0,
                 last_attempt TIMESTAMP,
-                status TEXT DEFAULT 'pending' -- pending, synced, failed
+                status TEXT DEFAULT 'pending', -- pending, synced, failed
+                idempotency_key TEXT
             )
         ''')
         
@@ -223,33 +236,23 @@ class VoiceToActionEngine:
     
     def _analyze_voice_command(self, transcription: str) -> Dict:
         """Analyser la transcription pour identifier la commande"""
-        transcription_lower = transcription.lower()
-        
-        best_match = {
-            'recognized': False,
-            'command_type': None,
-            'action': None,
-            'confidence': 0.0,
-            'parameters': {}
-        }
+        match = self.intent_matcher.match(transcription)
+        if not match:
+            return {
+                'recognized': False,
+                'command_type': None,
+                'action': None,
+                'confidence': 0.0,
+                'parameters': {}
+            }
         
-        for command_type, config in self.command_patterns.items():
-            for pattern in config['patterns']:
-                if pattern.lower() in transcription_lower:
-                    # Calcul de confiance basique (en production utiliser ML)
-                    confidence = len(pattern) / len(transcription_lower)
-                    confidence = min(confidence, 1.0)
-                    
-                    if confidence >= config['confidence_threshold'] and confidence > best_match['confidence']:
-                        best_match = {
-                            'recognized': True,
-                            'command_type': command_type,
-                            'action': config['action'],
-                            'confidence': confidence,
-                            'parameters': self._extract_parameters(transcription, command_type)
-                        }
-        
-        return best_match
+        return {
+            'recognized': True,
+            'command_type': match.intent,
+            'action': self.command_patterns[match.intent]['action'],
+            'confidence': match.score,
+            'parameters': self._extract_parameters(transcription, match.intent)
+        }
     
     def _extract_parameters(self, transcription: str, command_type: str) -> Dict:
         """Extraire les paramètres de la commande"""
@@ -485,6 +488,10 @@ class VoiceToActionEngine:
         
         conn.commit()
         conn.close()
+        
+        # Réveiller le service de synchronisation du processus
+        from core.offline_sync import wake_sync_service
+        wake_sync_service()
     
     def set_current_technician(self, technician_id: int):
         """Définir le technicien actuel pour les commandes vocales"""
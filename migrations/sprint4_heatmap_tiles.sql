@@ -0,0 +1,45 @@
+-- Migration Sprint 4 - Tuiles heatmap pré-agrégées
+-- Agrégat journalier par cellule de grille, maintenu par InterventionHeatmapManager
+-- (refresh_work_order_tiles après les écritures des routes, refresh_touched_tiles
+-- périodique pour les autres chemins, reconstruction complète quotidienne)
+
+CREATE TABLE IF NOT EXISTS intervention_heatmap_tiles (
+    bucket_date DATE NOT NULL,
+    cell_lat DECIMAL(9, 4) NOT NULL,
+    cell_lng DECIMAL(10, 4) NOT NULL,
+    intervention_count INT NOT NULL DEFAULT 0,
+    cost_sum DECIMAL(14,2) NOT NULL DEFAULT 0.00,
+    cost_count INT NOT NULL DEFAULT 0,
+    duration_hours_sum BIGINT NOT NULL DEFAULT 0,
+    duration_count INT NOT NULL DEFAULT 0,
+    last_customer_id INT NULL,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (bucket_date, cell_lat, cell_lng),
+    INDEX idx_cell (cell_lat, cell_lng)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Index utilisé pour recalculer un jour de tuiles
+ALTER TABLE work_orders ADD INDEX IF NOT EXISTS idx_wo_created_at (created_at);
+
+-- Remplissage initial à partir de l'historique
+DELETE FROM intervention_heatmap_tiles;
+
+INSERT INTO intervention_heatmap_tiles (
+    bucket_date, cell_lat, cell_lng, intervention_count,
+    cost_sum, cost_count, duration_hours_sum, duration_count,
+    last_customer_id
+)
+SELECT 
+    DATE(wo.created_at),
+    ROUND(wo.latitude, 4),
+    ROUND(wo.longitude, 4),
+    COUNT(*),
+    COALESCE(SUM(wo.total_cost), 0),
+    COUNT(wo.total_cost),
+    COALESCE(SUM(TIMESTAMPDIFF(HOUR, wo.created_at, wo.completed_at)), 0),
+    COUNT(wo.completed_at),
+    MAX(wo.customer_id)
+FROM work_orders wo
+WHERE wo.latitude IS NOT NULL 
+AND wo.longitude IS NOT NULL
+GROUP BY DATE(wo.created_at), ROUND(wo.latitude, 4), ROUND(wo.longitude, 4);
@@ -0,0 +1,17 @@
+-- Migration Sprint 7.7 - Cache persistant des réponses IA (services/llm_cache.py)
+-- Partagé par les workers, conservé entre redémarrages ; expires_at NULL = sans expiration
+
+CREATE TABLE IF NOT EXISTS ai_response_cache (
+    cache_key CHAR(64) NOT NULL,
+    endpoint VARCHAR(50) NOT NULL DEFAULT 'default',
+    model VARCHAR(100) NULL,
+    response MEDIUMTEXT NOT NULL,
+    size_bytes INT UNSIGNED NOT NULL DEFAULT 0,
+    hits INT UNSIGNED NOT NULL DEFAULT 0,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    last_hit_at DATETIME NULL,
+    expires_at DATETIME NULL,
+    PRIMARY KEY (cache_key),
+    INDEX idx_ai_cache_endpoint (endpoint),
+    INDEX idx_ai_cache_expires (expires_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
@@ -0,0 +1,12 @@
+-- Migration Sprint 7.11 - Révocations des tokens de l'API publique (core/api_tokens.py)
+-- Les tokens sont servis depuis un cache mémoire par processus : chaque
+-- processus relit ici les révocations récentes (quelques secondes) pour
+-- invalider son cache sans attendre le TTL
+
+CREATE TABLE IF NOT EXISTS api_token_revocations (
+    token_id INT NOT NULL PRIMARY KEY,
+    token_hash VARCHAR(255) NOT NULL,
+    revoked_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_revoked_at (revoked_at),
+    FOREIGN KEY (token_id) REFERENCES api_tokens(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
@@ -0,0 +1,413 @@
+-- Migration Sprint 7.13 - Instantanés agrégés Customer 360 (routes/api/customer360.py)
+-- Une ligne par client : compteurs et montants tenus à jour par triggers
+-- (bons de travail, factures, véhicules) au lieu d'une jointure
+-- customers x work_orders x vehicles qui multipliait les revenus par le
+-- nombre de véhicules. version est incrémentée à chaque écriture qui touche
+-- une section Customer 360 (toute modification d'un véhicule ou d'une
+-- facture affichés, pas seulement des colonnes agrégées) et sert d'ETag aux
+-- réponses /profile et /bundle. Les triggers de mise à jour des véhicules et
+-- factures sont recréés (DROP puis CREATE) pour remplacer ceux d'une
+-- première application de cette migration.
+-- last_work_order_at n'est pas recalculé à la suppression d'un bon de travail
+-- (rebuild_customer_snapshot() le remet à jour).
+
+CREATE TABLE IF NOT EXISTS customer_aggregate_snapshots (
+    customer_id INT NOT NULL PRIMARY KEY,
+    work_orders_count INT NOT NULL DEFAULT 0,
+    open_work_orders_count INT NOT NULL DEFAULT 0,
+    work_orders_revenue DECIMAL(14,2) NOT NULL DEFAULT 0.00,
+    last_work_order_at DATETIME NULL,
+    vehicles_count INT NOT NULL DEFAULT 0,
+    invoices_count INT NOT NULL DEFAULT 0,
+    invoices_paid_total DECIMAL(14,2) NOT NULL DEFAULT 0.00,
+    invoices_outstanding_total DECIMAL(14,2) NOT NULL DEFAULT 0.00,
+    version BIGINT UNSIGNED NOT NULL DEFAULT 1,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    FOREIGN KEY (customer_id) REFERENCES customers(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Factures par client et statut (agrégats et graphique des revenus)
+ALTER TABLE invoices ADD INDEX IF NOT EXISTS idx_invoices_customer_status (customer_id, status, created_at);
+
+-- work_orders
+DELIMITER $$
+CREATE TRIGGER IF NOT EXISTS trg_wo_c360_insert
+  AFTER INSERT ON work_orders
+  FOR EACH ROW
+BEGIN
+  IF NEW.customer_id IS NOT NULL THEN
+    INSERT INTO customer_aggregate_snapshots
+      (customer_id, work_orders_count, open_work_orders_count, work_orders_revenue, last_work_order_at)
+    VALUES (NEW.customer_id, 1, IF(NEW.status IN ('completed', 'cancelled'), 0, 1),
+            COALESCE(NEW.actual_cost, NEW.estimated_cost, 0), NEW.created_at)
+    ON DUPLICATE KEY UPDATE
+      work_orders_count = work_orders_count + VALUES(work_orders_count),
+      open_work_orders_count = open_work_orders_count + VALUES(open_work_orders_count),
+      work_orders_revenue = work_orders_revenue + VALUES(work_orders_revenue),
+      last_work_order_at = GREATEST(COALESCE(last_work_order_at, VALUES(last_work_order_at)),
+                                    COALESCE(VALUES(last_work_order_at), last_work_order_at)),
+      version = version + 1;
+  END IF;
+END$$
+
+CREATE TRIGGER IF NOT EXISTS trg_wo_c360_update
+  AFTER UPDATE ON work_orders
+  FOR EACH ROW
+BEGIN
+  IF NOT (OLD.customer_id <=> NEW.customer_id AND OLD.status <=> NEW.status AND OLD.actual_cost <=> NEW.actual_cost AND OLD.estimated_cost <=> NEW.estimated_cost) THEN
+    IF OLD.customer_id IS NOT NULL THEN
+      INSERT INTO customer_aggregate_snapshots
+        (customer_id, work_orders_count, open_work_orders_count, work_orders_revenue, last_work_order_at)
+      VALUES (OLD.customer_id, -1, -IF(OLD.status IN ('completed', 'cancelled'), 0, 1),
+              -COALESCE(OLD.actual_cost, OLD.estimated_cost, 0), NULL)
+      ON DUPLICATE KEY UPDATE
+        work_orders_count = work_orders_count + VALUES(work_orders_count),
+        open_work_orders_count = open_work_orders_count + VALUES(open_work_orders_count),
+        work_orders_revenue = work_orders_revenue + VALUES(work_orders_revenue),
+        last_work_order_at = GREATEST(COALESCE(last_work_order_at, VALUES(last_work_order_at)),
+                                      COALESCE(VALUES(last_work_order_at), last_work_order_at)),
+        version = version + 1;
+    END IF;
+    IF NEW.customer_id IS NOT NULL THEN
+      INSERT INTO customer_aggregate_snapshots
+        (customer_id, work_orders_count, open_work_orders_count, work_orders_revenue, last_work_order_at)
+      VALUES (NEW.customer_id, 1, IF(NEW.status IN ('completed', 'cancelled'), 0, 1),
+              COALESCE(NEW.actual_cost, NEW.estimated_cost, 0), NEW.created_at)
+      ON DUPLICATE KEY UPDATE
+        work_orders_count = work_orders_count + VALUES(work_orders_count),
+        open_work_orders_count = open_work_orders_count + VALUES(open_work_orders_count),
+        work_orders_revenue = work_orders_revenue + VALUES(work_orders_revenue),
+        last_work_order_at = GREATEST(COALESCE(last_work_order_at, VALUES(last_work_order_at)),
+                                      COALESCE(VALUES(last_work_order_at), last_work_order_at)),
+        version = version + 1;
+    END IF;
+  END IF;
+END$$
+
+CREATE TRIGGER IF NOT EXISTS trg_wo_c360_delete
+  AFTER DELETE ON work_orders
+  FOR EACH ROW
+BEGIN
+  IF OLD.customer_id IS NOT NULL THEN
+    INSERT INTO customer_aggregate_snapshots
+      (customer_id, work_orders_count, open_work_orders_count, work_orders_revenue, last_work_order_at)
+    VALUES (OLD.customer_id, -1, -IF(OLD.status IN ('completed', 'cancelled'), 0, 1),
+            -COALESCE(OLD.actual_cost, OLD.estimated_cost, 0), NULL)
+    ON DUPLICATE KEY UPDATE
+      work_orders_count = work_orders_count + VALUES(work_orders_count),
+      open_work_orders_count = open_work_orders_count + VALUES(open_work_orders_count),
+      work_orders_revenue = work_orders_revenue + VALUES(work_orders_revenue),
+      last_work_order_at = GREATEST(COALESCE(last_work_order_at, VALUES(last_work_order_at)),
+                                    COALESCE(VALUES(last_work_order_at), last_work_order_at)),
+      version = version + 1;
+  END IF;
+END$$
+DELIMITER ;
+
+-- invoices
+DELIMITER $$
+CREATE TRIGGER IF NOT EXISTS trg_inv_c360_insert
+  AFTER INSERT ON invoices
+  FOR EACH ROW
+BEGIN
+  IF NEW.customer_id IS NOT NULL THEN
+    INSERT INTO customer_aggregate_snapshots
+      (customer_id, invoices_count, invoices_paid_total, invoices_outstanding_total)
+    VALUES (NEW.customer_id, 1, IF(NEW.status = 'paid', NEW.total_amount, 0),
+            IF(NEW.status IN ('sent', 'open', 'overdue'), NEW.total_amount, 0))
+    ON DUPLICATE KEY UPDATE
+      invoices_count = invoices_count + VALUES(invoices_count),
+      invoices_paid_total = invoices_paid_total + VALUES(invoices_paid_total),
+      invoices_outstanding_total = invoices_outstanding_total + VALUES(invoices_outstanding_total),
+      version = version + 1;
+  END IF;
+END$$
+
+DROP TRIGGER IF EXISTS trg_inv_c360_update$$
+CREATE TRIGGER trg_inv_c360_update
+  AFTER UPDATE ON invoices
+  FOR EACH ROW
+BEGIN
+  IF OLD.customer_id <=> NEW.customer_id AND OLD.status <=> NEW.status AND OLD.total_amount <=> NEW.total_amount THEN
+    -- Numéro, échéance... : agrégats inchangés, facture affichée modifiée
+    IF NEW.customer_id IS NOT NULL THEN
+      INSERT INTO customer_aggregate_snapshots (customer_id) VALUES (NEW.customer_id)
+      ON DUPLICATE KEY UPDATE version = version + 1;
+    END IF;
+  ELSE
+    IF OLD.customer_id IS NOT NULL THEN
+      INSERT INTO customer_aggregate_snapshots
+        (customer_id, invoices_count, invoices_paid_total, invoices_outstanding_total)
+      VALUES (OLD.customer_id, -1, -IF(OLD.status = 'paid', OLD.total_amount, 0),
+              -IF(OLD.status IN ('sent', 'open', 'overdue'), OLD.total_amount, 0))
+      ON DUPLICATE KEY UPDATE
+        invoices_count = invoices_count + VALUES(invoices_count),
+        invoices_paid_total = invoices_paid_total + VALUES(invoices_paid_total),
+        invoices_outstanding_total = invoices_outstanding_total + VALUES(invoices_outstanding_total),
+        version = version + 1;
+    END IF;
+    IF NEW.customer_id IS NOT NULL THEN
+      INSERT INTO customer_aggregate_snapshots
+        (customer_id, invoices_count, invoices_paid_total, invoices_outstanding_total)
+      VALUES (NEW.customer_id, 1, IF(NEW.status = 'paid', NEW.total_amount, 0),
+              IF(NEW.status IN ('sent', 'open', 'overdue'), NEW.total_amount, 0))
+      ON DUPLICATE KEY UPDATE
+        invoices_count = invoices_count + VALUES(invoices_count),
+        invoices_paid_total = invoices_paid_total + VALUES(invoices_paid_total),
+        invoices_outstanding_total = invoices_outstanding_total + VALUES(invoices_outstanding_total),
+        version = version + 1;
+    END IF;
+  END IF;
+END$$
+
+CREATE TRIGGER IF NOT EXISTS trg_inv_c360_delete
+  AFTER DELETE ON invoices
+  FOR EACH ROW
+BEGIN
+  IF OLD.customer_id IS NOT NULL THEN
+    INSERT INTO customer_aggregate_snapshots
+      (customer_id, invoices_count, invoices_paid_total, invoices_outstanding_total)
+    VALUES (OLD.customer_id, -1, -IF(OLD.status = 'paid', OLD.total_amount, 0),
+            -IF(OLD.status IN ('sent', 'open', 'overdue'), OLD.total_amount, 0))
+    ON DUPLICATE KEY UPDATE
+      invoices_count = invoices_count + VALUES(invoices_count),
+      invoices_paid_total = invoices_paid_total + VALUES(invoices_paid_total),
+      invoices_outstanding_total = invoices_outstanding_total + VALUES(invoices_outstanding_total),
+      version = version + 1;
+  END IF;
+END$$
+DELIMITER ;
+
+-- vehicles
+DELIMITER $$
+CREATE TRIGGER IF NOT EXISTS trg_veh_c360_insert
+  AFTER INSERT ON vehicles
+  FOR EACH ROW
+BEGIN
+  IF NEW.customer_id IS NOT NULL THEN
+    INSERT INTO customer_aggregate_snapshots (customer_id, vehicles_count)
+    VALUES (NEW.customer_id, 1)
+    ON DUPLICATE KEY UPDATE vehicles_count = vehicles_count + VALUES(vehicles_count), version = version + 1;
+  END IF;
+END$$
+
+DROP TRIGGER IF EXISTS trg_veh_c360_update$$
+CREATE TRIGGER trg_veh_c360_update
+  AFTER UPDATE ON vehicles
+  FOR EACH ROW
+BEGIN
+  IF OLD.customer_id <=> NEW.customer_id THEN
+    -- Marque, modèle, immatriculation... : seule la version change
+    IF NEW.customer_id IS NOT NULL THEN
+      INSERT INTO customer_aggregate_snapshots (customer_id) VALUES (NEW.customer_id)
+      ON DUPLICATE KEY UPDATE version = version + 1;
+    END IF;
+  ELSE
+    IF OLD.customer_id IS NOT NULL THEN
+      INSERT INTO customer_aggregate_snapshots (customer_id, vehicles_count)
+      VALUES (OLD.customer_id, -1)
+      ON DUPLICATE KEY UPDATE vehicles_count = vehicles_count + VALUES(vehicles_count), version = version + 1;
+    END IF;
+    IF NEW.customer_id IS NOT NULL THEN
+      INSERT INTO customer_aggregate_snapshots (customer_id, vehicles_count)
+      VALUES (NEW.customer_id, 1)
+      ON DUPLICATE KEY UPDATE vehicles_count = vehicles_count + VALUES(vehicles_count), version = version + 1;
+    END IF;
+  END IF;
+END$$
+
+CREATE TRIGGER IF NOT EXISTS trg_veh_c360_delete
+  AFTER DELETE ON vehicles
+  FOR EACH ROW
+BEGIN
+  IF OLD.customer_id IS NOT NULL THEN
+    INSERT INTO customer_aggregate_snapshots (customer_id, vehicles_count)
+    VALUES (OLD.customer_id, -1)
+    ON DUPLICATE KEY UPDATE vehicles_count = vehicles_count + VALUES(vehicles_count), version = version + 1;
+  END IF;
+END$$
+DELIMITER ;
+
+-- Sections affichées sans agrégat : seule la version (ETag) change
+DELIMITER $$
+CREATE TRIGGER IF NOT EXISTS trg_customers_c360_update
+  AFTER UPDATE ON customers
+  FOR EACH ROW
+BEGIN
+  INSERT INTO customer_aggregate_snapshots (customer_id) VALUES (NEW.id)
+  ON DUPLICATE KEY UPDATE version = version + 1;
+END$$
+DELIMITER ;
+
+-- customer_activities
+DELIMITER $$
+CREATE TRIGGER IF NOT EXISTS trg_cact_c360_insert
+  AFTER INSERT ON customer_activities
+  FOR EACH ROW
+BEGIN
+  INSERT INTO customer_aggregate_snapshots (customer_id) VALUES (NEW.customer_id)
+  ON DUPLICATE KEY UPDATE version = version + 1;
+END$$
+
+CREATE TRIGGER IF NOT EXISTS trg_cact_c360_update
+  AFTER UPDATE ON customer_activities
+  FOR EACH ROW
+BEGIN
+  INSERT INTO customer_aggregate_snapshots (customer_id) VALUES (NEW.customer_id)
+  ON DUPLICATE KEY UPDATE version = version + 1;
+END$$
+
+CREATE TRIGGER IF NOT EXISTS trg_cact_c360_delete
+  AFTER DELETE ON customer_activities
+  FOR EACH ROW
+BEGIN
+  INSERT INTO customer_aggregate_snapshots (customer_id) VALUES (OLD.customer_id)
+  ON DUPLICATE KEY UPDATE version = version + 1;
+END$$
+DELIMITER ;
+
+-- customer_documents
+DELIMITER $$
+CREATE TRIGGER IF NOT EXISTS trg_cdoc_c360_insert
+  AFTER INSERT ON customer_documents
+  FOR EACH ROW
+BEGIN
+  INSERT INTO customer_aggregate_snapshots (customer_id) VALUES (NEW.customer_id)
+  ON DUPLICATE KEY UPDATE version = version + 1;
+END$$
+
+CREATE TRIGGER IF NOT EXISTS trg_cdoc_c360_update
+  AFTER UPDATE ON customer_documents
+  FOR EACH ROW
+BEGIN
+  INSERT INTO customer_aggregate_snapshots (customer_id) VALUES (NEW.customer_id)
+  ON DUPLICATE KEY UPDATE version = version + 1;
+END$$
+
+CREATE TRIGGER IF NOT EXISTS trg_cdoc_c360_delete
+  AFTER DELETE ON customer_documents
+  FOR EACH ROW
+BEGIN
+  INSERT INTO customer_aggregate_snapshots (customer_id) VALUES (OLD.customer_id)
+  ON DUPLICATE KEY UPDATE version = version + 1;
+END$$
+DELIMITER ;
+
+-- customer_consents
+DELIMITER $$
+CREATE TRIGGER IF NOT EXISTS trg_ccons_c360_insert
+  AFTER INSERT ON customer_consents
+  FOR EACH ROW
+BEGIN
+  INSERT INTO customer_aggregate_snapshots (customer_id) VALUES (NEW.customer_id)
+  ON DUPLICATE KEY UPDATE version = version + 1;
+END$$
+
+CREATE TRIGGER IF NOT EXISTS trg_ccons_c360_update
+  AFTER UPDATE ON customer_consents
+  FOR EACH ROW
+BEGIN
+  INSERT INTO customer_aggregate_snapshots (customer_id) VALUES (NEW.customer_id)
+  ON DUPLICATE KEY UPDATE version = version + 1;
+END$$
+
+CREATE TRIGGER IF NOT EXISTS trg_ccons_c360_delete
+  AFTER DELETE ON customer_consents
+  FOR EACH ROW
+BEGIN
+  INSERT INTO customer_aggregate_snapshots (customer_id) VALUES (OLD.customer_id)
+  ON DUPLICATE KEY UPDATE version = version + 1;
+END$$
+DELIMITER ;
+
+-- customer_addresses
+DELIMITER $$
+CREATE TRIGGER IF NOT EXISTS trg_caddr_c360_insert
+  AFTER INSERT ON customer_addresses
+  FOR EACH ROW
+BEGIN
+  INSERT INTO customer_aggregate_snapshots (customer_id) VALUES (NEW.customer_id)
+  ON DUPLICATE KEY UPDATE version = version + 1;
+END$$
+
+CREATE TRIGGER IF NOT EXISTS trg_caddr_c360_update
+  AFTER UPDATE ON customer_addresses
+  FOR EACH ROW
+BEGIN
+  INSERT INTO customer_aggregate_snapshots (customer_id) VALUES (NEW.customer_id)
+  ON DUPLICATE KEY UPDATE version = version + 1;
+END$$
+
+CREATE TRIGGER IF NOT EXISTS trg_caddr_c360_delete
+  AFTER DELETE ON customer_addresses
+  FOR EACH ROW
+BEGIN
+  INSERT INTO customer_aggregate_snapshots (customer_id) VALUES (OLD.customer_id)
+  ON DUPLICATE KEY UPDATE version = version + 1;
+END$$
+DELIMITER ;
+
+-- customer_contacts
+DELIMITER $$
+CREATE TRIGGER IF NOT EXISTS trg_ccont_c360_insert
+  AFTER INSERT ON customer_contacts
+  FOR EACH ROW
+BEGIN
+  INSERT INTO customer_aggregate_snapshots (customer_id) VALUES (NEW.customer_id)
+  ON DUPLICATE KEY UPDATE version = version + 1;
+END$$
+
+CREATE TRIGGER IF NOT EXISTS trg_ccont_c360_update
+  AFTER UPDATE ON customer_contacts
+  FOR EACH ROW
+BEGIN
+  INSERT INTO customer_aggregate_snapshots (customer_id) VALUES (NEW.customer_id)
+  ON DUPLICATE KEY UPDATE version = version + 1;
+END$$
+
+CREATE TRIGGER IF NOT EXISTS trg_ccont_c360_delete
+  AFTER DELETE ON customer_contacts
+  FOR EACH ROW
+BEGIN
+  INSERT INTO customer_aggregate_snapshots (customer_id) VALUES (OLD.customer_id)
+  ON DUPLICATE KEY UPDATE version = version + 1;
+END$$
+DELIMITER ;
+
+-- Amorçage (après les triggers : les écritures concurrentes sont couvertes
+-- par le recalcul absolu), agrégats pré-groupés par table, sans produit cartésien
+INSERT INTO customer_aggregate_snapshots
+    (customer_id, work_orders_count, open_work_orders_count, work_orders_revenue, last_work_order_at,
+     vehicles_count, invoices_count, invoices_paid_total, invoices_outstanding_total)
+SELECT 
+    c.id,
+    COALESCE(wo.total, 0), COALESCE(wo.open_total, 0), COALESCE(wo.revenue, 0), wo.last_at,
+    COALESCE(v.total, 0),
+    COALESCE(i.total, 0), COALESCE(i.paid, 0), COALESCE(i.outstanding, 0)
+FROM customers c
+LEFT JOIN (
+    SELECT customer_id, COUNT(*) AS total,
+           SUM(IF(status IN ('completed', 'cancelled'), 0, 1)) AS open_total,
+           SUM(COALESCE(actual_cost, estimated_cost, 0)) AS revenue,
+           MAX(created_at) AS last_at
+    FROM work_orders GROUP BY customer_id
+) wo ON wo.customer_id = c.id
+LEFT JOIN (
+    SELECT customer_id, COUNT(*) AS total FROM vehicles GROUP BY customer_id
+) v ON v.customer_id = c.id
+LEFT JOIN (
+    SELECT customer_id, COUNT(*) AS total,
+           SUM(IF(status = 'paid', total_amount, 0)) AS paid,
+           SUM(IF(status IN ('sent', 'open', 'overdue'), total_amount, 0)) AS outstanding
+    FROM invoices GROUP BY customer_id
+) i ON i.customer_id = c.id
+ON DUPLICATE KEY UPDATE
+    work_orders_count = VALUES(work_orders_count),
+    open_work_orders_count = VALUES(open_work_orders_count),
+    work_orders_revenue = VALUES(work_orders_revenue),
+    last_work_order_at = VALUES(last_work_order_at),
+    vehicles_count = VALUES(vehicles_count),
+    invoices_count = VALUES(invoices_count),
+    invoices_paid_total = VALUES(invoices_paid_total),
+    invoices_outstanding_total = VALUES(invoices_outstanding_total),
+    version = version + 1;
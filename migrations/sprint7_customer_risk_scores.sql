@@ -0,0 +1,27 @@
+-- Migration Sprint 7.14 - Scores de risque client calculés par lots (core/customer_risk.py)
+-- Une ligne par client : score, niveau, facteurs bruts et composantes,
+-- date de calcul ; previous_* et level_changed_at servent aux alertes de
+-- changement de niveau (GET /customers/risk-scores?changed_since=...)
+
+CREATE TABLE IF NOT EXISTS customer_risk_scores (
+    customer_id INT NOT NULL PRIMARY KEY,
+    score DECIMAL(5,1) NOT NULL DEFAULT 0.0,
+    level VARCHAR(20) NOT NULL DEFAULT 'very_low',
+    previous_score DECIMAL(5,1) NULL,
+    previous_level VARCHAR(20) NULL,
+    level_changed_at DATETIME NULL,
+    late_payments INT NOT NULL DEFAULT 0,
+    overdue_amount DECIMAL(12,2) NOT NULL DEFAULT 0.00,
+    account_days INT NOT NULL DEFAULT 0,
+    payment_delays_factor DECIMAL(5,1) NOT NULL DEFAULT 0.0,
+    overdue_factor DECIMAL(5,1) NOT NULL DEFAULT 0.0,
+    account_age_factor DECIMAL(5,1) NOT NULL DEFAULT 0.0,
+    computed_at DATETIME NOT NULL,
+    INDEX idx_risk_score (score),
+    INDEX idx_risk_level_score (level, score),
+    INDEX idx_risk_level_changed (level_changed_at),
+    FOREIGN KEY (customer_id) REFERENCES customers(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Agrégats groupés des factures par client (retards, montants en souffrance)
+ALTER TABLE invoices ADD INDEX IF NOT EXISTS idx_invoices_status_customer (status, customer_id, due_date);
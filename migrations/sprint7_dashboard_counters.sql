@@ -0,0 +1,9 @@
+-- Migration Sprint 7.5 - Index des compteurs du tableau de bord
+-- Couvrent les agrégats COUNT/SUM(CASE) de core.models.get_dashboard_stats()
+
+ALTER TABLE work_orders ADD INDEX IF NOT EXISTS idx_wo_status (status);
+ALTER TABLE work_orders ADD INDEX IF NOT EXISTS idx_wo_technician_status (assigned_technician_id, status);
+ALTER TABLE work_orders ADD INDEX IF NOT EXISTS idx_wo_created_at (created_at);
+ALTER TABLE users ADD INDEX IF NOT EXISTS idx_users_active_role (is_active, role);
+ALTER TABLE customers ADD INDEX IF NOT EXISTS idx_customers_active (is_active);
+ALTER TABLE notifications ADD INDEX IF NOT EXISTS idx_notifications_user_read (user_id, is_read);
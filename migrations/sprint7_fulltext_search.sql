@@ -0,0 +1,11 @@
+-- Migration Sprint 7.6 - Recherche plein texte (core/search.py)
+-- La collation utf8mb4_unicode_ci des colonnes rend MATCH insensible à la casse
+-- et aux accents ("frein" trouve "Frein" et "freiné" via le préfixe frein*)
+
+ALTER TABLE work_orders ADD FULLTEXT INDEX IF NOT EXISTS ft_wo_search (claim_number, customer_name, description);
+ALTER TABLE customers ADD FULLTEXT INDEX IF NOT EXISTS ft_customers_search (name, company, email);
+
+-- Préfixes courts (moins de 3 caractères) servis par les index B-tree
+ALTER TABLE work_orders ADD INDEX IF NOT EXISTS idx_wo_claim_number (claim_number);
+ALTER TABLE work_orders ADD INDEX IF NOT EXISTS idx_wo_customer_name (customer_name);
+ALTER TABLE customers ADD INDEX IF NOT EXISTS idx_customers_name (name);
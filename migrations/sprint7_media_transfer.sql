@@ -0,0 +1,37 @@
+-- Migration Sprint 7.10 - Médias terrain envoyés au stockage objet (core/media_transfer.py)
+-- Empreinte SHA-256 du fichier source : un média renvoyé après une coupure
+-- (ou capturé deux fois) n'est enregistré qu'une fois par bon de travail ;
+-- vignette et transcription vocale conservées pour l'affichage.
+-- filename reçoit la clé de l'objet, file_path son URL (/media/<bucket>/<clé>)
+
+CREATE TABLE IF NOT EXISTS work_order_media (
+    id INT PRIMARY KEY AUTO_INCREMENT,
+    work_order_id INT NOT NULL,
+    filename VARCHAR(255) NOT NULL,
+    original_filename VARCHAR(255) NOT NULL,
+    file_path VARCHAR(500) NOT NULL,
+    file_type VARCHAR(100),
+    file_size INT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    uploaded_by INT,
+    FOREIGN KEY (work_order_id) REFERENCES work_orders(id) ON DELETE CASCADE,
+    FOREIGN KEY (uploaded_by) REFERENCES users(id) ON DELETE SET NULL,
+    INDEX idx_work_order_id (work_order_id),
+    INDEX idx_created_at (created_at)
+);
+
+SET @col_exists = 0;
+SELECT COUNT(*) INTO @col_exists
+FROM information_schema.columns
+WHERE table_schema = DATABASE() AND table_name = 'work_order_media' AND column_name = 'content_hash';
+
+SET @sql = IF(@col_exists = 0,
+    'ALTER TABLE work_order_media
+        ADD COLUMN content_hash CHAR(64) NULL AFTER uploaded_by,
+        ADD COLUMN thumbnail_url VARCHAR(500) NULL AFTER content_hash,
+        ADD COLUMN transcription TEXT NULL AFTER thumbnail_url,
+        ADD UNIQUE KEY uq_work_order_media_hash (work_order_id, content_hash)',
+    'SELECT "Columns content_hash already exist" as info');
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
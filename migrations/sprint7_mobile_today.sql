@@ -0,0 +1,8 @@
+-- Migration Sprint 7.12 - Index de la vue mobile "aujourd'hui" (routes/mobile/routes.py)
+-- Chaque branche de la requête unique de get_today_snapshot() est une plage
+-- d'index par technicien : tâches planifiées dans la journée, interventions
+-- en cours, interventions démarrées dans la journée
+
+ALTER TABLE work_order_tasks ADD INDEX IF NOT EXISTS idx_wot_tech_scheduled (technician_id, scheduled_start);
+ALTER TABLE interventions ADD INDEX IF NOT EXISTS idx_int_tech_ended (technician_id, ended_at);
+ALTER TABLE interventions ADD INDEX IF NOT EXISTS idx_int_tech_started (technician_id, started_at);
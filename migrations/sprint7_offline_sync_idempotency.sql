@@ -0,0 +1,10 @@
+-- Migration Sprint 7.8 - Idempotence du rejeu de l'outbox offline (core/offline_sync.py)
+-- Une ligne par opération appliquée : un lot rejoué après une coupure réseau
+-- ignore les clés déjà présentes ; purge par appareil après 30 jours
+
+CREATE TABLE IF NOT EXISTS sync_applied_ops (
+    idempotency_key VARCHAR(100) NOT NULL PRIMARY KEY,
+    device_id VARCHAR(64) NOT NULL,
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_device_applied (device_id, applied_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
@@ -0,0 +1,48 @@
+-- Migration Sprint 7.4 - KPIs journaliers par site (multi-sites)
+-- Alimentée par MultiSiteManager.refresh_site_daily_kpis(), lue pour les tendances
+
+CREATE TABLE IF NOT EXISTS site_daily_kpis (
+    site_id INT NOT NULL,
+    kpi_date DATE NOT NULL,
+    total_work_orders INT NOT NULL DEFAULT 0,
+    completed_orders INT NOT NULL DEFAULT 0,
+    pending_orders INT NOT NULL DEFAULT 0,
+    in_progress_orders INT NOT NULL DEFAULT 0,
+    completion_hours_sum BIGINT NOT NULL DEFAULT 0,
+    completion_count INT NOT NULL DEFAULT 0,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (site_id, kpi_date),
+    INDEX idx_kpi_date (kpi_date)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Index utilisés par les agrégats par site
+ALTER TABLE users ADD INDEX IF NOT EXISTS idx_users_site_active (site_id, is_active);
+ALTER TABLE work_orders ADD INDEX IF NOT EXISTS idx_wo_technician_created (assigned_technician_id, created_at);
+
+-- Remplissage initial sur 12 mois
+INSERT INTO site_daily_kpis (
+    site_id, kpi_date, total_work_orders, completed_orders,
+    pending_orders, in_progress_orders, completion_hours_sum, completion_count
+)
+SELECT 
+    u.site_id,
+    DATE(w.created_at),
+    COUNT(*),
+    COUNT(CASE WHEN w.status = 'completed' THEN 1 END),
+    COUNT(CASE WHEN w.status = 'pending' THEN 1 END),
+    COUNT(CASE WHEN w.status = 'in_progress' THEN 1 END),
+    COALESCE(SUM(CASE WHEN w.status = 'completed' THEN 
+        TIMESTAMPDIFF(HOUR, w.created_at, w.completed_at) END), 0),
+    COUNT(CASE WHEN w.status = 'completed' AND w.completed_at IS NOT NULL THEN 1 END)
+FROM work_orders w
+INNER JOIN users u ON u.id = w.assigned_technician_id
+WHERE u.site_id IS NOT NULL
+AND w.created_at >= CURDATE() - INTERVAL 365 DAY
+GROUP BY u.site_id, DATE(w.created_at)
+ON DUPLICATE KEY UPDATE
+    total_work_orders = VALUES(total_work_orders),
+    completed_orders = VALUES(completed_orders),
+    pending_orders = VALUES(pending_orders),
+    in_progress_orders = VALUES(in_progress_orders),
+    completion_hours_sum = VALUES(completion_hours_sum),
+    completion_count = VALUES(completion_count);
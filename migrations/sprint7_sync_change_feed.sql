@@ -0,0 +1,131 @@
+-- Migration Sprint 7.9 - Journal des modifications pour la synchronisation descendante (core/change_feed.py)
+-- Une ligne par modification de bon de travail, tâche ou intervention, écrite
+-- par triggers (tous les chemins d'écriture sont couverts) ; seq sert de
+-- version de ligne. technician_id = destinataire : une réaffectation écrit une
+-- pierre tombale pour l'ancien technicien. Les suppressions en cascade des
+-- clés étrangères ne déclenchent pas de trigger : la pierre tombale d'un bon
+-- de travail vaut pour ses tâches et interventions.
+
+CREATE TABLE IF NOT EXISTS sync_change_log (
+    seq BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
+    entity_type ENUM('work_order', 'task', 'intervention') NOT NULL,
+    entity_id INT NOT NULL,
+    work_order_id INT NULL,
+    technician_id INT NULL,
+    op ENUM('upsert', 'delete') NOT NULL,
+    changed_at TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3),
+    PRIMARY KEY (seq),
+    INDEX idx_change_technician (technician_id, seq),
+    INDEX idx_change_entity (entity_type, entity_id, seq),
+    INDEX idx_change_date (changed_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Point de reprise acquitté par appareil ; device_id est choisi par le
+-- client, la clé inclut donc l'utilisateur
+CREATE TABLE IF NOT EXISTS sync_device_checkpoints (
+    user_id INT NOT NULL,
+    device_id VARCHAR(64) NOT NULL,
+    last_seq BIGINT UNSIGNED NOT NULL DEFAULT 0,
+    last_pull_at DATETIME NULL,
+    PRIMARY KEY (user_id, device_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- work_orders
+DELIMITER $$
+CREATE TRIGGER IF NOT EXISTS trg_wo_change_insert
+  AFTER INSERT ON work_orders
+  FOR EACH ROW
+BEGIN
+  INSERT INTO sync_change_log (entity_type, entity_id, work_order_id, technician_id, op)
+  VALUES ('work_order', NEW.id, NEW.id, NEW.assigned_technician_id, 'upsert');
+END$$
+
+CREATE TRIGGER IF NOT EXISTS trg_wo_change_update
+  AFTER UPDATE ON work_orders
+  FOR EACH ROW
+BEGIN
+  IF OLD.assigned_technician_id IS NOT NULL AND NOT (OLD.assigned_technician_id <=> NEW.assigned_technician_id) THEN
+    INSERT INTO sync_change_log (entity_type, entity_id, work_order_id, technician_id, op)
+    VALUES ('work_order', OLD.id, OLD.id, OLD.assigned_technician_id, 'delete');
+  END IF;
+  INSERT INTO sync_change_log (entity_type, entity_id, work_order_id, technician_id, op)
+  VALUES ('work_order', NEW.id, NEW.id, NEW.assigned_technician_id, 'upsert');
+END$$
+
+CREATE TRIGGER IF NOT EXISTS trg_wo_change_delete
+  AFTER DELETE ON work_orders
+  FOR EACH ROW
+BEGIN
+  INSERT INTO sync_change_log (entity_type, entity_id, work_order_id, technician_id, op)
+  VALUES ('work_order', OLD.id, OLD.id, OLD.assigned_technician_id, 'delete');
+END$$
+DELIMITER ;
+
+-- work_order_tasks
+DELIMITER $$
+CREATE TRIGGER IF NOT EXISTS trg_wot_change_insert
+  AFTER INSERT ON work_order_tasks
+  FOR EACH ROW
+BEGIN
+  INSERT INTO sync_change_log (entity_type, entity_id, work_order_id, technician_id, op)
+  VALUES ('task', NEW.id, NEW.work_order_id, NEW.technician_id, 'upsert');
+END$$
+
+CREATE TRIGGER IF NOT EXISTS trg_wot_change_update
+  AFTER UPDATE ON work_order_tasks
+  FOR EACH ROW
+BEGIN
+  IF OLD.technician_id IS NOT NULL AND NOT (OLD.technician_id <=> NEW.technician_id) THEN
+    INSERT INTO sync_change_log (entity_type, entity_id, work_order_id, technician_id, op)
+    VALUES ('task', OLD.id, OLD.work_order_id, OLD.technician_id, 'delete');
+  END IF;
+  INSERT INTO sync_change_log (entity_type, entity_id, work_order_id, technician_id, op)
+  VALUES ('task', NEW.id, NEW.work_order_id, NEW.technician_id, 'upsert');
+END$$
+
+CREATE TRIGGER IF NOT EXISTS trg_wot_change_delete
+  AFTER DELETE ON work_order_tasks
+  FOR EACH ROW
+BEGIN
+  INSERT INTO sync_change_log (entity_type, entity_id, work_order_id, technician_id, op)
+  VALUES ('task', OLD.id, OLD.work_order_id, OLD.technician_id, 'delete');
+END$$
+DELIMITER ;
+
+-- interventions
+DELIMITER $$
+CREATE TRIGGER IF NOT EXISTS trg_int_change_insert
+  AFTER INSERT ON interventions
+  FOR EACH ROW
+BEGIN
+  INSERT INTO sync_change_log (entity_type, entity_id, work_order_id, technician_id, op)
+  VALUES ('intervention', NEW.id, NEW.work_order_id, NEW.technician_id, 'upsert');
+END$$
+
+CREATE TRIGGER IF NOT EXISTS trg_int_change_update
+  AFTER UPDATE ON interventions
+  FOR EACH ROW
+BEGIN
+  IF OLD.technician_id IS NOT NULL AND NOT (OLD.technician_id <=> NEW.technician_id) THEN
+    INSERT INTO sync_change_log (entity_type, entity_id, work_order_id, technician_id, op)
+    VALUES ('intervention', OLD.id, OLD.work_order_id, OLD.technician_id, 'delete');
+  END IF;
+  INSERT INTO sync_change_log (entity_type, entity_id, work_order_id, technician_id, op)
+  VALUES ('intervention', NEW.id, NEW.work_order_id, NEW.technician_id, 'upsert');
+END$$
+
+CREATE TRIGGER IF NOT EXISTS trg_int_change_delete
+  AFTER DELETE ON interventions
+  FOR EACH ROW
+BEGIN
+  INSERT INTO sync_change_log (entity_type, entity_id, work_order_id, technician_id, op)
+  VALUES ('intervention', OLD.id, OLD.work_order_id, OLD.technician_id, 'delete');
+END$$
+DELIMITER ;
+
+-- Purge quotidienne (un appareil plus ancien reçoit reset_required)
+DROP EVENT IF EXISTS purge_sync_change_log;
+CREATE EVENT purge_sync_change_log
+ON SCHEDULE EVERY 1 DAY
+STARTS CURRENT_TIMESTAMP
+DO DELETE FROM sync_change_log WHERE changed_at < NOW() - INTERVAL 30 DAY;
@@ -3,12 +3,9 @@ import datetime
 import os
 import io
 import json
-import requests
-import threading
-import time
 import hashlib
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from flask import Blueprint, render_template, request, jsonify, current_app, session
+from functools import partial
+from flask import Blueprint, render_template, request, jsonify, current_app, session, Response, stream_with_context
 from drive_helpers.google_drive_helper import get_drive_helper
 from utils import get_db_connection
 
@@ -18,6 +15,9 @@ from googleapiclient.http import MediaIoBaseUpload
 
 # Import de la fonction de connexion DB depuis core
 from core.database import db_manager
+from services.openai_client import openai_client, OpenAIError
+from services.llm_cache import llm_cache
+from services.ai_pipeline import AIPipeline
 
 openai_bp = Blueprint('openai', __name__, template_folder='../templates')
 
@@ -29,26 +29,11 @@ OPENAI_TRANSCRIBE_TIMEOUT = int(os.environ.get('OPENAI_TRANSCRIBE_TIMEOUT', '120
 OPENAI_FAST_MODEL = os.environ.get('OPENAI_FAST_MODEL', 'gpt-4o-mini')
 OPENAI_CACHE_TTL = int(os.environ.get('OPENAI_CACHE_TTL', '300'))  # seconds
 OPENAI_MAX_CONTEXT_CHARS = int(os.environ.get('OPENAI_MAX_CONTEXT_CHARS', '6000'))
-OPENAI_PARALLEL_THREADS = int(os.environ.get('OPENAI_PARALLEL_THREADS', '4'))
-
-# Simple in-memory cache to avoid duplicate/combinatorial calls during active sessions
-_ai_response_cache = {}
-_ai_cache_lock = threading.Lock()
-
-def _cache_get(key):
-    with _ai_cache_lock:
-        entry = _ai_response_cache.get(key)
-        if not entry:
-            return None
-        value, expires = entry
-        if time.time() > expires:
-            del _ai_response_cache[key]
-            return None
-        return value
-
-def _cache_set(key, value, ttl=OPENAI_CACHE_TTL):
-    with _ai_cache_lock:
-        _ai_response_cache[key] = (value, time.time() + ttl)
+OPENAI_PARALLEL_THREADS = int(os.environ.get('OPENAI_PARALLEL_THREADS', '7'))
+OPENAI_SUGGESTIONS_DEADLINE = float(os.environ.get('OPENAI_SUGGESTIONS_DEADLINE', '45'))  # seconds
+
+SUGGESTION_SECTIONS = ('diagnostic_steps', 'common_parts', 'repair_procedures', 'safety_warnings',
+                       'time_estimates', 'preventive_maintenance')
 
 def _short_hash(s: str) -> str:
     return hashlib.sha256(s.encode('utf-8')).hexdigest()[:16]
@@ -62,32 +47,121 @@ def _truncate_context(text: str) -> str:
     return text[-OPENAI_MAX_CONTEXT_CHARS:]
 
 
-def _call_openai(payload, api_key, timeout=OPENAI_TIMEOUT):
+# Session HTTP keep-alive, fusion des appels identiques en vol, reprises et métriques ;
+# réponses en cache LRU mémoire + table ai_response_cache (services/llm_cache.py)
+openai_client.cache = llm_cache
+
+
+def _call_openai(payload, api_key, timeout=OPENAI_TIMEOUT, endpoint='default', cache_ttl=None):
     """Centralized OpenAI call with caching and error handling."""
-    chat_url = f"{OPENAI_API_BASE}/v1/chat/completions"
-    key = _short_hash(json.dumps({'payload': payload, 'model': payload.get('model')}))
+    return openai_client.chat_completion(payload, api_key, timeout=timeout,
+                                         endpoint=endpoint, cache_ttl=cache_ttl)
+
+
+def _wants_stream(data):
+    """Le client demande une réponse en flux (champ stream ou Accept: text/event-stream)"""
+    return bool(data.get('stream')) or 'text/event-stream' in (request.headers.get('Accept') or '')
+
+
+def _sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _stream_completion(payload, api_key, timeout, endpoint, cache_ttl=None,
+                       on_complete=None, done_data=None):
+    """
+    Réponse Server-Sent Events : un évènement token par fragment, puis done
+    (ou error). on_complete(texte) n'est appelé que si le flux est complet ;
+    une déconnexion du client ferme le générateur et l'appel amont.
+    """
+    logger = current_app.logger
+
+    def generate():
+        parts = []
+        tokens = openai_client.stream_chat_completion(payload, api_key, timeout=timeout,
+                                                      endpoint=endpoint, cache_ttl=cache_ttl)
+        try:
+            for delta in tokens:
+                parts.append(delta)
+                yield _sse_event('token', {'content': delta})
+        except OpenAIError as e:
+            yield _sse_event('error', {'error': 'AI request failed', 'details': e.details})
+            return
+        except Exception as e:
+            logger.exception('Error streaming OpenAI response')
+            yield _sse_event('error', {'error': str(e)})
+            return
+        finally:
+            tokens.close()
+
+        text = ''.join(parts)
+        if not text:
+            yield _sse_event('error', {'error': 'No response generated'})
+            return
+        if on_complete:
+            try:
+                on_complete(text)
+            except Exception as e:
+                logger.warning('Post-stream hook failed: %s', str(e))
+        yield _sse_event('done', dict(done_data or {}, success=True, content=text))
 
-    # Try the cache first for idempotent calls
-    cached = _cache_get(key)
-    if cached is not None:
-        return cached
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # pas de mise en tampon nginx
+    return response
 
-    headers = {'Authorization': f'Bearer {api_key}', 'Content-Type': 'application/json'}
+
+def _save_summary_note(work_order_id, user_id, summary_type, summary):
+    """Enregistrer le résumé IA dans les notes d'intervention (best-effort)"""
     try:
-        resp = requests.post(chat_url, headers=headers, json=payload, timeout=timeout)
-        if resp.status_code == 200:
-            result = resp.json()
-            _cache_set(key, result)
-            return result
-        else:
-            current_app.logger.error('OpenAI call failed %s %s', resp.status_code, resp.text)
-            return {'error': True, 'status_code': resp.status_code, 'text': resp.text}
-    except requests.Timeout:
-        current_app.logger.exception('OpenAI request timed out')
-        return {'error': True, 'text': 'timeout'}
+        conn2 = db_manager.get_connection()
+        try:
+            with conn2.cursor() as cursor:
+                cursor.execute("""
+                    INSERT INTO intervention_notes (
+                        work_order_id, technician_id, note_type, content
+                    ) VALUES (%s, %s, %s, %s)
+                """, (
+                    work_order_id,
+                    user_id,
+                    'ai_summary',
+                    f"🤖 Résumé IA ({summary_type}):\n\n{summary}"
+                ))
+                conn2.commit()
+        finally:
+            try:
+                conn2.close()
+            except Exception:
+                pass
     except Exception as e:
-        current_app.logger.exception('OpenAI request exception')
-        return {'error': True, 'text': str(e)}
+        # Log but don't fail the request if note saving fails
+        current_app.logger.warning('Failed to save AI summary to notes: %s', str(e))
+
+
+@openai_bp.route('/ai/metrics')
+def openai_metrics():
+    """Métriques du client OpenAI (appels, fusions, reprises, latences, jetons)"""
+    if session.get('user_role') not in ('admin', 'manager'):
+        return jsonify({'error': 'Forbidden'}), 403
+    return jsonify(openai_client.get_metrics())
+
+
+@openai_bp.route('/ai/cache')
+def openai_cache_stats():
+    """Statistiques du cache des réponses IA"""
+    if session.get('user_role') not in ('admin', 'manager'):
+        return jsonify({'error': 'Forbidden'}), 403
+    return jsonify(llm_cache.get_stats())
+
+
+@openai_bp.route('/ai/cache/purge', methods=['POST'])
+def openai_cache_purge():
+    """Purger le cache des réponses IA (admin) : endpoint et expired_only optionnels"""
+    if session.get('user_role') != 'admin':
+        return jsonify({'error': 'Forbidden'}), 403
+    data = request.get_json(silent=True) or {}
+    result = llm_cache.purge(endpoint=data.get('endpoint'), expired_only=bool(data.get('expired_only')))
+    return jsonify({'success': True, **result})
 
 
 @openai_bp.route('/openai/audio')
@@ -203,24 +277,13 @@ def handle_audio_upload():
                 current_app.logger.exception('Drive upload failed')
 
         # Send file to OpenAI transcription endpoint (Whisper)
-        transcribe_url = f"{OPENAI_API_BASE}/v1/audio/transcriptions"
-        files = {
-            'file': (filename, io.BytesIO(file_bytes), file.mimetype or 'application/octet-stream')
-        }
-        data = {
-            'model': 'whisper-1'
-        }
+        file_tuple = (filename, file_bytes, file.mimetype or 'application/octet-stream')
+        transcription_result = openai_client.transcribe(file_tuple, api_key, timeout=OPENAI_TRANSCRIBE_TIMEOUT)
+        if transcription_result.get('error'):
+            current_app.logger.error('OpenAI transcription error: %s %s',
+                                     transcription_result.get('status_code'), transcription_result.get('text'))
+            return jsonify({'error': 'Transcription failed', 'details': transcription_result.get('text')}), 500
 
-        headers = {
-            'Authorization': f'Bearer {api_key}'
-        }
-
-        resp = requests.post(transcribe_url, headers=headers, data=data, files=files, timeout=120)
-        if resp.status_code != 200:
-            current_app.logger.error('OpenAI transcription error: %s %s', resp.status_code, resp.text)
-            return jsonify({'error': 'Transcription failed', 'details': resp.text}), 500
-
-        transcription_result = resp.json()
         text = transcription_result.get('text') or transcription_result.get('transcription') or ''
 
         translated_text = None
@@ -243,7 +306,7 @@ def handle_audio_upload():
             }
             # Use centralized OpenAI helper with a shorter timeout
             payload['messages'][1]['content'] = _truncate_context(payload['messages'][1]['content'])
-            jr = _call_openai(payload, api_key, timeout=OPENAI_TRANSCRIBE_TIMEOUT)
+            jr = _call_openai(payload, api_key, timeout=OPENAI_TRANSCRIBE_TIMEOUT, endpoint='translation')
             if jr and not jr.get('error'):
                 choices = jr.get('choices') or []
                 translated_text = choices[0].get('message', {}).get('content') or choices[0].get('text') if choices else ''
@@ -472,7 +535,17 @@ def generate_summary_route(work_order_id):
             'max_tokens': 2000
         }
 
-        result = _call_openai(payload, api_key, timeout=OPENAI_SUMMARY_TIMEOUT)
+        cache_ttl = llm_cache.ttl_for_work_order('summary', work_order)
+        if _wants_stream(data):
+            user_id = session.get('user_id')
+            return _stream_completion(
+                payload, api_key, OPENAI_SUMMARY_TIMEOUT, 'summary', cache_ttl=cache_ttl,
+                on_complete=lambda summary: _save_summary_note(work_order_id, user_id, summary_type, summary),
+                done_data={'work_order_id': work_order_id, 'summary_type': summary_type}
+            )
+
+        result = _call_openai(payload, api_key, timeout=OPENAI_SUMMARY_TIMEOUT, endpoint='summary',
+                              cache_ttl=cache_ttl)
         if not result or result.get('error'):
             return jsonify({'success': False, 'error': 'AI summary generation failed', 'details': result}), 500
 
@@ -483,29 +556,7 @@ def generate_summary_route(work_order_id):
         summary = choices[0].get('message', {}).get('content', '')
 
         # Save the AI interaction to database for audit trail (best-effort)
-        try:
-            conn2 = db_manager.get_connection()
-            try:
-                with conn2.cursor() as cursor:
-                    cursor.execute("""
-                        INSERT INTO intervention_notes (
-                            work_order_id, technician_id, note_type, content
-                        ) VALUES (%s, %s, %s, %s)
-                    """, (
-                        work_order_id,
-                        session.get('user_id'),
-                        'ai_summary',
-                        f"🤖 Résumé IA ({summary_type}):\n\n{summary}"
-                    ))
-                    conn2.commit()
-            finally:
-                try:
-                    conn2.close()
-                except Exception:
-                    pass
-        except Exception as e:
-            # Log but don't fail the request if note saving fails
-            current_app.logger.warning('Failed to save AI summary to notes: %s', str(e))
+        _save_summary_note(work_order_id, session.get('user_id'), summary_type, summary)
 
         return jsonify({
             'success': True,
@@ -601,7 +652,11 @@ Réponds de manière concise et précise aux questions de suivi. Base tes répon
             'max_tokens': 1000
         }
 
-        result = _call_openai(payload, api_key, timeout=OPENAI_TIMEOUT)
+        if _wants_stream(data):
+            return _stream_completion(payload, api_key, OPENAI_TIMEOUT, 'chat',
+                                      done_data={'work_order_id': work_order_id})
+
+        result = _call_openai(payload, api_key, timeout=OPENAI_TIMEOUT, endpoint='chat')
         if not result or result.get('error'):
             return jsonify({'success': False, 'error': 'AI chat failed', 'details': result}), 500
 
@@ -694,7 +749,8 @@ def generate_ai_summary():
         headers = {'Authorization': f'Bearer {api_key}', 'Content-Type': 'application/json'}
         # Truncate prompt/context and use helper
         payload['messages'][1]['content'] = _truncate_context(payload['messages'][1]['content'])
-        result = _call_openai(payload, api_key, timeout=OPENAI_TIMEOUT)
+        result = _call_openai(payload, api_key, timeout=OPENAI_TIMEOUT, endpoint='summary',
+                              cache_ttl=llm_cache.ttl_for_work_order('summary', work_order))
         if not result or result.get('error'):
             current_app.logger.error('OpenAI summary error: %s', result)
             return jsonify({'error': 'Summary generation failed', 'details': result}), 500
@@ -926,13 +982,19 @@ def get_intelligent_suggestions(work_order_id):
         # Determine language (query param 'lang' or default 'fr')
         lang = request.args.get('lang') or request.args.get('language') or 'fr'
 
+        section = request.args.get('section')
+        if section and section not in SUGGESTION_SECTIONS:
+            return jsonify({'success': False, 'error': 'Unknown section'}), 400
+
         # Perform web research and generate suggestions
-        suggestions = generate_contextual_suggestions(work_order, recent_notes, api_key, language=lang)
+        suggestions, timings = generate_contextual_suggestions(work_order, recent_notes, api_key,
+                                                               language=lang, section=section)
 
         return jsonify({
             'success': True,
             'suggestions': suggestions,
-            'work_order_id': work_order_id
+            'work_order_id': work_order_id,
+            'timings': timings
         })
     except Exception as e:
         current_app.logger.exception('Error generating suggestions')
@@ -969,8 +1031,13 @@ def search_technical_info():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
-def generate_contextual_suggestions(work_order, recent_notes, api_key, language='fr'):
-    """Generate intelligent suggestions based on intervention context"""
+def generate_contextual_suggestions(work_order, recent_notes, api_key, language='fr', section=None):
+    """
+    Generate intelligent suggestions based on intervention context
+
+    Renvoie (suggestions, timings) ; section limite le calcul à une rubrique
+    et à ses dépendances.
+    """
     
     # Build vehicle context
     vehicle_context = {
@@ -985,31 +1052,37 @@ def generate_contextual_suggestions(work_order, recent_notes, api_key, language=
     problem_description = work_order.get('description', '')
     notes_context = '\n'.join([note['content'] for note in recent_notes[:3]])
     
-    # Perform web research for common issues
-    web_research = research_common_issues(vehicle_context, problem_description, api_key)
-    
-    # Parallelize specialist calls to reduce wall time
-    tasks = {
-        'diagnostic_steps': (generate_diagnostic_suggestions, (vehicle_context, problem_description, web_research, api_key, language)),
-        'common_parts': (get_common_parts_for_issue, (vehicle_context, problem_description, api_key, language)),
-        'repair_procedures': (get_repair_procedures, (vehicle_context, problem_description, web_research, api_key, language)),
-        'safety_warnings': (get_safety_warnings, (vehicle_context, problem_description, api_key, language)),
-        'time_estimates': (get_time_estimates, (vehicle_context, problem_description, api_key, language)),
-        'preventive_maintenance': (get_preventive_suggestions, (vehicle_context, api_key, language))
-    }
+    # Seules les étapes de diagnostic et de procédures attendent la recherche ;
+    # les autres partent en même temps qu'elle
+    pipeline = AIPipeline('suggestions', deadline=OPENAI_SUGGESTIONS_DEADLINE,
+                          max_workers=OPENAI_PARALLEL_THREADS)
+    pipeline.add('web_research', partial(research_common_issues, vehicle_context, problem_description, api_key),
+                 default=[])
+    pipeline.add('diagnostic_steps',
+                 partial(generate_diagnostic_suggestions, vehicle_context, problem_description,
+                         api_key=api_key, language=language),
+                 depends=('web_research',))
+    pipeline.add('common_parts', partial(get_common_parts_for_issue, vehicle_context, problem_description, api_key, language))
+    pipeline.add('repair_procedures',
+                 partial(get_repair_procedures, vehicle_context, problem_description,
+                         api_key=api_key, language=language),
+                 depends=('web_research',))
+    pipeline.add('safety_warnings', partial(get_safety_warnings, vehicle_context, problem_description, api_key, language))
+    pipeline.add('time_estimates', partial(get_time_estimates, vehicle_context, problem_description, api_key, language))
+    pipeline.add('preventive_maintenance', partial(get_preventive_suggestions, vehicle_context, api_key, language))
+
+    result = pipeline.run(targets=[section] if section else None)
 
     suggestions = {}
-    with ThreadPoolExecutor(max_workers=OPENAI_PARALLEL_THREADS) as exec:
-        futures = {exec.submit(func, *args): name for name, (func, args) in tasks.items()}
-        for fut in as_completed(futures):
-            name = futures[fut]
-            try:
-                suggestions[name] = fut.result()
-            except Exception as e:
-                suggestions[name] = f'Failed to generate {name}: {str(e)}'
-
-    suggestions['web_research'] = web_research
-    return suggestions
+    for name, value in result.results.items():
+        status = result.timings[name]['status']
+        if status == 'ok' or name == 'web_research':
+            suggestions[name] = value
+        elif status == 'error':
+            suggestions[name] = f"Failed to generate {name}: {result.timings[name].get('error')}"
+        else:
+            suggestions[name] = f"Timed out generating {name}"
+    return suggestions, result.to_dict()
 
 
 def research_common_issues(vehicle_context, problem_description, api_key):
@@ -1043,7 +1116,7 @@ Return only the search queries, one per line."""
         'max_tokens': 200
     }
 
-    result = _call_openai(payload, api_key, timeout=30)
+    result = _call_openai(payload, api_key, timeout=30, endpoint='suggestions')
     if not result or result.get('error'):
         return []
 
@@ -1229,7 +1302,7 @@ def call_openai_for_suggestions(prompt, api_key, specialist_role, language='fr')
         'max_tokens': 1000
     }
 
-    result = _call_openai(payload, api_key, timeout=OPENAI_TIMEOUT)
+    result = _call_openai(payload, api_key, timeout=OPENAI_TIMEOUT, endpoint='suggestions')
     if not result or result.get('error'):
         return f"Error generating {specialist_role} suggestions"
 
@@ -1287,7 +1360,7 @@ Use your automotive knowledge to provide detailed, practical information.
         'Content-Type': 'application/json'
     }
     
-    result = _call_openai(payload, api_key, timeout=OPENAI_TIMEOUT)
+    result = _call_openai(payload, api_key, timeout=OPENAI_TIMEOUT, endpoint='search')
     if not result or result.get('error'):
         return {'error': 'Search failed', 'query': enhanced_query}
 
@@ -4,8 +4,10 @@ Routes API pour Customer 360 - Support du lazy loading et intégration temps ré
 
 from flask import Blueprint, jsonify, render_template, request, current_app
 from core.database import DatabaseManager
+from contextlib import contextmanager
 import json
-from datetime import datetime, timedelta
+from datetime import datetime, date, timedelta
+from decimal import Decimal
 import logging
 
 # Blueprint pour les API Customer 360
@@ -16,77 +18,156 @@ logger = logging.getLogger(__name__)
 # Instance du gestionnaire de base de données
 db_manager = DatabaseManager()
 
+# Agrégats par client (customer_aggregate_snapshots, migration 7.13) : tenus
+# à jour par les triggers de work_orders / invoices / vehicles, leur version
+# (incrémentée aussi par les écritures des tables affichées) sert d'ETag
+SNAPSHOT_FIELDS = ('work_orders_count', 'open_work_orders_count', 'work_orders_revenue',
+                   'last_work_order_at', 'vehicles_count', 'invoices_count',
+                   'invoices_paid_total', 'invoices_outstanding_total')
+
+CUSTOMER_AGGREGATES_QUERY = """
+SELECT 
+    (SELECT COUNT(*) FROM work_orders WHERE customer_id = %(id)s) as work_orders_count,
+    (SELECT COUNT(*) FROM work_orders WHERE customer_id = %(id)s
+        AND status NOT IN ('completed', 'cancelled')) as open_work_orders_count,
+    (SELECT COALESCE(SUM(COALESCE(actual_cost, estimated_cost, 0)), 0)
+        FROM work_orders WHERE customer_id = %(id)s) as work_orders_revenue,
+    (SELECT MAX(created_at) FROM work_orders WHERE customer_id = %(id)s) as last_work_order_at,
+    (SELECT COUNT(*) FROM vehicles WHERE customer_id = %(id)s) as vehicles_count,
+    (SELECT COUNT(*) FROM invoices WHERE customer_id = %(id)s) as invoices_count,
+    (SELECT COALESCE(SUM(total_amount), 0) FROM invoices
+        WHERE customer_id = %(id)s AND status = 'paid') as invoices_paid_total,
+    (SELECT COALESCE(SUM(total_amount), 0) FROM invoices
+        WHERE customer_id = %(id)s AND status IN ('sent', 'open', 'overdue')) as invoices_outstanding_total
+"""
+
+@contextmanager
+def _cursor(cursor=None):
+    """Curseur de l'appelant (bundle, une seule connexion) ou connexion dédiée"""
+    if cursor is not None:
+        yield cursor
+        return
+    connection = db_manager.get_connection()
+    try:
+        with connection.cursor() as own_cursor:
+            yield own_cursor
+    finally:
+        connection.close()
+
+def rebuild_customer_snapshot(customer_id, cursor=None):
+    """Recalculer les agrégats d'un client (sous-requêtes indépendantes, sans produit cartésien)"""
+    with _cursor(cursor) as cur:
+        cur.execute(CUSTOMER_AGGREGATES_QUERY, {'id': customer_id})
+        snapshot = cur.fetchone()
+        try:
+            cur.execute(f"""
+                INSERT INTO customer_aggregate_snapshots (customer_id, {', '.join(SNAPSHOT_FIELDS)})
+                VALUES (%s, {', '.join(['%s'] * len(SNAPSHOT_FIELDS))})
+                ON DUPLICATE KEY UPDATE
+                    {', '.join(f'{field} = VALUES({field})' for field in SNAPSHOT_FIELDS)},
+                    version = version + 1
+            """, [customer_id] + [snapshot[field] for field in SNAPSHOT_FIELDS])
+            cur.execute("SELECT version FROM customer_aggregate_snapshots WHERE customer_id = %s", (customer_id,))
+            snapshot['version'] = cur.fetchone()['version']
+            cur.connection.commit()
+        except Exception as e:
+            # Table absente (migration 7.13 non appliquée) : agrégats servis sans cache HTTP
+            logger.warning(f"⚠️ Instantané client {customer_id} non enregistré: {e}")
+            cur.connection.rollback()
+            snapshot['version'] = None
+    return snapshot
+
+def get_customer_snapshot(customer_id, cursor=None):
+    """Agrégats d'un client (une lecture par clé primaire ; recalcul si absent)"""
+    with _cursor(cursor) as cur:
+        try:
+            cur.execute("SELECT * FROM customer_aggregate_snapshots WHERE customer_id = %s", (customer_id,))
+            snapshot = cur.fetchone()
+        except Exception:
+            snapshot = None
+        if not snapshot:
+            snapshot = rebuild_customer_snapshot(customer_id, cur)
+    return snapshot
+
+def customer_etag(customer_id, snapshot):
+    """ETag d'une réponse Customer 360 : version de l'instantané et jour (graphiques glissants)"""
+    if not snapshot or snapshot.get('version') is None:
+        return None
+    return f"c360-{customer_id}-{snapshot['version']}-{datetime.now():%Y%m%d}"
+
+def _not_modified(etag):
+    return etag is not None and request.if_none_match.contains(etag)
+
+def _cacheable(payload, etag):
+    """Réponse JSON revalidée à chaque affichage (304 tant que la version ne change pas)"""
+    response = jsonify(payload)
+    if etag:
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def _not_modified_response(etag):
+    response = current_app.response_class(status=304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def _json_ready(value):
+    """Dates en ISO 8601 et décimaux en float, récursivement"""
+    if isinstance(value, dict):
+        return {key: _json_ready(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_json_ready(item) for item in value]
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+def _profile_stats(snapshot):
+    return {
+        'total_work_orders': int(snapshot['work_orders_count'] or 0),
+        'open_work_orders': int(snapshot['open_work_orders_count'] or 0),
+        'total_vehicles': int(snapshot['vehicles_count'] or 0),
+        'total_revenue': float(snapshot['work_orders_revenue'] or 0),
+        'total_invoices': int(snapshot['invoices_count'] or 0),
+        'total_paid': float(snapshot['invoices_paid_total'] or 0),
+        'total_outstanding': float(snapshot['invoices_outstanding_total'] or 0),
+        'last_work_order_at': snapshot['last_work_order_at'].isoformat() if snapshot['last_work_order_at'] else None
+    }
+
+def _fetch_customer_profile(cursor, customer_id):
+    cursor.execute("""
+    SELECT id, name, company, email, phone, mobile, customer_type, 
+           created_at, last_activity_date, status, is_active
+    FROM customers 
+    WHERE id = %s
+    """, (customer_id,))
+    return cursor.fetchone()
+
 @customer360_api.route('/<int:customer_id>/profile')
 def get_customer_profile(customer_id):
     """
     Récupère les informations de profil d'un client
+    Statistiques lues dans l'instantané du client ; ETag sur sa version
     """
     try:
-        connection = db_manager.get_connection()
-        if not connection:
-            return jsonify({'success': False, 'error': 'Erreur de connexion à la base de données'}), 500
-            
-        cursor = connection.cursor()
-        
-        # Récupérer les informations de base du client
-        query = """
-        SELECT id, name, company, email, phone, mobile, customer_type, 
-               created_at, last_activity_date, status, is_active
-        FROM customers 
-        WHERE id = %s
-        """
-        cursor.execute(query, (customer_id,))
-        customer = cursor.fetchone()
-        
-        if not customer:
-            return jsonify({'success': False, 'error': 'Client non trouvé'}), 404
+        with _cursor() as cursor:
+            snapshot = get_customer_snapshot(customer_id, cursor)
+            etag = customer_etag(customer_id, snapshot)
+            if _not_modified(etag):
+                return _not_modified_response(etag)
             
-        # Convertir en dict si nécessaire (PyMySQL retourne déjà des dicts avec DictCursor)
-        if isinstance(customer, tuple):
-            customer = {
-                'id': customer[0],
-                'name': customer[1], 
-                'company': customer[2],
-                'email': customer[3],
-                'phone': customer[4],
-                'mobile': customer[5],
-                'customer_type': customer[6],
-                'created_at': customer[7],
-                'last_activity_date': customer[8],
-                'status': customer[9],
-                'is_active': customer[10]
-            }
+            customer = _fetch_customer_profile(cursor, customer_id)
+            if not customer:
+                return jsonify({'success': False, 'error': 'Client non trouvé'}), 404
         
-        # Récupérer quelques statistiques rapides
-        stats_query = """
-        SELECT 
-            COUNT(DISTINCT wo.id) as total_work_orders,
-            COUNT(DISTINCT v.id) as total_vehicles,
-            COALESCE(SUM(COALESCE(wo.actual_cost, wo.estimated_cost, 0)), 0) as total_revenue
-        FROM customers c
-        LEFT JOIN work_orders wo ON c.id = wo.customer_id  
-        LEFT JOIN vehicles v ON c.id = v.customer_id
-        WHERE c.id = %s
-        """
-        cursor.execute(stats_query, (customer_id,))
-        stats = cursor.fetchone()
-        
-        if isinstance(stats, tuple):
-            stats = {
-                'total_work_orders': stats[0] or 0,
-                'total_vehicles': stats[1] or 0, 
-                'total_revenue': float(stats[2]) if stats[2] else 0.0
-            }
-        
-        cursor.close()
-        connection.close()
-        
-        return jsonify({
+        return _cacheable({
             'success': True,
             'customer': customer,
-            'stats': stats,
+            'stats': _profile_stats(snapshot),
             'timestamp': datetime.now().isoformat()
-        })
+        }, etag)
         
     except Exception as e:
         logger.error(f"Erreur lors de la récupération du profil pour le client {customer_id}: {e}")
@@ -125,6 +206,62 @@ def load_section(customer_id, section_name):
         logger.error(f"Erreur lors du chargement de la section {section_name} pour le client {customer_id}: {str(e)}")
         return jsonify({'error': 'Erreur serveur'}), 500
 
+def _fetch_activities(cursor, customer_id, page=1, per_page=10, search='', activity_type='', period=''):
+    """Activités d'un client (page demandée, total filtré)"""
+    base_query = """
+    SELECT 
+        id,
+        activity_type,
+        title,
+        description,
+        reference_data,
+        created_at,
+        actor_name
+    FROM customer_activities 
+    WHERE customer_id = %s
+    """
+    
+    params = [customer_id]
+    conditions = []
+    
+    # Ajouter les filtres
+    if search:
+        conditions.append("(title LIKE %s OR description LIKE %s)")
+        params.extend([f'%{search}%', f'%{search}%'])
+    
+    if activity_type:
+        conditions.append("activity_type = %s")
+        params.append(activity_type)
+    
+    if period:
+        period_conditions = get_period_condition(period)
+        if period_conditions:
+            conditions.append(period_conditions['condition'])
+            params.extend(period_conditions['params'])
+    
+    # Ajouter les conditions à la requête
+    if conditions:
+        base_query += " AND " + " AND ".join(conditions)
+    
+    # Compter le total
+    count_query = f"SELECT COUNT(*) as total FROM ({base_query}) as filtered"
+    cursor.execute(count_query, params)
+    total_count = cursor.fetchone()['total']
+    
+    # Ajouter la pagination
+    base_query += " ORDER BY created_at DESC LIMIT %s OFFSET %s"
+    params.extend([per_page, (page - 1) * per_page])
+    
+    cursor.execute(base_query, params)
+    activities = cursor.fetchall()
+    
+    # Formater les dates
+    for activity in activities:
+        if activity['created_at']:
+            activity['created_at'] = activity['created_at'].isoformat()
+    
+    return activities, total_count
+
 @customer360_api.route('/<int:customer_id>/activity')
 def get_customer_activity(customer_id):
     """
@@ -137,65 +274,9 @@ def get_customer_activity(customer_id):
         activity_type = request.args.get('type', '')
         period = request.args.get('period', '')
         
-        # Construire la requête
-        connection = db_manager.get_connection()
-        cursor = connection.cursor()
-        
-        # Base query
-        base_query = """
-        SELECT 
-            id,
-            activity_type,
-            title,
-            description,
-            reference_data,
-            created_at,
-            actor_name
-        FROM customer_activities 
-        WHERE customer_id = %s
-        """
-        
-        params = [customer_id]
-        conditions = []
-        
-        # Ajouter les filtres
-        if search:
-            conditions.append("(title LIKE %s OR description LIKE %s)")
-            params.extend([f'%{search}%', f'%{search}%'])
-        
-        if activity_type:
-            conditions.append("activity_type = %s")
-            params.append(activity_type)
-        
-        if period:
-            period_conditions = get_period_condition(period)
-            if period_conditions:
-                conditions.append(period_conditions['condition'])
-                params.extend(period_conditions['params'])
-        
-        # Ajouter les conditions à la requête
-        if conditions:
-            base_query += " AND " + " AND ".join(conditions)
-        
-        # Compter le total
-        count_query = f"SELECT COUNT(*) as total FROM ({base_query}) as filtered"
-        cursor.execute(count_query, params)
-        total_count = cursor.fetchone()['total']
-        
-        # Ajouter la pagination
-        base_query += " ORDER BY created_at DESC LIMIT %s OFFSET %s"
-        params.extend([per_page, (page - 1) * per_page])
-        
-        cursor.execute(base_query, params)
-        activities = cursor.fetchall()
-        
-        # Formater les dates
-        for activity in activities:
-            if activity['created_at']:
-                activity['created_at'] = activity['created_at'].isoformat()
-        
-        cursor.close()
-        connection.close()
+        with _cursor() as cursor:
+            activities, total_count = _fetch_activities(cursor, customer_id, page, per_page,
+                                                        search, activity_type, period)
         
         return jsonify({
             'success': True,
@@ -209,6 +290,48 @@ def get_customer_activity(customer_id):
         logger.error(f"Erreur lors de la récupération de l'activité pour le client {customer_id}: {str(e)}")
         return jsonify({'success': False, 'error': 'Erreur serveur'}), 500
 
+def _fetch_invoices(cursor, customer_id, page=1, per_page=10, status=''):
+    """Factures d'un client (page demandée, total filtré)"""
+    base_query = """
+    SELECT 
+        id,
+        number,
+        created_at,
+        due_date,
+        total_amount,
+        status
+    FROM invoices 
+    WHERE customer_id = %s
+    """
+    
+    params = [customer_id]
+    
+    if status:
+        base_query += " AND status = %s"
+        params.append(status)
+    
+    # Compter le total
+    count_query = f"SELECT COUNT(*) as total FROM ({base_query}) as filtered"
+    cursor.execute(count_query, params)
+    total_count = cursor.fetchone()['total']
+    
+    # Ajouter la pagination
+    base_query += " ORDER BY created_at DESC LIMIT %s OFFSET %s"
+    params.extend([per_page, (page - 1) * per_page])
+    
+    cursor.execute(base_query, params)
+    invoices = cursor.fetchall()
+    
+    # Formater les données
+    for invoice in invoices:
+        if invoice['created_at']:
+            invoice['created_at'] = invoice['created_at'].isoformat()
+        if invoice['due_date']:
+            invoice['due_date'] = invoice['due_date'].isoformat()
+        invoice['total_amount'] = float(invoice['total_amount']) if invoice['total_amount'] else 0
+    
+    return invoices, total_count
+
 @customer360_api.route('/<int:customer_id>/invoices')
 def get_customer_invoices(customer_id):
     """
@@ -219,49 +342,8 @@ def get_customer_invoices(customer_id):
         per_page = int(request.args.get('per_page', 10))
         status = request.args.get('status', '')
         
-        connection = db_manager.get_connection()
-        cursor = connection.cursor()
-        
-        base_query = """
-        SELECT 
-            id,
-            number,
-            created_at,
-            due_date,
-            total_amount,
-            status
-        FROM invoices 
-        WHERE customer_id = %s
-        """
-        
-        params = [customer_id]
-        
-        if status:
-            base_query += " AND status = %s"
-            params.append(status)
-        
-        # Compter le total
-        count_query = f"SELECT COUNT(*) as total FROM ({base_query}) as filtered"
-        cursor.execute(count_query, params)
-        total_count = cursor.fetchone()['total']
-        
-        # Ajouter la pagination
-        base_query += " ORDER BY created_at DESC LIMIT %s OFFSET %s"
-        params.extend([per_page, (page - 1) * per_page])
-        
-        cursor.execute(base_query, params)
-        invoices = cursor.fetchall()
-        
-        # Formater les données
-        for invoice in invoices:
-            if invoice['created_at']:
-                invoice['created_at'] = invoice['created_at'].isoformat()
-            if invoice['due_date']:
-                invoice['due_date'] = invoice['due_date'].isoformat()
-            invoice['total_amount'] = float(invoice['total_amount']) if invoice['total_amount'] else 0
-        
-        cursor.close()
-        connection.close()
+        with _cursor() as cursor:
+            invoices, total_count = _fetch_invoices(cursor, customer_id, page, per_page, status)
         
         return jsonify({
             'success': True,
@@ -274,6 +356,62 @@ def get_customer_invoices(customer_id):
         logger.error(f"Erreur lors de la récupération des factures pour le client {customer_id}: {str(e)}")
         return jsonify({'success': False, 'error': 'Erreur serveur'}), 500
 
+def _fetch_documents(cursor, customer_id, page=1, per_page=12, search='', doc_type='', status=''):
+    """Documents d'un client (page demandée, total filtré)"""
+    base_query = """
+    SELECT 
+        id,
+        title,
+        filename,
+        file_size,
+        document_type,
+        status,
+        is_signed,
+        created_at,
+        updated_at
+    FROM customer_documents 
+    WHERE customer_id = %s
+    """
+    
+    params = [customer_id]
+    conditions = []
+    
+    if search:
+        conditions.append("(title LIKE %s OR filename LIKE %s)")
+        params.extend([f'%{search}%', f'%{search}%'])
+    
+    if doc_type:
+        conditions.append("document_type = %s")
+        params.append(doc_type)
+    
+    if status:
+        conditions.append("status = %s")
+        params.append(status)
+    
+    if conditions:
+        base_query += " AND " + " AND ".join(conditions)
+    
+    # Compter le total
+    count_query = f"SELECT COUNT(*) as total FROM ({base_query}) as filtered"
+    cursor.execute(count_query, params)
+    total_count = cursor.fetchone()['total']
+    
+    # Ajouter la pagination
+    base_query += " ORDER BY created_at DESC LIMIT %s OFFSET %s"
+    params.extend([per_page, (page - 1) * per_page])
+    
+    cursor.execute(base_query, params)
+    documents = cursor.fetchall()
+    
+    # Formater les données
+    for doc in documents:
+        if doc['created_at']:
+            doc['created_at'] = doc['created_at'].isoformat()
+        if doc['updated_at']:
+            doc['updated_at'] = doc['updated_at'].isoformat()
+    
+    return documents, total_count
+
 @customer360_api.route('/<int:customer_id>/documents')
 def get_customer_documents(customer_id):
     """
@@ -286,63 +424,9 @@ def get_customer_documents(customer_id):
         doc_type = request.args.get('type', '')
         status = request.args.get('status', '')
         
-        connection = db_manager.get_connection()
-        cursor = connection.cursor()
-        
-        base_query = """
-        SELECT 
-            id,
-            title,
-            filename,
-            file_size,
-            document_type,
-            status,
-            is_signed,
-            created_at,
-            updated_at
-        FROM customer_documents 
-        WHERE customer_id = %s
-        """
-        
-        params = [customer_id]
-        conditions = []
-        
-        if search:
-            conditions.append("(title LIKE %s OR filename LIKE %s)")
-            params.extend([f'%{search}%', f'%{search}%'])
-        
-        if doc_type:
-            conditions.append("document_type = %s")
-            params.append(doc_type)
-        
-        if status:
-            conditions.append("status = %s")
-            params.append(status)
-        
-        if conditions:
-            base_query += " AND " + " AND ".join(conditions)
-        
-        # Compter le total
-        count_query = f"SELECT COUNT(*) as total FROM ({base_query}) as filtered"
-        cursor.execute(count_query, params)
-        total_count = cursor.fetchone()['total']
-        
-        # Ajouter la pagination
-        base_query += " ORDER BY created_at DESC LIMIT %s OFFSET %s"
-        params.extend([per_page, (page - 1) * per_page])
-        
-        cursor.execute(base_query, params)
-        documents = cursor.fetchall()
-        
-        # Formater les données
-        for doc in documents:
-            if doc['created_at']:
-                doc['created_at'] = doc['created_at'].isoformat()
-            if doc['updated_at']:
-                doc['updated_at'] = doc['updated_at'].isoformat()
-        
-        cursor.close()
-        connection.close()
+        with _cursor() as cursor:
+            documents, total_count = _fetch_documents(cursor, customer_id, page, per_page,
+                                                      search, doc_type, status)
         
         return jsonify({
             'success': True,
@@ -375,6 +459,56 @@ def get_customer_analytics(customer_id):
         logger.error(f"Erreur lors de la récupération des analytics pour le client {customer_id}: {str(e)}")
         return jsonify({'success': False, 'error': 'Erreur serveur'}), 500
 
+def _fetch_revenue_chart(cursor, customer_id, period='6m'):
+    """Revenus payés par mois (ou trimestre sur 2 ans) : (libellés, valeurs)"""
+    # Calculer les données selon la période
+    end_date = datetime.now()
+    if period == '6m':
+        start_date = end_date - timedelta(days=180)
+        interval = 'month'
+    elif period == '1y':
+        start_date = end_date - timedelta(days=365)
+        interval = 'month'
+    elif period == '2y':
+        start_date = end_date - timedelta(days=730)
+        interval = 'quarter'
+    else:
+        start_date = end_date - timedelta(days=180)
+        interval = 'month'
+    
+    # Requête pour les revenus par période
+    if interval == 'month':
+        query = """
+        SELECT 
+            DATE_FORMAT(created_at, '%%Y-%%m') as period,
+            SUM(total_amount) as revenue
+        FROM invoices 
+        WHERE customer_id = %s 
+        AND created_at >= %s 
+        AND status = 'paid'
+        GROUP BY DATE_FORMAT(created_at, '%%Y-%%m')
+        ORDER BY period
+        """
+    else:  # quarter
+        query = """
+        SELECT 
+            CONCAT(YEAR(created_at), '-Q', QUARTER(created_at)) as period,
+            SUM(total_amount) as revenue
+        FROM invoices 
+        WHERE customer_id = %s 
+        AND created_at >= %s 
+        AND status = 'paid'
+        GROUP BY YEAR(created_at), QUARTER(created_at)
+        ORDER BY period
+        """
+    
+    cursor.execute(query, [customer_id, start_date])
+    results = cursor.fetchall()
+    
+    labels = [result['period'] for result in results]
+    values = [float(result['revenue']) if result['revenue'] else 0 for result in results]
+    return labels, values
+
 @customer360_api.route('/<int:customer_id>/revenue-chart')
 def get_revenue_chart_data(customer_id):
     """
@@ -383,58 +517,8 @@ def get_revenue_chart_data(customer_id):
     try:
         period = request.args.get('period', '6m')
         
-        # Calculer les données selon la période
-        end_date = datetime.now()
-        if period == '6m':
-            start_date = end_date - timedelta(days=180)
-            interval = 'month'
-        elif period == '1y':
-            start_date = end_date - timedelta(days=365)
-            interval = 'month'
-        elif period == '2y':
-            start_date = end_date - timedelta(days=730)
-            interval = 'quarter'
-        else:
-            start_date = end_date - timedelta(days=180)
-            interval = 'month'
-        
-        connection = db_manager.get_connection()
-        cursor = connection.cursor()
-        
-        # Requête pour les revenus par période
-        if interval == 'month':
-            query = """
-            SELECT 
-                DATE_FORMAT(created_at, '%%Y-%%m') as period,
-                SUM(total_amount) as revenue
-            FROM invoices 
-            WHERE customer_id = %s 
-            AND created_at >= %s 
-            AND status = 'paid'
-            GROUP BY DATE_FORMAT(created_at, '%%Y-%%m')
-            ORDER BY period
-            """
-        else:  # quarter
-            query = """
-            SELECT 
-                CONCAT(YEAR(created_at), '-Q', QUARTER(created_at)) as period,
-                SUM(total_amount) as revenue
-            FROM invoices 
-            WHERE customer_id = %s 
-            AND created_at >= %s 
-            AND status = 'paid'
-            GROUP BY YEAR(created_at), QUARTER(created_at)
-            ORDER BY period
-            """
-        
-        cursor.execute(query, [customer_id, start_date])
-        results = cursor.fetchall()
-        
-        labels = [result['period'] for result in results]
-        values = [float(result['revenue']) if result['revenue'] else 0 for result in results]
-        
-        cursor.close()
-        connection.close()
+        with _cursor() as cursor:
+            labels, values = _fetch_revenue_chart(cursor, customer_id, period)
         
         return jsonify({
             'success': True,
@@ -446,51 +530,52 @@ def get_revenue_chart_data(customer_id):
         logger.error(f"Erreur lors de la récupération des données de revenus pour le client {customer_id}: {str(e)}")
         return jsonify({'success': False, 'error': 'Erreur serveur'}), 500
 
+def _fetch_consents(cursor, customer_id):
+    """Consentements RGPD d'un client, aux noms de champs attendus par l'interface"""
+    query = """
+    SELECT 
+        c.id,
+        c.consent_type,
+        c.purpose_description,
+        c.legal_basis,
+        c.is_active,
+        c.consent_given_at,
+        c.consent_withdrawn_at,
+        c.source,
+        c.created_at
+    FROM customer_consents c
+    WHERE c.customer_id = %s
+    ORDER BY c.created_at DESC
+    """
+    
+    cursor.execute(query, [customer_id])
+    consents = cursor.fetchall()
+    
+    # Calculer le statut RGPD global
+    gdpr_status = calculate_gdpr_status(customer_id, consents)
+    
+    # Formater les dates et adapter aux nouveaux noms de colonnes
+    for consent in consents:
+        if consent.get('consent_given_at'):
+            consent['granted_at'] = consent['consent_given_at'].isoformat()
+            consent['granted'] = consent['is_active']
+        if consent.get('consent_withdrawn_at'):
+            consent['withdrawn_at'] = consent['consent_withdrawn_at'].isoformat()
+        consent['purpose'] = consent.get('consent_type')
+        consent['description'] = consent.get('purpose_description')
+        if consent['created_at']:
+            consent['created_at'] = consent['created_at'].isoformat()
+    
+    return consents, gdpr_status
+
 @customer360_api.route('/<int:customer_id>/consents')
 def get_customer_consents(customer_id):
     """
     API pour récupérer les consentements RGPD du client
     """
     try:
-        connection = db_manager.get_connection()
-        cursor = connection.cursor()
-        
-        query = """
-        SELECT 
-            c.id,
-            c.consent_type,
-            c.purpose_description,
-            c.legal_basis,
-            c.is_active,
-            c.consent_given_at,
-            c.consent_withdrawn_at,
-            c.source,
-            c.created_at
-        FROM customer_consents c
-        WHERE c.customer_id = %s
-        ORDER BY c.created_at DESC
-        """
-        
-        cursor.execute(query, [customer_id])
-        consents = cursor.fetchall()
-        
-        # Calculer le statut RGPD global
-        gdpr_status = calculate_gdpr_status(customer_id, consents)
-        
-        # Formater les dates et adapter aux nouveaux noms de colonnes
-        for consent in consents:
-            if consent.get('consent_given_at'):
-                consent['granted_at'] = consent['consent_given_at'].isoformat()
-                consent['granted'] = consent['is_active']
-            if consent.get('consent_withdrawn_at'):
-                consent['withdrawn_at'] = consent['consent_withdrawn_at'].isoformat()
-            consent['purpose'] = consent.get('consent_type')
-            consent['description'] = consent.get('purpose_description')
-            if consent['created_at']:
-                consent['created_at'] = consent['created_at'].isoformat()
-        
-        cursor.close()
-        connection.close()
+        with _cursor() as cursor:
+            consents, gdpr_status = _fetch_consents(cursor, customer_id)
         
         return jsonify({
             'success': True,
@@ -502,6 +587,88 @@ def get_customer_consents(customer_id):
         logger.error(f"Erreur lors de la récupération des consentements pour le client {customer_id}: {str(e)}")
         return jsonify({'success': False, 'error': 'Erreur serveur'}), 500
 
+# Sections du bundle, dans l'ordre des onglets
+BUNDLE_SECTIONS = ('profile', 'activity', 'invoices', 'documents', 'analytics', 'revenue_chart', 'consents')
+
+def _load_bundle_section(cursor, customer_id, section):
+    """Données d'une section du bundle (premières pages, comme au premier affichage de l'onglet)"""
+    if section == 'profile':
+        return {
+            'vehicles': get_customer_vehicles(customer_id, cursor),
+            'addresses': get_customer_addresses_data(customer_id, cursor),
+            'contacts': get_customer_contacts(customer_id, cursor)
+        }
+    if section == 'activity':
+        activities, total_count = _fetch_activities(cursor, customer_id)
+        return {'activities': activities, 'total_count': total_count}
+    if section == 'invoices':
+        invoices, total_count = _fetch_invoices(cursor, customer_id)
+        return {'invoices': invoices, 'total_count': total_count}
+    if section == 'documents':
+        documents, total_count = _fetch_documents(cursor, customer_id)
+        return {'documents': documents, 'total_count': total_count}
+    if section == 'analytics':
+        return calculate_customer_analytics(customer_id)
+    if section == 'revenue_chart':
+        labels, values = _fetch_revenue_chart(cursor, customer_id)
+        return {'labels': labels, 'values': values}
+    if section == 'consents':
+        consents, gdpr_status = _fetch_consents(cursor, customer_id)
+        return {'consents': consents, 'gdpr_status': gdpr_status}
+    return None
+
+@customer360_api.route('/<int:customer_id>/bundle')
+def get_customer_bundle(customer_id):
+    """
+    Toutes les sections Customer 360 en un appel, sur une seule connexion
+    
+    ?sections=activity,invoices limite la réponse. La version de l'instantané
+    est lue en premier : si elle correspond à If-None-Match, réponse 304 sans
+    autre requête. Une section en erreur est signalée dans 'errors' sans
+    empêcher les autres.
+    """
+    requested = request.args.get('sections')
+    sections = [name for name in (requested.split(',') if requested else BUNDLE_SECTIONS)
+                if name in BUNDLE_SECTIONS]
+    
+    try:
+        with _cursor() as cursor:
+            snapshot = get_customer_snapshot(customer_id, cursor)
+            etag = customer_etag(customer_id, snapshot)
+            if etag and requested:
+                etag = f"{etag}-{'.'.join(sections)}"
+            if _not_modified(etag):
+                return _not_modified_response(etag)
+            
+            customer = _fetch_customer_profile(cursor, customer_id)
+            if not customer:
+                return jsonify({'success': False, 'error': 'Client non trouvé'}), 404
+            
+            payload = {
+                'success': True,
+                'customer': customer,
+                'stats': _profile_stats(snapshot),
+                'version': snapshot.get('version'),
+                'errors': {}
+            }
+            for section in sections:
+                try:
+                    payload[section] = _load_bundle_section(cursor, customer_id, section)
+                except Exception as e:
+                    # Table absente ou requête en échec : les autres sections restent servies
+                    logger.warning(f"⚠️ Section {section} du client {customer_id} indisponible: {e}")
+                    cursor.connection.rollback()
+                    payload[section] = None
+                    payload['errors'][section] = 'Section indisponible'
+        
+        payload['timestamp'] = datetime.now().isoformat()
+        # Une réponse partielle ne doit pas être servie en 304 ensuite
+        return _cacheable(_json_ready(payload), None if payload['errors'] else etag)
+        
+    except Exception as e:
+        logger.error(f"Erreur lors de la récupération du bundle pour le client {customer_id}: {e}")
+        return jsonify({'success': False, 'error': 'Erreur serveur'}), 500
+
 @customer360_api.route('/<int:customer_id>/send-email', methods=['POST'])
 def send_customer_email(customer_id):
     """
@@ -544,30 +711,18 @@ def send_customer_email(customer_id):
 # Fonctions utilitaires
 
 def get_customer_data(customer_id):
-    """Récupérer les données de base du client"""
+    """Récupérer les données de base du client (compteurs issus de l'instantané)"""
     try:
-        connection = db_manager.get_connection()
-        cursor = connection.cursor()
-        
-        query = """
-        SELECT 
-            c.*,
-            COUNT(DISTINCT v.id) as vehicles_count,
-            COUNT(DISTINCT wo.id) as work_orders_count,
-            COALESCE(SUM(i.total_amount), 0) as total_spent
-        FROM customers c
-        LEFT JOIN vehicles v ON c.id = v.customer_id
-        LEFT JOIN work_orders wo ON c.id = wo.customer_id
-        LEFT JOIN invoices i ON c.id = i.customer_id AND i.status = 'paid'
-        WHERE c.id = %s
-        GROUP BY c.id
-        """
-        
-        cursor.execute(query, [customer_id])
-        customer = cursor.fetchone()
-        
-        cursor.close()
-        connection.close()
+        with _cursor() as cursor:
+            cursor.execute("SELECT * FROM customers WHERE id = %s", [customer_id])
+            customer = cursor.fetchone()
+            if not customer:
+                return None
+            
+            snapshot = get_customer_snapshot(customer_id, cursor)
+            customer['vehicles_count'] = snapshot['vehicles_count']
+            customer['work_orders_count'] = snapshot['work_orders_count']
+            customer['total_spent'] = snapshot['invoices_paid_total']
         
         return customer
     except Exception as e:
@@ -717,72 +872,57 @@ def calculate_gdpr_status(customer_id, consents=None): return {'compliant': True
 def get_gdpr_requests(customer_id): return []
 
 # Fonctions pour la section profile
-def get_customer_vehicles(customer_id):
+def get_customer_vehicles(customer_id, cursor=None):
     """Récupérer les véhicules d'un client"""
     try:
-        connection = db_manager.get_connection()
-        cursor = connection.cursor()
-        
-        cursor.execute("""
-            SELECT id, customer_id, make, model, year, license_plate, vin, color, notes, created_at, updated_at
-            FROM vehicles 
-            WHERE customer_id = %s 
-            ORDER BY created_at DESC
-        """, [customer_id])
-        
-        vehicles = cursor.fetchall()
-        
-        cursor.close()
-        connection.close()
+        with _cursor(cursor) as cur:
+            cur.execute("""
+                SELECT id, customer_id, make, model, year, license_plate, vin, color, notes, created_at, updated_at
+                FROM vehicles 
+                WHERE customer_id = %s 
+                ORDER BY created_at DESC
+            """, [customer_id])
+            
+            vehicles = cur.fetchall()
         
         return vehicles or []
     except Exception as e:
         logger.error(f"Erreur lors de la récupération des véhicules pour le client {customer_id}: {str(e)}")
         return []
 
-def get_customer_addresses_data(customer_id):
+def get_customer_addresses_data(customer_id, cursor=None):
     """Récupérer les adresses d'un client"""
     try:
-        connection = db_manager.get_connection()
-        cursor = connection.cursor()
-        
-        cursor.execute("""
-            SELECT id, customer_id, address_type, label, address_line_1, address_line_2,
-                   city, state_province, postal_code, country, latitude, longitude,
-                   is_primary, is_verified, delivery_instructions, access_code,
-                   contact_name, contact_phone, created_at, updated_at
-            FROM customer_addresses 
-            WHERE customer_id = %s 
-            ORDER BY is_primary DESC, created_at DESC
-        """, [customer_id])
-        
-        addresses = cursor.fetchall()
-        
-        cursor.close()
-        connection.close()
+        with _cursor(cursor) as cur:
+            cur.execute("""
+                SELECT id, customer_id, address_type, label, address_line_1, address_line_2,
+                       city, state_province, postal_code, country, latitude, longitude,
+                       is_primary, is_verified, delivery_instructions, access_code,
+                       contact_name, contact_phone, created_at, updated_at
+                FROM customer_addresses 
+                WHERE customer_id = %s 
+                ORDER BY is_primary DESC, created_at DESC
+            """, [customer_id])
+            
+            addresses = cur.fetchall()
         
         return addresses or []
     except Exception as e:
         logger.error(f"Erreur lors de la récupération des adresses pour le client {customer_id}: {str(e)}")
         return []
 
-def get_customer_contacts(customer_id):
+def get_customer_contacts(customer_id, cursor=None):
     """Récupérer les contacts d'un client"""
     try:
-        connection = db_manager.get_connection()
-        cursor = connection.cursor()
-        
-        cursor.execute("""
-            SELECT id, customer_id, first_name, last_name, phone, email, role, is_primary, notes, created_at, updated_at
-            FROM customer_contacts 
-            WHERE customer_id = %s 
-            ORDER BY is_primary DESC, created_at DESC
-        """, [customer_id])
-        
-        contacts = cursor.fetchall()
-        
-        cursor.close()
-        connection.close()
+        with _cursor(cursor) as cur:
+            cur.execute("""
+                SELECT id, customer_id, first_name, last_name, phone, email, role, is_primary, notes, created_at, updated_at
+                FROM customer_contacts 
+                WHERE customer_id = %s 
+                ORDER BY is_primary DESC, created_at DESC
+            """, [customer_id])
+            
+            contacts = cur.fetchall()
         
         return contacts or []
     except Exception as e:
@@ -803,18 +943,10 @@ def get_customer_basic_stats(customer_id):
             'avg_rating': 0
         }
         
-        # Nombre de commandes/bons de travail
-        cursor.execute("""
-            SELECT COUNT(*) as total_orders, 
-                   COALESCE(SUM(total_amount), 0) as total_revenue
-            FROM work_orders 
-            WHERE customer_id = %s
-        """, [customer_id])
-        
-        result = cursor.fetchone()
-        if result:
-            stats['total_orders'] = result['total_orders'] or 0
-            stats['total_revenue'] = float(result['total_revenue'] or 0)
+        # Nombre de bons de travail et revenus (instantané du client)
+        snapshot = get_customer_snapshot(customer_id, cursor)
+        stats['total_orders'] = snapshot['work_orders_count'] or 0
+        stats['total_revenue'] = float(snapshot['work_orders_revenue'] or 0)
         
         # Nombre d'interventions
         cursor.execute("""
@@ -7,6 +7,7 @@ from flask import Blueprint, request, jsonify, session
 import pymysql
 from core.config import get_db_config
 from core.utils import log_info, log_error, log_warning
+from core.search import search_service
 from datetime import datetime
 import json
 
@@ -930,6 +931,43 @@ def dashboard_stats():
         log_error(f"Error in dashboard_stats endpoint: {e}")
         return jsonify({'error': f'Internal server error: {str(e)}'}), 500
 
+@bp.route('/search/typeahead', methods=['GET'])
+def search_typeahead():
+    """Saisie semi-automatique : meilleurs bons de travail et clients pour un terme"""
+    try:
+        query = request.args.get('q', '')
+        k = request.args.get('k', 8, type=int)
+        
+        return jsonify(search_service.typeahead(query, k))
+        
+    except Exception as e:
+        log_error(f"Error in search typeahead: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@bp.route('/search', methods=['GET'])
+def search():
+    """Recherche plein texte paginée (type=work_orders|customers)"""
+    try:
+        query = request.args.get('q', '')
+        search_type = request.args.get('type', 'work_orders')
+        limit = request.args.get('limit', 20, type=int)
+        offset = request.args.get('offset', 0, type=int)
+        
+        if search_type == 'customers':
+            page = search_service.search_customers(query, limit=limit, offset=offset)
+        elif search_type == 'work_orders':
+            page = search_service.search_work_orders(query, limit=limit, offset=offset)
+        else:
+            return jsonify({'error': 'Invalid search type'}), 400
+        
+        page['query'] = query
+        page['offset'] = offset
+        return jsonify(page)
+        
+    except Exception as e:
+        log_error(f"Error in search endpoint: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
 @bp.route('/online-users', methods=['GET'])
 def online_users():
     """Récupérer la liste des utilisateurs en ligne"""
@@ -3,13 +3,15 @@ Sprint 6 - API Publique Documentée avec Swagger/OpenAPI
 Routes API pour intégrations partenaires avec documentation automatique
 """
 
-from flask import Blueprint, request, jsonify, session, current_app
+from flask import Blueprint, request, jsonify, session, current_app, after_this_request
 from flask_restx import Api, Resource, fields, Namespace
 from werkzeug.exceptions import BadRequest, Unauthorized, Forbidden, NotFound
 import pymysql
 from core.database import get_db_connection
 from core.rbac_advanced import permission_manager, audit_logger, security_logger
 from core.utils import log_info, log_error
+from core import api_tokens
+from core.rate_limit import rate_limiter
 import hashlib
 import secrets
 from datetime import datetime, timedelta
@@ -93,58 +95,36 @@ class APITokenManager:
     
     @staticmethod
     def validate_token(token: str) -> Optional[Dict]:
-        """Valide un token API et retourne les informations associées"""
-        token_hash = hashlib.sha256(token.encode()).hexdigest()
-        
+        """Valide un token API et retourne les informations associées (cache mémoire, voir core.api_tokens)"""
         try:
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute("""
-                        SELECT * FROM api_tokens 
-                        WHERE token_hash = %s 
-                        AND is_active = TRUE 
-                        AND (expires_at IS NULL OR expires_at > NOW())
-                    """, (token_hash,))
-                    
-                    token_data = cursor.fetchone()
-                    
-                    if token_data:
-                        # Mettre à jour les statistiques d'usage
-                        cursor.execute("""
-                            UPDATE api_tokens 
-                            SET last_used_at = NOW(), usage_count = usage_count + 1
-                            WHERE id = %s
-                        """, (token_data['id'],))
-                        conn.commit()
-                        
-                        return token_data
-                    
+            return api_tokens.validate_token(token)
         except Exception as e:
             log_error(f"Erreur lors de la validation du token: {e}")
             
         return None
     
+    @staticmethod
+    def revoke_token(token_id: int) -> bool:
+        """Révoque un token (effectif dans tous les processus en quelques secondes)"""
+        try:
+            return api_tokens.revoke_token(token_id)
+        except Exception as e:
+            log_error(f"Erreur lors de la révocation du token API: {e}")
+            return False
+    
     @staticmethod
     def log_api_usage(token_id: int, endpoint: str, method: str, 
                      status: int, response_time: int = None):
-        """Log l'utilisation de l'API"""
+        """Log l'utilisation de l'API (compteurs et journal écrits par lots en arrière-plan)"""
         try:
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute("""
-                        INSERT INTO api_usage_logs 
-                        (token_id, endpoint, http_method, ip_address, 
-                         response_status, response_time_ms)
-                        VALUES (%s, %s, %s, %s, %s, %s)
-                    """, (
-                        token_id,
-                        endpoint,
-                        method,
-                        request.environ.get('HTTP_X_FORWARDED_FOR', request.remote_addr),
-                        status,
-                        response_time
-                    ))
-                    conn.commit()
+            api_tokens.usage_accounting.record(
+                token_id,
+                endpoint,
+                method,
+                request.environ.get('HTTP_X_FORWARDED_FOR', request.remote_addr),
+                status,
+                response_time
+            )
         except Exception as e:
             log_error(f"Erreur lors du logging d'usage API: {e}")
 
@@ -191,6 +171,20 @@ def require_api_auth(required_permissions: List[str] = None):
                         'required': list(missing_permissions)
                     }, 403
             
+            # Limiter le débit (rate_limit_per_hour, seaux séparés lecture / écriture)
+            rate_limit = rate_limiter.hit(token_data['id'], token_data.get('rate_limit_per_hour'), request.method)
+            if not rate_limit.allowed:
+                APITokenManager.log_api_usage(token_data['id'], request.endpoint, request.method, 429)
+                return {
+                    'error': 'Limite de requêtes dépassée',
+                    'retry_after': int(rate_limit.headers()['Retry-After'])
+                }, 429, rate_limit.headers()
+            
+            @after_this_request
+            def add_rate_limit_headers(response):
+                response.headers.update(rate_limit.headers())
+                return response
+            
             # Stocker les infos du token pour usage dans la route
             request.api_token = token_data
             
@@ -670,6 +664,9 @@ def list_api_tokens():
     if not permission_manager.user_has_permission(session['user_id'], 'system.api_management'):
         return jsonify({'error': 'Permission denied'}), 403
     
+    # Compteurs d'usage à jour (agrégés en mémoire entre deux écritures)
+    api_tokens.usage_accounting.flush()
+    
     try:
         with get_db_connection() as conn:
             with conn.cursor() as cursor:
@@ -688,6 +685,21 @@ def list_api_tokens():
         log_error(f"Erreur lors de la récupération des tokens: {e}")
         return jsonify({'error': 'Erreur serveur'}), 500
 
+@api_public_bp.route('/admin/tokens/<int:token_id>', methods=['DELETE'])
+def revoke_api_token(token_id):
+    """Révoque un token API (admin seulement)"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Authentication required'}), 401
+    
+    if not permission_manager.user_has_permission(session['user_id'], 'system.api_management'):
+        return jsonify({'error': 'Permission denied'}), 403
+    
+    if not APITokenManager.revoke_token(token_id):
+        return jsonify({'error': 'Token introuvable ou erreur serveur'}), 404
+    
+    log_info(f"Token API {token_id} révoqué par l'utilisateur {session['user_id']}")
+    return jsonify({'success': True, 'token_id': token_id, 'revoked': True})
+
 # ============================================================================
 # ROUTE DE TEST DE L'API
 # ============================================================================
@@ -3,16 +3,25 @@ Sprint 6 - API Publique Simplifiée avec Documentation
 Routes API pour intégrations partenaires
 """
 
-from flask import Blueprint, request, jsonify, session, render_template_string
+from flask import (Blueprint, request, jsonify, session, render_template_string, after_this_request,
+                   Response, stream_with_context)
 import pymysql
 from core.database import get_db_connection
 from core.rbac_advanced import permission_manager, audit_logger, security_logger
-from core.utils import log_info, log_error
+from core.utils import (log_info, log_error, ValidationError, validate_work_order_data,
+                        validate_customer_data)
+from core.models import WorkOrder
+from core import api_tokens
+from core.rate_limit import rate_limiter
 import hashlib
 import secrets
-from datetime import datetime, timedelta
+import uuid
+from datetime import datetime, date, timedelta
+from decimal import Decimal
 import json
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
+
+from utils.pagination import encode_cursor, decode_cursor
 
 # Création du blueprint
 api_public_bp = Blueprint('api_public', __name__, url_prefix='/api/v1')
@@ -64,58 +73,36 @@ class APITokenManager:
     
     @staticmethod
     def validate_token(token: str) -> Optional[Dict]:
-        """Valide un token API et retourne les informations associées"""
-        token_hash = hashlib.sha256(token.encode()).hexdigest()
-        
+        """Valide un token API et retourne les informations associées (cache mémoire, voir core.api_tokens)"""
         try:
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute("""
-                        SELECT * FROM api_tokens 
-                        WHERE token_hash = %s 
-                        AND is_active = TRUE 
-                        AND (expires_at IS NULL OR expires_at > NOW())
-                    """, (token_hash,))
-                    
-                    token_data = cursor.fetchone()
-                    
-                    if token_data:
-                        # Mettre à jour les statistiques d'usage
-                        cursor.execute("""
-                            UPDATE api_tokens 
-                            SET last_used_at = NOW(), usage_count = usage_count + 1
-                            WHERE id = %s
-                        """, (token_data['id'],))
-                        conn.commit()
-                        
-                        return token_data
-                    
+            return api_tokens.validate_token(token)
         except Exception as e:
             log_error(f"Erreur lors de la validation du token: {e}")
             
         return None
     
+    @staticmethod
+    def revoke_token(token_id: int) -> bool:
+        """Révoque un token (effectif dans tous les processus en quelques secondes)"""
+        try:
+            return api_tokens.revoke_token(token_id)
+        except Exception as e:
+            log_error(f"Erreur lors de la révocation du token API: {e}")
+            return False
+    
     @staticmethod
     def log_api_usage(token_id: int, endpoint: str, method: str, 
                      status: int, response_time: int = None):
-        """Log l'utilisation de l'API"""
+        """Log l'utilisation de l'API (compteurs et journal écrits par lots en arrière-plan)"""
         try:
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute("""
-                        INSERT INTO api_usage_logs 
-                        (token_id, endpoint, http_method, ip_address, 
-                         response_status, response_time_ms)
-                        VALUES (%s, %s, %s, %s, %s, %s)
-                    """, (
-                        token_id,
-                        endpoint,
-                        method,
-                        request.environ.get('HTTP_X_FORWARDED_FOR', request.remote_addr),
-                        status,
-                        response_time
-                    ))
-                    conn.commit()
+            api_tokens.usage_accounting.record(
+                token_id,
+                endpoint,
+                method,
+                request.environ.get('HTTP_X_FORWARDED_FOR', request.remote_addr),
+                status,
+                response_time
+            )
         except Exception as e:
             log_error(f"Erreur lors du logging d'usage API: {e}")
 
@@ -162,6 +149,20 @@ def require_api_auth(required_permissions: List[str] = None):
                         'required': list(missing_permissions)
                     }), 403
             
+            # Limiter le débit (rate_limit_per_hour, seaux séparés lecture / écriture)
+            rate_limit = rate_limiter.hit(token_data['id'], token_data.get('rate_limit_per_hour'), request.method)
+            if not rate_limit.allowed:
+                APITokenManager.log_api_usage(token_data['id'], request.endpoint, request.method, 429)
+                return jsonify({
+                    'error': 'Limite de requêtes dépassée',
+                    'retry_after': int(rate_limit.headers()['Retry-After'])
+                }), 429, rate_limit.headers()
+            
+            @after_this_request
+            def add_rate_limit_headers(response):
+                response.headers.update(rate_limit.headers())
+                return response
+            
             # Stocker les infos du token pour usage dans la route
             request.api_token = token_data
             
@@ -191,6 +192,10 @@ def require_api_auth(required_permissions: List[str] = None):
 # ROUTES WORK ORDERS API
 # ============================================================================
 
+# Relations incluses sur demande dans la liste (?include=lines,interventions),
+# chargées en une requête IN (...) par relation pour toute la page
+WORK_ORDER_INCLUDES = ('lines', 'interventions')
+
 @api_public_bp.route('/work_orders', methods=['GET'])
 @require_api_auth(['work_orders.view_all'])
 def get_work_orders():
@@ -201,6 +206,13 @@ def get_work_orders():
         status = request.args.get('status')
         priority = request.args.get('priority')
         technician_id = request.args.get('technician_id', type=int)
+        include = [name.strip() for name in (request.args.get('include') or '').split(',') if name.strip()]
+        unknown = [name for name in include if name not in WORK_ORDER_INCLUDES]
+        if unknown:
+            return jsonify({
+                'error': f"include invalide: {', '.join(unknown)}",
+                'allowed': list(WORK_ORDER_INCLUDES)
+            }), 400
         
         offset = (page - 1) * per_page
         
@@ -247,6 +259,17 @@ def get_work_orders():
                 
                 work_orders = cursor.fetchall()
                 
+                if include:
+                    # Relations de toute la page en lot (pas une requête par bon)
+                    loaded = WorkOrder.prefetch_related(WorkOrder.from_rows(work_orders), *include)
+                    by_id = {wo.id: wo for wo in loaded}
+                    for wo in work_orders:
+                        model = by_id[wo['id']]
+                        if 'lines' in include:
+                            wo['lines'] = [line.to_dict() for line in model.get_lines()]
+                        if 'interventions' in include:
+                            wo['interventions'] = [note.to_dict() for note in model.get_interventions()]
+                
                 # Convertir les datetime en string pour JSON
                 for wo in work_orders:
                     for key, value in wo.items():
@@ -292,8 +315,7 @@ def create_work_order():
                     return jsonify({'error': 'Client introuvable'}), 400
                 
                 # Générer un numéro de réclamation unique
-                import uuid
-                claim_number = f"WO-{datetime.now().strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}"
+                claim_number = _new_claim_number()
                 
                 # Insérer le bon de travail
                 cursor.execute("""
@@ -517,6 +539,521 @@ def create_customer():
         log_error(f"Erreur API create_customer: {e}")
         return jsonify({'error': 'Erreur serveur'}), 500
 
+# ============================================================================
+# ROUTES BULK ET EXPORT (synchronisation des partenaires)
+# ============================================================================
+
+BULK_MAX_ITEMS = 5000
+BULK_CHUNK = 500
+EXPORT_PAGE_SIZE = 1000
+EXPORT_MAX_ROWS = 100000
+
+WORK_ORDER_INSERT_COLUMNS = (
+    'claim_number', 'title', 'customer_id', 'customer_name', 'customer_address', 'customer_phone',
+    'customer_email', 'description', 'priority', 'status', 'assigned_technician_id',
+    'estimated_duration', 'scheduled_date', 'notes', 'created_by_user_id'
+)
+WORK_ORDER_REQUIRED_FIELDS = ('title', 'priority', 'customer_id')
+WORK_ORDER_UPDATE_FIELDS = (
+    'title', 'customer_name', 'customer_address', 'customer_phone', 'customer_email', 'description',
+    'priority', 'status', 'assigned_technician_id', 'estimated_duration', 'scheduled_date', 'notes'
+)
+CUSTOMER_INSERT_COLUMNS = ('name', 'email', 'phone', 'type', 'address', 'city', 'postal_code')
+CUSTOMER_UPDATE_FIELDS = CUSTOMER_INSERT_COLUMNS + ('is_active',)
+CUSTOMER_TYPES = ('individual', 'company', 'government')
+
+
+def _bulk_items():
+    """Éléments d'une requête bulk ({"items": [...]}) ; (items, réponse d'erreur)"""
+    data = request.get_json(silent=True) or {}
+    items = data.get('items')
+    if not isinstance(items, list) or not items:
+        return None, (jsonify({'error': 'Liste "items" requise'}), 400)
+    if len(items) > BULK_MAX_ITEMS:
+        return None, (jsonify({'error': f'Maximum {BULK_MAX_ITEMS} éléments par requête'}), 413)
+    return items, None
+
+
+def _bulk_response(results: List[Dict], processed: int):
+    """200 si tout est passé, 207 si une partie a échoué, 400 si rien n'est passé"""
+    failed = sum(1 for result in results if 'errors' in result)
+    status = 200 if not failed else (207 if processed else 400)
+    return jsonify({
+        'success': failed == 0,
+        'processed': processed,
+        'failed': failed,
+        'results': results
+    }), status
+
+
+def _validation_errors(validator, data: Dict, **kwargs) -> List[str]:
+    """Erreurs de validation d'un élément ; listes et objets JSON refusés champ par champ"""
+    errors = [f"Valeur invalide pour {name}: texte ou nombre attendu"
+              for name, value in data.items() if isinstance(value, (list, dict))]
+    if errors:
+        return errors
+    try:
+        validator(data, **kwargs)
+        return []
+    except ValidationError as e:
+        return str(e).split('; ')
+    except (TypeError, ValueError, AttributeError) as e:
+        return [f"Données invalides: {e}"]
+
+
+def _as_id(value) -> Optional[int]:
+    """Identifiant entier (nombre JSON ou chaîne de chiffres), None sinon"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value)
+    return None
+
+
+def _item_failure(index: int, item, error: Exception) -> Dict:
+    """Élément refusé sur une erreur inattendue (les autres éléments sont traités)"""
+    log_error(f"Erreur API bulk, élément {index}: {error}")
+    result = {'index': index, 'errors': [f'Élément invalide: {error}']}
+    if isinstance(item, dict) and isinstance(item.get('id'), int):
+        result['id'] = item['id']
+    return result
+
+
+def _ids_in(cursor, query: str, values: List) -> List[Dict]:
+    """SELECT ... IN (...) par tranches (listes de plusieurs milliers de valeurs)"""
+    rows = []
+    for start in range(0, len(values), BULK_CHUNK):
+        chunk = values[start:start + BULK_CHUNK]
+        cursor.execute(query.format(placeholders=', '.join(['%s'] * len(chunk))), chunk)
+        rows.extend(cursor.fetchall())
+    return rows
+
+
+def _bulk_insert(cursor, table: str, columns: Tuple[str, ...], rows: List[Tuple],
+                 key_column: Optional[str] = None) -> List[int]:
+    """
+    INSERT multi-lignes par paquets de BULK_CHUNK ; renvoie les identifiants
+    créés dans l'ordre des lignes
+
+    Avec key_column (colonne unique), les identifiants sont relus par cette
+    clé ; sinon ils sont déduits de LAST_INSERT_ID, un INSERT ... VALUES
+    recevant des auto-incréments espacés de auto_increment_increment.
+    """
+    ids = []
+    step = 1
+    if key_column is None:
+        cursor.execute("SELECT @@SESSION.auto_increment_increment AS step")
+        step = int(cursor.fetchone()['step'] or 1)
+    row_sql = f"({', '.join(['%s'] * len(columns))}, NOW())"
+    for start in range(0, len(rows), BULK_CHUNK):
+        chunk = rows[start:start + BULK_CHUNK]
+        cursor.execute(
+            f"INSERT INTO {table} ({', '.join(columns)}, created_at) VALUES {', '.join([row_sql] * len(chunk))}",
+            [value for row in chunk for value in row]
+        )
+        if key_column is None:
+            ids.extend(cursor.lastrowid + step * offset for offset in range(len(chunk)))
+    if key_column is not None:
+        position = columns.index(key_column)
+        keys = [row[position] for row in rows]
+        found = {row[key_column]: row['id'] for row in _ids_in(
+            cursor, f"SELECT id, {key_column} FROM {table} WHERE {key_column} IN ({{placeholders}})", keys
+        )}
+        ids = [found[key] for key in keys]
+    return ids
+
+
+def _new_claim_number() -> str:
+    """Numéro de réclamation généré comme pour POST /work_orders (WO-YYYYMMDD-XXXXXXXX)"""
+    return f"WO-{datetime.now().strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}"
+
+
+def _parse_dates(fields: Dict, names: Tuple[str, ...] = ('scheduled_date',)) -> Dict:
+    """Dates ISO 8601 (validées) -> datetime MySQL (heure locale du serveur si un fuseau est donné)"""
+    for name in names:
+        if isinstance(fields.get(name), str):
+            value = datetime.fromisoformat(fields[name].replace('Z', '+00:00'))
+            fields[name] = value.astimezone().replace(tzinfo=None) if value.tzinfo else value
+    return fields
+
+
+def _bulk_update(cursor, table: str, changes: Dict[int, Dict]):
+    """
+    Mettre à jour plusieurs lignes par instruction : une colonne = un CASE id
+    (les lignes qui ne modifient pas cette colonne la gardent inchangée)
+    """
+    ids = list(changes)
+    for start in range(0, len(ids), BULK_CHUNK):
+        chunk = ids[start:start + BULK_CHUNK]
+        columns = sorted({column for row_id in chunk for column in changes[row_id]})
+        assignments = []
+        params = []
+        for column in columns:
+            cases = [row_id for row_id in chunk if column in changes[row_id]]
+            assignments.append(f"{column} = CASE id {' '.join(['WHEN %s THEN %s'] * len(cases))} ELSE {column} END")
+            for row_id in cases:
+                params.extend([row_id, changes[row_id][column]])
+        cursor.execute(
+            f"UPDATE {table} SET {', '.join(assignments)} WHERE id IN ({', '.join(['%s'] * len(chunk))})",
+            params + chunk
+        )
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return str(value)
+
+
+def _ndjson_export(table: str, columns: str, where: List[str], params: List, entity: str):
+    """
+    Export NDJSON par ordre (updated_at, id) : une ligne JSON par enregistrement,
+    puis une ligne finale {"_next_cursor", "_has_more"} pour reprendre l'export
+    (pagination par clé, sans OFFSET ni COUNT)
+    """
+    limit = min(request.args.get('limit', EXPORT_MAX_ROWS, type=int), EXPORT_MAX_ROWS)
+    updated_since = request.args.get('updated_since')
+    where, params = list(where), list(params)
+    if updated_since:
+        try:
+            params.append(datetime.fromisoformat(updated_since.replace('Z', '+00:00')).replace(tzinfo=None))
+        except ValueError:
+            return jsonify({'error': 'updated_since invalide (ISO 8601 attendu)'}), 400
+        where.append("updated_at >= %s")
+    position = decode_cursor(request.args.get('cursor'), 2)
+    if request.args.get('cursor') and not position:
+        return jsonify({'error': 'Curseur invalide'}), 400
+    last = position[0] if position else None
+
+    def generate():
+        nonlocal last
+        sent = 0
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                while sent < limit:
+                    page_where, page_params = list(where), list(params)
+                    if last:
+                        page_where.append("(updated_at > %s OR (updated_at = %s AND id > %s))")
+                        page_params.extend([last[0], last[0], last[1]])
+                    size = min(EXPORT_PAGE_SIZE, limit - sent)
+                    cursor.execute(f"""
+                        SELECT {columns} FROM {table}
+                        {'WHERE ' + ' AND '.join(page_where) if page_where else ''}
+                        ORDER BY updated_at ASC, id ASC
+                        LIMIT %s
+                    """, page_params + [size])
+                    rows = cursor.fetchall()
+                    for row in rows:
+                        yield json.dumps(row, default=_json_default, ensure_ascii=False) + '\n'
+                    sent += len(rows)
+                    if rows:
+                        last = [rows[-1]['updated_at'], rows[-1]['id']]
+                    if len(rows) < size:
+                        break
+        yield json.dumps({
+            '_entity': entity,
+            '_count': sent,
+            '_has_more': sent >= limit,
+            '_next_cursor': encode_cursor(last) if last else request.args.get('cursor')
+        }) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+@api_public_bp.route('/work_orders/bulk', methods=['POST'])
+@require_api_auth(['work_orders.create'])
+def bulk_create_work_orders():
+    """
+    Crée jusqu'à BULK_MAX_ITEMS bons de travail en une transaction
+
+    Mêmes règles que POST /work_orders : title, priority et customer_id
+    requis, numéro de réclamation généré (un claim_number fourni est
+    ignoré). Les champs fournis sont validés par
+    core.utils.validate_work_order_data ; les éléments invalides sont
+    rapportés individuellement, les autres sont insérés.
+    """
+    items, error = _bulk_items()
+    if error:
+        return error
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                # Nom et adresse du client complétés depuis customer_id
+                customer_ids = list({_as_id(item.get('customer_id')) for item in items
+                                     if isinstance(item, dict)} - {None})
+                customers = {row['id']: row for row in _ids_in(
+                    cursor, "SELECT id, name, address, phone, email FROM customers WHERE id IN ({placeholders})",
+                    customer_ids
+                )}
+
+                results = []
+                rows = []
+                seen = set()
+                for index, item in enumerate(items):
+                    if not isinstance(item, dict):
+                        results.append({'index': index, 'errors': ['Objet JSON attendu']})
+                        continue
+                    try:
+                        record = {key: value for key, value in item.items() if key != 'claim_number'}
+                        errors = [f'Champ requis manquant: {field}' for field in WORK_ORDER_REQUIRED_FIELDS
+                                  if not record.get(field)]
+                        customer = None
+                        if record.get('customer_id'):
+                            record['customer_id'] = _as_id(record['customer_id'])
+                            customer = customers.get(record['customer_id'])
+                            if record['customer_id'] is None:
+                                errors.append('customer_id entier requis')
+                            elif not customer:
+                                errors.append('Client introuvable')
+                        if not errors:
+                            errors = _validation_errors(validate_work_order_data, record, is_update=True)
+                        if errors:
+                            results.append({'index': index, 'errors': errors})
+                            continue
+                        for field in ('name', 'address', 'phone', 'email'):
+                            record.setdefault(f'customer_{field}', customer[field])
+                        claim_number = _new_claim_number()
+                        while claim_number in seen:
+                            claim_number = _new_claim_number()
+                        record['claim_number'] = claim_number
+                        record.setdefault('description', '')
+                        record.setdefault('status', 'pending')
+                        record['created_by_user_id'] = request.api_token['created_by']
+                        _parse_dates(record)
+                        row = tuple(record.get(column) for column in WORK_ORDER_INSERT_COLUMNS)
+                    except Exception as e:
+                        results.append(_item_failure(index, item, e))
+                        continue
+                    seen.add(claim_number)
+                    rows.append(row)
+                    results.append({'index': index, 'claim_number': claim_number})
+
+                if rows:
+                    created = iter(_bulk_insert(cursor, 'work_orders', WORK_ORDER_INSERT_COLUMNS, rows,
+                                                key_column='claim_number'))
+                    conn.commit()
+                    for result in results:
+                        if 'errors' not in result:
+                            result['id'] = next(created)
+
+        if rows:
+            audit_logger.log_action(
+                None, 'bulk_create', 'work_orders', None,
+                new_values={'count': len(rows)},
+                endpoint=request.endpoint,
+                http_method=request.method,
+                response_status=201
+            )
+        return _bulk_response(results, len(rows))
+
+    except Exception as e:
+        log_error(f"Erreur API bulk_create_work_orders: {e}")
+        return jsonify({'error': 'Erreur serveur', 'processed': 0}), 500
+
+
+@api_public_bp.route('/work_orders/bulk', methods=['PATCH'])
+@require_api_auth(['work_orders.edit_all'])
+def bulk_update_work_orders():
+    """Met à jour jusqu'à BULK_MAX_ITEMS bons de travail ({"items": [{"id": ..., champs...}]}) en une transaction"""
+    items, error = _bulk_items()
+    if error:
+        return error
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                ids = list({item['id'] for item in items if isinstance(item, dict) and isinstance(item.get('id'), int)})
+                known = {row['id'] for row in _ids_in(
+                    cursor, "SELECT id FROM work_orders WHERE id IN ({placeholders})", ids
+                )}
+
+                results = []
+                changes = {}
+                for index, item in enumerate(items):
+                    if not isinstance(item, dict) or not isinstance(item.get('id'), int):
+                        results.append({'index': index, 'errors': ['Champ "id" entier requis']})
+                        continue
+                    if item['id'] not in known:
+                        results.append({'index': index, 'id': item['id'], 'errors': ['Bon de travail introuvable']})
+                        continue
+                    try:
+                        fields = {key: value for key, value in item.items() if key in WORK_ORDER_UPDATE_FIELDS}
+                        unknown = sorted(set(item) - set(fields) - {'id'})
+                        errors = _validation_errors(validate_work_order_data, fields, is_update=True)
+                        if unknown:
+                            errors.append(f"Champs non modifiables: {', '.join(unknown)}")
+                        if not fields and not unknown:
+                            errors.append('Aucun champ à modifier')
+                        if errors:
+                            results.append({'index': index, 'id': item['id'], 'errors': errors})
+                            continue
+                        _parse_dates(fields)
+                    except Exception as e:
+                        results.append(_item_failure(index, item, e))
+                        continue
+                    # Plusieurs éléments pour un même id : le dernier l'emporte, champ par champ
+                    changes.setdefault(item['id'], {}).update(fields)
+                    results.append({'index': index, 'id': item['id']})
+
+                if changes:
+                    _bulk_update(cursor, 'work_orders', changes)
+                    conn.commit()
+
+        if changes:
+            audit_logger.log_action(
+                None, 'bulk_update', 'work_orders', None,
+                new_values={'count': len(changes)},
+                endpoint=request.endpoint,
+                http_method=request.method,
+                response_status=200
+            )
+        return _bulk_response(results, sum(1 for result in results if 'errors' not in result))
+
+    except Exception as e:
+        log_error(f"Erreur API bulk_update_work_orders: {e}")
+        return jsonify({'error': 'Erreur serveur', 'processed': 0}), 500
+
+
+@api_public_bp.route('/work_orders/export', methods=['GET'])
+@require_api_auth(['work_orders.view_all'])
+def export_work_orders():
+    """Export NDJSON incrémental des bons de travail (updated_since, cursor, limit)"""
+    try:
+        return _ndjson_export('work_orders', '*', [], [], 'work_order')
+    except Exception as e:
+        log_error(f"Erreur API export_work_orders: {e}")
+        return jsonify({'error': 'Erreur serveur'}), 500
+
+
+@api_public_bp.route('/customers/bulk', methods=['POST'])
+@require_api_auth(['customers.create'])
+def bulk_create_customers():
+    """Crée jusqu'à BULK_MAX_ITEMS clients en une transaction (rapport par élément)"""
+    items, error = _bulk_items()
+    if error:
+        return error
+    try:
+        results = []
+        rows = []
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                results.append({'index': index, 'errors': ['Objet JSON attendu']})
+                continue
+            try:
+                errors = _validation_errors(validate_customer_data, dict(
+                    item, customer_type=item.get('type'), company=item.get('company') or item.get('name')
+                ))
+                if item.get('type') not in CUSTOMER_TYPES:
+                    errors.append('Type de client invalide')
+                if errors:
+                    results.append({'index': index, 'errors': errors})
+                    continue
+                row = tuple(item.get(column) for column in CUSTOMER_INSERT_COLUMNS)
+            except Exception as e:
+                results.append(_item_failure(index, item, e))
+                continue
+            rows.append(row)
+            results.append({'index': index})
+
+        if rows:
+            with get_db_connection() as conn:
+                with conn.cursor() as cursor:
+                    created = iter(_bulk_insert(cursor, 'customers', CUSTOMER_INSERT_COLUMNS, rows))
+                    conn.commit()
+            for result in results:
+                if 'errors' not in result:
+                    result['id'] = next(created)
+
+            audit_logger.log_action(
+                None, 'bulk_create', 'customers', None,
+                new_values={'count': len(rows)},
+                endpoint=request.endpoint,
+                http_method=request.method,
+                response_status=201
+            )
+        return _bulk_response(results, len(rows))
+
+    except Exception as e:
+        log_error(f"Erreur API bulk_create_customers: {e}")
+        return jsonify({'error': 'Erreur serveur', 'processed': 0}), 500
+
+
+@api_public_bp.route('/customers/bulk', methods=['PATCH'])
+@require_api_auth(['customers.edit'])
+def bulk_update_customers():
+    """Met à jour jusqu'à BULK_MAX_ITEMS clients ({"items": [{"id": ..., champs...}]}) en une transaction"""
+    items, error = _bulk_items()
+    if error:
+        return error
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                ids = list({item['id'] for item in items if isinstance(item, dict) and isinstance(item.get('id'), int)})
+                known = {row['id'] for row in _ids_in(
+                    cursor, "SELECT id FROM customers WHERE id IN ({placeholders})", ids
+                )}
+
+                results = []
+                changes = {}
+                for index, item in enumerate(items):
+                    if not isinstance(item, dict) or not isinstance(item.get('id'), int):
+                        results.append({'index': index, 'errors': ['Champ "id" entier requis']})
+                        continue
+                    if item['id'] not in known:
+                        results.append({'index': index, 'id': item['id'], 'errors': ['Client introuvable']})
+                        continue
+                    try:
+                        fields = {key: value for key, value in item.items() if key in CUSTOMER_UPDATE_FIELDS}
+                        unknown = sorted(set(item) - set(fields) - {'id'})
+                        errors = _validation_errors(validate_customer_data, dict(fields, customer_type='individual'),
+                                                    is_update=True)
+                        if 'type' in fields and fields['type'] not in CUSTOMER_TYPES:
+                            errors.append('Type de client invalide')
+                        if unknown:
+                            errors.append(f"Champs non modifiables: {', '.join(unknown)}")
+                        if not fields and not unknown:
+                            errors.append('Aucun champ à modifier')
+                    except Exception as e:
+                        results.append(_item_failure(index, item, e))
+                        continue
+                    if errors:
+                        results.append({'index': index, 'id': item['id'], 'errors': errors})
+                        continue
+                    changes.setdefault(item['id'], {}).update(fields)
+                    results.append({'index': index, 'id': item['id']})
+
+                if changes:
+                    _bulk_update(cursor, 'customers', changes)
+                    conn.commit()
+
+        if changes:
+            audit_logger.log_action(
+                None, 'bulk_update', 'customers', None,
+                new_values={'count': len(changes)},
+                endpoint=request.endpoint,
+                http_method=request.method,
+                response_status=200
+            )
+        return _bulk_response(results, sum(1 for result in results if 'errors' not in result))
+
+    except Exception as e:
+        log_error(f"Erreur API bulk_update_customers: {e}")
+        return jsonify({'error': 'Erreur serveur', 'processed': 0}), 500
+
+
+@api_public_bp.route('/customers/export', methods=['GET'])
+@require_api_auth(['customers.export'])
+def export_customers():
+    """Export NDJSON incrémental des clients, actifs et désactivés (updated_since, cursor, limit)"""
+    try:
+        return _ndjson_export('customers', '*', [], [], 'customer')
+    except Exception as e:
+        log_error(f"Erreur API export_customers: {e}")
+        return jsonify({'error': 'Erreur serveur'}), 500
+
 # ============================================================================
 # DOCUMENTATION API STATIQUE
 # ============================================================================
@@ -562,6 +1099,9 @@ def api_documentation():
             <p>ou</p>
             <div class="code">X-API-Key: YOUR_API_TOKEN</div>
             <p>Contactez votre administrateur ChronoTech pour obtenir un token API.</p>
+            <p>Chaque token est limité à son quota horaire, décompté séparément pour les lectures (GET) et les écritures.
+            Chaque réponse indique <code>X-RateLimit-Limit</code>, <code>X-RateLimit-Remaining</code> et
+            <code>X-RateLimit-Reset</code> (secondes) ; au-delà du quota, la réponse 429 précise <code>Retry-After</code>.</p>
         </div>
 
         <h2>📋 Endpoints Work Orders</h2>
@@ -669,6 +1209,33 @@ def api_documentation():
             <ul><li>customers.create</li></ul>
         </div>
 
+        <h2>🔄 Synchronisation en masse</h2>
+        
+        <div class="endpoint">
+            <h3><span class="method post">POST</span> /api/v1/work_orders/bulk &nbsp; <span class="method post">POST</span> /api/v1/customers/bulk</h3>
+            <p>Crée jusqu'à 5000 enregistrements en une transaction : <code>{"items": [...]}</code>.
+            Chaque élément est validé ; la réponse (200, 207 si partielle, 400 si aucun) rapporte pour chaque index
+            l'<code>id</code> créé ou la liste <code>errors</code>. Les numéros de réclamation déjà utilisés sont refusés.</p>
+        </div>
+        
+        <div class="endpoint">
+            <h3><span class="method put">PATCH</span> /api/v1/work_orders/bulk &nbsp; <span class="method put">PATCH</span> /api/v1/customers/bulk</h3>
+            <p>Met à jour jusqu'à 5000 enregistrements : <code>{"items": [{"id": 42, "status": "completed"}, ...]}</code>
+            (seuls les champs fournis sont modifiés et validés).</p>
+        </div>
+        
+        <div class="endpoint">
+            <h3><span class="method get">GET</span> /api/v1/work_orders/export &nbsp; <span class="method get">GET</span> /api/v1/customers/export</h3>
+            <p>Export NDJSON (<code>application/x-ndjson</code>) par ordre de modification : un objet JSON par ligne,
+            puis une ligne finale <code>{"_next_cursor", "_has_more", "_count"}</code>.</p>
+            <table>
+                <tr><th>Paramètre</th><th>Description</th></tr>
+                <tr><td>updated_since</td><td>Date ISO 8601 : seulement les enregistrements modifiés depuis</td></tr>
+                <tr><td>cursor</td><td>Valeur <code>_next_cursor</code> de l'export précédent (reprise, synchronisation incrémentale)</td></tr>
+                <tr><td>limit</td><td>Nombre maximum d'enregistrements (max 100000)</td></tr>
+            </table>
+        </div>
+
         <h2>🔧 Endpoint Utilitaire</h2>
 
         <div class="endpoint">
@@ -695,10 +1262,13 @@ def api_documentation():
             <tr><th>Code</th><th>Description</th></tr>
             <tr><td>200</td><td>Succès</td></tr>
             <tr><td>201</td><td>Créé avec succès</td></tr>
+            <tr><td>207</td><td>Traitement bulk partiel (voir errors par élément)</td></tr>
             <tr><td>400</td><td>Requête invalide</td></tr>
             <tr><td>401</td><td>Non authentifié</td></tr>
             <tr><td>403</td><td>Permissions insuffisantes</td></tr>
             <tr><td>404</td><td>Ressource introuvable</td></tr>
+            <tr><td>413</td><td>Trop d'éléments dans une requête bulk</td></tr>
+            <tr><td>429</td><td>Quota horaire du token dépassé (voir Retry-After)</td></tr>
             <tr><td>500</td><td>Erreur serveur</td></tr>
         </table>
 
@@ -777,6 +1347,9 @@ def list_api_tokens():
     if not permission_manager.user_has_permission(session['user_id'], 'system.api_management'):
         return jsonify({'error': 'Permission denied'}), 403
     
+    # Compteurs d'usage à jour (agrégés en mémoire entre deux écritures)
+    api_tokens.usage_accounting.flush()
+    
     try:
         with get_db_connection() as conn:
             with conn.cursor() as cursor:
@@ -804,6 +1377,21 @@ def list_api_tokens():
         log_error(f"Erreur lors de la récupération des tokens: {e}")
         return jsonify({'error': 'Erreur serveur'}), 500
 
+@api_public_bp.route('/admin/tokens/<int:token_id>', methods=['DELETE'])
+def revoke_api_token(token_id):
+    """Révoque un token API (admin seulement)"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Authentication required'}), 401
+    
+    if not permission_manager.user_has_permission(session['user_id'], 'system.api_management'):
+        return jsonify({'error': 'Permission denied'}), 403
+    
+    if not APITokenManager.revoke_token(token_id):
+        return jsonify({'error': 'Token introuvable ou erreur serveur'}), 404
+    
+    log_info(f"Token API {token_id} révoqué par l'utilisateur {session['user_id']}")
+    return jsonify({'success': True, 'token_id': token_id, 'revoked': True})
+
 # ============================================================================
 # ROUTE DE TEST DE L'API
 # ============================================================================
@@ -2,18 +2,21 @@
 ChronoTech Sprint 2 - Routes API pour l'Expérience Terrain Augmentée
 APIs REST pour voice-to-action, mode offline et AR
 """
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, current_app, session
 from flask_login import login_required, current_user
 import json
 import logging
 from datetime import datetime
 import os
+import uuid
+from werkzeug.utils import secure_filename
 
 from core.voice_to_action import voice_engine
-from core.offline_sync import sync_manager
+from core.offline_sync import get_sync_manager, wake_sync_service
 from core.ar_checklist import ar_overlay
 from core.models import WorkOrder, User
 from core.database import get_db_connection
+from core import change_feed
 
 logger = logging.getLogger(__name__)
 sprint2_api = Blueprint('sprint2_api', __name__, url_prefix='/api/sprint2')
@@ -153,6 +156,7 @@ def get_voice_commands_history():
 def get_offline_status():
     """Récupérer le statut du mode offline"""
     try:
+        sync_manager = get_sync_manager()
         if not sync_manager:
             return jsonify({
                 'success': False,
@@ -190,6 +194,7 @@ def get_offline_status():
 def force_sync_now():
     """Forcer une synchronisation immédiate"""
     try:
+        sync_manager = get_sync_manager()
         if not sync_manager:
             return jsonify({
                 'success': False,
@@ -283,6 +288,7 @@ def update_offline_work_order(work_order_id):
         
         conn.commit()
         conn.close()
+        wake_sync_service()
         
         return jsonify({
             'success': True,
@@ -298,6 +304,156 @@ def update_offline_work_order(work_order_id):
             'error': str(e)
         }), 500
 
+@sprint2_api.route('/offline/work-order/<int:work_order_id>/media', methods=['POST'])
+@login_required
+def add_offline_media(work_order_id):
+    """Enregistrer une photo ou vidéo terrain ; l'envoi se fait en arrière-plan (reprenable)"""
+    try:
+        sync_manager = get_sync_manager()
+        if not sync_manager:
+            return jsonify({
+                'success': False,
+                'message': 'Gestionnaire de synchronisation non initialisé'
+            }), 500
+
+        file = request.files.get('file')
+        if not file or not file.filename:
+            return jsonify({
+                'success': False,
+                'message': 'Fichier manquant'
+            }), 400
+
+        media_dir = os.path.join(os.path.dirname(sync_manager.offline_db_path) or '.', 'offline_media')
+        os.makedirs(media_dir, exist_ok=True)
+        file_path = os.path.join(media_dir, f"{uuid.uuid4().hex}_{secure_filename(file.filename)}")
+        file.save(file_path)
+
+        media_id = sync_manager.add_media_file(
+            work_order_id, file_path,
+            file_type=file.mimetype,
+            transcription=request.form.get('transcription'),
+            original_filename=file.filename,
+            uploaded_by=current_user.id
+        )
+
+        return jsonify({
+            'success': True,
+            'media_id': media_id,
+            'queued_for_sync': True,
+            'progress': sync_manager.get_media_progress()
+        })
+
+    except Exception as e:
+        logger.error(f"Erreur enregistrement média offline: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@sprint2_api.route('/sync/stats', methods=['GET'])
+@login_required
+def get_sync_stats():
+    """Profondeur de l'outbox, retard et débit du service de synchronisation"""
+    try:
+        sync_manager = get_sync_manager()
+        if not sync_manager:
+            return jsonify({
+                'success': False,
+                'message': 'Gestionnaire de synchronisation non initialisé'
+            }), 500
+        
+        return jsonify({'success': True, **sync_manager.get_queue_stats()})
+        
+    except Exception as e:
+        logger.error(f"Erreur statistiques synchronisation: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+# =============================================================================
+# SYNCHRONISATION DESCENDANTE (serveur -> appareils)
+# =============================================================================
+
+def _changes_scope():
+    """Technicien dont l'appareil reçoit les modifications (None : tout, superviseurs)"""
+    if session.get('user_role') in ('admin', 'manager', 'supervisor'):
+        return None
+    return current_user.id
+
+@sprint2_api.route('/sync/changes', methods=['GET'])
+@login_required
+def get_sync_changes():
+    """
+    Deltas depuis la séquence since (?since=<seq>&device=<id>&limit=500)
+
+    Appeler avec since=<next_since précédent> acquitte le point de reprise de
+    l'appareil ; sans since, la synchronisation reprend au dernier point
+    acquitté. Répéter tant que has_more ; reset_required : recharger les
+    listes complètes puis reprendre à head_seq.
+    """
+    device_id = (request.args.get('device') or '').strip()
+    if len(device_id) > 64:
+        return jsonify({'success': False, 'message': 'Identifiant appareil invalide'}), 400
+    try:
+        since = request.args.get('since', type=int)
+        limit = request.args.get('limit', change_feed.DEFAULT_PAGE_SIZE, type=int)
+        if since is not None and since < 0:
+            return jsonify({'success': False, 'message': 'Séquence invalide'}), 400
+
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cursor:
+                if device_id:
+                    if since is None:
+                        checkpoint = change_feed.get_checkpoint(cursor, current_user.id, device_id)
+                        since = checkpoint['last_seq'] if checkpoint else 0
+                    else:
+                        change_feed.save_checkpoint(cursor, current_user.id, device_id, since)
+                result = change_feed.get_changes(cursor, since or 0, _changes_scope(), limit)
+            conn.commit()
+        finally:
+            conn.close()
+
+        return jsonify({'success': True, 'since': since or 0, 'device': device_id or None, **result})
+
+    except Exception as e:
+        logger.error(f"Erreur flux de modifications: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@sprint2_api.route('/sync/conflicts', methods=['POST'])
+@login_required
+def check_sync_conflicts():
+    """
+    Vérifier des modifications hors ligne avant envoi
+    Corps : {"items": [{"type": "task", "id": 12, "base_version": 345}, ...]}
+    """
+    data = request.get_json(silent=True) or {}
+    items = data.get('items')
+    if not isinstance(items, list) or not items or len(items) > change_feed.MAX_PAGE_SIZE:
+        return jsonify({'success': False, 'message': 'Liste items requise'}), 400
+    try:
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cursor:
+                conflicts = change_feed.detect_conflicts(cursor, items, _changes_scope())
+        finally:
+            conn.close()
+
+        return jsonify({'success': True, 'checked': len(items), 'conflicts': conflicts})
+
+    except (ValueError, TypeError, KeyError) as e:
+        return jsonify({'success': False, 'message': f'Élément invalide: {e}'}), 400
+    except Exception as e:
+        logger.error(f"Erreur détection de conflits: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 # =============================================================================
 # AR CHECKLIST APIs
 # =============================================================================
@@ -423,6 +579,7 @@ def finalize_ar_session():
             
             conn.commit()
             conn.close()
+            wake_sync_service()
         
         return jsonify(result)
         
@@ -589,6 +746,7 @@ def get_recent_field_activities():
 def sprint2_health_check():
     """Vérification santé des services Sprint 2"""
     try:
+        sync_manager = get_sync_manager()
         health_status = {
             'voice_engine': {
                 'status': 'ok' if voice_engine else 'error',
@@ -7,6 +7,8 @@ import pymysql
 from datetime import datetime, timedelta
 from flask import request, jsonify, render_template, flash, redirect, url_for
 from core.utils import log_error
+from core.customer_risk import (get_risk_score, list_risk_scores, refresh_risk_scores,
+                                format_risk_score, RISK_LEVEL_LABELS)
 from .utils import get_db_connection, require_role, get_current_user, log_customer_activity
 
 
@@ -456,96 +458,101 @@ def setup_finance_routes(bp):
     @bp.route('/<int:customer_id>/risk-score', methods=['GET'])
     @require_role('admin', 'manager', 'staff')
     def calculate_risk_score(customer_id):
-        """Calcule le score de risque d'un client"""
+        """
+        Score de risque d'un client
+        Servi depuis customer_risk_scores, recalculé si absent, plus ancien que
+        RISK_SCORE_MAX_AGE ou sur demande (?refresh=1)
+        """
         try:
             conn = get_db_connection()
             if not conn:
                 return jsonify({'success': False, 'message': 'Erreur de connexion'}), 500
             
-            cursor = conn.cursor(pymysql.cursors.DictCursor)
+            try:
+                row = get_risk_score(conn, customer_id, refresh=request.args.get('refresh') in ('1', 'true'))
+            finally:
+                conn.close()
             
-            # Facteurs de risque
-            risk_factors = {
-                'payment_delays': 0,
-                'overdue_amount': 0,
-                'payment_frequency': 0,
-                'credit_utilization': 0,
-                'account_age': 0
-            }
+            if not row:
+                return jsonify({'success': False, 'message': 'Client introuvable'}), 404
             
-            # Retards de paiement récents
-            cursor.execute("""
-                SELECT COUNT(*) as late_payments
-                FROM invoices
-                WHERE customer_id = %s 
-                AND status = 'paid' 
-                AND paid_at > due_date
-                AND created_at >= DATE_SUB(NOW(), INTERVAL 12 MONTH)
-            """, [customer_id])
+            return jsonify({
+                'success': True,
+                'risk_score': format_risk_score(row)
+            })
             
-            late_payments = cursor.fetchone()['late_payments']
-            risk_factors['payment_delays'] = min(late_payments * 10, 50)
+        except Exception as e:
+            log_error(f"Erreur calcul score risque: {e}")
+            return jsonify({'success': False, 'message': str(e)}), 500
+
+    @bp.route('/risk-scores', methods=['GET'])
+    @require_role('admin', 'manager', 'staff')
+    def list_customer_risk_scores():
+        """
+        Classement des clients par risque (scores enregistrés)
+        Filtres : level, changed_since (ISO, changements de niveau), limit (max 500)
+        """
+        try:
+            level = request.args.get('level')
+            if level and level not in RISK_LEVEL_LABELS:
+                return jsonify({'success': False, 'message': 'Niveau de risque invalide'}), 400
             
-            # Montant en souffrance
-            cursor.execute("""
-                SELECT COALESCE(SUM(total_amount), 0) as overdue
-                FROM invoices
-                WHERE customer_id = %s 
-                AND status IN ('open', 'sent')
-                AND due_date < NOW()
-            """, [customer_id])
+            changed_since = request.args.get('changed_since')
+            if changed_since:
+                try:
+                    changed_since = datetime.fromisoformat(changed_since)
+                except ValueError:
+                    return jsonify({'success': False, 'message': 'changed_since invalide (ISO 8601)'}), 400
             
-            overdue = cursor.fetchone()['overdue']
-            risk_factors['overdue_amount'] = min((overdue / 1000) * 5, 30)
+            limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
             
-            # Ancienneté du compte (bonus de confiance)
-            cursor.execute("""
-                SELECT DATEDIFF(NOW(), created_at) as account_days
-                FROM customers
-                WHERE id = %s
-            """, [customer_id])
+            conn = get_db_connection()
+            if not conn:
+                return jsonify({'success': False, 'message': 'Erreur de connexion'}), 500
             
-            account_days = cursor.fetchone()['account_days']
-            if account_days > 365:
-                risk_factors['account_age'] = -10  # Bonus pour ancienneté
-            
-            # Score total (0-100, 0 = très faible risque, 100 = très haut risque)
-            total_score = sum(risk_factors.values())
-            total_score = max(0, min(100, total_score))
-            
-            # Classification
-            if total_score <= 20:
-                risk_level = 'very_low'
-                risk_label = 'Très faible'
-            elif total_score <= 40:
-                risk_level = 'low'
-                risk_label = 'Faible'
-            elif total_score <= 60:
-                risk_level = 'medium'
-                risk_label = 'Moyen'
-            elif total_score <= 80:
-                risk_level = 'high'
-                risk_label = 'Élevé'
-            else:
-                risk_level = 'very_high'
-                risk_label = 'Très élevé'
+            try:
+                rows = list_risk_scores(conn, level=level, changed_since=changed_since, limit=limit)
+            finally:
+                conn.close()
             
-            cursor.close()
-            conn.close()
+            return jsonify({
+                'success': True,
+                'risk_scores': [dict(format_risk_score(row), customer_name=row['customer_name']) for row in rows]
+            })
+            
+        except Exception as e:
+            log_error(f"Erreur classement risque clients: {e}")
+            return jsonify({'success': False, 'message': str(e)}), 500
+
+    @bp.route('/risk-scores/refresh', methods=['POST'])
+    @require_role('admin', 'manager')
+    def refresh_customer_risk_scores():
+        """Recalculer les scores de risque de tous les clients (lot vectorisé)"""
+        try:
+            conn = get_db_connection()
+            if not conn:
+                return jsonify({'success': False, 'message': 'Erreur de connexion'}), 500
+            
+            try:
+                result = refresh_risk_scores(conn)
+            finally:
+                conn.close()
             
             return jsonify({
                 'success': True,
-                'risk_score': {
-                    'score': total_score,
-                    'level': risk_level,
-                    'label': risk_label,
-                    'factors': risk_factors,
-                    'calculated_at': datetime.now().isoformat()
-                }
+                'scored': result['scored'],
+                'computed_at': result['computed_at'].isoformat(),
+                'level_changes': [{
+                    'customer_id': row['customer_id'],
+                    'previous_level': row['previous_level'],
+                    'level': row['level'],
+                    'previous_score': float(row['previous_score']) if row['previous_score'] is not None else None,
+                    'score': float(row['score'])
+                } for row in result['changed']]
             })
             
         except Exception as e:
-            log_error(f"Erreur calcul score risque: {e}")
+            log_error(f"Erreur recalcul scores de risque: {e}")
             return jsonify({'success': False, 'message': str(e)}), 500
 
     # =====================================================
@@ -3,10 +3,13 @@ from core.database import get_db_connection
 Routes Mobile pour Techniciens - Sprint 3
 Interface optimisée mobile avec actions rapides
 """
-from flask import Blueprint, render_template, request, redirect, url_for, session, jsonify, flash
+from flask import Blueprint, render_template, request, redirect, url_for, session, jsonify, flash, Response
 from datetime import datetime, date, timedelta
 from functools import wraps
+import json
 import os
+import threading
+import time
 import pymysql
 
 # Blueprint mobile  
@@ -27,6 +30,137 @@ def require_technician(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# Instantané "aujourd'hui" par technicien : partagé par la vue HTML et la
+# variante JSON, servi quelques secondes puis relu (invalidé par start/stop/note)
+MOBILE_TODAY_TTL = int(os.environ.get('MOBILE_TODAY_TTL', '10'))
+OPEN_TASK_STATUSES = ('pending', 'assigned', 'in_progress')
+_today_cache = {}
+_today_cache_lock = threading.Lock()
+
+def invalidate_today_snapshot(technician_id):
+    """Oublier l'instantané d'un technicien (après une action sur ses tâches)"""
+    with _today_cache_lock:
+        for key in [key for key in _today_cache if key[0] == technician_id]:
+            del _today_cache[key]
+
+def _on_day(value, day):
+    return value is not None and value.date() == day
+
+def _load_today_rows(cursor, technician_id, day):
+    """
+    Tâches du jour d'un technicien en une requête
+    
+    Chaque branche de l'UNION est une plage d'index (technicien + date ou
+    statut) ; l'ensemble couvre à la fois la liste (tâches du jour, tâches
+    ouvertes non planifiées, intervention en cours) et les statistiques
+    (interventions démarrées aujourd'hui).
+    """
+    day_start = datetime.combine(day, datetime.min.time())
+    day_end = day_start + timedelta(days=1)
+    cursor.execute("""
+        SELECT 
+            wot.*,
+            wo.description as wo_title,
+            wo.claim_number,
+            wo.customer_id,
+            c.name as customer_name,
+            c.phone as customer_phone,
+            v.make, v.model, v.license_plate,
+            i.id as intervention_id,
+            i.started_at as intervention_started,
+            i.ended_at as intervention_ended,
+            CASE 
+                WHEN i.started_at IS NOT NULL AND i.ended_at IS NULL THEN 'active'
+                WHEN i.ended_at IS NOT NULL THEN 'completed'
+                ELSE 'pending'
+            END as intervention_status,
+            CASE 
+                WHEN i.started_at IS NOT NULL AND i.ended_at IS NULL 
+                THEN TIMESTAMPDIFF(MINUTE, i.started_at, NOW())
+                WHEN i.started_at IS NOT NULL AND i.ended_at IS NOT NULL
+                THEN TIMESTAMPDIFF(MINUTE, i.started_at, i.ended_at)
+                ELSE 0
+            END as elapsed_minutes
+        FROM (
+            SELECT id FROM work_order_tasks
+            WHERE technician_id = %s AND scheduled_start >= %s AND scheduled_start < %s
+            UNION
+            SELECT id FROM work_order_tasks
+            WHERE technician_id = %s AND status IN ('pending', 'assigned', 'in_progress') AND scheduled_start IS NULL
+            UNION
+            SELECT task_id FROM interventions
+            WHERE technician_id = %s AND ended_at IS NULL AND started_at IS NOT NULL
+            UNION
+            SELECT task_id FROM interventions
+            WHERE technician_id = %s AND started_at >= %s AND started_at < %s
+        ) day_tasks
+        JOIN work_order_tasks wot ON wot.id = day_tasks.id
+        JOIN work_orders wo ON wot.work_order_id = wo.id
+        JOIN customers c ON wo.customer_id = c.id
+        LEFT JOIN vehicles v ON wo.vehicle_id = v.id
+        LEFT JOIN interventions i ON wot.id = i.task_id
+        WHERE wot.technician_id = %s
+        ORDER BY 
+            FIELD(wot.priority, 'urgent', 'high', 'medium', 'low'),
+            FIELD(wot.status, 'in_progress', 'assigned', 'pending', 'done'),
+            wot.scheduled_start ASC,
+            wot.created_at ASC
+    """, (technician_id, day_start, day_end,
+          technician_id,
+          technician_id,
+          technician_id, day_start, day_end,
+          technician_id))
+    return cursor.fetchall()
+
+def _build_today_snapshot(rows, day):
+    """Liste des tâches et statistiques du jour, dérivées des mêmes lignes"""
+    tasks = []
+    stats = {'total_tasks': 0, 'completed_tasks': 0, 'active_interventions': 0, 'total_minutes_today': 0}
+    for row in rows:
+        scheduled_today = _on_day(row['scheduled_start'], day)
+        unscheduled_open = row['scheduled_start'] is None and row['status'] in OPEN_TASK_STATUSES
+        active = row['intervention_status'] == 'active'
+        
+        if scheduled_today or unscheduled_open or active:
+            tasks.append(row)
+        
+        if scheduled_today or unscheduled_open or _on_day(row['intervention_started'], day):
+            stats['total_tasks'] += 1
+            if row['status'] == 'done':
+                stats['completed_tasks'] += 1
+            if active:
+                stats['active_interventions'] += 1
+            elif row['intervention_status'] == 'completed':
+                stats['total_minutes_today'] += int(row['elapsed_minutes'] or 0)
+    return tasks, stats
+
+def get_today_snapshot(technician_id):
+    """Instantané (tâches, statistiques) du jour, en cache MOBILE_TODAY_TTL secondes"""
+    today = date.today()
+    cache_key = (technician_id, today)
+    now = time.time()
+    with _today_cache_lock:
+        cached = _today_cache.get(cache_key)
+    if cached and now - cached[0] < MOBILE_TODAY_TTL:
+        return cached[1]
+    
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            rows = _load_today_rows(cursor, technician_id, today)
+    finally:
+        conn.close()
+    
+    snapshot = _build_today_snapshot(rows, today)
+    with _today_cache_lock:
+        # Écarter les instantanés expirés ou d'un autre jour : le cache ne
+        # garde que les techniciens actifs depuis MOBILE_TODAY_TTL secondes
+        for key in [key for key, (cached_at, _) in _today_cache.items()
+                    if key[1] != today or now - cached_at >= MOBILE_TODAY_TTL]:
+            del _today_cache[key]
+        _today_cache[cache_key] = (now, snapshot)
+    return snapshot
+
 @mobile_bp.route('/today')
 @require_technician
 def mobile_today():
@@ -37,87 +171,59 @@ def mobile_today():
     technician_id = session.get('user_id')
     today = date.today()
     
-    conn = get_db_connection()
     try:
-        with conn.cursor() as cursor:
-            # Récupérer les tâches du technicien pour aujourd'hui
-            cursor.execute("""
-                SELECT 
-                    wot.*,
-                    wo.description as wo_title,
-                    wo.claim_number,
-                    wo.customer_id,
-                    c.name as customer_name,
-                    c.phone as customer_phone,
-                    v.make, v.model, v.license_plate,
-                    i.id as intervention_id,
-                    i.started_at as intervention_started,
-                    i.ended_at as intervention_ended,
-                    CASE 
-                        WHEN i.started_at IS NOT NULL AND i.ended_at IS NULL THEN 'active'
-                        WHEN i.ended_at IS NOT NULL THEN 'completed'
-                        ELSE 'pending'
-                    END as intervention_status,
-                    CASE 
-                        WHEN i.started_at IS NOT NULL AND i.ended_at IS NULL 
-                        THEN TIMESTAMPDIFF(MINUTE, i.started_at, NOW())
-                        WHEN i.started_at IS NOT NULL AND i.ended_at IS NOT NULL
-                        THEN TIMESTAMPDIFF(MINUTE, i.started_at, i.ended_at)
-                        ELSE 0
-                    END as elapsed_minutes
-                FROM work_order_tasks wot
-                JOIN work_orders wo ON wot.work_order_id = wo.id
-                JOIN customers c ON wo.customer_id = c.id
-                LEFT JOIN vehicles v ON wo.vehicle_id = v.id
-                LEFT JOIN interventions i ON wot.id = i.task_id
-                WHERE wot.technician_id = %s
-                AND (
-                    DATE(wot.scheduled_start) = %s
-                    OR (wot.scheduled_start IS NULL AND wot.status IN ('pending', 'assigned', 'in_progress'))
-                    OR (i.started_at IS NOT NULL AND i.ended_at IS NULL)
-                )
-                ORDER BY 
-                    FIELD(wot.priority, 'urgent', 'high', 'medium', 'low'),
-                    FIELD(wot.status, 'in_progress', 'assigned', 'pending', 'done'),
-                    wot.scheduled_start ASC,
-                    wot.created_at ASC
-            """, (technician_id, today))
-            
-            tasks = cursor.fetchall()
-            
-            # Statistiques rapides
-            cursor.execute("""
-                SELECT 
-                    COUNT(*) as total_tasks,
-                    COUNT(CASE WHEN wot.status = 'done' THEN 1 END) as completed_tasks,
-                    COUNT(CASE WHEN i.started_at IS NOT NULL AND i.ended_at IS NULL THEN 1 END) as active_interventions,
-                    COALESCE(SUM(CASE 
-                        WHEN i.started_at IS NOT NULL AND i.ended_at IS NOT NULL 
-                        THEN TIMESTAMPDIFF(MINUTE, i.started_at, i.ended_at)
-                        ELSE 0 
-                    END), 0) as total_minutes_today
-                FROM work_order_tasks wot
-                LEFT JOIN interventions i ON wot.id = i.task_id
-                WHERE wot.technician_id = %s
-                AND (
-                    DATE(wot.scheduled_start) = %s
-                    OR (wot.scheduled_start IS NULL AND wot.status IN ('pending', 'assigned', 'in_progress'))
-                    OR (i.started_at IS NOT NULL AND DATE(i.started_at) = %s)
-                )
-            """, (technician_id, today, today))
-            
-            stats = cursor.fetchone()
-            
-            return render_template('mobile/technician_today.html', 
-                                 tasks=tasks, 
-                                 stats=stats,
-                                 today=today)
-                                 
+        tasks, stats = get_today_snapshot(technician_id)
+        return render_template('mobile/technician_today.html', 
+                             tasks=tasks, 
+                             stats=stats,
+                             today=today)
+                             
     except Exception as e:
         flash(f'Erreur lors du chargement des tâches: {str(e)}', 'error')
         return render_template('mobile/technician_today.html', tasks=[], stats={})
-    finally:
-        conn.close()
+
+# Champs transmis par la variante JSON (liaisons cellulaires lentes)
+TODAY_JSON_FIELDS = ('id', 'title', 'priority', 'status', 'work_order_id', 'claim_number',
+                     'customer_name', 'customer_phone', 'scheduled_start', 'intervention_id',
+                     'intervention_status', 'intervention_started', 'elapsed_minutes')
+
+def _compact_task(task):
+    item = {}
+    for field in TODAY_JSON_FIELDS:
+        value = task.get(field)
+        if value is None:
+            continue
+        item[field] = value.isoformat() if isinstance(value, datetime) else value
+    vehicle = ' '.join(part for part in (task.get('make'), task.get('model')) if part)
+    if task.get('license_plate'):
+        vehicle = f"{vehicle} - {task['license_plate']}" if vehicle else task['license_plate']
+    if vehicle:
+        item['vehicle'] = vehicle
+    return item
+
+@mobile_bp.route('/today.json')
+@require_technician
+def mobile_today_json():
+    """
+    Variante JSON compacte de la vue du jour pour l'application mobile
+    Champs utiles seulement, valeurs nulles omises, ETag (304 si inchangé)
+    """
+    technician_id = session.get('user_id')
+    
+    try:
+        tasks, stats = get_today_snapshot(technician_id)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    body = json.dumps({
+        'date': date.today().isoformat(),
+        'stats': {key: int(value) for key, value in stats.items()},
+        'tasks': [_compact_task(task) for task in tasks]
+    }, separators=(',', ':'), ensure_ascii=False, default=str)
+    response = Response(body, mimetype='application/json')
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.add_etag()
+    return response.make_conditional(request)
 
 @mobile_bp.route('/task/<int:task_id>/start', methods=['POST'])
 @require_technician
@@ -173,6 +279,7 @@ def start_task(task_id):
             """, (task_id,))
             
             conn.commit()
+            invalidate_today_snapshot(technician_id)
             
             return jsonify({
                 'success': True, 
@@ -226,6 +333,7 @@ def stop_task(task_id):
             """, (task_id,))
             
             conn.commit()
+            invalidate_today_snapshot(technician_id)
             
             # Calculer durée
             cursor.execute("""
@@ -280,6 +388,7 @@ def add_quick_note(task_id):
             """, (intervention['id'], technician_id, note_content))
             
             conn.commit()
+            invalidate_today_snapshot(technician_id)
             
             return jsonify({
                 'success': True,
@@ -2,9 +2,10 @@
 Routes PDF - Sprint 3
 Endpoints pour générer et télécharger les PDFs
 """
-from flask import Blueprint, request, jsonify, send_file, abort, current_app
+from flask import Blueprint, request, jsonify, send_file, abort, current_app, Response, stream_with_context
 from flask_login import login_required, current_user
 import os
+import itertools
 import logging
 from datetime import datetime
 from werkzeug.utils import secure_filename
@@ -17,6 +18,14 @@ except ImportError as e:
     print(f"Service PDF non disponible: {e}")
     PDF_SERVICE_AVAILABLE = False
 
+# File de rendu asynchrone (pool de processus)
+try:
+    from services.pdf_render_queue import render_queue
+    PDF_QUEUE_AVAILABLE = PDF_SERVICE_AVAILABLE
+except ImportError as e:
+    print(f"File de rendu PDF non disponible: {e}")
+    PDF_QUEUE_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
 # Blueprint PDF
@@ -84,6 +93,63 @@ def generate_work_order_pdf(work_order_id):
             'error': 'Erreur lors de la génération du PDF'
         }), 500
 
+@pdf_bp.route('/work-order/<int:work_order_id>/async', methods=['POST'])
+@login_required
+def submit_work_order_pdf(work_order_id):
+    """
+    Soumettre le rendu du PDF d'un bon de travail à la file asynchrone
+    
+    Retourne 200 si un PDF identique existe déjà en cache, sinon 202 avec
+    l'URL de suivi du job (/pdf/jobs/<job_id>).
+    
+    Query params:
+        include_interventions: inclure les détails des interventions (default: true)
+    """
+    if not PDF_QUEUE_AVAILABLE:
+        return jsonify({
+            'success': False,
+            'error': 'File de rendu PDF non disponible'
+        }), 503
+    
+    try:
+        include_interventions = request.args.get('include_interventions', 'true').lower() == 'true'
+        
+        if not _can_access_work_order(work_order_id, current_user):
+            abort(403)
+        
+        job = render_queue.submit_work_order(work_order_id, include_interventions, current_user.id)
+        return jsonify(_job_response(job)), 200 if job['status'] == 'done' else 202
+    
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 404
+    except Exception as e:
+        logger.error(f"Erreur soumission PDF Work Order {work_order_id}: {e}")
+        return jsonify({
+            'success': False,
+            'error': 'Erreur lors de la soumission du rendu PDF'
+        }), 500
+
+@pdf_bp.route('/jobs/<job_id>')
+@login_required
+def get_pdf_job_status(job_id):
+    """
+    Suivre un job de rendu PDF (queued, running, done, error)
+    
+    Args:
+        job_id: identifiant renvoyé par /work-order/<id>/async
+    """
+    if not PDF_QUEUE_AVAILABLE:
+        return jsonify({
+            'success': False,
+            'error': 'File de rendu PDF non disponible'
+        }), 503
+    
+    job = render_queue.get_job(job_id, current_user.id)
+    if not job:
+        return jsonify({'success': False, 'error': 'Job introuvable ou expiré'}), 404
+    
+    return jsonify(_job_response(job))
+
 @pdf_bp.route('/intervention/<int:intervention_id>')
 @login_required
 def generate_intervention_pdf(intervention_id):
@@ -156,8 +222,15 @@ def download_generated_pdf(filename):
         if not _can_download_pdf(safe_filename, current_user):
             abort(403)
         
+        # Marqué utilisé (épargné par la purge) et ouvert avant l'envoi :
+        # une purge pendant le téléchargement ne coupe pas le fichier
+        try:
+            os.utime(pdf_path, None)
+            pdf_file = open(pdf_path, 'rb')
+        except FileNotFoundError:
+            abort(404)
         return send_file(
-            pdf_path,
+            pdf_file,
             as_attachment=True,
             download_name=safe_filename,
             mimetype='application/pdf'
@@ -188,7 +261,7 @@ def generate_batch_work_order_pdfs():
     
     try:
         data = request.get_json()
-        if not data or 'work_order_ids' not in data:
+        if not data or not data.get('work_order_ids'):
             return jsonify({
                 'success': False,
                 'error': 'work_order_ids requis'
@@ -206,42 +279,52 @@ def generate_batch_work_order_pdfs():
                     'error': f'Accès refusé pour le work order {wo_id}'
                 }), 403
         
-        # Générer les PDFs
-        results = []
-        generated_files = []
+        if not PDF_QUEUE_AVAILABLE:
+            return jsonify({
+                'success': False,
+                'error': 'File de rendu PDF non disponible'
+            }), 503
         
-        for wo_id in work_order_ids:
-            result = pdf_generator.generate_work_order_pdf(
-                work_order_id=wo_id,
-                include_interventions=include_interventions
-            )
-            
-            results.append({
-                'work_order_id': wo_id,
-                'success': result['success'],
-                'filename': result.get('filename'),
-                'error': result.get('error')
-            })
-            
-            if result['success']:
-                generated_files.append(result['pdf_path'])
+        # Rendus répartis sur le pool de processus, produits au fil de l'eau ;
+        # les données du lot sont chargées ici, avant toute réponse
+        entries = render_queue.iter_work_order_batch(work_order_ids, include_interventions)
         
-        # Si zip demandé, créer une archive
-        if zip_download and generated_files:
-            zip_path = _create_pdf_zip(generated_files)
+        # Si zip demandé, l'archive est streamée au client entrée par entrée,
+        # une fois un premier PDF obtenu (sinon réponse d'erreur)
+        if zip_download:
+            ready = []
+            for entry in entries:
+                ready.append(entry)
+                if 'error' not in entry:
+                    break
+            else:
+                return _batch_failure_response(ready)
             
-            return send_file(
-                zip_path,
-                as_attachment=True,
-                download_name=f"work_orders_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip",
-                mimetype='application/zip'
+            zip_name = f"work_orders_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+            return Response(
+                stream_with_context(_stream_pdf_zip(itertools.chain(ready, entries))),
+                mimetype='application/zip',
+                headers={'Content-Disposition': f'attachment; filename="{zip_name}"'}
             )
-        else:
-            return jsonify({
-                'success': True,
-                'results': results,
-                'total_generated': len(generated_files)
+        
+        entries = list(entries)
+        if all('error' in entry for entry in entries):
+            return _batch_failure_response(entries)
+        
+        results = []
+        for entry in entries:
+            results.append({
+                'work_order_id': entry['work_order_id'],
+                'success': 'error' not in entry,
+                'filename': entry.get('filename'),
+                'error': entry.get('error')
             })
+        
+        return jsonify({
+            'success': True,
+            'results': results,
+            'total_generated': sum(1 for r in results if r['success'])
+        })
     
     except Exception as e:
         logger.error(f"Erreur génération batch PDFs: {e}")
@@ -258,7 +341,8 @@ def pdf_service_status():
         'available': PDF_SERVICE_AVAILABLE,
         'weasyprint_available': PDF_SERVICE_AVAILABLE and hasattr(pdf_generator, 'WEASYPRINT_AVAILABLE') and pdf_generator.WEASYPRINT_AVAILABLE,
         'reportlab_available': PDF_SERVICE_AVAILABLE and hasattr(pdf_generator, 'REPORTLAB_AVAILABLE') and pdf_generator.REPORTLAB_AVAILABLE,
-        'output_directory': os.path.join(os.getcwd(), 'static', 'generated_pdfs') if PDF_SERVICE_AVAILABLE else None
+        'output_directory': os.path.join(os.getcwd(), 'static', 'generated_pdfs') if PDF_SERVICE_AVAILABLE else None,
+        'render_queue': render_queue.get_stats() if PDF_QUEUE_AVAILABLE else None
     })
 
 @pdf_bp.route('/templates/test')
@@ -344,6 +428,14 @@ def test_pdf_template():
             'error': str(e)
         }), 500
 
+def _job_response(job: dict) -> dict:
+    """Réponse JSON d'un job de rendu, avec l'URL de téléchargement une fois terminé"""
+    response = {'success': job['status'] != 'error', **job}
+    response['status_url'] = f"/pdf/jobs/{job['job_id']}"
+    if job['status'] == 'done':
+        response['download_url'] = f"/pdf/download/{job['filename']}"
+    return response
+
 def _can_access_work_order(work_order_id: int, user) -> bool:
     """
     Vérifier si l'utilisateur peut accéder au work order
@@ -410,25 +502,74 @@ def _can_download_pdf(filename: str, user) -> bool:
     
     return True  # Par défaut, autoriser
 
-def _create_pdf_zip(pdf_files: list) -> str:
+def _batch_failure_response(entries):
+    """Aucun PDF produit : 404 si aucun bon de travail n'existe, 500 sinon"""
+    status = 404 if entries and all(entry.get('missing') for entry in entries) else 500
+    return jsonify({
+        'success': False,
+        'error': 'Aucun PDF généré',
+        'results': [
+            {'work_order_id': entry['work_order_id'], 'success': False, 'error': entry['error']}
+            for entry in entries
+        ],
+        'total_generated': 0
+    }), status
+
+class _ZipStreamBuffer:
+    """Flux d'écriture non positionnable : zipfile y écrit, le générateur vide"""
+    
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0
+    
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+    
+    def tell(self) -> int:
+        return self._offset
+    
+    def flush(self):
+        pass
+    
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def _stream_pdf_zip(entries):
     """
-    Créer une archive ZIP des PDFs générés
+    Streamer une archive ZIP des PDFs sans fichier temporaire
     
     Args:
-        pdf_files: Liste des chemins vers les PDFs
+        entries: itérable de résultats de rendu (voir iter_work_order_batch)
         
-    Returns:
-        Chemin vers le fichier ZIP
+    Yields:
+        Morceaux de l'archive, émis à chaque PDF ajouté
     """
     import zipfile
     
-    zip_filename = f"work_orders_batch_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
-    zip_path = os.path.join(os.getcwd(), 'static', 'generated_pdfs', zip_filename)
+    buffer = _ZipStreamBuffer()
+    errors = []
     
-    with zipfile.ZipFile(zip_path, 'w') as zipf:
-        for pdf_path in pdf_files:
-            if os.path.exists(pdf_path):
-                # Ajouter le fichier avec juste le nom (pas le chemin complet)
-                zipf.write(pdf_path, os.path.basename(pdf_path))
+    # Les PDFs sont déjà compressés : stockage sans deflate
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as zipf:
+        try:
+            for entry in entries:
+                if 'error' in entry:
+                    errors.append(f"Work order {entry['work_order_id']}: {entry['error']}")
+                    continue
+                
+                info = zipfile.ZipInfo(entry['filename'], date_time=datetime.now().timetuple()[:6])
+                zipf.writestr(info, entry['pdf_bytes'])
+                yield buffer.drain()
+        except Exception as e:
+            # En-têtes déjà envoyés : l'archive reste lisible, l'échec y est noté
+            logger.error(f"Erreur export PDF par lot interrompu: {e}")
+            errors.append(f"Export interrompu: {e}")
+        
+        if errors:
+            zipf.writestr('erreurs.txt', '\n'.join(errors))
     
-    return zip_path
+    yield buffer.drain()
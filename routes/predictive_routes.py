@@ -3,10 +3,11 @@ Routes API Sprint 4 - Analyse prédictive et proactive
 Endpoints pour maintenance prévisionnelle, heatmap et eco-scoring
 """
 
-from flask import Blueprint, jsonify, request, render_template
+from flask import Blueprint, jsonify, request, render_template, Response
 from flask_login import login_required, current_user
 from datetime import datetime, timedelta
 import json
+import gzip
 from core.predictive_analytics import predictive_engine, heatmap_manager, eco_scoring
 from core.database import get_db_connection
 import logging
@@ -175,11 +176,16 @@ def get_heatmap_data():
     """Récupère les données de heatmap des interventions"""
     try:
         date_filter = request.args.get('period', 'all')
+        if date_filter not in heatmap_manager.PERIODS:
+            return jsonify({
+                'success': False,
+                'error': f"Période invalide (valeurs: {', '.join(heatmap_manager.PERIODS)})"
+            }), 400
         
         heatmap_data = heatmap_manager.generate_heatmap_data(date_filter)
         
         if 'error' in heatmap_data:
-            return jsonify({'success': False, 'error': heatmap_data['error']}), 400
+            return jsonify({'success': False, 'error': heatmap_data['error']}), 500
         
         return jsonify({
             'success': True,
@@ -190,6 +196,38 @@ def get_heatmap_data():
         logger.error(f"Erreur données heatmap: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@predictive_bp.route('/heatmap/compact')
+@login_required
+def get_compact_heatmap_data():
+    """Heatmap compacte: tableaux parallèles lat/lng/weight/count, gzip si accepté"""
+    try:
+        date_filter = request.args.get('period', 'all')
+        if date_filter not in heatmap_manager.PERIODS:
+            return jsonify({
+                'success': False,
+                'error': f"Période invalide (valeurs: {', '.join(heatmap_manager.PERIODS)})"
+            }), 400
+        
+        heatmap_data = heatmap_manager.generate_compact_heatmap(date_filter)
+        
+        if 'error' in heatmap_data:
+            return jsonify({'success': False, 'error': heatmap_data['error']}), 500
+        
+        payload = json.dumps(heatmap_data, separators=(',', ':')).encode('utf-8')
+        response = Response(payload, mimetype='application/json')
+        
+        if 'gzip' in request.headers.get('Accept-Encoding', ''):
+            response.set_data(gzip.compress(payload))
+            response.headers['Content-Encoding'] = 'gzip'
+        
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['Cache-Control'] = 'private, max-age=60'
+        return response
+        
+    except Exception as e:
+        logger.error(f"Erreur données heatmap compacte: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @predictive_bp.route('/heatmap/page')
 @login_required
 def heatmap_page():
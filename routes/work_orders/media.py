@@ -0,0 +1,69 @@
+"""
+Service des médias terrain envoyés au stockage objet (core/media_transfer.py)
+URL construites par MediaTransfer.object_url : /media/<bucket>/<clé>
+"""
+from flask import Blueprint, abort, send_file
+import logging
+import mimetypes
+
+from core.config import get_db_config
+from core.media_transfer import MediaTransfer, NoSuchKey
+from utils.auth import login_required
+import pymysql
+
+logger = logging.getLogger(__name__)
+
+bp = Blueprint('media', __name__)
+
+_media_transfer = None
+
+
+def get_media_transfer():
+    """MediaTransfer partagé (même stockage que la synchronisation offline)"""
+    global _media_transfer
+    if _media_transfer is None:
+        _media_transfer = MediaTransfer()
+    return _media_transfer
+
+
+def _media_type(transfer, key):
+    """Type du média enregistré pour cette clé (objet ou vignette), None si inconnu"""
+    conn = pymysql.connect(**get_db_config())
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT filename, file_type
+                FROM work_order_media
+                WHERE filename = %s OR thumbnail_url = %s
+                LIMIT 1
+            """, (key, transfer.object_url(key)))
+            row = cursor.fetchone()
+    finally:
+        conn.close()
+    if not row:
+        return None
+    if row['filename'] != key:
+        return 'image/jpeg'
+    return row['file_type'] or mimetypes.guess_type(key)[0] or 'application/octet-stream'
+
+
+@bp.route('/media/<bucket>/<path:key>')
+@login_required
+def serve_media(bucket, key):
+    """Servir un média (ou sa vignette) rattaché à un bon de travail"""
+    transfer = get_media_transfer()
+    if bucket != transfer.bucket:
+        abort(404)
+    try:
+        mimetype = _media_type(transfer, key)
+    except Exception as e:
+        logger.error(f"❌ Erreur lecture work_order_media pour {key}: {e}")
+        abort(500)
+    if mimetype is None:
+        abort(404)
+    try:
+        body = transfer.open(key)
+    except (NoSuchKey, ValueError):
+        abort(404)
+    # Clés adressées par contenu : un objet ne change jamais
+    return send_file(body, mimetype=mimetype, etag=key, max_age=31536000, conditional=True)
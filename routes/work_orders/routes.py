@@ -13,8 +13,11 @@ import os
 from functools import wraps
 
 # Import de l'utilitaire de pagination et authentification
-from utils.pagination import Pagination, paginate_query
+from utils.pagination import Pagination, paginate_keyset
 from utils.auth import login_required as requires_auth
+from core.predictive_analytics import heatmap_manager
+from core.search import search_service
+from core.media_transfer import MEDIA_PUBLIC_BASE_URL
 
 # Configuration du logging
 logger = logging.getLogger(__name__)
@@ -60,6 +63,7 @@ def index():
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)  # 20 éléments par page par défaut
         per_page = max(5, min(100, per_page))  # Limite entre 5 et 100
+        page_cursor = request.args.get('cursor')  # Navigation précédent/suivant par clé
         
         conn = get_db_connection()
         if not conn:
@@ -114,15 +118,16 @@ def index():
                 where_clause = "WHERE " + " AND ".join(where_conditions) if where_conditions else ""
                 
                 # Debug temporaire pour la pagination
-                logger.info(f"🔍 PAGINATION DEBUG: page={page}, per_page={per_page}")
+                logger.info(f"🔍 PAGINATION DEBUG: page={page}, per_page={per_page}, cursor={bool(page_cursor)}")
                 logger.info(f"🔍 FILTRES DEBUG: status='{status_filter}', priority='{priority_filter}', technician='{technician_filter}', search='{search_query}'")
                 logger.info(f"🔍 WHERE DEBUG: {where_clause}")
                 logger.info(f"🔍 PARAMS DEBUG: {params}")
                 
-                # Requête principale pour la pagination
+                # Requête principale pour la pagination (tri et LIMIT ajoutés par paginate_keyset)
                 base_query = f"""
                     SELECT 
                         wo.*,
+                        FIELD(wo.priority, 'urgent', 'high', 'medium', 'low') as priority_rank,
                         u.name as technician_name,
                         c.name as customer_full_name,
                         c.phone as customer_phone_contact,
@@ -133,22 +138,21 @@ def index():
                         COALESCE(SUM(wol.MONTANT), 0) as total_amount,
                         COUNT(CASE WHEN wol.STATUS = 'A' THEN 1 END) as active_lines,
                         DATEDIFF(NOW(), wo.created_at) as days_old,
-                        CASE 
-                            WHEN wo.scheduled_date IS NOT NULL THEN wo.scheduled_date
-                            ELSE wo.created_at 
-                        END as sort_date
+                        COALESCE(wo.scheduled_date, wo.created_at) as sort_date
                     FROM work_orders wo
                     LEFT JOIN users u ON wo.assigned_technician_id = u.id
                     LEFT JOIN customers c ON wo.customer_id = c.id
                     LEFT JOIN users creator ON wo.created_by_user_id = creator.id
                     LEFT JOIN work_order_products wop ON wo.id = wop.work_order_id
                     LEFT JOIN work_order_lines wol ON wo.id = wol.work_order_id
-                    {where_clause}
+                    {where_clause or 'WHERE 1=1'} {{keyset}}
                     GROUP BY wo.id
-                    ORDER BY 
-                        FIELD(wo.priority, 'urgent', 'high', 'medium', 'low'),
-                        sort_date DESC
                 """
+                sort_keys = [
+                    ("FIELD(wo.priority, 'urgent', 'high', 'medium', 'low')", 'priority_rank', 'ASC'),
+                    ("COALESCE(wo.scheduled_date, wo.created_at)", 'sort_date', 'DESC'),
+                    ("wo.id", 'id', 'DESC')
+                ]
                 
                 # Requête de comptage spécifique pour la pagination
                 count_query = f"""
@@ -162,8 +166,9 @@ def index():
                     {where_clause}
                 """
                 
-                # Application de la pagination
-                pagination = paginate_query(cursor, base_query, params, page, per_page, count_query)
+                # Application de la pagination (curseur pour précédent/suivant, total en cache)
+                pagination = paginate_keyset(cursor, base_query, params, sort_keys, page, per_page,
+                                             cursor_token=page_cursor, count_query=count_query)
                 work_orders = pagination.items
                 
                 # Récupération des données pour les filtres
@@ -437,6 +442,7 @@ def create_work_order():
                         work_order_id
                     ))
                 conn.commit()
+                heatmap_manager.refresh_work_order_tiles(work_order_id)
                 flash(f'Bon de travail {claim_number} créé avec succès', 'success')
                 is_ajax = request.headers.get('X-Requested-With') == 'XMLHttpRequest' or request.is_json
                 if is_ajax:
@@ -668,6 +674,7 @@ def edit_work_order(id):
                       location_latitude or None, location_longitude or None, internal_notes,
                       public_notes or '', estimated_duration or None, estimated_cost or None, id))
                 conn.commit()
+            heatmap_manager.refresh_work_order_tiles(id)
                 
             flash('Bon de travail modifié avec succès', 'success')
             return redirect(url_for('work_orders.view_work_order', id=id))
@@ -717,12 +724,18 @@ def edit_work_order(id):
             media_files = []
             try:
                 cursor.execute("""
-                    SELECT id, filename, original_filename, file_type, created_at
+                    SELECT id, filename, original_filename, file_path, file_type, created_at
                     FROM work_order_media 
                     WHERE work_order_id = %s
                     ORDER BY created_at DESC
                 """, (id,))
                 media_files = cursor.fetchall()
+                for media in media_files:
+                    # Médias synchronisés : servis depuis le stockage objet
+                    if (media['file_path'] or '').startswith(MEDIA_PUBLIC_BASE_URL):
+                        media['url'] = media['file_path']
+                    else:
+                        media['url'] = url_for('static', filename='uploads/' + media['filename'])
             except Exception as e:
                 print(f"Erreur lors de la récupération des médias: {e}")
                 media_files = []
@@ -840,6 +853,9 @@ def update_status(id):
                 ))
             
             conn.commit()
+            # Tuile heatmap du jour: coûts et durées pris en compte à la complétion
+            if new_status == 'completed' and old_status != 'completed':
+                heatmap_manager.refresh_work_order_tiles(id)
             
             return jsonify({
                 'success': True, 
@@ -914,35 +930,16 @@ def today_tasks():
 # Routes API pour les interactions AJAX
 @bp.route('/api/search')
 def api_search():
-    """API de recherche rapide pour les work orders"""
+    """API de recherche rapide pour les work orders (index FULLTEXT, classés par pertinence)"""
     query = request.args.get('q', '')
     limit = min(int(request.args.get('limit', 10)), 50)
+    offset = max(int(request.args.get('offset', 0)), 0)
     
     if len(query) < 2:
         return jsonify([])
     
-    conn = get_db_connection()
-    try:
-        with conn.cursor() as cursor:
-            cursor.execute("""
-                SELECT 
-                    wo.id, wo.claim_number, wo.status, wo.priority,
-                    c.name as customer_name,
-                    u.name as technician_name
-                FROM work_orders wo
-                LEFT JOIN customers c ON wo.customer_id = c.id
-                LEFT JOIN users u ON wo.assigned_technician_id = u.id
-                WHERE wo.claim_number LIKE %s 
-                   OR c.name LIKE %s 
-                   OR wo.description LIKE %s
-                ORDER BY wo.created_at DESC
-                LIMIT %s
-            """, (f"%{query}%", f"%{query}%", f"%{query}%", limit))
-            
-            results = cursor.fetchall()
-            return jsonify(results)
-    finally:
-        conn.close()
+    page = search_service.search_work_orders(query, limit=limit, offset=offset)
+    return jsonify(page['results'])
 
 @bp.route('/api/stats')
 def api_stats():
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark de régression des statistiques du tableau de bord
+
+Instrumente db_manager.execute_query pour compter, pour chaque rôle, les
+requêtes émises et les lignes transférées par get_dashboard_stats() et
+get_recent_activities(). Les compteurs doivent rester en O(1) lignes quel
+que soit le volume de la base : le script échoue sinon.
+Usage (depuis la racine du projet, base configurée) :
+    python scripts/analysis/benchmark_dashboard_stats.py [--iterations 50]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from core import models
+from core.database import db_manager
+
+# Bornes attendues par appel (cache froid)
+MAX_QUERIES = 2
+MAX_ROWS = 2
+
+
+class QueryCounter:
+    """Compte les requêtes et les lignes renvoyées par execute_query"""
+
+    def __init__(self):
+        self.queries = 0
+        self.rows = 0
+        self._original = db_manager.execute_query
+
+    def __enter__(self):
+        def counting_execute_query(query, params=None, fetch_one=False, fetch_all=True):
+            result = self._original(query, params, fetch_one=fetch_one, fetch_all=fetch_all)
+            self.queries += 1
+            if isinstance(result, (list, tuple)):
+                self.rows += len(result)
+            elif result is not None and not isinstance(result, int):
+                self.rows += 1
+            return result
+        db_manager.execute_query = counting_execute_query
+        return self
+
+    def __exit__(self, *exc):
+        db_manager.execute_query = self._original
+        return False
+
+
+def pick_user(role):
+    """Premier utilisateur actif du rôle demandé"""
+    row = db_manager.execute_query(
+        "SELECT id FROM users WHERE role = %s AND is_active = TRUE LIMIT 1", (role,), fetch_one=True
+    )
+    return row['id'] if row else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark des statistiques du tableau de bord")
+    parser.add_argument('--iterations', type=int, default=50)
+    args = parser.parse_args()
+
+    volume = db_manager.execute_query("SELECT COUNT(*) AS n FROM work_orders", fetch_one=True)['n']
+    print(f"📊 Statistiques du tableau de bord ({volume} bons de travail)")
+    print("=" * 70)
+
+    failures = 0
+    for role in ('admin', 'manager', 'technician', None):
+        user_id = pick_user(role) if role else None
+
+        models.invalidate_dashboard_stats()
+        with QueryCounter() as counter:
+            start = time.perf_counter()
+            stats = models.get_dashboard_stats(user_id, role)
+            cold_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        for _ in range(args.iterations):
+            models.get_dashboard_stats(user_id, role)
+        warm_ms = (time.perf_counter() - start) * 1000 / args.iterations
+
+        ok = counter.queries <= MAX_QUERIES and counter.rows <= MAX_ROWS and stats
+        failures += 0 if ok else 1
+        print(f"{'✅' if ok else '❌'} rôle={role or '-':<10} requêtes={counter.queries} lignes={counter.rows} "
+              f"froid={cold_ms:.1f} ms chaud={warm_ms:.2f} ms")
+
+    with QueryCounter() as counter:
+        activities = models.get_recent_activities(limit=10)
+    ok = counter.queries == 1 and counter.rows <= 10
+    failures += 0 if ok else 1
+    print(f"{'✅' if ok else '❌'} activités récentes: requêtes={counter.queries} lignes={counter.rows} "
+          f"({len(activities)} activités)")
+
+    print("=" * 70)
+    if failures:
+        print(f"❌ {failures} vérification(s) en échec")
+        return 1
+    print("✅ Compteurs en O(1) lignes transférées")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la reconnaissance d'intentions
+
+Compare, sur un corpus de questions superviseur et de transcriptions
+vocales (français/anglais) :
+- legacy : boucle re.search motif par motif (ConversationalAI) et
+  recherches de sous-chaînes imbriquées (VoiceToActionEngine)
+- compiled : IntentMatcher (expression unique compilée au démarrage)
+
+Affiche les classifications par seconde et les écarts de résultat (les
+saisies sans accents ne sont reconnues que par la nouvelle version), puis
+l'évolution avec un catalogue de commandes agrandi (--extra-commands).
+Usage (depuis la racine du projet) :
+    python scripts/analysis/benchmark_intent_matching.py [--rounds 2000] [--corpus fichier.txt]
+        [--extra-commands 50 200]
+"""
+
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT_DIR)
+
+QUESTIONS = [
+    "quels techniciens sont disponibles cet après-midi ?",
+    "quels techniciens sont disponibles cet apres-midi ?",
+    "qui est libre demain",
+    "disponibilité des techniciens",
+    "disponibilite des techniciens",
+    "combien de tâches pour jean dupont",
+    "combien d'interventions pour marie",
+    "charge de travail de hélène",
+    "planning de demain",
+    "performance de l'équipe nord",
+    "statistiques de la semaine",
+    "résultats de pierre",
+    "quelles tâches urgentes ?",
+    "interventions urgentes aujourd'hui",
+    "priorités du jour",
+    "problèmes critiques",
+    "satisfaction client garage martin",
+    "feedback du client dupuis",
+    "avis client transport leblanc",
+    "éco-score de l'atelier",
+    "impact environnemental de la flotte",
+    "durabilité des pièces",
+    "who is available this afternoon?",
+    "how many work orders for john",
+    "show me urgent tasks",
+    "bonjour",
+]
+
+VOICE_TRANSCRIPTIONS = [
+    "commencer la tâche numéro douze trente quatre",
+    "commencer la tache",
+    "je commence",
+    "terminer l'intervention",
+    "terminer l’intervention",
+    "travail terminé tout est en ordre",
+    "travail termine",
+    "c'est fini",
+    "ajouter une note vérification des freins effectuée",
+    "prendre note pneus usés",
+    "observation fuite d'huile",
+    "mettre en pause",
+    "reprendre",
+    "problème détecté sur le système hydraulique",
+    "signaler un problème urgent",
+    "dysfonctionnement",
+    "start task",
+    "complete task",
+    "take a note",
+    "report an incident",
+    "quelle heure est-il",
+]
+
+
+def legacy_classify(question_patterns, question):
+    """Ancienne version de ConversationalAI._classify_question"""
+    for question_type, patterns in question_patterns.items():
+        for pattern in patterns:
+            match = re.search(pattern, question)
+            if match:
+                params = match.groups() if match.groups() else []
+                return question_type, params
+    return 'unknown', []
+
+
+def legacy_voice(command_patterns, transcription):
+    """Ancienne version de VoiceToActionEngine._analyze_voice_command (sans paramètres)"""
+    transcription_lower = transcription.lower()
+    best = (None, 0.0)
+    for command_type, config in command_patterns.items():
+        for pattern in config['patterns']:
+            if pattern.lower() in transcription_lower:
+                confidence = min(len(pattern) / len(transcription_lower), 1.0)
+                if confidence >= config['confidence_threshold'] and confidence > best[1]:
+                    best = (command_type, confidence)
+    return best
+
+
+def throughput(func, corpus, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for text in corpus:
+            func(text)
+    elapsed = time.perf_counter() - start
+    return rounds * len(corpus) / elapsed
+
+
+def synthetic_commands(count):
+    """Commandes fictives (mots uniques) ajoutées au catalogue vocal"""
+    commands = {}
+    for index in range(count):
+        word = ''.join(chr(ord('a') + (index * 7 + k * 3) % 26) for k in range(4)) + f"x{index}"
+        commands[f"custom_{index}"] = {
+            'patterns': [f"lancer {word}", f"{word} maintenant", f"programme {word}"],
+            'confidence_threshold': 0.5,
+            'action': 'custom'
+        }
+    return commands
+
+
+def load_corpus(path):
+    with open(path, encoding='utf-8') as handle:
+        return [line.strip() for line in handle if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la reconnaissance d'intentions")
+    parser.add_argument('--rounds', type=int, default=2000)
+    parser.add_argument('--corpus', help="Questions supplémentaires, une par ligne")
+    parser.add_argument('--extra-commands', type=int, nargs='+', default=[50, 200])
+    args = parser.parse_args()
+
+    from core.intent_matcher import IntentMatcher
+    from core.conversational_ai import ConversationalAI
+    from core.voice_to_action import VoiceToActionEngine
+
+    questions = QUESTIONS + (load_corpus(args.corpus) if args.corpus else [])
+    ai = ConversationalAI()
+    cleaned = [ai._clean_question(q) for q in questions]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        voice = VoiceToActionEngine(offline_db_path=os.path.join(tmp, 'offline.db'))
+
+    print("📊 Questions superviseur")
+    differences = 0
+    for question in cleaned:
+        old = legacy_classify(ai.question_patterns, question)
+        new = ai._classify_question(question)
+        if (old[0], list(old[1])) != (new[0], list(new[1])):
+            differences += 1
+            print(f"   ≠ {question!r}: {old[0]} -> {new[0]} {list(new[1])}")
+    legacy_rate = throughput(lambda q: legacy_classify(ai.question_patterns, q), cleaned, args.rounds)
+    compiled_rate = throughput(ai._classify_question, cleaned, args.rounds)
+    print(f"   legacy   : {legacy_rate:>10.0f} classifications/s")
+    print(f"   compiled : {compiled_rate:>10.0f} classifications/s (x{compiled_rate / legacy_rate:.1f})")
+    print(f"   écarts   : {differences}/{len(cleaned)}")
+
+    print("\n🎤 Commandes vocales")
+    differences = 0
+    for transcription in VOICE_TRANSCRIPTIONS:
+        old = legacy_voice(voice.command_patterns, transcription)
+        match = voice.intent_matcher.match(transcription)
+        new = (match.intent, match.score) if match else (None, 0.0)
+        if old[0] != new[0]:
+            differences += 1
+            print(f"   ≠ {transcription!r}: {old[0]} -> {new[0]}")
+    legacy_rate = throughput(lambda t: legacy_voice(voice.command_patterns, t), VOICE_TRANSCRIPTIONS, args.rounds)
+    compiled_rate = throughput(voice.intent_matcher.match, VOICE_TRANSCRIPTIONS, args.rounds)
+    print(f"   legacy   : {legacy_rate:>10.0f} classifications/s")
+    print(f"   compiled : {compiled_rate:>10.0f} classifications/s (x{compiled_rate / legacy_rate:.1f})")
+    print(f"   écarts   : {differences}/{len(VOICE_TRANSCRIPTIONS)}")
+
+    print("\n📈 Catalogue vocal agrandi")
+    for extra in args.extra_commands:
+        commands = dict(voice.command_patterns, **synthetic_commands(extra))
+        matcher = IntentMatcher(strategy='coverage')
+        for command_type, config in commands.items():
+            matcher.add_phrases(command_type, config['patterns'], threshold=config['confidence_threshold'])
+        matcher.compile()
+        rounds = max(1, args.rounds // 10)
+        legacy_rate = throughput(lambda t: legacy_voice(commands, t), VOICE_TRANSCRIPTIONS, rounds)
+        compiled_rate = throughput(matcher.match, VOICE_TRANSCRIPTIONS, rounds)
+        print(f"   +{extra:<4} commandes : legacy {legacy_rate:>9.0f}/s, compiled {compiled_rate:>9.0f}/s "
+              f"(x{compiled_rate / legacy_rate:.1f})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Benchmark du rejeu de l'outbox offline (core/offline_sync.py)
+
+Simule une tablette restée hors ligne : N opérations (notes insérées, statuts
+mis à jour, suppressions, par rafales comme une session de technicien) dans
+une outbox SQLite temporaire, rejouées vers une table MySQL temporaire :
+- legacy : une requête et une écriture SQLite par opération (ancien rejeu)
+- batched : OfflineSyncManager (lots groupés, une transaction par lot)
+
+Vérifie aussi l'idempotence : un second rejeu des mêmes opérations ne doit
+rien modifier. La table et les clés d'idempotence créées sont supprimées.
+Usage (depuis la racine du projet, base configurée) :
+    python scripts/analysis/benchmark_offline_sync.py [--operations 20000] [--batch-size 500]
+"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT_DIR)
+
+import mysql.connector
+
+from core.config import get_db_config
+from core.offline_sync import OfflineSyncManager, APPLIED_OPS_DDL
+
+BENCH_TABLE = 'bench_offline_sync'
+SEED_ROWS = 2000
+
+
+def mysql_config():
+    """Configuration de l'application adaptée à mysql.connector"""
+    config = get_db_config()
+    config.pop('cursorclass', None)
+    config.pop('autocommit', None)
+    return config
+
+
+def reset_table(conn):
+    cursor = conn.cursor()
+    cursor.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+    cursor.execute(f'''
+        CREATE TABLE {BENCH_TABLE} (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            work_order_id INT,
+            status VARCHAR(20),
+            note TEXT
+        ) ENGINE=InnoDB
+    ''')
+    cursor.executemany(
+        f"INSERT INTO {BENCH_TABLE} (id, work_order_id, status, note) VALUES (%s, %s, 'pending', '')",
+        [(i, i) for i in range(1, SEED_ROWS + 1)]
+    )
+    conn.commit()
+    cursor.close()
+
+
+def generate_operations(count, seed=42):
+    """Opérations par rafales de même type (1 à 20), mélange 60/35/5"""
+    rng = random.Random(seed)
+    deletable = list(range(SEED_ROWS // 2 + 1, SEED_ROWS + 1))
+    operations = []
+    while len(operations) < count:
+        kind = rng.choices(['insert', 'update', 'delete'], weights=[60, 35, 5])[0]
+        for _ in range(rng.randint(1, 20)):
+            if kind == 'insert':
+                operations.append((None, 'insert', {'work_order_id': rng.randint(1, 500),
+                                                    'note': f"Note vocale {len(operations)}"}))
+            elif kind == 'update':
+                operations.append((rng.randint(1, SEED_ROWS // 2), 'update',
+                                   {'status': rng.choice(['in_progress', 'completed', 'paused'])}))
+            elif deletable:
+                operations.append((deletable.pop(), 'delete', {}))
+    return operations[:count]
+
+
+def fill_outbox(manager, operations):
+    with manager._lock:
+        local = manager._local()
+        local.execute("DELETE FROM sync_queue")
+        local.executemany(
+            "INSERT INTO sync_queue (table_name, record_id, action, data) VALUES (?, ?, ?, ?)",
+            [(BENCH_TABLE, record_id, action, json.dumps(data)) for record_id, action, data in operations]
+        )
+        local.commit()
+
+
+def legacy_replay(manager, conn):
+    """Ancien rejeu : une requête MySQL et un UPDATE SQLite par opération"""
+    local = sqlite3.connect(manager.offline_db_path)
+    local.row_factory = sqlite3.Row
+    rows = local.execute("SELECT * FROM sync_queue WHERE status = 'pending' ORDER BY id").fetchall()
+    cursor = conn.cursor()
+    for item in rows:
+        data = json.loads(item['data'])
+        if item['action'] == 'insert':
+            cursor.execute(f"INSERT INTO {BENCH_TABLE} ({', '.join(data)}) VALUES ({', '.join(['%s'] * len(data))})",
+                           list(data.values()))
+        elif item['action'] == 'update':
+            cursor.execute(f"UPDATE {BENCH_TABLE} SET {', '.join(f'{k} = %s' for k in data)} WHERE id = %s",
+                           list(data.values()) + [item['record_id']])
+        else:
+            cursor.execute(f"DELETE FROM {BENCH_TABLE} WHERE id = %s", (item['record_id'],))
+        local.execute("UPDATE sync_queue SET status = 'synced', last_attempt = CURRENT_TIMESTAMP WHERE id = ?",
+                      (item['id'],))
+    conn.commit()
+    local.commit()
+    cursor.close()
+    local.close()
+    return len(rows)
+
+
+def table_fingerprint(conn):
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT COUNT(*), COALESCE(SUM(CRC32(CONCAT_WS('|', id, work_order_id, status, note))), 0) "
+                   f"FROM {BENCH_TABLE}")
+    result = cursor.fetchone()
+    cursor.close()
+    return tuple(int(value) for value in result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du rejeu de l'outbox offline")
+    parser.add_argument('--operations', type=int, default=20000)
+    parser.add_argument('--batch-size', type=int, default=500)
+    args = parser.parse_args()
+
+    config = mysql_config()
+    conn = mysql.connector.connect(**config)
+    cursor = conn.cursor()
+    cursor.execute(APPLIED_OPS_DDL)
+    conn.commit()
+
+    operations = generate_operations(args.operations)
+    print(f"📦 {len(operations)} opérations en attente (table {BENCH_TABLE})")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = OfflineSyncManager(config, os.path.join(tmp, 'offline.db'))
+        manager.batch_size = args.batch_size
+        try:
+            reset_table(conn)
+            fill_outbox(manager, operations)
+            start = time.perf_counter()
+            count = legacy_replay(manager, conn)
+            legacy_elapsed = time.perf_counter() - start
+            legacy_state = table_fingerprint(conn)
+            print(f"   legacy  : {count / legacy_elapsed:>9.0f} op/s ({legacy_elapsed:.2f}s)")
+
+            reset_table(conn)
+            fill_outbox(manager, operations)
+            start = time.perf_counter()
+            with manager._lock:
+                applied = manager._sync_queue_items()
+            batched_elapsed = time.perf_counter() - start
+            batched_state = table_fingerprint(conn)
+            print(f"   batched : {len(operations) / batched_elapsed:>9.0f} op/s ({batched_elapsed:.2f}s, "
+                  f"lots de {args.batch_size}) x{legacy_elapsed / batched_elapsed:.1f}")
+            print(f"   état final identique : {'✅' if legacy_state == batched_state else '❌'}")
+
+            # Rejeu des mêmes opérations (lot perdu avant le marquage local)
+            with manager._lock:
+                local = manager._local()
+                local.execute("UPDATE sync_queue SET status = 'pending'")
+                local.commit()
+                replayed = manager._sync_queue_items()
+            unchanged = table_fingerprint(conn) == batched_state
+            print(f"   rejeu idempotent : {replayed} réappliquées, table inchangée {'✅' if unchanged else '❌'}")
+            ok = applied == len(operations) and legacy_state == batched_state and replayed == 0 and unchanged
+        finally:
+            cursor.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+            cursor.execute("DELETE FROM sync_applied_ops WHERE device_id = %s", (manager.device_id,))
+            conn.commit()
+            manager._close_mysql()
+            manager._local().close()
+
+    cursor.close()
+    conn.close()
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Banc d'essai du client OpenAI partagé contre un serveur local factice
+
+Le serveur imite /v1/chat/completions (latence configurable, 429 avec
+Retry-After sur la première requête) et compte les appels reçus. Le script
+vérifie :
+- la fusion des appels identiques simultanés (un seul appel HTTP)
+- la reprise après 429
+- la réutilisation des connexions keep-alive
+Usage :
+    python scripts/analysis/benchmark_openai_client.py [--callers 20] [--latency 0.2]
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from services.openai_client import OpenAIClient
+
+
+class StubState:
+    latency = 0.2
+    hits = 0
+    connections = set()
+    rate_limited_once = False
+    lock = threading.Lock()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        with StubState.lock:
+            StubState.hits += 1
+            StubState.connections.add(self.client_address)
+            first = not StubState.rate_limited_once
+            StubState.rate_limited_once = True
+
+        if first:
+            self._reply(429, {'error': {'message': 'rate limited'}}, {'Retry-After': '0.1'})
+            return
+
+        time.sleep(StubState.latency)
+        payload = json.loads(body or b'{}')
+        content = payload.get('messages', [{}])[-1].get('content', '')
+        self._reply(200, {
+            'choices': [{'message': {'role': 'assistant', 'content': f"echo: {content}"}}],
+            'usage': {'prompt_tokens': 10, 'completion_tokens': 5, 'total_tokens': 15}
+        })
+
+    def _reply(self, status, data, headers=None):
+        raw = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(raw)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def log_message(self, *args):
+        pass
+
+
+def payload(text):
+    return {'model': 'gpt-4o-mini', 'messages': [{'role': 'user', 'content': text}]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Banc d'essai du client OpenAI")
+    parser.add_argument('--callers', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.2)
+    args = parser.parse_args()
+    StubState.latency = args.latency
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = OpenAIClient(base_url=f"http://127.0.0.1:{server.server_port}", max_concurrency=4)
+
+    print("🔍 Client OpenAI contre serveur factice")
+    print("=" * 60)
+
+    # 1. Appels identiques simultanés : une seule requête HTTP (plus la reprise 429)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.callers) as pool:
+        results = list(pool.map(lambda _: client.chat_completion(payload('même question'), 'sk-test'),
+                                range(args.callers)))
+    elapsed = time.perf_counter() - start
+    identical_hits = StubState.hits
+    ok = all(not r.get('error') for r in results) and identical_hits == 2
+    print(f"{'✅' if ok else '❌'} {args.callers} appels identiques -> {identical_hits} requêtes HTTP "
+          f"(dont 1 x 429) en {elapsed * 1000:.0f} ms")
+
+    # 2. Appels distincts : limités par max_concurrency, connexions réutilisées
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.callers) as pool:
+        list(pool.map(lambda i: client.chat_completion(payload(f'question {i % 8}'), 'sk-test'),
+                      range(args.callers)))
+    elapsed = time.perf_counter() - start
+    print(f"✅ {args.callers} appels (8 distincts) -> {StubState.hits - identical_hits} requêtes HTTP "
+          f"en {elapsed * 1000:.0f} ms, {len(StubState.connections)} connexions TCP")
+
+    print("\n📊 Métriques :")
+    print(json.dumps(client.get_metrics(), indent=2))
+
+    client.close()
+    server.shutdown()
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Benchmark du rendu PDF des bons de travail
+
+Compare, pour 1, 10 et 100 documents :
+- cold : contexte de rendu reconstruit à chaque document (gabarit, CSS,
+  polices), comme avant la mise en cache
+- warm : contexte réutilisé (gabarit Jinja2 compilé, CSS analysé,
+  FontConfiguration et cache d'images partagés)
+
+Chaque scénario tourne dans un processus séparé pour mesurer son pic de RSS.
+Usage (depuis la racine du projet) :
+    python scripts/analysis/benchmark_pdf_render.py [--counts 1 10 100]
+"""
+
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import time
+from datetime import datetime, timedelta
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT_DIR)
+
+
+def sample_work_order(index: int):
+    """Données de test proches de /pdf/templates/test"""
+    now = datetime(2025, 1, 1, 8, 0)
+    wo_data = {
+        'id': 1000 + index,
+        'claim_number': f'BENCH-{index:04d}',
+        'customer_name': 'Client Benchmark',
+        'customer_email': 'bench@example.com',
+        'customer_phone': '555-0123',
+        'customer_address': '123 Rue Test',
+        'customer_city': 'Testville',
+        'customer_postal_code': '12345',
+        'make': 'Toyota',
+        'model': 'Camry',
+        'year': 2020,
+        'license_plate': 'TEST-123',
+        'vin': '1HGBH41JXMN109186',
+        'mileage': 45000,
+        'fuel_type': 'Essence'
+    }
+    tasks_data = [
+        {
+            'id': task_id,
+            'title': f'Tâche {task_id}',
+            'description': 'Contrôle et remplacement si nécessaire',
+            'priority': ('high', 'medium', 'low')[task_id % 3],
+            'status': ('pending', 'assigned', 'done')[task_id % 3],
+            'technician_name': 'Jean Dupont'
+        }
+        for task_id in range(1, 9)
+    ]
+    interventions_data = [
+        {
+            'task_title': f'Tâche {task_id}',
+            'technician_name': 'Jean Dupont',
+            'started_at': now + timedelta(hours=task_id),
+            'ended_at': now + timedelta(hours=task_id, minutes=45),
+            'result_status': 'completed',
+            'notes_count': 2,
+            'media_count': 1
+        }
+        for task_id in range(1, 5)
+    ]
+    return wo_data, tasks_data, interventions_data
+
+
+def reset_render_context(generator):
+    """Repartir d'un contexte de rendu vide (mode cold)"""
+    from weasyprint.text.fonts import FontConfiguration
+    generator.font_config = FontConfiguration()
+    generator._template_env = None
+    generator._pdf_css = None
+    generator._stylesheets = {}
+    generator._image_cache = {}
+
+
+def run_scenario(mode: str, count: int, queue):
+    """Rendre `count` documents et renvoyer les mesures au processus parent"""
+    os.chdir(ROOT_DIR)
+    from services.pdf_generator import pdf_generator, WEASYPRINT_AVAILABLE
+
+    if not WEASYPRINT_AVAILABLE:
+        queue.put({'error': 'WeasyPrint non disponible'})
+        return
+
+    durations = []
+    total_bytes = 0
+    for index in range(count):
+        if mode == 'cold':
+            reset_render_context(pdf_generator)
+        start = time.perf_counter()
+        pdf_bytes = pdf_generator.render_work_order_bytes(*sample_work_order(index))
+        durations.append(time.perf_counter() - start)
+        total_bytes += len(pdf_bytes)
+
+    durations.sort()
+    queue.put({
+        'mode': mode,
+        'count': count,
+        'mean_ms': sum(durations) / count * 1000,
+        'p95_ms': durations[min(count - 1, int(count * 0.95))] * 1000,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'avg_pdf_kb': total_bytes / count / 1024
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du rendu PDF des bons de travail")
+    parser.add_argument('--counts', type=int, nargs='+', default=[1, 10, 100])
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context('spawn')
+    print(f"{'mode':<6} {'docs':>5} {'moy. ms/doc':>12} {'p95 ms':>9} {'RSS max MB':>11} {'PDF ko':>8}")
+    print("-" * 56)
+
+    for count in args.counts:
+        for mode in ('cold', 'warm'):
+            queue = context.Queue()
+            process = context.Process(target=run_scenario, args=(mode, count, queue))
+            process.start()
+            result = queue.get()
+            process.join()
+
+            if 'error' in result:
+                print(f"❌ {result['error']}")
+                return 1
+
+            print(f"{mode:<6} {count:>5} {result['mean_ms']:>12.1f} {result['p95_ms']:>9.1f} "
+                  f"{result['peak_rss_mb']:>11.1f} {result['avg_pdf_kb']:>8.1f}")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Benchmark du limiteur de débit de l'API publique (core/rate_limit.py)
+
+Mesure le coût de RateLimiter.hit() (stockage mémoire) pour un trafic
+réparti sur de nombreux tokens, en un thread puis en parallèle, et vérifie
+sur une horloge simulée que la limite horaire est appliquée (refus, en-têtes
+Retry-After, recharge, seaux lecture / écriture indépendants). Le script
+échoue si un appel coûte plus de --budget-us microsecondes en moyenne.
+Usage (depuis la racine du projet, sans base de données) :
+    python scripts/analysis/benchmark_rate_limiter.py [--calls 200000] [--tokens 500] [--threads 8]
+"""
+
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from core.rate_limit import MemoryBackend, RateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def check_semantics():
+    """Limite de 100/h : 100 lectures accordées, la 101e refusée, un jeton toutes les 36 s"""
+    clock = FakeClock()
+    limiter = RateLimiter(MemoryBackend(clock=clock))
+    results = [limiter.hit(1, 100, 'GET') for _ in range(101)]
+    refused = results[-1]
+    ok = all(result.allowed for result in results[:100]) and not refused.allowed
+    ok = ok and refused.headers()['Retry-After'] == '36' and refused.headers()['X-RateLimit-Remaining'] == '0'
+    # Les écritures ont leur propre seau
+    ok = ok and limiter.hit(1, 100, 'POST').allowed
+    clock.now += 36
+    ok = ok and limiter.hit(1, 100, 'GET').allowed and not limiter.hit(1, 100, 'GET').allowed
+    print(f"   sémantique (limite, Retry-After, recharge, lecture/écriture) : {'✅' if ok else '❌'}")
+    return ok
+
+
+def run(limiter, keys, calls):
+    hit = limiter.hit
+    start = time.perf_counter()
+    for i in range(calls):
+        token_id, method = keys[i % len(keys)]
+        hit(token_id, 1000, method)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du limiteur de débit de l'API publique")
+    parser.add_argument('--calls', type=int, default=200000)
+    parser.add_argument('--tokens', type=int, default=500)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--budget-us', type=float, default=50.0)
+    args = parser.parse_args()
+
+    ok = check_semantics()
+
+    rng = random.Random(42)
+    keys = [(rng.randint(1, args.tokens), rng.choice(['GET', 'GET', 'GET', 'POST'])) for _ in range(10000)]
+
+    limiter = RateLimiter(MemoryBackend())
+    elapsed = run(limiter, keys, args.calls)
+    single_us = elapsed / args.calls * 1_000_000
+    print(f"🚦 {args.calls} appels, {args.tokens} tokens")
+    print(f"   1 thread   : {single_us:6.2f} µs/appel")
+
+    limiter = RateLimiter(MemoryBackend())
+    per_thread = args.calls // args.threads
+    durations = []
+    threads = [threading.Thread(target=lambda: durations.append(run(limiter, keys, per_thread)))
+               for _ in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Latence vue par un appel quand tous les threads sont actifs
+    threaded_us = max(durations) / per_thread * 1_000_000
+    print(f"   {args.threads} threads : {threaded_us:6.2f} µs/appel (contention du verrou comprise)")
+
+    within = max(single_us, threaded_us) < args.budget_us
+    print(f"   budget {args.budget_us:.0f} µs : {'✅' if within else '❌'}")
+    return 0 if ok and within else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
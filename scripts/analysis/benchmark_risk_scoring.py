@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Benchmark du score de risque client par lots (core/customer_risk.py)
+
+Sur des facteurs synthétiques, compare score_risk_factors() (NumPy, tous les
+clients à la fois) au calcul historique client par client de
+/customers/<id>/risk-score : scores et niveaux doivent être identiques, et le
+calcul vectorisé au moins --min-speedup fois plus rapide. Sans base de données.
+Usage (depuis la racine du projet) :
+    python scripts/analysis/benchmark_risk_scoring.py [--customers 100000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from core.customer_risk import score_risk_factors
+
+
+def reference_score(late_payments, overdue, account_days):
+    """Calcul historique (une requête par facteur, score en Python)"""
+    risk_factors = {
+        'payment_delays': min(late_payments * 10, 50),
+        'overdue_amount': min((overdue / 1000) * 5, 30),
+        'account_age': -10 if account_days > 365 else 0
+    }
+    # Somme de gauche à droite comme NumPy (sum() compense les arrondis depuis
+    # Python 3.12 et départagerait autrement les scores en x.x5), puis score
+    # arrondi au dixième avant le niveau, comme le score enregistré
+    total = risk_factors['payment_delays'] + risk_factors['overdue_amount'] + risk_factors['account_age']
+    total_score = float(np.round(max(0, min(100, total)), 1))
+    if total_score <= 20:
+        risk_level = 'very_low'
+    elif total_score <= 40:
+        risk_level = 'low'
+    elif total_score <= 60:
+        risk_level = 'medium'
+    elif total_score <= 80:
+        risk_level = 'high'
+    else:
+        risk_level = 'very_high'
+    return total_score, risk_level
+
+
+def synthetic_factors(count, seed=42):
+    rng = np.random.default_rng(seed)
+    late = rng.poisson(0.8, count).astype(float)
+    # Moitié des clients sans retard, montants entiers (bornes 20/40/60/80 atteintes)
+    overdue = np.where(rng.random(count) < 0.5, 0.0, np.round(rng.exponential(2500, count)))
+    return {
+        'customer_id': np.arange(1, count + 1, dtype=np.int64),
+        'late_payments': late,
+        'overdue_amount': overdue,
+        'account_days': rng.integers(0, 3000, count).astype(float),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du score de risque client par lots")
+    parser.add_argument('--customers', type=int, default=100000)
+    parser.add_argument('--min-speedup', type=float, default=10.0)
+    args = parser.parse_args()
+
+    factors = synthetic_factors(args.customers)
+    rows = list(zip(factors['late_payments'].tolist(), factors['overdue_amount'].tolist(),
+                    factors['account_days'].tolist()))
+
+    start = time.perf_counter()
+    expected = [reference_score(*row) for row in rows]
+    reference_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scores = score_risk_factors(factors)
+    vectorized_time = time.perf_counter() - start
+
+    same_scores = np.allclose(scores['score'], [score for score, _ in expected])
+    same_levels = scores['level'].tolist() == [level for _, level in expected]
+    speedup = reference_time / vectorized_time if vectorized_time else float('inf')
+
+    print(f"🎯 {args.customers} clients")
+    print(f"   calcul par client : {reference_time * 1000:8.1f} ms")
+    print(f"   lot NumPy         : {vectorized_time * 1000:8.1f} ms (x{speedup:.0f})")
+    levels, counts = np.unique(scores['level'], return_counts=True)
+    print("   niveaux : " + ', '.join(f"{level}={count}" for level, count in zip(levels, counts)))
+    print(f"   scores identiques : {'✅' if same_scores else '❌'}")
+    print(f"   niveaux identiques : {'✅' if same_levels else '❌'}")
+    fast_enough = speedup >= args.min_speedup
+    print(f"   accélération >= x{args.min_speedup:.0f} : {'✅' if fast_enough else '❌'}")
+    return 0 if same_scores and same_levels and fast_enough else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
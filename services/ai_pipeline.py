@@ -0,0 +1,153 @@
+"""
+Exécution de pipelines d'appels IA en graphe de dépendances
+Chaque étape déclare les étapes dont elle a besoin ; les étapes prêtes
+démarrent immédiatement en parallèle, sous un délai global qui renvoie des
+résultats partiels, avec le temps de chaque étape
+"""
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Any, Callable, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class PipelineStep:
+    """Étape : func(**{dépendance: résultat}) ; default si échec ou délai dépassé"""
+
+    __slots__ = ('name', 'func', 'depends', 'default')
+
+    def __init__(self, name: str, func: Callable[..., Any], depends: Tuple[str, ...] = (), default: Any = None):
+        self.name = name
+        self.func = func
+        self.depends = tuple(depends)
+        self.default = default
+
+
+class PipelineResult:
+    """Résultats par étape, statut/durée de chaque étape et drapeau partiel"""
+
+    __slots__ = ('results', 'timings', 'total_ms', 'partial')
+
+    def __init__(self, results: Dict[str, Any], timings: Dict[str, Dict[str, Any]], total_ms: float):
+        self.results = results
+        self.timings = timings
+        self.total_ms = total_ms
+        self.partial = any(t['status'] != 'ok' for t in timings.values())
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'total_ms': self.total_ms, 'partial': self.partial, 'steps': self.timings}
+
+
+class AIPipeline:
+    """
+    Graphe d'étapes IA
+
+        pipeline = AIPipeline('suggestions', deadline=45)
+        pipeline.add('research', research)
+        pipeline.add('diagnostic', partial(diagnose, ctx), depends=('research',))
+        result = pipeline.run()
+
+    Le résultat d'une dépendance est passé en argument nommé (nom de l'étape).
+    Une étape dont une dépendance a échoué reçoit la valeur par défaut de
+    celle-ci. Au délai global, les étapes non terminées prennent leur valeur
+    par défaut (statut 'timeout') et leurs threads sont abandonnés.
+    """
+
+    def __init__(self, name: str, deadline: Optional[float] = None, max_workers: Optional[int] = None):
+        self.name = name
+        self.deadline = deadline
+        self.max_workers = max_workers
+        self._steps: Dict[str, PipelineStep] = {}
+
+    def add(self, name: str, func: Callable[..., Any], depends: Iterable[str] = (), default: Any = None) -> 'AIPipeline':
+        """Déclarer une étape (les dépendances doivent être déclarées avant)"""
+        if name in self._steps:
+            raise ValueError(f"Étape déjà déclarée: {name}")
+        missing = [dep for dep in depends if dep not in self._steps]
+        if missing:
+            raise ValueError(f"Dépendances inconnues pour {name}: {', '.join(missing)}")
+        self._steps[name] = PipelineStep(name, func, tuple(depends), default)
+        return self
+
+    def run(self, targets: Optional[Iterable[str]] = None) -> PipelineResult:
+        """Exécuter toutes les étapes, ou seulement targets et leurs dépendances"""
+        steps = self._select(targets)
+        started = time.perf_counter()
+        deadline_at = started + self.deadline if self.deadline else None
+
+        results: Dict[str, Any] = {}
+        timings: Dict[str, Dict[str, Any]] = {}
+        pending = dict(steps)
+        running = {}  # future -> (nom, début)
+
+        executor = ThreadPoolExecutor(max_workers=self.max_workers or max(1, len(steps)),
+                                      thread_name_prefix=f"pipeline-{self.name}")
+        try:
+            while pending or running:
+                for name, step in list(pending.items()):
+                    if all(dep in results for dep in step.depends):
+                        kwargs = {dep: results[dep] for dep in step.depends}
+                        running[executor.submit(step.func, **kwargs)] = (name, time.perf_counter())
+                        del pending[name]
+
+                remaining = deadline_at - time.perf_counter() if deadline_at else None
+                if remaining is not None and remaining <= 0:
+                    break
+                done, _ = wait(running, timeout=remaining, return_when=FIRST_COMPLETED)
+                if not done:
+                    break
+
+                for future in done:
+                    name, step_started = running.pop(future)
+                    timing = {
+                        'start_ms': round((step_started - started) * 1000, 1),
+                        'duration_ms': round((time.perf_counter() - step_started) * 1000, 1),
+                        'status': 'ok'
+                    }
+                    try:
+                        results[name] = future.result()
+                    except Exception as e:
+                        logger.warning(f"Pipeline {self.name}: étape {name} en échec: {e}")
+                        results[name] = steps[name].default
+                        timing['status'] = 'error'
+                        timing['error'] = str(e)
+                    timings[name] = timing
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        # Délai dépassé : valeurs par défaut pour ce qui n'a pas abouti
+        now = time.perf_counter()
+        for name, step_started in running.values():
+            results[name] = steps[name].default
+            timings[name] = {
+                'start_ms': round((step_started - started) * 1000, 1),
+                'duration_ms': round((now - step_started) * 1000, 1),
+                'status': 'timeout'
+            }
+        for name, step in pending.items():
+            results[name] = step.default
+            timings[name] = {'start_ms': None, 'duration_ms': 0, 'status': 'skipped'}
+
+        result = PipelineResult(results, timings, round((now - started) * 1000, 1))
+        logger.info(
+            f"Pipeline {self.name}: {result.total_ms} ms"
+            + (" (partiel)" if result.partial else "") + " - "
+            + ', '.join(f"{name}={t['duration_ms']}ms/{t['status']}" for name, t in timings.items())
+        )
+        return result
+
+    def _select(self, targets: Optional[Iterable[str]]) -> Dict[str, PipelineStep]:
+        if targets is None:
+            return dict(self._steps)
+        selected = set()
+        stack = list(targets)
+        while stack:
+            name = stack.pop()
+            if name in selected:
+                continue
+            if name not in self._steps:
+                raise ValueError(f"Étape inconnue: {name}")
+            selected.add(name)
+            stack.extend(self._steps[name].depends)
+        return {name: step for name, step in self._steps.items() if name in selected}
@@ -0,0 +1,272 @@
+"""
+Cache des réponses IA à deux niveaux
+LRU mémoire borné (entrées et octets) devant une table MySQL partagée par
+les workers et conservée entre redémarrages, clé = empreinte du prompt + modèle
+"""
+import os
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+from core.database import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+# TTL par type d'appel (secondes) ; 0 = sans expiration
+DEFAULT_TTL_POLICIES = {
+    'default': int(os.environ.get('OPENAI_CACHE_TTL', '300')),
+    'summary': 3600,
+    'summary_closed': 0,  # résumé d'un bon de travail terminé : ne change plus
+    'chat': 300,
+    'suggestions': 6 * 3600,
+    'search': 24 * 3600,
+    'translation': 7 * 24 * 3600
+}
+
+CLOSED_WORK_ORDER_STATUSES = ('completed', 'closed', 'cancelled')
+
+
+class LLMResponseCache:
+    """Cache LRU mémoire + table ai_response_cache"""
+
+    def __init__(self, max_entries: Optional[int] = None, max_bytes: Optional[int] = None,
+                 policies: Optional[Dict[str, int]] = None, persistent: bool = True):
+        self.max_entries = max_entries or int(os.environ.get('AI_CACHE_MAX_ENTRIES', '2000'))
+        self.max_bytes = max_bytes or int(os.environ.get('AI_CACHE_MAX_MB', '64')) * 1024 * 1024
+        self.policies = dict(DEFAULT_TTL_POLICIES, **(policies or {}))
+        self.persistent = persistent and os.environ.get('AI_CACHE_PERSISTENT', '1') != '0'
+
+        self._entries = OrderedDict()  # key -> (value, expires_at|None, size, endpoint)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            'memory_hits': 0,
+            'persistent_hits': 0,
+            'misses': 0,
+            'writes': 0,
+            'evictions': 0,
+            'persistent_errors': 0
+        }
+
+    # ------------------------------------------------------------------
+    # Interface utilisée par OpenAIClient
+    # ------------------------------------------------------------------
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Réponse en cache (mémoire puis table), None sinon"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                value, expires_at, _size, _endpoint = entry
+                if expires_at is None or expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._stats['memory_hits'] += 1
+                    return value
+                self._remove(key)
+
+        row = self._load_persistent(key)
+        if row is None:
+            with self._lock:
+                self._stats['misses'] += 1
+            return None
+
+        value = json.loads(row['response'])
+        expires_at = row['expires_at'].timestamp() if row['expires_at'] else None
+        with self._lock:
+            self._stats['persistent_hits'] += 1
+            self._store(key, value, expires_at, len(row['response']), row['endpoint'])
+        return value
+
+    def set(self, key: str, value: Dict[str, Any], ttl: Optional[int] = None,
+            endpoint: str = 'default', model: Optional[str] = None):
+        """
+        Mettre une réponse en cache
+
+        ttl None : politique de l'endpoint ; 0 : sans expiration.
+        """
+        if ttl is None:
+            ttl = self.policies.get(endpoint, self.policies['default'])
+        expires_at = time.time() + ttl if ttl else None
+        raw = json.dumps(value, ensure_ascii=False, default=str)
+
+        with self._lock:
+            self._stats['writes'] += 1
+            self._store(key, value, expires_at, len(raw), endpoint)
+        self._save_persistent(key, raw, expires_at, endpoint, model)
+
+    def ttl_for_work_order(self, endpoint: str, work_order: Optional[Dict[str, Any]]) -> Optional[int]:
+        """TTL d'un appel portant sur un bon de travail : infini s'il est terminé"""
+        if work_order and work_order.get('status') in CLOSED_WORK_ORDER_STATUSES:
+            return self.policies.get(f"{endpoint}_closed", 0)
+        return None
+
+    # ------------------------------------------------------------------
+    # Administration
+    # ------------------------------------------------------------------
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Statistiques des deux niveaux"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_entries'] = len(self._entries)
+            stats['memory_bytes'] = self._bytes
+        stats['max_entries'] = self.max_entries
+        stats['max_bytes'] = self.max_bytes
+        stats['policies'] = self.policies
+
+        lookups = stats['memory_hits'] + stats['persistent_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['memory_hits'] + stats['persistent_hits']) / lookups, 3) if lookups else None
+
+        if self.persistent:
+            try:
+                conn = get_db_connection()
+                try:
+                    with conn.cursor() as cursor:
+                        cursor.execute("""
+                            SELECT endpoint, COUNT(*) AS entries, COALESCE(SUM(size_bytes), 0) AS bytes,
+                                   COALESCE(SUM(hits), 0) AS hits
+                            FROM ai_response_cache
+                            GROUP BY endpoint
+                        """)
+                        stats['persistent'] = {
+                            row['endpoint']: {
+                                'entries': int(row['entries']),
+                                'bytes': int(row['bytes']),
+                                'hits': int(row['hits'])
+                            }
+                            for row in cursor.fetchall()
+                        }
+                finally:
+                    conn.close()
+            except Exception as e:
+                stats['persistent'] = {'error': str(e)}
+        return stats
+
+    def purge(self, endpoint: Optional[str] = None, expired_only: bool = False) -> Dict[str, int]:
+        """Vider le cache (tout, un endpoint, ou seulement les entrées expirées)"""
+        now = time.time()
+        with self._lock:
+            keys = [
+                key for key, (_value, expires_at, _size, entry_endpoint) in self._entries.items()
+                if (endpoint is None or entry_endpoint == endpoint)
+                and (not expired_only or (expires_at is not None and expires_at <= now))
+            ]
+            for key in keys:
+                self._remove(key)
+
+        deleted = 0
+        if self.persistent:
+            conditions = []
+            params = []
+            if endpoint:
+                conditions.append("endpoint = %s")
+                params.append(endpoint)
+            if expired_only:
+                conditions.append("expires_at IS NOT NULL AND expires_at <= NOW()")
+            where_clause = "WHERE " + " AND ".join(conditions) if conditions else ""
+            try:
+                conn = get_db_connection()
+                try:
+                    with conn.cursor() as cursor:
+                        cursor.execute(f"DELETE FROM ai_response_cache {where_clause}", params)
+                        deleted = cursor.rowcount
+                    conn.commit()
+                finally:
+                    conn.close()
+            except Exception as e:
+                logger.error(f"Erreur purge cache IA: {e}")
+
+        return {'memory_removed': len(keys), 'persistent_removed': deleted}
+
+    # ------------------------------------------------------------------
+    # Interne
+    # ------------------------------------------------------------------
+
+    def _store(self, key, value, expires_at, size, endpoint):
+        """Insérer en mémoire puis évincer les moins récemment utilisées (verrou tenu)"""
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (value, expires_at, size, endpoint)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self._stats['evictions'] += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry:
+            self._bytes -= entry[2]
+
+    def _load_persistent(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.persistent:
+            return None
+        try:
+            conn = get_db_connection()
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("""
+                        SELECT response, endpoint, expires_at
+                        FROM ai_response_cache
+                        WHERE cache_key = %s AND (expires_at IS NULL OR expires_at > NOW())
+                    """, (key,))
+                    row = cursor.fetchone()
+                    if row:
+                        cursor.execute("""
+                            UPDATE ai_response_cache SET hits = hits + 1, last_hit_at = NOW()
+                            WHERE cache_key = %s
+                        """, (key,))
+                conn.commit()
+                return row
+            finally:
+                conn.close()
+        except Exception as e:
+            self._persistent_failed(e)
+            return None
+
+    def _save_persistent(self, key, raw, expires_at, endpoint, model):
+        if not self.persistent:
+            return
+        try:
+            conn = get_db_connection()
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("""
+                        INSERT INTO ai_response_cache
+                            (cache_key, endpoint, model, response, size_bytes, expires_at)
+                        VALUES (%s, %s, %s, %s, %s, %s)
+                        ON DUPLICATE KEY UPDATE
+                            response = VALUES(response),
+                            size_bytes = VALUES(size_bytes),
+                            expires_at = VALUES(expires_at),
+                            endpoint = VALUES(endpoint)
+                    """, (
+                        key, endpoint, model, raw, len(raw),
+                        datetime.fromtimestamp(expires_at) if expires_at else None
+                    ))
+                conn.commit()
+            finally:
+                conn.close()
+        except Exception as e:
+            self._persistent_failed(e)
+
+    def _persistent_failed(self, error: Exception):
+        with self._lock:
+            self._stats['persistent_errors'] += 1
+        # Table absente (migration non appliquée) : rester en mémoire seule
+        if getattr(error, 'args', None) and error.args[0] == 1146:
+            logger.warning("Table ai_response_cache absente - cache IA en mémoire seulement")
+            self.persistent = False
+        else:
+            logger.warning(f"Cache IA persistant indisponible: {error}")
+
+
+# Instance globale du cache des réponses IA
+llm_cache = LLMResponseCache()
@@ -0,0 +1,364 @@
+"""
+Client HTTP OpenAI partagé
+Session keep-alive mutualisée, fusion des requêtes identiques en vol,
+limitation de concurrence, reprises avec backoff et métriques
+"""
+import os
+import copy
+import json
+import time
+import random
+import hashlib
+import logging
+import threading
+from collections import deque
+from typing import Dict, Any, Optional, Callable, Iterator
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+def _parse_reset(value: Optional[str]) -> Optional[float]:
+    """Délai OpenAI (Retry-After "2" ou x-ratelimit-reset-requests "1.5s"/"20ms") en secondes"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        if value.endswith('ms'):
+            return float(value[:-2]) / 1000
+        if value.endswith('s'):
+            return float(value[:-1])
+        return float(value)
+    except ValueError:
+        return None
+
+
+class OpenAIError(Exception):
+    """Échec d'un appel en flux (détails au format des réponses d'erreur)"""
+
+    def __init__(self, details: Dict[str, Any]):
+        super().__init__(details.get('text') or 'OpenAI error')
+        self.details = details
+
+
+class _Flight:
+    """Appel en cours partagé par les demandeurs d'une même requête"""
+
+    __slots__ = ('event', 'result')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+
+
+class OpenAIClient:
+    """Client OpenAI thread-safe partagé par le processus"""
+
+    def __init__(self, base_url: Optional[str] = None, max_concurrency: Optional[int] = None,
+                 max_retries: Optional[int] = None, pool_size: Optional[int] = None):
+        self.base_url = (base_url or os.environ.get('OPENAI_API_BASE', 'https://api.openai.com')).rstrip('/')
+        self.max_concurrency = max_concurrency or int(os.environ.get('OPENAI_MAX_CONCURRENCY', '8'))
+        self.max_retries = max_retries if max_retries is not None else int(os.environ.get('OPENAI_MAX_RETRIES', '3'))
+        self.pool_size = pool_size or int(os.environ.get('OPENAI_POOL_SIZE', str(self.max_concurrency)))
+        self.backoff_base = 0.5  # secondes
+        self.backoff_max = 20.0
+
+        # Cache de réponses optionnel : get(key), set(key, value, ttl=, endpoint=, model=)
+        self.cache = None
+
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._semaphore = threading.BoundedSemaphore(self.max_concurrency)
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+
+        self._metrics_lock = threading.Lock()
+        self._latencies = deque(maxlen=500)
+        self._metrics = {
+            'requests': 0,
+            'http_calls': 0,
+            'cache_hits': 0,
+            'coalesced': 0,
+            'retries': 0,
+            'rate_limited': 0,
+            'errors': 0,
+            'streams': 0,
+            'streams_cancelled': 0,
+            'prompt_tokens': 0,
+            'completion_tokens': 0,
+            'total_tokens': 0
+        }
+
+    # ------------------------------------------------------------------
+    # API publique
+    # ------------------------------------------------------------------
+
+    def chat_completion(self, payload: Dict[str, Any], api_key: str, timeout: float = 30,
+                        cache_ttl: Optional[int] = None, cache_key: Optional[str] = None,
+                        endpoint: str = 'default') -> Dict[str, Any]:
+        """
+        Appel /v1/chat/completions
+
+        Renvoie la réponse JSON, ou {'error': True, 'status_code'?, 'text'}.
+        Les appels identiques simultanés (même payload) partagent une seule
+        requête HTTP (fusion limitée aux appels d'une même clé API) ; les
+        réponses réussies sont mises en cache si un cache est configuré
+        (cache_ttl None : politique de l'endpoint). timeout borne la durée
+        totale de l'appel, reprises comprises.
+        """
+        key = cache_key or self.payload_key(payload)
+        self._count('requests')
+
+        cached = self.cache.get(key) if self.cache else None
+        if cached is not None:
+            self._count('cache_hits')
+            return cached
+
+        def call():
+            result = self._post_with_retry('/v1/chat/completions', api_key, timeout, json=payload)
+            if not result.get('error'):
+                self._record_usage(result.get('usage'))
+                if self.cache:
+                    self.cache.set(key, result, ttl=cache_ttl, endpoint=endpoint, model=payload.get('model'))
+            return result
+
+        flight_key = f"{self._api_key_fingerprint(api_key)}:{key}"
+        return self._single_flight(flight_key, call)
+
+    def stream_chat_completion(self, payload: Dict[str, Any], api_key: str, timeout: float = 30,
+                               cache_ttl: Optional[int] = None, endpoint: str = 'default') -> Iterator[str]:
+        """
+        Appel /v1/chat/completions en flux : générateur des fragments de texte
+
+        Une réponse en cache est renvoyée d'un bloc. La réponse complète est
+        mise en cache (même clé que chat_completion) seulement si le flux va
+        à son terme ; fermer le générateur (client déconnecté) coupe la
+        connexion amont. Lève OpenAIError si l'appel échoue avant le flux.
+        """
+        key = self.payload_key(payload)
+        self._count('requests')
+
+        cached = self.cache.get(key) if self.cache else None
+        if cached is not None:
+            self._count('cache_hits')
+            choices = cached.get('choices') or [{}]
+            content = (choices[0].get('message') or {}).get('content') or ''
+            if content:
+                yield content
+            return
+
+        stream_payload = dict(payload, stream=True, stream_options={'include_usage': True})
+        resp = self._post_with_retry('/v1/chat/completions', api_key, timeout, json=stream_payload, stream=True)
+        if isinstance(resp, dict):
+            raise OpenAIError(resp)
+
+        self._count('streams')
+        resp.encoding = 'utf-8'  # text/event-stream sans charset
+        parts = []
+        usage = None
+        completed = False
+        try:
+            for line in resp.iter_lines(decode_unicode=True):
+                if not line or not line.startswith('data:'):
+                    continue
+                data = line[5:].strip()
+                if data == '[DONE]':
+                    completed = True
+                    break
+                chunk = json.loads(data)
+                usage = chunk.get('usage') or usage
+                for choice in chunk.get('choices') or []:
+                    delta = (choice.get('delta') or {}).get('content')
+                    if delta:
+                        parts.append(delta)
+                        yield delta
+        except GeneratorExit:
+            self._count('streams_cancelled')
+            raise
+        finally:
+            resp.close()
+
+        if not completed:
+            return
+        self._record_usage(usage)
+        if self.cache:
+            result = {
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': ''.join(parts)},
+                             'finish_reason': 'stop'}],
+                'usage': usage
+            }
+            self.cache.set(key, result, ttl=cache_ttl, endpoint=endpoint, model=payload.get('model'))
+
+    def transcribe(self, file_tuple, api_key: str, model: str = 'whisper-1',
+                   timeout: float = 120) -> Dict[str, Any]:
+        """Appel /v1/audio/transcriptions (multipart, jamais fusionné ni mis en cache)"""
+        self._count('requests')
+        return self._post_with_retry(
+            '/v1/audio/transcriptions', api_key, timeout,
+            data={'model': model}, files={'file': file_tuple}
+        )
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Compteurs, latences et jetons consommés"""
+        with self._metrics_lock:
+            metrics = dict(self._metrics)
+            latencies = sorted(self._latencies)
+        with self._inflight_lock:
+            metrics['inflight'] = len(self._inflight)
+        if latencies:
+            metrics['latency_ms'] = {
+                'p50': round(latencies[len(latencies) // 2] * 1000, 1),
+                'p95': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 1),
+                'max': round(latencies[-1] * 1000, 1),
+                'samples': len(latencies)
+            }
+        metrics['max_concurrency'] = self.max_concurrency
+        return metrics
+
+    @staticmethod
+    def payload_key(payload: Dict[str, Any]) -> str:
+        """Empreinte stable d'un payload (clé de cache et de fusion)"""
+        canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _api_key_fingerprint(api_key: str) -> str:
+        """Empreinte de la clé API (les appels de clés différentes ne sont jamais fusionnés)"""
+        return hashlib.sha256((api_key or '').encode('utf-8')).hexdigest()[:16]
+
+    def close(self):
+        """Fermer la session HTTP (les connexions du pool)"""
+        with self._session_lock:
+            session, self._session = self._session, None
+        if session:
+            session.close()
+
+    # ------------------------------------------------------------------
+    # Interne
+    # ------------------------------------------------------------------
+
+    def _get_session(self) -> requests.Session:
+        """Session keep-alive créée à la première utilisation"""
+        with self._session_lock:
+            if self._session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=2, pool_maxsize=self.pool_size)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                self._session = session
+            return self._session
+
+    def _single_flight(self, key: str, call: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        with self._inflight_lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+
+        if not leader:
+            self._count('coalesced')
+            flight.event.wait()
+            # Copie : chaque demandeur peut modifier sa réponse sans toucher aux autres
+            return copy.deepcopy(flight.result)
+
+        try:
+            flight.result = call()
+        except Exception as e:
+            logger.exception('OpenAI request exception')
+            flight.result = {'error': True, 'text': str(e)}
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+            flight.event.set()
+        return copy.deepcopy(flight.result)
+
+    def _post_with_retry(self, path: str, api_key: str, timeout: float, stream: bool = False, **kwargs):
+        """
+        Réponse JSON (ou requests.Response si stream), dict d'erreur après les reprises
+
+        timeout est un budget global : chaque tentative reçoit le temps
+        restant et aucune reprise n'est tentée si l'attente la dépasserait.
+        """
+        url = f"{self.base_url}{path}"
+        headers = {'Authorization': f'Bearer {api_key}'}
+        deadline = time.monotonic() + timeout
+        attempt = 0
+
+        while True:
+            resp = None
+            error = None
+            with self._semaphore:
+                started = time.perf_counter()
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    error = 'timeout'
+                else:
+                    try:
+                        self._count('http_calls')
+                        resp = self._get_session().post(url, headers=headers, timeout=remaining,
+                                                        stream=stream, **kwargs)
+                    except requests.Timeout:
+                        error = 'timeout'
+                    except requests.ConnectionError as e:
+                        error = str(e)
+            elapsed = time.perf_counter() - started
+
+            if resp is not None and resp.status_code == 200:
+                with self._metrics_lock:
+                    self._latencies.append(elapsed)
+                if stream:
+                    return resp
+                try:
+                    return resp.json()
+                except ValueError:
+                    self._count('errors')
+                    logger.error('OpenAI invalid JSON response: %s', resp.text[:500])
+                    return {'error': True, 'status_code': resp.status_code,
+                            'text': f'Invalid JSON response: {resp.text[:500]}'}
+
+            retryable = error is not None or resp.status_code in RETRYABLE_STATUS
+            if resp is not None and resp.status_code == 429:
+                self._count('rate_limited')
+
+            delay = self._retry_delay(attempt + 1, resp) if retryable else 0
+            out_of_time = time.monotonic() + delay >= deadline
+            if not retryable or attempt >= self.max_retries or out_of_time:
+                self._count('errors')
+                if resp is not None:
+                    logger.error('OpenAI call failed %s %s', resp.status_code, resp.text[:500])
+                    return {'error': True, 'status_code': resp.status_code, 'text': resp.text}
+                logger.error('OpenAI request failed: %s', error)
+                return {'error': True, 'text': error}
+
+            attempt += 1
+            self._count('retries')
+            time.sleep(delay)
+
+    def _retry_delay(self, attempt: int, resp) -> float:
+        """Délai annoncé par l'API si présent, sinon backoff exponentiel avec gigue"""
+        if resp is not None:
+            announced = (_parse_reset(resp.headers.get('Retry-After'))
+                         or _parse_reset(resp.headers.get('x-ratelimit-reset-requests')))
+            if announced is not None:
+                return min(announced, self.backoff_max)
+        delay = min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1)))
+        return delay * (0.5 + random.random() / 2)
+
+    def _record_usage(self, usage: Optional[Dict[str, Any]]):
+        if not usage:
+            return
+        with self._metrics_lock:
+            for field in ('prompt_tokens', 'completion_tokens', 'total_tokens'):
+                self._metrics[field] += int(usage.get(field) or 0)
+
+    def _count(self, name: str, amount: int = 1):
+        with self._metrics_lock:
+            self._metrics[name] += amount
+
+
+# Instance globale partagée par les routes IA
+openai_client = OpenAIClient()
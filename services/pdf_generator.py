@@ -3,11 +3,16 @@ Service de génération PDF - Sprint 3
 Génération de rapports professionnels pour work orders et interventions
 """
 import os
+import json
+import time
+import hashlib
+import uuid
 import logging
 from datetime import datetime
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple, Callable
 from io import BytesIO
 import pymysql
+from jinja2 import Environment, FileSystemLoader, select_autoescape
 
 # Import des librairies PDF
 try:
@@ -30,6 +35,10 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+# Version du rendu des bons de travail : à incrémenter à chaque modification
+# du HTML/CSS pour invalider le cache des PDFs déjà générés
+PDF_TEMPLATE_VERSION = '2'
+
 class PDFGeneratorService:
     """Service de génération PDF pour ChronoTech"""
     
@@ -54,6 +63,21 @@ class PDFGeneratorService:
         
         # Configuration des polices
         self.font_config = FontConfiguration() if WEASYPRINT_AVAILABLE else None
+        
+        # Contexte de rendu réutilisé entre documents (par processus) :
+        # gabarits Jinja2 compilés, CSS analysés, images décodées
+        self._template_env = None
+        self._pdf_css = None
+        self._stylesheets = {}
+        self._image_cache = {}
+        
+        # Rétention des PDFs générés (âge maximal et taille totale du dossier)
+        self.retention_days = int(os.getenv('PDF_RETENTION_DAYS', 7))
+        self.max_output_bytes = int(os.getenv('PDF_CACHE_MAX_MB', 500)) * 1024 * 1024
+        self.purge_interval = 600  # secondes entre deux purges automatiques
+        # Fichiers utilisés récemment (rendu, téléchargement) jamais supprimés
+        self.purge_grace = int(os.getenv('PDF_PURGE_GRACE_SECONDS', 900))
+        self._last_purge = 0.0
     
     def get_db_connection(self):
         """Connexion à la base de données"""
@@ -63,6 +87,9 @@ class PDFGeneratorService:
         """
         Générer un PDF complet du bon de travail
         
+        Le PDF est adressé par le contenu : si les données du work order n'ont
+        pas changé depuis le dernier rendu, le fichier existant est renvoyé.
+        
         Args:
             work_order_id: ID du bon de travail
             include_interventions: Inclure les détails des interventions
@@ -71,35 +98,19 @@ class PDFGeneratorService:
             Dict avec le chemin du fichier et les métadonnées
         """
         try:
-            # Récupérer les données du work order
-            wo_data = self._get_work_order_data(work_order_id)
-            if not wo_data:
-                raise ValueError(f"Work Order {work_order_id} non trouvé")
+            wo_data, tasks_data, interventions_data = self.load_work_order_bundle(
+                work_order_id, include_interventions
+            )
             
-            # Récupérer les tâches
-            tasks_data = self._get_work_order_tasks(work_order_id)
+            pdf_path = self.get_cached_pdf_path(
+                wo_data, tasks_data, interventions_data, include_interventions
+            )
+            cached = self.touch_cached_pdf(pdf_path)
+            if not cached:
+                self.render_work_order_file(wo_data, tasks_data, interventions_data, pdf_path)
+                self.purge_generated_pdfs()
             
-            # Récupérer les interventions si demandé
-            interventions_data = []
-            if include_interventions:
-                interventions_data = self._get_work_order_interventions(work_order_id)
-            
-            # Générer le PDF selon la méthode disponible
-            if WEASYPRINT_AVAILABLE:
-                pdf_path = self._generate_weasyprint_pdf(wo_data, tasks_data, interventions_data)
-            elif REPORTLAB_AVAILABLE:
-                pdf_path = self._generate_reportlab_pdf(wo_data, tasks_data, interventions_data)
-            else:
-                raise RuntimeError("Aucune librairie PDF disponible (WeasyPrint ou ReportLab)")
-            
-            return {
-                'success': True,
-                'pdf_path': pdf_path,
-                'filename': os.path.basename(pdf_path),
-                'work_order_id': work_order_id,
-                'generated_at': datetime.now().isoformat(),
-                'size_bytes': os.path.getsize(pdf_path) if os.path.exists(pdf_path) else 0
-            }
+            return self.build_pdf_result(work_order_id, pdf_path, cached)
             
         except Exception as e:
             logger.error(f"Erreur génération PDF Work Order {work_order_id}: {e}")
@@ -109,6 +120,164 @@ class PDFGeneratorService:
                 'work_order_id': work_order_id
             }
     
+    def load_work_order_bundle(self, work_order_id: int, include_interventions: bool = True) -> Tuple[Dict, List, List]:
+        """Charger le work order, ses tâches et (optionnellement) ses interventions"""
+        bundles = self.load_work_order_bundles([work_order_id], include_interventions)
+        if work_order_id not in bundles:
+            raise ValueError(f"Work Order {work_order_id} non trouvé")
+        return bundles[work_order_id]
+    
+    def load_work_order_bundles(self, work_order_ids: List[int],
+                                include_interventions: bool = True) -> Dict[int, Tuple[Dict, List, List]]:
+        """
+        Charger plusieurs work orders en trois requêtes ensemblistes
+        
+        Returns:
+            Dict work_order_id -> (wo_data, tasks_data, interventions_data),
+            sans entrée pour les work orders introuvables
+        """
+        ids = sorted({int(wo_id) for wo_id in work_order_ids})
+        if not ids:
+            return {}
+        
+        conn = self.get_db_connection()
+        try:
+            with conn.cursor() as cursor:
+                work_orders = self._fetch_work_orders(cursor, ids)
+                tasks = self._fetch_work_order_tasks(cursor, ids)
+                interventions = self._fetch_work_order_interventions(cursor, ids) if include_interventions else {}
+        finally:
+            conn.close()
+        
+        return {
+            wo_id: (wo_data, tasks.get(wo_id, []), interventions.get(wo_id, []))
+            for wo_id, wo_data in work_orders.items()
+        }
+    
+    def compute_cache_key(self, wo_data: Dict, tasks_data: List, interventions_data: List,
+                          include_interventions: bool = True) -> str:
+        """Empreinte SHA-256 des données du work order et de la version du gabarit"""
+        payload = json.dumps({
+            'template_version': PDF_TEMPLATE_VERSION,
+            'engine': 'weasyprint' if WEASYPRINT_AVAILABLE else 'reportlab',
+            'include_interventions': include_interventions,
+            'work_order': wo_data,
+            'tasks': tasks_data,
+            'interventions': interventions_data
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    def get_cached_pdf_path(self, wo_data: Dict, tasks_data: List, interventions_data: List,
+                            include_interventions: bool = True) -> str:
+        """Chemin du PDF adressé par contenu (work_order_<id>_<empreinte>.pdf)"""
+        cache_key = self.compute_cache_key(wo_data, tasks_data, interventions_data, include_interventions)
+        return os.path.join(self.output_path, f"work_order_{wo_data['id']}_{cache_key[:16]}.pdf")
+    
+    def touch_cached_pdf(self, pdf_path: str) -> bool:
+        """Marquer un PDF en cache comme récemment utilisé (éviction LRU)"""
+        try:
+            os.utime(pdf_path, None)
+            return True
+        except OSError:
+            return False
+    
+    def render_work_order_bytes(self, wo_data: Dict, tasks_data: List, interventions_data: List) -> bytes:
+        """Rendre le PDF d'un work order en mémoire"""
+        if WEASYPRINT_AVAILABLE:
+            html = HTML(string=self._create_work_order_html(wo_data, tasks_data, interventions_data),
+                        base_url=self.static_path)
+            return html.write_pdf(stylesheets=[self._get_work_order_stylesheet()],
+                                  font_config=self.font_config, cache=self._image_cache)
+        elif REPORTLAB_AVAILABLE:
+            buffer = BytesIO()
+            self._generate_reportlab_pdf(wo_data, tasks_data, interventions_data, buffer)
+            return buffer.getvalue()
+        else:
+            raise RuntimeError("Aucune librairie PDF disponible (WeasyPrint ou ReportLab)")
+    
+    def render_work_order_file(self, wo_data: Dict, tasks_data: List, interventions_data: List,
+                               pdf_path: str) -> str:
+        """Rendre le PDF d'un work order vers pdf_path"""
+        pdf_bytes = self.render_work_order_bytes(wo_data, tasks_data, interventions_data)
+        return self.store_pdf_bytes(pdf_path, pdf_bytes)
+    
+    def store_pdf_bytes(self, pdf_path: str, pdf_bytes: bytes) -> str:
+        """Écrire un PDF de façon atomique (fichier temporaire puis renommage)"""
+        tmp_path = f"{pdf_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(pdf_bytes)
+            os.replace(tmp_path, pdf_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return pdf_path
+    
+    def build_pdf_result(self, work_order_id: int, pdf_path: str, cached: bool = False) -> Dict[str, Any]:
+        """Métadonnées renvoyées pour un PDF de work order"""
+        return {
+            'success': True,
+            'pdf_path': pdf_path,
+            'filename': os.path.basename(pdf_path),
+            'work_order_id': work_order_id,
+            'cached': cached,
+            'generated_at': datetime.fromtimestamp(os.path.getmtime(pdf_path)).isoformat(),
+            'size_bytes': os.path.getsize(pdf_path)
+        }
+    
+    def purge_generated_pdfs(self, force: bool = False) -> Dict[str, int]:
+        """
+        Appliquer la politique de rétention de static/generated_pdfs
+        
+        Supprime les fichiers plus vieux que retention_days, puis les moins
+        récemment utilisés tant que le dossier dépasse max_output_bytes ; un
+        fichier utilisé depuis moins de purge_grace secondes (téléchargement
+        en cours, job venant de se terminer) est conservé.
+        """
+        now = time.time()
+        if not force and now - self._last_purge < self.purge_interval:
+            return {'removed': 0, 'remaining_bytes': -1}
+        self._last_purge = now
+        
+        entries = []
+        for name in os.listdir(self.output_path):
+            if not name.endswith(('.pdf', '.zip')):
+                continue
+            path = os.path.join(self.output_path, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        
+        removed = 0
+        max_age = self.retention_days * 86400
+        kept = []
+        for mtime, size, path in entries:
+            if now - mtime > max_age:
+                removed += self._remove_file(path)
+            else:
+                kept.append((mtime, size, path))
+        
+        total_bytes = sum(size for _, size, _ in kept)
+        for mtime, size, path in sorted(kept):
+            if total_bytes <= self.max_output_bytes or now - mtime < self.purge_grace:
+                break
+            if self._remove_file(path):
+                removed += 1
+                total_bytes -= size
+        
+        if removed:
+            logger.info(f"Rétention PDF: {removed} fichier(s) supprimé(s), {total_bytes} octets conservés")
+        return {'removed': removed, 'remaining_bytes': total_bytes}
+    
+    def _remove_file(self, path: str) -> int:
+        try:
+            os.remove(path)
+            return 1
+        except OSError:
+            return 0
+    
     def generate_intervention_report_pdf(self, intervention_id: int) -> Dict[str, Any]:
         """
         Générer un rapport PDF d'intervention pour le technicien
@@ -159,32 +328,7 @@ class PDFGeneratorService:
         conn = self.get_db_connection()
         try:
             with conn.cursor() as cursor:
-                cursor.execute("""
-                    SELECT 
-                        wo.*,
-                        c.name as customer_name,
-                        c.email as customer_email,
-                        c.phone as customer_phone,
-                        c.address as customer_address,
-                        c.city as customer_city,
-                        c.postal_code as customer_postal_code,
-                        v.make, v.model, v.year, v.license_plate, v.vin,
-                        v.mileage, v.fuel_type,
-                        u.name as technician_name,
-                        u.email as technician_email,
-                        COUNT(DISTINCT wot.id) as tasks_count,
-                        COUNT(DISTINCT i.id) as interventions_count
-                    FROM work_orders wo
-                    JOIN customers c ON wo.customer_id = c.id
-                    LEFT JOIN vehicles v ON wo.vehicle_id = v.id
-                    LEFT JOIN users u ON wo.assigned_technician_id = u.id
-                    LEFT JOIN work_order_tasks wot ON wo.id = wot.work_order_id
-                    LEFT JOIN interventions i ON wot.id = i.task_id
-                    WHERE wo.id = %s
-                    GROUP BY wo.id
-                """, (work_order_id,))
-                
-                return cursor.fetchone()
+                return self._fetch_work_orders(cursor, [work_order_id]).get(work_order_id)
         finally:
             conn.close()
     
@@ -193,27 +337,7 @@ class PDFGeneratorService:
         conn = self.get_db_connection()
         try:
             with conn.cursor() as cursor:
-                cursor.execute("""
-                    SELECT 
-                        wot.*,
-                        u.name as technician_name,
-                        i.id as intervention_id,
-                        i.started_at,
-                        i.ended_at,
-                        i.result_status,
-                        CASE 
-                            WHEN i.started_at IS NOT NULL AND i.ended_at IS NOT NULL 
-                            THEN TIMESTAMPDIFF(MINUTE, i.started_at, i.ended_at)
-                            ELSE NULL 
-                        END as duration_minutes
-                    FROM work_order_tasks wot
-                    LEFT JOIN users u ON wot.technician_id = u.id
-                    LEFT JOIN interventions i ON wot.id = i.task_id
-                    WHERE wot.work_order_id = %s
-                    ORDER BY wot.created_at ASC
-                """, (work_order_id,))
-                
-                return cursor.fetchall()
+                return self._fetch_work_order_tasks(cursor, [work_order_id]).get(work_order_id, [])
         finally:
             conn.close()
     
@@ -222,28 +346,94 @@ class PDFGeneratorService:
         conn = self.get_db_connection()
         try:
             with conn.cursor() as cursor:
-                cursor.execute("""
-                    SELECT 
-                        i.*,
-                        wot.title as task_title,
-                        wot.description as task_description,
-                        u.name as technician_name,
-                        COUNT(DISTINCT in_.id) as notes_count,
-                        COUNT(DISTINCT im.id) as media_count
-                    FROM interventions i
-                    JOIN work_order_tasks wot ON i.task_id = wot.id
-                    LEFT JOIN users u ON i.technician_id = u.id
-                    LEFT JOIN intervention_notes in_ ON i.id = in_.intervention_id
-                    LEFT JOIN intervention_media im ON i.id = im.intervention_id
-                    WHERE i.work_order_id = %s
-                    GROUP BY i.id
-                    ORDER BY i.started_at ASC
-                """, (work_order_id,))
-                
-                return cursor.fetchall()
+                return self._fetch_work_order_interventions(cursor, [work_order_id]).get(work_order_id, [])
         finally:
             conn.close()
     
+    def _fetch_work_orders(self, cursor, work_order_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """Données complètes des work orders demandés, indexées par ID"""
+        placeholders = ', '.join(['%s'] * len(work_order_ids))
+        cursor.execute(f"""
+            SELECT 
+                wo.*,
+                c.name as customer_name,
+                c.email as customer_email,
+                c.phone as customer_phone,
+                c.address as customer_address,
+                c.city as customer_city,
+                c.postal_code as customer_postal_code,
+                v.make, v.model, v.year, v.license_plate, v.vin,
+                v.mileage, v.fuel_type,
+                u.name as technician_name,
+                u.email as technician_email,
+                COUNT(DISTINCT wot.id) as tasks_count,
+                COUNT(DISTINCT i.id) as interventions_count
+            FROM work_orders wo
+            JOIN customers c ON wo.customer_id = c.id
+            LEFT JOIN vehicles v ON wo.vehicle_id = v.id
+            LEFT JOIN users u ON wo.assigned_technician_id = u.id
+            LEFT JOIN work_order_tasks wot ON wo.id = wot.work_order_id
+            LEFT JOIN interventions i ON wot.id = i.task_id
+            WHERE wo.id IN ({placeholders})
+            GROUP BY wo.id
+        """, work_order_ids)
+        
+        return {row['id']: row for row in cursor.fetchall()}
+    
+    def _fetch_work_order_tasks(self, cursor, work_order_ids: List[int]) -> Dict[int, List[Dict[str, Any]]]:
+        """Tâches des work orders demandés, groupées par work_order_id"""
+        placeholders = ', '.join(['%s'] * len(work_order_ids))
+        cursor.execute(f"""
+            SELECT 
+                wot.*,
+                u.name as technician_name,
+                i.id as intervention_id,
+                i.started_at,
+                i.ended_at,
+                i.result_status,
+                CASE 
+                    WHEN i.started_at IS NOT NULL AND i.ended_at IS NOT NULL 
+                    THEN TIMESTAMPDIFF(MINUTE, i.started_at, i.ended_at)
+                    ELSE NULL 
+                END as duration_minutes
+            FROM work_order_tasks wot
+            LEFT JOIN users u ON wot.technician_id = u.id
+            LEFT JOIN interventions i ON wot.id = i.task_id
+            WHERE wot.work_order_id IN ({placeholders})
+            ORDER BY wot.work_order_id, wot.created_at ASC
+        """, work_order_ids)
+        
+        tasks = {}
+        for row in cursor.fetchall():
+            tasks.setdefault(row['work_order_id'], []).append(row)
+        return tasks
+    
+    def _fetch_work_order_interventions(self, cursor, work_order_ids: List[int]) -> Dict[int, List[Dict[str, Any]]]:
+        """Interventions des work orders demandés, groupées par work_order_id"""
+        placeholders = ', '.join(['%s'] * len(work_order_ids))
+        cursor.execute(f"""
+            SELECT 
+                i.*,
+                wot.title as task_title,
+                wot.description as task_description,
+                u.name as technician_name,
+                COUNT(DISTINCT in_.id) as notes_count,
+                COUNT(DISTINCT im.id) as media_count
+            FROM interventions i
+            JOIN work_order_tasks wot ON i.task_id = wot.id
+            LEFT JOIN users u ON i.technician_id = u.id
+            LEFT JOIN intervention_notes in_ ON i.id = in_.intervention_id
+            LEFT JOIN intervention_media im ON i.id = im.intervention_id
+            WHERE i.work_order_id IN ({placeholders})
+            GROUP BY i.id
+            ORDER BY i.work_order_id, i.started_at ASC
+        """, work_order_ids)
+        
+        interventions = {}
+        for row in cursor.fetchall():
+            interventions.setdefault(row['work_order_id'], []).append(row)
+        return interventions
+    
     def _get_intervention_data(self, intervention_id: int) -> Optional[Dict[str, Any]]:
         """Récupérer les données complètes d'une intervention"""
         conn = self.get_db_connection()
@@ -313,29 +503,48 @@ class PDFGeneratorService:
         finally:
             conn.close()
     
-    def _generate_weasyprint_pdf(self, wo_data: Dict, tasks_data: List, interventions_data: List) -> str:
+    def _generate_weasyprint_pdf(self, wo_data: Dict, tasks_data: List, interventions_data: List,
+                                 pdf_path: Optional[str] = None) -> str:
         """Générer PDF avec WeasyPrint (HTML/CSS)"""
         # Créer le template HTML
         html_content = self._create_work_order_html(wo_data, tasks_data, interventions_data)
         
-        # CSS pour styling professionnel
-        css_content = self._get_pdf_css()
-        
         # Générer le PDF
-        filename = f"work_order_{wo_data['id']}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-        pdf_path = os.path.join(self.output_path, filename)
+        if not pdf_path:
+            filename = f"work_order_{wo_data['id']}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+            pdf_path = os.path.join(self.output_path, filename)
         
         html = HTML(string=html_content, base_url=self.static_path)
-        css = CSS(string=css_content, font_config=self.font_config)
         
-        html.write_pdf(pdf_path, stylesheets=[css], font_config=self.font_config)
+        html.write_pdf(pdf_path, stylesheets=[self._get_work_order_stylesheet()],
+                       font_config=self.font_config, cache=self._image_cache)
         
         return pdf_path
     
-    def _generate_reportlab_pdf(self, wo_data: Dict, tasks_data: List, interventions_data: List) -> str:
+    def _get_work_order_stylesheet(self):
+        """Feuille de style des work orders, analysée une seule fois par processus"""
+        return self.get_stylesheet('work_order', self._get_pdf_css)
+    
+    def get_stylesheet(self, name: str, css_factory: Callable[[], str]):
+        """
+        Objet CSS WeasyPrint mis en cache par nom
+        
+        Args:
+            name: clé du cache (une feuille par type de document)
+            css_factory: fournit le CSS source, appelé seulement au premier usage
+        """
+        stylesheet = self._stylesheets.get(name)
+        if stylesheet is None:
+            stylesheet = CSS(string=css_factory(), font_config=self.font_config)
+            self._stylesheets[name] = stylesheet
+        return stylesheet
+    
+    def _generate_reportlab_pdf(self, wo_data: Dict, tasks_data: List, interventions_data: List,
+                                pdf_path: Optional[str] = None) -> str:
         """Générer PDF avec ReportLab (programmation directe)"""
-        filename = f"work_order_{wo_data['id']}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-        pdf_path = os.path.join(self.output_path, filename)
+        if not pdf_path:
+            filename = f"work_order_{wo_data['id']}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+            pdf_path = os.path.join(self.output_path, filename)
         
         # Créer le document
         doc = SimpleDocTemplate(pdf_path, pagesize=A4)
@@ -414,325 +623,31 @@ class PDFGeneratorService:
         return pdf_path
     
     def _create_work_order_html(self, wo_data: Dict, tasks_data: List, interventions_data: List) -> str:
-        """Créer le template HTML pour le work order"""
-        html = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="UTF-8">
-            <title>Bon de Travail #{wo_data['claim_number']}</title>
-        </head>
-        <body>
-            <div class="header">
-                <h1>CHRONOTECH</h1>
-                <h2>BON DE TRAVAIL #{wo_data['claim_number']}</h2>
-                <div class="date">Généré le {datetime.now().strftime('%d/%m/%Y à %H:%M')}</div>
-            </div>
-            
-            <div class="section">
-                <h3>INFORMATIONS CLIENT</h3>
-                <table class="info-table">
-                    <tr><td class="label">Client:</td><td>{wo_data['customer_name']}</td></tr>
-                    <tr><td class="label">Téléphone:</td><td>{wo_data['customer_phone'] or '-'}</td></tr>
-                    <tr><td class="label">Email:</td><td>{wo_data['customer_email'] or '-'}</td></tr>
-                    <tr><td class="label">Adresse:</td><td>{(wo_data['customer_address'] or '') + ' ' + (wo_data['customer_city'] or '') + ' ' + (wo_data['customer_postal_code'] or '')}</td></tr>
-                </table>
-            </div>
-        """
-        
-        if wo_data['make'] and wo_data['model']:
-            html += f"""
-            <div class="section">
-                <h3>INFORMATIONS VÉHICULE</h3>
-                <table class="info-table">
-                    <tr><td class="label">Véhicule:</td><td>{wo_data['make']} {wo_data['model']} ({wo_data['year'] or 'N/A'})</td></tr>
-                    <tr><td class="label">Plaque:</td><td>{wo_data['license_plate'] or '-'}</td></tr>
-                    <tr><td class="label">VIN:</td><td>{wo_data['vin'] or '-'}</td></tr>
-                    <tr><td class="label">Kilométrage:</td><td>{wo_data['mileage'] or '-'} km</td></tr>
-                    <tr><td class="label">Carburant:</td><td>{wo_data['fuel_type'] or '-'}</td></tr>
-                </table>
-            </div>
-            """
-        
-        if tasks_data:
-            html += """
-            <div class="section">
-                <h3>TÂCHES À EFFECTUER</h3>
-                <table class="tasks-table">
-                    <thead>
-                        <tr>
-                            <th>#</th>
-                            <th>Description</th>
-                            <th>Priorité</th>
-                            <th>Statut</th>
-                            <th>Technicien</th>
-                        </tr>
-                    </thead>
-                    <tbody>
-            """
-            
-            for i, task in enumerate(tasks_data, 1):
-                priority_class = f"priority-{task['priority']}"
-                status_class = f"status-{task['status']}"
-                
-                html += f"""
-                        <tr>
-                            <td>{i}</td>
-                            <td>{task['title']}</td>
-                            <td class="{priority_class}">{task['priority'].upper()}</td>
-                            <td class="{status_class}">{task['status'].replace('_', ' ').title()}</td>
-                            <td>{task['technician_name'] or 'Non assigné'}</td>
-                        </tr>
-                """
-                
-                if task['description']:
-                    html += f"""
-                        <tr class="task-description">
-                            <td></td>
-                            <td colspan="4"><em>{task['description']}</em></td>
-                        </tr>
-                    """
-            
-            html += """
-                    </tbody>
-                </table>
-            </div>
-            """
-        
-        if interventions_data:
-            html += """
-            <div class="section">
-                <h3>INTERVENTIONS RÉALISÉES</h3>
-            """
-            
-            for intervention in interventions_data:
-                duration = ""
-                if intervention['started_at'] and intervention['ended_at']:
-                    duration_min = (intervention['ended_at'] - intervention['started_at']).total_seconds() / 60
-                    duration = f" - Durée: {int(duration_min // 60)}h{int(duration_min % 60):02d}"
-                
-                html += f"""
-                <div class="intervention">
-                    <h4>{intervention['task_title']}</h4>
-                    <div class="intervention-meta">
-                        <strong>Technicien:</strong> {intervention['technician_name'] or 'N/A'}<br>
-                        <strong>Début:</strong> {intervention['started_at'].strftime('%d/%m/%Y %H:%M') if intervention['started_at'] else 'N/A'}<br>
-                        <strong>Fin:</strong> {intervention['ended_at'].strftime('%d/%m/%Y %H:%M') if intervention['ended_at'] else 'En cours'}{duration}<br>
-                        <strong>Résultat:</strong> {intervention['result_status'] or 'En cours'}
-                    </div>
-                    
-                    <div class="intervention-stats">
-                        <span class="stat">📝 {intervention['notes_count']} note(s)</span>
-                        <span class="stat">📷 {intervention['media_count']} média(s)</span>
-                    </div>
-                </div>
-                """
-            
-            html += "</div>"
-        
-        html += """
-            <div class="footer">
-                <div class="signature-area">
-                    <div class="signature-box">
-                        <div class="signature-line"></div>
-                        <div class="signature-label">Signature Technicien</div>
-                    </div>
-                    <div class="signature-box">
-                        <div class="signature-line"></div>
-                        <div class="signature-label">Signature Client</div>
-                    </div>
-                </div>
-                
-                <div class="footer-info">
-                    <p><strong>ChronoTech</strong> - Service d'intervention technique</p>
-                    <p>Document généré automatiquement le {datetime.now().strftime('%d/%m/%Y à %H:%M')}</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-        
-        return html
+        """Créer le HTML du work order à partir du gabarit Jinja2 compilé"""
+        template = self._get_template_env().get_template('work_order_report.html')
+        return template.render(
+            wo=wo_data,
+            tasks=tasks_data,
+            interventions=interventions_data,
+            generated_at=datetime.now()
+        )
+    
+    def _get_template_env(self) -> Environment:
+        """Environnement Jinja2 des gabarits PDF (templates compilés une fois par processus)"""
+        if self._template_env is None:
+            self._template_env = Environment(
+                loader=FileSystemLoader(self.templates_path),
+                autoescape=select_autoescape(['html']),
+                auto_reload=False
+            )
+        return self._template_env
     
     def _get_pdf_css(self) -> str:
-        """CSS professionnel pour les PDFs"""
-        return """
-        @page {
-            size: A4;
-            margin: 2cm;
-            @bottom-center {
-                content: "Page " counter(page) " sur " counter(pages);
-                font-size: 10px;
-                color: #666;
-            }
-        }
-        
-        body {
-            font-family: 'DejaVu Sans', Arial, sans-serif;
-            font-size: 12px;
-            line-height: 1.4;
-            color: #333;
-        }
-        
-        .header {
-            text-align: center;
-            margin-bottom: 30px;
-            padding-bottom: 20px;
-            border-bottom: 2px solid #667eea;
-        }
-        
-        .header h1 {
-            color: #667eea;
-            font-size: 24px;
-            margin: 0;
-            font-weight: bold;
-        }
-        
-        .header h2 {
-            color: #333;
-            font-size: 18px;
-            margin: 10px 0;
-        }
-        
-        .date {
-            color: #666;
-            font-size: 10px;
-        }
-        
-        .section {
-            margin-bottom: 25px;
-            page-break-inside: avoid;
-        }
-        
-        .section h3 {
-            background: #667eea;
-            color: white;
-            padding: 8px 12px;
-            margin: 0 0 15px 0;
-            font-size: 14px;
-            text-transform: uppercase;
-        }
-        
-        .info-table {
-            width: 100%;
-            border-collapse: collapse;
-        }
-        
-        .info-table td {
-            padding: 8px;
-            border: 1px solid #ddd;
-        }
-        
-        .info-table .label {
-            background: #f8f9fa;
-            font-weight: bold;
-            width: 25%;
-        }
-        
-        .tasks-table {
-            width: 100%;
-            border-collapse: collapse;
-            font-size: 11px;
-        }
-        
-        .tasks-table th {
-            background: #667eea;
-            color: white;
-            padding: 8px;
-            text-align: left;
-            font-weight: bold;
-        }
-        
-        .tasks-table td {
-            padding: 6px 8px;
-            border: 1px solid #ddd;
-            vertical-align: top;
-        }
-        
-        .tasks-table .task-description td {
-            font-style: italic;
-            color: #666;
-            font-size: 10px;
-        }
-        
-        .priority-urgent { background: #ffe6e6; color: #c62828; font-weight: bold; }
-        .priority-high { background: #fff3e0; color: #ef6c00; font-weight: bold; }
-        .priority-medium { background: #e3f2fd; color: #1976d2; }
-        .priority-low { background: #f3e5f5; color: #7b1fa2; }
-        
-        .status-done { background: #e8f5e8; color: #2e7d32; }
-        .status-in_progress { background: #fff9c4; color: #f57f17; }
-        .status-assigned { background: #e1f5fe; color: #0277bd; }
-        .status-pending { background: #fce4ec; color: #ad1457; }
-        
-        .intervention {
-            border: 1px solid #ddd;
-            border-radius: 5px;
-            padding: 15px;
-            margin-bottom: 15px;
-            background: #fafafa;
-        }
-        
-        .intervention h4 {
-            color: #667eea;
-            margin: 0 0 10px 0;
-            font-size: 14px;
-        }
-        
-        .intervention-meta {
-            font-size: 11px;
-            line-height: 1.6;
-            margin-bottom: 10px;
-        }
-        
-        .intervention-stats {
-            display: flex;
-            gap: 15px;
-        }
-        
-        .intervention-stats .stat {
-            font-size: 10px;
-            color: #666;
-        }
-        
-        .footer {
-            margin-top: 40px;
-            padding-top: 20px;
-            border-top: 1px solid #ddd;
-        }
-        
-        .signature-area {
-            display: flex;
-            justify-content: space-between;
-            margin-bottom: 30px;
-        }
-        
-        .signature-box {
-            width: 40%;
-            text-align: center;
-        }
-        
-        .signature-line {
-            border-bottom: 1px solid #333;
-            height: 40px;
-            margin-bottom: 5px;
-        }
-        
-        .signature-label {
-            font-size: 10px;
-            color: #666;
-        }
-        
-        .footer-info {
-            text-align: center;
-            font-size: 10px;
-            color: #666;
-        }
-        
-        .footer-info p {
-            margin: 5px 0;
-        }
-        """
+        """CSS professionnel pour les PDFs (templates/pdf/work_order_report.css)"""
+        if self._pdf_css is None:
+            with open(os.path.join(self.templates_path, 'work_order_report.css'), encoding='utf-8') as f:
+                self._pdf_css = f.read()
+        return self._pdf_css
     
     def _generate_intervention_weasyprint_pdf(self, intervention_data: Dict, notes_data: List, media_data: List) -> str:
         """Générer PDF d'intervention avec WeasyPrint"""
@@ -0,0 +1,314 @@
+"""
+File de rendu PDF asynchrone - Sprint 3
+Rendu des bons de travail dans un pool de processus (WeasyPrint est CPU-bound
+et garde le GIL) avec cache de PDFs adressé par contenu
+"""
+import os
+import json
+import uuid
+import time
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, Any, Optional, List, Iterator
+
+from services.pdf_generator import pdf_generator
+
+logger = logging.getLogger(__name__)
+
+# État des jobs partagé entre les workers du serveur (hors de static/)
+PDF_JOBS_PATH = os.getenv('PDF_JOBS_PATH', os.path.join('data', 'pdf_jobs'))
+
+
+def _render_work_order_job(wo_data: Dict, tasks_data: list, interventions_data: list, pdf_path: str) -> str:
+    """Point d'entrée exécuté dans un processus du pool"""
+    from services.pdf_generator import pdf_generator as worker_generator
+    return worker_generator.render_work_order_file(wo_data, tasks_data, interventions_data, pdf_path)
+
+
+def _render_work_order_bytes_job(wo_data: Dict, tasks_data: list, interventions_data: list) -> bytes:
+    """Rendu en mémoire exécuté dans un processus du pool (export par lot)"""
+    from services.pdf_generator import pdf_generator as worker_generator
+    return worker_generator.render_work_order_bytes(wo_data, tasks_data, interventions_data)
+
+
+class PDFRenderQueue:
+    """
+    File de rendu PDF : jobs soumis au pool, suivis par identifiant
+
+    Chaque job est aussi écrit dans jobs_path (un fichier JSON par job) :
+    le statut est lisible depuis n'importe quel worker du serveur, seul le
+    créateur du job y a accès.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, job_ttl: int = 3600,
+                 jobs_path: str = PDF_JOBS_PATH):
+        default_workers = max(1, (os.cpu_count() or 2) // 2)
+        self.max_workers = max_workers or int(os.getenv('PDF_RENDER_WORKERS', default_workers))
+        self.job_ttl = job_ttl  # secondes de conservation d'un job terminé
+        self.jobs_path = jobs_path
+        os.makedirs(self.jobs_path, exist_ok=True)
+        self._executor = None
+        self._jobs = {}
+        self._inflight = {}  # pdf_path -> job_id (un seul rendu par empreinte)
+        self._lock = threading.Lock()
+
+    def get_executor(self) -> ProcessPoolExecutor:
+        """Pool de processus créé à la première utilisation"""
+        with self._lock:
+            if self._executor is None:
+                # spawn : pas de fork d'un processus serveur multi-thread
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._executor
+
+    def submit_work_order(self, work_order_id: int, include_interventions: bool = True,
+                          user_id: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Soumettre le rendu d'un bon de travail pour user_id
+
+        Les données sont chargées dans le processus courant pour calculer
+        l'empreinte : un PDF déjà rendu pour ces données est renvoyé
+        immédiatement, un rendu identique déjà en cours est partagé.
+        """
+        wo_data, tasks_data, interventions_data = pdf_generator.load_work_order_bundle(
+            work_order_id, include_interventions
+        )
+        pdf_path = pdf_generator.get_cached_pdf_path(
+            wo_data, tasks_data, interventions_data, include_interventions
+        )
+
+        self._prune_jobs()
+
+        if pdf_generator.touch_cached_pdf(pdf_path):
+            job = self._new_job(work_order_id, pdf_path, user_id)
+            job['status'] = 'done'
+            job['cached'] = True
+            job['finished_at'] = time.time()
+            with self._lock:
+                self._jobs[job['job_id']] = job
+            self._save_job(job)
+            return self._public_job(job)
+
+        executor = self.get_executor()
+        with self._lock:
+            job = self._new_job(work_order_id, pdf_path, user_id)
+            existing_id = self._inflight.get(pdf_path)
+            if existing_id and existing_id in self._jobs:
+                # Rendu identique en cours : nouveau job sur le même rendu
+                job['future'] = self._jobs[existing_id]['future']
+            else:
+                job['future'] = executor.submit(
+                    _render_work_order_job, wo_data, tasks_data, interventions_data, pdf_path
+                )
+                self._inflight[pdf_path] = job['job_id']
+            self._jobs[job['job_id']] = job
+
+        self._save_job(job)
+        job['future'].add_done_callback(lambda future, job_id=job['job_id']: self._on_done(job_id, future))
+        return self._public_job(job)
+
+    def iter_work_order_batch(self, work_order_ids: List[int],
+                              include_interventions: bool = True) -> Iterator[Dict[str, Any]]:
+        """
+        Rendre un lot de bons de travail en parallèle sur le pool
+
+        Les données du lot sont chargées en trois requêtes dès l'appel (une
+        erreur de base survient avant toute réponse). Chaque résultat est
+        produit dès qu'il est prêt (PDF en cache d'abord, puis rendus dans
+        l'ordre de fin) : {'work_order_id', 'filename', 'pdf_bytes'} ou
+        {'work_order_id', 'error'} ('missing' pour un bon de travail absent).
+        """
+        bundles = pdf_generator.load_work_order_bundles(work_order_ids, include_interventions)
+        return self._render_batch(work_order_ids, bundles, include_interventions)
+
+    def _render_batch(self, work_order_ids: List[int], bundles: Dict,
+                      include_interventions: bool) -> Iterator[Dict[str, Any]]:
+        futures = {}
+        try:
+            for wo_id in dict.fromkeys(work_order_ids):
+                bundle = bundles.get(int(wo_id))
+                if not bundle:
+                    yield {'work_order_id': wo_id, 'error': f"Work Order {wo_id} non trouvé", 'missing': True}
+                    continue
+
+                pdf_path = pdf_generator.get_cached_pdf_path(*bundle, include_interventions)
+                if pdf_generator.touch_cached_pdf(pdf_path):
+                    with open(pdf_path, 'rb') as f:
+                        yield self._batch_entry(wo_id, pdf_path, f.read())
+                    continue
+
+                future = self.get_executor().submit(_render_work_order_bytes_job, *bundle)
+                futures[future] = (wo_id, pdf_path)
+
+            for future in as_completed(futures):
+                wo_id, pdf_path = futures[future]
+                try:
+                    pdf_bytes = future.result()
+                except Exception as e:
+                    logger.error(f"Erreur rendu PDF Work Order {wo_id} (lot): {e}")
+                    yield {'work_order_id': wo_id, 'error': str(e)}
+                    continue
+
+                pdf_generator.store_pdf_bytes(pdf_path, pdf_bytes)
+                yield self._batch_entry(wo_id, pdf_path, pdf_bytes)
+        finally:
+            # Client déconnecté ou lot terminé : abandonner les rendus non démarrés
+            for future in futures:
+                future.cancel()
+            if futures:
+                pdf_generator.purge_generated_pdfs()
+
+    def _batch_entry(self, work_order_id: int, pdf_path: str, pdf_bytes: bytes) -> Dict[str, Any]:
+        return {
+            'work_order_id': work_order_id,
+            'filename': os.path.basename(pdf_path),
+            'pdf_bytes': pdf_bytes
+        }
+
+    def get_job(self, job_id: str, user_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Statut d'un job de rendu (None s'il est inconnu, expiré ou créé par un autre utilisateur)"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            # Job soumis par un autre worker
+            job = self._load_job(job_id)
+            if job and job['status'] == 'queued' and os.path.exists(job['pdf_path']):
+                job['status'] = 'done'
+                job['finished_at'] = job['finished_at'] or os.path.getmtime(job['pdf_path'])
+        if not job or job.get('user_id') != user_id:
+            return None
+        return self._public_job(job)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Statistiques de la file"""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        counts = {}
+        for job in jobs:
+            status = self._job_status(job)
+            counts[status] = counts.get(status, 0) + 1
+        return {
+            'max_workers': self.max_workers,
+            'pool_started': self._executor is not None,
+            'jobs': counts
+        }
+
+    def shutdown(self, wait: bool = True):
+        """Arrêter le pool de rendu"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=wait)
+
+    def _new_job(self, work_order_id: int, pdf_path: str, user_id: Optional[int]) -> Dict[str, Any]:
+        return {
+            'job_id': uuid.uuid4().hex,
+            'work_order_id': work_order_id,
+            'user_id': user_id,
+            'pdf_path': pdf_path,
+            'status': 'queued',
+            'cached': False,
+            'error': None,
+            'future': None,
+            'submitted_at': time.time(),
+            'finished_at': None
+        }
+
+    def _job_file(self, job_id: str) -> Optional[str]:
+        if not job_id.isalnum():
+            return None
+        return os.path.join(self.jobs_path, f"{job_id}.json")
+
+    def _save_job(self, job: Dict[str, Any]):
+        """Écriture atomique de l'état du job (lu par les autres workers)"""
+        path = self._job_file(job['job_id'])
+        record = {key: value for key, value in job.items() if key != 'future'}
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, 'w') as handle:
+                json.dump(record, handle)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Job PDF {job['job_id']} non enregistré: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _load_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        path = self._job_file(job_id)
+        if not path:
+            return None
+        try:
+            with open(path) as handle:
+                return dict(json.load(handle), future=None)
+        except (OSError, ValueError):
+            return None
+
+    def _on_done(self, job_id: str, future):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if not job:
+                return
+            if self._inflight.get(job['pdf_path']) == job_id:
+                del self._inflight[job['pdf_path']]
+            job['finished_at'] = time.time()
+            error = future.exception()
+            if error:
+                job['status'] = 'error'
+                job['error'] = str(error)
+            else:
+                job['status'] = 'done'
+        self._save_job(job)
+
+        if error:
+            logger.error(f"Erreur rendu PDF Work Order {job['work_order_id']}: {error}")
+        else:
+            pdf_generator.purge_generated_pdfs()
+
+    def _job_status(self, job: Dict[str, Any]) -> str:
+        if job['status'] == 'queued' and job['future'] is not None and job['future'].running():
+            return 'running'
+        return job['status']
+
+    def _public_job(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        status = self._job_status(job)
+        public = {
+            'job_id': job['job_id'],
+            'work_order_id': job['work_order_id'],
+            'status': status,
+            'cached': job['cached'],
+            'submitted_at': datetime.fromtimestamp(job['submitted_at']).isoformat()
+        }
+        if status == 'done':
+            public['filename'] = os.path.basename(job['pdf_path'])
+            public['finished_at'] = datetime.fromtimestamp(job['finished_at']).isoformat()
+        elif status == 'error':
+            public['error'] = job['error']
+        return public
+
+    def _prune_jobs(self):
+        """Oublier les jobs terminés depuis plus de job_ttl secondes"""
+        limit = time.time() - self.job_ttl
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job['finished_at'] and job['finished_at'] < limit
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+        # Fichiers de jobs (tous workers), non modifiés depuis job_ttl
+        for name in os.listdir(self.jobs_path):
+            path = os.path.join(self.jobs_path, name)
+            try:
+                if os.path.getmtime(path) < limit:
+                    os.remove(path)
+            except OSError:
+                continue
+
+
+# Instance globale de la file de rendu
+render_queue = PDFRenderQueue()
@@ -2,6 +2,93 @@
 Template PDF pour les rapports d'intervention - WeasyPrint
 """
 
+# CSS spécifique pour les interventions (ajouté au CSS des work orders)
+INTERVENTION_CSS = """
+    .task-description {
+        background: #f8f9fa;
+        padding: 15px;
+        border-left: 4px solid #667eea;
+        margin: 10px 0;
+        line-height: 1.6;
+    }
+    
+    .note-item {
+        border: 1px solid #e0e0e0;
+        border-radius: 5px;
+        margin-bottom: 15px;
+        overflow: hidden;
+    }
+    
+    .note-header {
+        background: #f5f5f5;
+        padding: 8px 12px;
+        font-size: 11px;
+        border-bottom: 1px solid #e0e0e0;
+    }
+    
+    .note-content {
+        padding: 12px;
+        line-height: 1.5;
+    }
+    
+    .media-grid {
+        display: grid;
+        grid-template-columns: repeat(auto-fill, minmax(200px, 1fr));
+        gap: 15px;
+        margin-top: 15px;
+    }
+    
+    .media-item {
+        border: 1px solid #ddd;
+        border-radius: 5px;
+        padding: 10px;
+        text-align: center;
+        background: #fafafa;
+    }
+    
+    .media-icon {
+        font-size: 24px;
+        margin-bottom: 8px;
+    }
+    
+    .media-filename {
+        font-size: 11px;
+        font-weight: bold;
+        margin-bottom: 4px;
+        word-break: break-all;
+    }
+    
+    .media-meta {
+        font-size: 9px;
+        color: #666;
+    }
+    
+    .summary-box {
+        background: #e3f2fd;
+        border: 1px solid #90caf9;
+        border-radius: 5px;
+        padding: 15px;
+        margin: 15px 0;
+    }
+    
+    .summary-box p {
+        margin: 5px 0;
+        font-size: 12px;
+    }
+    
+    .signature-name {
+        font-size: 10px;
+        color: #666;
+        margin-top: 3px;
+    }
+    
+    /* Status colors */
+    .status-completed { background: #e8f5e8; color: #2e7d32; padding: 3px 8px; border-radius: 3px; }
+    .status-in_progress { background: #fff9c4; color: #f57f17; padding: 3px 8px; border-radius: 3px; }
+    .status-pending { background: #fce4ec; color: #ad1457; padding: 3px 8px; border-radius: 3px; }
+    .status-cancelled { background: #ffebee; color: #c62828; padding: 3px 8px; border-radius: 3px; }
+    """
+
 def generate_intervention_weasyprint_pdf(pdf_generator, intervention_data, notes_data, media_data):
     """Générer PDF d'intervention avec WeasyPrint"""
     import os
@@ -160,101 +247,19 @@ def generate_intervention_weasyprint_pdf(pdf_generator, intervention_data, notes
     </html>
     """
     
-    # CSS spécifique pour les interventions
-    css_content = pdf_generator._get_pdf_css() + """
-    .task-description {
-        background: #f8f9fa;
-        padding: 15px;
-        border-left: 4px solid #667eea;
-        margin: 10px 0;
-        line-height: 1.6;
-    }
-    
-    .note-item {
-        border: 1px solid #e0e0e0;
-        border-radius: 5px;
-        margin-bottom: 15px;
-        overflow: hidden;
-    }
-    
-    .note-header {
-        background: #f5f5f5;
-        padding: 8px 12px;
-        font-size: 11px;
-        border-bottom: 1px solid #e0e0e0;
-    }
-    
-    .note-content {
-        padding: 12px;
-        line-height: 1.5;
-    }
-    
-    .media-grid {
-        display: grid;
-        grid-template-columns: repeat(auto-fill, minmax(200px, 1fr));
-        gap: 15px;
-        margin-top: 15px;
-    }
-    
-    .media-item {
-        border: 1px solid #ddd;
-        border-radius: 5px;
-        padding: 10px;
-        text-align: center;
-        background: #fafafa;
-    }
-    
-    .media-icon {
-        font-size: 24px;
-        margin-bottom: 8px;
-    }
-    
-    .media-filename {
-        font-size: 11px;
-        font-weight: bold;
-        margin-bottom: 4px;
-        word-break: break-all;
-    }
-    
-    .media-meta {
-        font-size: 9px;
-        color: #666;
-    }
-    
-    .summary-box {
-        background: #e3f2fd;
-        border: 1px solid #90caf9;
-        border-radius: 5px;
-        padding: 15px;
-        margin: 15px 0;
-    }
-    
-    .summary-box p {
-        margin: 5px 0;
-        font-size: 12px;
-    }
-    
-    .signature-name {
-        font-size: 10px;
-        color: #666;
-        margin-top: 3px;
-    }
-    
-    /* Status colors */
-    .status-completed { background: #e8f5e8; color: #2e7d32; padding: 3px 8px; border-radius: 3px; }
-    .status-in_progress { background: #fff9c4; color: #f57f17; padding: 3px 8px; border-radius: 3px; }
-    .status-pending { background: #fce4ec; color: #ad1457; padding: 3px 8px; border-radius: 3px; }
-    .status-cancelled { background: #ffebee; color: #c62828; padding: 3px 8px; border-radius: 3px; }
-    """
     
     # Générer le PDF
     filename = f"intervention_report_{intervention_data['id']}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
     pdf_path = os.path.join(pdf_generator.output_path, filename)
     
-    from weasyprint import HTML, CSS
+    from weasyprint import HTML
     
     html = HTML(string=html_content, base_url=pdf_generator.static_path)
-    css = CSS(string=css_content, font_config=pdf_generator.font_config)
+    
+    # CSS des work orders + CSS spécifique, analysés une fois par processus
+    css = pdf_generator.get_stylesheet(
+        'intervention_report', lambda: pdf_generator._get_pdf_css() + INTERVENTION_CSS
+    )
     
     html.write_pdf(pdf_path, stylesheets=[css], font_config=pdf_generator.font_config)
     
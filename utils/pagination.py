@@ -2,10 +2,26 @@
 Utilitaire de pagination pour ChronoTech
 """
 import math
+import json
+import time
+import base64
+import threading
+from datetime import datetime, date
+from decimal import Decimal
+
+# Cache des totaux (COUNT) : une liste filtrée n'est recomptée qu'après COUNT_CACHE_TTL secondes
+COUNT_CACHE_TTL = 60
+COUNT_CACHE_SIZE = 256
+_count_cache = {}
+_count_cache_lock = threading.Lock()
 
 class Pagination:
     """Classe de pagination simple pour les listes de données"""
     
+    # Pas de curseurs en pagination par OFFSET (voir KeysetPagination)
+    prev_cursor = None
+    next_cursor = None
+    
     def __init__(self, page, per_page, total, items):
         self.page = page
         self.per_page = per_page
@@ -80,3 +96,197 @@ def paginate_query(cursor, base_query, params, page, per_page, count_query=None)
     items = cursor.fetchall()
     
     return Pagination(page, per_page, total, items)
+
+
+class KeysetPagination(Pagination):
+    """
+    Pagination par clé (seek) : les pages précédente/suivante sont désignées
+    par des curseurs opaques plutôt que par un OFFSET
+    """
+    
+    def __init__(self, page, per_page, total, items, has_prev=False, has_next=False,
+                 prev_cursor=None, next_cursor=None, total_is_estimate=False):
+        super().__init__(page, per_page, total, items)
+        self._has_prev = has_prev
+        self._has_next = has_next
+        self.prev_cursor = prev_cursor
+        self.next_cursor = next_cursor
+        self.total_is_estimate = total_is_estimate
+        # Le total peut être en retard (cache) : au moins la page courante
+        if items and self.pages < page:
+            self.pages = page
+    
+    @property
+    def has_prev(self):
+        return self._has_prev
+    
+    @property
+    def has_next(self):
+        return self._has_next
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    if isinstance(value, date):
+        return {'d': value.isoformat()}
+    if isinstance(value, Decimal):
+        return {'dec': str(value)}
+    return value
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if 'dt' in value:
+            return datetime.fromisoformat(value['dt'])
+        if 'd' in value:
+            return date.fromisoformat(value['d'])
+        if 'dec' in value:
+            return Decimal(value['dec'])
+    return value
+
+def encode_cursor(values, direction='next'):
+    """Curseur opaque (base64 URL) pour les valeurs de tri d'une ligne"""
+    payload = json.dumps({'v': [_encode_value(v) for v in values], 'd': direction}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(token, key_count):
+    """
+    Décoder un curseur ; None s'il est absent ou invalide (retour à la
+    pagination par numéro de page)
+    """
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        values = [_decode_value(v) for v in payload['v']]
+        direction = payload.get('d', 'next')
+    except (ValueError, TypeError, KeyError):
+        return None
+    if len(values) != key_count or direction not in ('next', 'prev'):
+        return None
+    return values, direction
+
+def _keyset_condition(sort_keys, values, direction):
+    """
+    Condition « après la ligne du curseur » pour un tri multi-colonnes aux
+    sens mixtes : (k1 > v1) OR (k1 = v1 AND k2 < v2) OR ...
+    """
+    clauses = []
+    params = []
+    for index, (expression, _column, order) in enumerate(sort_keys):
+        ascending = order.upper() == 'ASC'
+        if direction == 'prev':
+            ascending = not ascending
+        parts = [f"{expr} = %s" for expr, _col, _order in sort_keys[:index]]
+        parts.append(f"{expression} {'>' if ascending else '<'} %s")
+        clauses.append("(" + " AND ".join(parts) + ")")
+        params.extend(values[:index + 1])
+    return "(" + " OR ".join(clauses) + ")", params
+
+def cached_count(cursor, count_query, params, ttl=COUNT_CACHE_TTL):
+    """Total d'une requête de comptage, mis en cache ttl secondes par (requête, paramètres)"""
+    key = (count_query, tuple(params))
+    now = time.time()
+    with _count_cache_lock:
+        cached = _count_cache.get(key)
+    if cached and now - cached[0] < ttl:
+        return cached[1]
+    
+    cursor.execute(count_query, params)
+    total = cursor.fetchone()['total']
+    
+    with _count_cache_lock:
+        if len(_count_cache) >= COUNT_CACHE_SIZE:
+            # Éviction des entrées les plus anciennes
+            for stale_key in sorted(_count_cache, key=lambda k: _count_cache[k][0])[:COUNT_CACHE_SIZE // 4]:
+                del _count_cache[stale_key]
+        _count_cache[key] = (now, total)
+    return total
+
+def estimate_count(cursor, query, params):
+    """Estimation du nombre de lignes par l'optimiseur (EXPLAIN), sans parcours"""
+    cursor.execute(f"EXPLAIN {query}", params)
+    plan = cursor.fetchall()
+    return int(plan[0].get('rows') or 0) if plan else 0
+
+def paginate_keyset(cursor, query, params, sort_keys, page, per_page, cursor_token=None,
+                    count_query=None, count_ttl=COUNT_CACHE_TTL, estimate_total=False):
+    """
+    Pagine une requête SQL par clé (seek) plutôt que par OFFSET
+    
+    Args:
+        cursor: Curseur de base de données
+        query: Requête SQL sans ORDER BY ni LIMIT, contenant le marqueur
+            {keyset} à l'endroit où ajouter « AND (...) » dans le WHERE
+            (après tous les autres paramètres)
+        params: Paramètres de la requête
+        sort_keys: Clés de tri [(expression SQL, colonne du résultat, 'ASC'|'DESC')],
+            non nulles, la dernière unique (ex. l'id)
+        page: Numéro de page affiché (page de départ si pas de curseur)
+        per_page: Nombre d'éléments par page
+        cursor_token: Curseur reçu (prev_cursor/next_cursor d'une page précédente)
+        count_query: Requête de comptage (total mis en cache count_ttl secondes)
+        estimate_total: Utiliser l'estimation EXPLAIN plutôt que COUNT
+    
+    Returns:
+        KeysetPagination: Objet de pagination avec les résultats et les curseurs
+    """
+    page = max(1, int(page))
+    per_page = max(1, min(100, int(per_page)))
+    params = list(params)
+    
+    decoded = decode_cursor(cursor_token, len(sort_keys))
+    if decoded:
+        values, direction = decoded
+        condition, seek_params = _keyset_condition(sort_keys, values, direction)
+        offset = 0
+    else:
+        # Sans curseur (première page ou saut direct) : OFFSET classique
+        direction = 'next'
+        condition, seek_params = None, []
+        offset = (page - 1) * per_page
+    
+    order_parts = []
+    for expression, _column, order in sort_keys:
+        ascending = order.upper() == 'ASC'
+        if direction == 'prev':
+            ascending = not ascending
+        order_parts.append(f"{expression} {'ASC' if ascending else 'DESC'}")
+    
+    paginated_query = (
+        query.replace('{keyset}', f"AND {condition}" if condition else '')
+        + f" ORDER BY {', '.join(order_parts)} LIMIT %s"
+    )
+    query_params = params + seek_params + [per_page + 1]
+    if offset:
+        paginated_query += " OFFSET %s"
+        query_params.append(offset)
+    
+    cursor.execute(paginated_query, query_params)
+    items = list(cursor.fetchall())
+    has_more = len(items) > per_page
+    items = items[:per_page]
+    
+    if direction == 'prev':
+        items.reverse()
+        has_prev, has_next = has_more, True
+    else:
+        has_prev, has_next = page > 1, has_more
+    
+    def row_values(row):
+        return [row[column] for _expression, column, _order in sort_keys]
+    
+    next_cursor = encode_cursor(row_values(items[-1]), 'next') if has_next and items else None
+    prev_cursor = encode_cursor(row_values(items[0]), 'prev') if has_prev and items else None
+    
+    total = 0
+    if count_query:
+        if estimate_total:
+            total = estimate_count(cursor, count_query, params)
+        else:
+            total = cached_count(cursor, count_query, params, count_ttl)
+    
+    return KeysetPagination(page, per_page, total, items,
+                            has_prev=has_prev, has_next=has_next,
+                            prev_cursor=prev_cursor, next_cursor=next_cursor,
+                            total_is_estimate=estimate_total)